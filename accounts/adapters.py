@@ -25,22 +25,22 @@ class MyAccountAdapter(DefaultAccountAdapter):
             return super().get_login_redirect_url(request)
 
         # Importamos aquí para evitar problemas de import circular
+        from accounts.perfiles import obtener_perfil
         from domain.models import Paciente, Dentista
 
+        perfil = obtener_perfil(request)
+
         # =======================
         # DENTISTA
         # =======================
-        dentista_obj = Dentista.objects.filter(user=user).first()
-        if dentista_obj:
+        if perfil.es_dentista:
             return reverse("dentista:dashboard")
 
         # =======================
         # PACIENTE
         # =======================
-        paciente = None
-        if hasattr(user, "paciente_perfil"):
-            paciente = user.paciente_perfil
-        else:
+        paciente = perfil.paciente
+        if paciente is None:
             nombre_base = user.get_full_name() or (user.email.split("@")[0] if user.email else user.username) or "Paciente"
             dentista_default = Dentista.objects.first()
             if dentista_default:
@@ -0,0 +1,169 @@
+# accounts/perfiles.py
+"""
+Resolución del rol del usuario (dentista / paciente) una sola vez por request.
+
+proyecto_rc.middleware.PerfilUsuarioMiddleware cuelga request.perfil; el rol
+y el id del perfil se guardan en la sesión y el objeto (Dentista o Paciente)
+se carga solo cuando una vista lo pide. Con JWT (DRF) el usuario se lee al primer acceso, después
+de que DRF autenticó, así que funciona igual sin sesión; si el token trae el
+rol en sus claims (accounts/principal.py) tampoco hace falta buscarlo.
+"""
+
+from django.http import Http404
+
+from domain.models import Dentista, Paciente
+
+SESSION_KEY = "_perfil_usuario"
+# (rol, perfil_id) que accounts/principal.py toma de los claims del JWT y cuelga del User
+ATRIBUTO_PERFIL = "_perfil_token"
+
+ROL_DENTISTA = "dentista"
+ROL_PACIENTE = "paciente"
+
+_MODELOS = {ROL_DENTISTA: Dentista, ROL_PACIENTE: Paciente}
+_SIN_RESOLVER = object()
+
+
+class PerfilUsuario:
+    """
+    Rol y perfil del usuario autenticado.
+    - rol: "dentista", "paciente" o None.
+    - dentista / paciente: instancia (o None), cargada a lo más una vez.
+    - dentista_id / paciente_id: sin consulta cuando el rol ya está en sesión.
+    """
+
+    def __init__(self, request):
+        self._request = request
+        self._user_id = _SIN_RESOLVER
+        self._rol = None
+        self._perfil_id = None
+        self._perfil = _SIN_RESOLVER
+
+    # ---------------------------------------------------------
+    # Resolución
+    # ---------------------------------------------------------
+    def _usuario(self):
+        user = getattr(self._request, "user", None)
+        if user is None or not user.is_authenticated:
+            return None
+        return user
+
+    def _resolver(self):
+        user = self._usuario()
+        user_id = user.pk if user else None
+        if user_id == self._user_id:
+            return
+        self._user_id = user_id
+        self._rol, self._perfil_id, self._perfil = None, None, _SIN_RESOLVER
+        if user is None:
+            return
+
+        session = getattr(self._request, "session", None)
+        guardado = session.get(SESSION_KEY) if session is not None else None
+        if guardado and guardado.get("user_id") == user_id:
+            self._rol, self._perfil_id = guardado["rol"], guardado["id"]
+            return
+
+        # Claims firmados del JWT: _cargar comprueba que el perfil siga siendo de este usuario
+        del_token = getattr(user, ATRIBUTO_PERFIL, None)
+        if del_token and del_token[0] in _MODELOS and del_token[1]:
+            self._rol, self._perfil_id = del_token
+            return
+
+        self._resolver_desde_bd(user)
+
+    def _resolver_desde_bd(self, user):
+        # Mismo orden que el adapter de login: primero dentista, luego paciente
+        for rol, modelo in _MODELOS.items():
+            perfil = modelo.objects.filter(user=user).first()
+            if perfil:
+                self._asignar(rol, perfil, user)
+                # Solo en sesiones ya existentes (login web); con JWT no creamos una sesión nueva
+                session = getattr(self._request, "session", None)
+                if session is not None and session.session_key:
+                    session[SESSION_KEY] = {"user_id": user.pk, "rol": rol, "id": perfil.pk}
+                return
+        # Sin rol no se guarda nada: el perfil puede crearse en esta misma sesión
+        self._perfil = None
+
+    def _asignar(self, rol, perfil, user):
+        self._rol, self._perfil_id, self._perfil = rol, perfil.pk, perfil
+        # Dejamos cacheadas ambas direcciones del OneToOne (user.dentista / perfil.user)
+        campo_user = _MODELOS[rol]._meta.get_field("user")
+        campo_user.set_cached_value(perfil, user)
+        campo_user.remote_field.set_cached_value(user, perfil)
+
+    def _cargar(self):
+        self._resolver()
+        if self._perfil is not _SIN_RESOLVER:
+            return self._perfil
+
+        user = self._usuario()
+        perfil = _MODELOS[self._rol].objects.filter(pk=self._perfil_id).first()
+        if perfil is None or perfil.user_id != user.pk:
+            # Perfil borrado o reasignado: olvidamos la sesión y resolvemos de nuevo
+            session = getattr(self._request, "session", None)
+            if session is not None:
+                session.pop(SESSION_KEY, None)
+            self._rol, self._perfil_id = None, None
+            self._resolver_desde_bd(user)
+        else:
+            self._asignar(self._rol, perfil, user)
+        return self._perfil
+
+    # ---------------------------------------------------------
+    # API pública
+    # ---------------------------------------------------------
+    @property
+    def rol(self):
+        self._resolver()
+        return self._rol
+
+    @property
+    def es_dentista(self):
+        return self.rol == ROL_DENTISTA
+
+    @property
+    def es_paciente(self):
+        return self.rol == ROL_PACIENTE
+
+    @property
+    def dentista_id(self):
+        return self._perfil_id if self.es_dentista else None
+
+    @property
+    def paciente_id(self):
+        return self._perfil_id if self.es_paciente else None
+
+    def _perfil_de_rol(self, rol):
+        if self.rol != rol:
+            return None
+        perfil = self._cargar()
+        # Si la sesión estaba desactualizada, _cargar pudo resolver otro rol
+        return perfil if self._rol == rol else None
+
+    @property
+    def dentista(self):
+        return self._perfil_de_rol(ROL_DENTISTA)
+
+    @property
+    def paciente(self):
+        return self._perfil_de_rol(ROL_PACIENTE)
+
+
+def obtener_perfil(request):
+    """request.perfil, creándolo si la request no pasó por el middleware."""
+    perfil = getattr(request, "perfil", None)
+    if perfil is None:
+        perfil = PerfilUsuario(request)
+        request.perfil = perfil
+    return perfil
+
+
+def dentista_o_404(request):
+    """Equivalente a get_object_or_404(Dentista, user=request.user) usando el perfil cacheado."""
+    dentista = obtener_perfil(request).dentista
+    if dentista is None:
+        raise Http404("No existe un perfil de dentista para este usuario.")
+    return dentista
+
@@ -0,0 +1,134 @@
+"""
+Autenticación JWT de la API móvil sin consultas por request.
+
+JWTAuthentication de simplejwt lee el User en cada llamada y luego
+PerfilUsuario busca su Dentista/Paciente (dos consultas más). Aquí:
+
+- El token lleva el rol y el id del perfil como claims ("rol", "perfil_id"),
+  firmados al emitirse (TokenConPerfilSerializer, /api/token/). PerfilUsuario
+  los toma sin consultar; si el perfil ya no es de ese usuario vuelve a
+  resolver desde la BD como siempre. Los tokens sin esos claims (emitidos
+  antes o con RefreshToken.for_user) funcionan igual, solo sin el atajo.
+- El User se guarda en la caché compartida unos segundos
+  (JWT_PRINCIPAL_TTL, 60 por defecto) bajo una versión por usuario. Cualquier
+  save o delete del User cambia la versión (accounts/signals.py), así que la
+  suspensión de procesar_inasistencia (is_active=False) corta el acceso en la
+  siguiente llamada, no al vencer el TTL. Lo que no pasa por señales
+  (QuerySet.update) debe llamar a invalidar_principal.
+
+Solo se cachean campos de identidad, nunca la contraseña: queda diferida,
+así que un save() del usuario cacheado no la pisa.
+"""
+
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from accounts.perfiles import ATRIBUTO_PERFIL, ROL_DENTISTA, ROL_PACIENTE
+from domain.models import Dentista, Paciente
+from proyecto_rc.metricas import incrementar
+
+VERSION_KEY = "principal:version:{}"
+PRINCIPAL_KEY = "principal:{}:{}"
+CLAIM_ROL = "rol"
+CLAIM_PERFIL = "perfil_id"
+
+# En el orden del modelo: User.from_db reparte los valores por posición
+CAMPOS = tuple(
+    f.attname for f in User._meta.concrete_fields
+    if f.attname in {"id", "username", "email", "first_name", "last_name", "is_active", "is_staff", "is_superuser"}
+)
+
+
+def ttl_principal():
+    return int(getattr(settings, "JWT_PRINCIPAL_TTL", 60))
+
+
+# ---------------------------------------------------------
+# Versión por usuario
+# ---------------------------------------------------------
+def _clave(user_id):
+    return VERSION_KEY.format(user_id)
+
+
+def version_principal(user_id):
+    clave = _clave(user_id)
+    version = cache.get(clave)
+    if version is None:
+        cache.add(clave, uuid.uuid4().hex, timeout=None)
+        version = cache.get(clave)
+    return version
+
+
+def invalidar_principal(user_id):
+    """
+    Cambia la versión del usuario ahora y otra vez al confirmar: si otra
+    request leyó el User antes del commit (aún activo) y lo cacheó, la
+    segunda versión deja esa entrada inalcanzable.
+    """
+    if not user_id:
+        return
+    cache.set(_clave(user_id), uuid.uuid4().hex, timeout=None)
+    transaction.on_commit(lambda: cache.set(_clave(user_id), uuid.uuid4().hex, timeout=None))
+
+
+def principal(user_id):
+    """User (solo CAMPOS, contraseña diferida) desde la caché o la BD; None si no existe."""
+    clave = PRINCIPAL_KEY.format(user_id, version_principal(user_id))
+    valores = cache.get(clave)
+    if valores is None:
+        incrementar("rc_cache_principal_total", resultado="miss")
+        valores = User.objects.filter(pk=user_id).values_list(*CAMPOS).first()
+        if valores is None:
+            return None
+        cache.set(clave, valores, timeout=ttl_principal())
+    else:
+        incrementar("rc_cache_principal_total", resultado="hit")
+    return User.from_db(DEFAULT_DB_ALIAS, CAMPOS, valores)
+
+
+# ---------------------------------------------------------
+# Emisión y validación del token
+# ---------------------------------------------------------
+class TokenConPerfilSerializer(TokenObtainPairSerializer):
+    """/api/token/: agrega rol y perfil_id al refresh (y al access que se derive de él)."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        for rol, modelo in ((ROL_DENTISTA, Dentista), (ROL_PACIENTE, Paciente)):
+            perfil_id = modelo.objects.filter(user=user).values_list("id", flat=True).first()
+            if perfil_id:
+                token[CLAIM_ROL], token[CLAIM_PERFIL] = rol, perfil_id
+                break
+        return token
+
+
+class JWTPrincipalAuthentication(JWTAuthentication):
+    """JWTAuthentication que toma el User de principal() y el perfil de los claims."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = principal(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        rol = validated_token.get(CLAIM_ROL)
+        if rol:
+            setattr(user, ATRIBUTO_PERFIL, (rol, validated_token.get(CLAIM_PERFIL)))
+        return user
@@ -1,7 +1,8 @@
 from django.contrib.auth.models import User
-from django.db.models.signals import pre_delete
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
+from accounts.principal import invalidar_principal
 from domain.models import Dentista, Paciente
 
 
@@ -23,3 +24,10 @@ def borrar_perfiles_relacionados(sender, instance, **kwargs):
             instance.paciente_perfil.delete()
     except Exception as exc:
         print(f"[WARN] No se pudo borrar perfil de paciente antes de eliminar usuario {instance.id}: {exc}")
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidar_principal_usuario(sender, instance, **kwargs):
+    # Suspensiones (is_active=False), cambios de permisos o borrado: el JWT deja de usar la copia cacheada
+    invalidar_principal(instance.pk)
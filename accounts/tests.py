@@ -3,11 +3,13 @@ from unittest import mock
 
 from allauth.socialaccount.models import SocialApp
 from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
 from django.contrib.sites.models import Site
 from django.core.management import call_command, CommandError
-from django.test import TestCase, override_settings
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
 
+from accounts.perfiles import SESSION_KEY, PerfilUsuario
 from domain.models import Dentista, Paciente
 
 
@@ -54,3 +56,57 @@ class LoginRedirectTests(TestCase):
 
         response = self.client.get(reverse("redireccionar_usuario"))
         self.assertRedirects(response, reverse("paciente:completar_perfil"), fetch_redirect_response=False)
+
+
+class PerfilUsuarioTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="pac_perfil", password="pass")
+        self.dentista = Dentista.objects.create(
+            user=User.objects.create_user(username="dent_perfil", password="pass"), nombre="Dr. Perfil"
+        )
+        self.paciente = Paciente.objects.create(user=self.user, dentista=self.dentista, nombre="Paciente Perfil")
+
+    def _request(self, session):
+        request = RequestFactory().get("/")
+        request.user = User.objects.get(pk=self.user.pk)
+        request.session = session
+        return request
+
+    def _sesion(self):
+        session = SessionStore()
+        session.create()
+        return session
+
+    def test_rol_en_sesion_evita_resolver_de_nuevo(self):
+        session = self._sesion()
+        perfil = PerfilUsuario(self._request(session))
+        with self.assertNumQueries(2):  # busca dentista (no hay) y luego paciente
+            self.assertEqual(perfil.paciente, self.paciente)
+        self.assertEqual(session[SESSION_KEY]["id"], self.paciente.id)
+
+        # Siguiente request: id sin consultas y el objeto con una sola, compartido con user.paciente_perfil
+        request = self._request(session)
+        perfil = PerfilUsuario(request)
+        with self.assertNumQueries(0):
+            self.assertTrue(perfil.es_paciente)
+            self.assertEqual(perfil.paciente_id, self.paciente.id)
+        with self.assertNumQueries(1):
+            self.assertEqual(perfil.paciente, self.paciente)
+            self.assertIs(request.user.paciente_perfil, perfil.paciente)
+
+    def test_perfil_borrado_se_resuelve_de_nuevo(self):
+        session = self._sesion()
+        session[SESSION_KEY] = {"user_id": self.user.pk, "rol": "dentista", "id": 999}
+        perfil = PerfilUsuario(self._request(session))
+
+        self.assertEqual(perfil.paciente, None)  # la sesión dice dentista
+        self.assertIsNone(perfil.dentista)
+        self.assertEqual(perfil.rol, "paciente")
+        self.assertEqual(session[SESSION_KEY]["rol"], "paciente")
+
+    def test_sin_sesion_previa_no_crea_sesion(self):
+        session = SessionStore()
+        perfil = PerfilUsuario(self._request(session))
+
+        self.assertEqual(perfil.paciente, self.paciente)
+        self.assertNotIn(SESSION_KEY, session)
@@ -35,17 +35,17 @@ def redirect_by_role(request):
         # Nombre de la URL de login (definida en urls.py como account_login)
         return redirect("account_login")
 
+    from accounts.perfiles import obtener_perfil
     from domain.models import Dentista, Paciente
-    dentista_obj = Dentista.objects.filter(user=user).first()
-    tiene_dentista = dentista_obj is not None
-    tiene_paciente = Paciente.objects.filter(user=user).exists()
+    perfil = obtener_perfil(request)
+    tiene_paciente = perfil.es_paciente
 
     # 1. Admin / staff -> panel de Django
     if user.is_superuser or user.is_staff or user.groups.filter(name="Administrador").exists():
         return redirect("/admin/")
 
     # 2. Dentista -> dashboard dentista (solo si existe perfil)
-    if dentista_obj:
+    if perfil.es_dentista:
         return redirect("dentista:dashboard")
 
     # 3. Paciente -> dashboard paciente (por defecto)
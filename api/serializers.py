@@ -6,10 +6,11 @@ from django.contrib.auth import get_user_model
 from domain.models import Dentista, Servicio  # Importamos los modelos correctos
 
 User = get_user_model() # Así se obtiene el User en Django
+# Formato de /api/servicios/: domain/catalogo.py guarda estos bytes ya renderizados
 class ServicioSerializer(serializers.ModelSerializer):
     class Meta:
         model = Servicio
-        fields = ("id", "nombre", "descripcion", "precio", "activo")
+        fields = ("id", "nombre", "descripcion", "precio", "duracion_estimada", "activo")
 
 # # Serializer para el perfil del dentista
 class PerfilDentistaSerializer(serializers.ModelSerializer):
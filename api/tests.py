@@ -1,15 +1,41 @@
 from datetime import datetime, timedelta, time
+import json
+from io import StringIO
 import os
+import tempfile
+import threading
+import time as time_mod
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from unittest import mock
 
-from django.test import TestCase, override_settings
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection
+from django.http import JsonResponse
+from django.test import LiveServerTestCase, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
 from django.urls import reverse
 from django.utils import timezone
 from django.contrib.auth.models import User
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
 
-from domain.models import Dentista, Paciente, Servicio, Horario, Cita, Pago
+from accounts.principal import principal
+from domain.conversaciones import MAXIMO_TURNOS
+from domain.reservas import candado_local, vencer_retenciones
+from domain.sincronizacion import sin_lapidas
+from domain.models import (
+    AvisoDentista, Dentista, Paciente, Servicio, Horario, Cita, Pago, ReservaTemporal, Notificacion, RegistroBorrado,
+)
+from proyecto_rc import metricas
+from proyecto_rc.trazas import leer_trazas
+from proyecto_rc.middleware import PerfiladorSQLMiddleware
+from proyecto_rc.presupuestos import PRESUPUESTOS, PresupuestoExcedido, presupuesto_consultas
 
 
 class HealthCheckTests(TestCase):
@@ -29,6 +55,149 @@ class HealthCheckTests(TestCase):
         self.assertIn("allowed_hosts", body)
 
 
+@override_settings(PERFILADOR_SQL_HABILITADO=True, PERFILADOR_SQL_MUESTREO=0, PERFILADOR_SQL_TOKEN="perf", PERFILADOR_SQL_NMAS1=3)
+class PerfiladorSQLTests(TestCase):
+    def _vista_nmas1(self, request):
+        for i in range(5):
+            Servicio.objects.filter(id=i).first()
+        return JsonResponse({"ok": True})
+
+    def test_registra_consultas_y_nmas1_con_cabecera(self):
+        middleware = PerfiladorSQLMiddleware(self._vista_nmas1)
+        request = RequestFactory().get("/perfilado/", HTTP_X_PERFILAR_SQL="perf")
+
+        with self.assertLogs("proyecto_rc.perfilador", level="INFO") as logs:
+            middleware(request)
+
+        perfil = logs.records[0].perfil
+        self.assertEqual(perfil["consultas"], 5)
+        self.assertEqual(len(perfil["nmas1"]), 1)
+        self.assertEqual(perfil["nmas1"][0]["veces"], 5)
+        self.assertIn("api/tests.py", perfil["nmas1"][0]["origen"])
+
+    def test_sin_cabecera_ni_muestreo_no_perfila(self):
+        middleware = PerfiladorSQLMiddleware(self._vista_nmas1)
+        with self.assertNoLogs("proyecto_rc.perfilador", level="INFO"):
+            middleware(RequestFactory().get("/perfilado/", HTTP_X_PERFILAR_SQL="otro"))
+            middleware(RequestFactory().get("/perfilado/"))
+
+
+@override_settings(METRICAS_TOKEN="met")
+class MetricasTests(TestCase):
+    def setUp(self):
+        metricas.reiniciar()
+        self.addCleanup(metricas.reiniciar)
+
+    def _scrape(self, **extra):
+        return self.client.get(reverse("api_metrics"), **extra)
+
+    def test_requiere_token(self):
+        self.assertEqual(self._scrape().status_code, 403)
+        self.assertEqual(self._scrape(HTTP_AUTHORIZATION="Bearer otro").status_code, 403)
+        self.assertEqual(self._scrape(HTTP_AUTHORIZATION="Bearer met").status_code, 200)
+
+    def test_expone_vistas_histogramas_y_gauges(self):
+        user = User.objects.create_user(username="docm", password="x")
+        dentista = Dentista.objects.create(user=user, nombre="Doc M")
+        ReservaTemporal.objects.create(
+            dentista=dentista, fecha=timezone.localdate(), hora_inicio=time(9, 0), hora_fin=time(9, 30),
+            expires_at=timezone.now() + timedelta(minutes=10),
+        )
+        self.client.get(reverse("api_health"))
+        self.client.get(reverse("api_health"))
+
+        resp = self._scrape(HTTP_AUTHORIZATION="Bearer met")
+        self.assertTrue(resp["Content-Type"].startswith("text/plain; version=0.0.4"))
+        texto = resp.content.decode()
+        self.assertIn('rc_http_requests_total{estado="200",metodo="GET",vista="api_health"} 2', texto)
+        self.assertIn('rc_http_request_segundos_bucket{vista="api_health",le="+Inf"} 2', texto)
+        self.assertIn('rc_db_consultas_segundos_count{vista="api_health"} 2', texto)
+        self.assertIn("# TYPE rc_http_request_segundos histogram", texto)
+        self.assertIn("rc_reservas_temporales_activas 1", texto)
+        self.assertIn("rc_recordatorios_pendientes 0", texto)
+
+    def test_agrega_volcados_de_otros_procesos(self):
+        with tempfile.TemporaryDirectory() as directorio, self.settings(METRICAS_DIR=directorio):
+            metricas.incrementar("rc_chatbot_respuestas_total", source="ia")
+            metricas.observar("rc_chatbot_llm_segundos", 0.3, resultado="ok")
+            metricas.volcar()
+            # El archivo de este proceso se renombra como si fuera otro worker
+            propio = os.path.join(directorio, f"metricas-{os.getpid()}.json")
+            os.replace(propio, os.path.join(directorio, "metricas-999999.json"))
+
+            metricas.incrementar("rc_chatbot_respuestas_total", source="ia")
+            metricas.incrementar("rc_chatbot_respuestas_total", source="local")
+            texto = metricas.exponer()
+
+        self.assertIn('rc_chatbot_respuestas_total{source="ia"} 3', texto)
+        self.assertIn('rc_chatbot_respuestas_total{source="local"} 1', texto)
+        self.assertIn('rc_chatbot_llm_segundos_bucket{resultado="ok",le="0.5"} 2', texto)
+        self.assertIn('rc_chatbot_llm_segundos_count{resultado="ok"} 2', texto)
+
+
+class PresupuestoConsultasTests(TestCase):
+    def _vista(self, consultas):
+        def vista(request):
+            for i in range(consultas):
+                Servicio.objects.filter(id=i).first()
+            return JsonResponse({"ok": True})
+        return vista
+
+    def test_registra_presupuesto_por_vista(self):
+        vista = presupuesto_consultas(max=2)(self._vista(1))
+        self.assertEqual(PRESUPUESTOS[f"{__name__}.{vista.__qualname__}"], 2)
+        self.assertEqual(vista(RequestFactory().get("/ok/")).status_code, 200)
+
+    @override_settings(PRESUPUESTO_CONSULTAS_ESTRICTO=True)
+    def test_estricto_falla_al_exceder(self):
+        vista = presupuesto_consultas(max=2)(self._vista(4))
+        with self.assertRaisesMessage(PresupuestoExcedido, "4 consultas (máximo 2)") as ctx:
+            vista(RequestFactory().get("/nmas1/"))
+        self.assertIn("4x SELECT", str(ctx.exception))
+
+    @override_settings(PRESUPUESTO_CONSULTAS_ESTRICTO=False)
+    def test_produccion_solo_registra_warning(self):
+        vista = presupuesto_consultas(max=2)(self._vista(4))
+        with self.assertLogs("proyecto_rc.presupuestos", level="WARNING") as logs:
+            resp = vista(RequestFactory().get("/nmas1/"))
+        self.assertEqual(resp.status_code, 200)
+        datos = logs.records[0].presupuesto
+        self.assertEqual((datos["consultas"], datos["maximo"], datos["ruta"]), (4, 2, "/nmas1/"))
+        self.assertEqual(datos["repetidas"][0]["veces"], 4)
+
+    def test_endpoints_api_dentro_de_presupuesto(self):
+        # Agenda ocupada y 30 citas/servicios: un N+1 en cualquier endpoint excede su presupuesto
+        dentista = Dentista.objects.create(user=User.objects.create(username="doc_api"), nombre="Dr Carga")
+        user = User.objects.create(username="pac_api")
+        paciente = Paciente.objects.create(user=user, dentista=dentista, nombre="Paciente Carga")
+        servicios = [
+            Servicio.objects.create(dentista=dentista, nombre=f"Servicio {i}", precio=100, duracion_estimada=30)
+            for i in range(30)
+        ]
+        for dia in range(1, 7):
+            Horario.objects.create(dentista=dentista, dia_semana=dia, hora_inicio=time(9, 0), hora_fin=time(10, 0))
+        hoy = timezone.localdate()
+        for i in range(30):
+            fecha = hoy + timedelta(days=i + 1)
+            Cita.objects.create(
+                dentista=dentista, paciente=paciente, servicio=servicios[i], fecha=fecha,
+                hora_inicio=time(9, 0), hora_fin=time(10, 0), estado="CONFIRMADA",
+            )
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}")
+        servicio_id = servicios[0].id
+        peticiones = [
+            (reverse("api_servicios"), {}),
+            (reverse("api_listar_citas"), {}),
+            (reverse("api_slots"), {"servicio_id": servicio_id, "dentista_id": dentista.id, "fecha": (hoy + timedelta(days=3)).isoformat()}),
+            (reverse("api_primer_espacio"), {"servicio_id": servicio_id, "limite": 3}),
+        ]
+        for url, params in peticiones:
+            with self.subTest(url=url):
+                self.assertEqual(client.get(url, params).status_code, 200)
+
+
 class ChatbotSecurityTests(TestCase):
     @override_settings(CHATBOT_REQUIRE_SECRET=True, CHATBOT_API_SECRET="abc123")
     def test_chatbot_rechaza_sin_header_secret(self):
@@ -49,6 +218,55 @@ class ChatbotSecurityTests(TestCase):
         self.assertEqual(resp.status_code, 200)
 
 
+@override_settings(CHATBOT_REQUIRE_SECRET=False, CHATBOT_API_SECRET="")
+class ChatbotConversacionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.historiales = []
+
+        def responder(mensaje, history=None, lang_code="es"):
+            self.historiales.append(list(history or []))
+            return {"message": f"eco {mensaje}", "source": "local"}
+
+        parche = mock.patch("api.views.responder_chatbot", side_effect=responder)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def _enviar(self, client, texto, conversacion=None):
+        resp = client.post(reverse("chatbot_api"), {"query": texto, "conversacion": conversacion}, format="json")
+        self.assertEqual(resp.status_code, 200, resp.content)
+        return resp
+
+    def test_anonimo_no_crea_sesion_ni_escribe_en_bd(self):
+        from django.contrib.sessions.models import Session
+
+        client = APIClient()
+        with CaptureQueriesContext(connection) as consultas:
+            token = self._enviar(client, "hola").json()["conversacion"]
+            resp = self._enviar(client, "horarios", token)
+        self.assertEqual(consultas.captured_queries, [])
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, resp.cookies)
+        self.assertEqual(Session.objects.count(), 0)
+        self.assertEqual(self.historiales[-1], ["Usuario: hola", "Asistente: eco hola"])
+
+    def test_guarda_solo_los_ultimos_turnos(self):
+        client = APIClient()
+        token = None
+        for i in range(MAXIMO_TURNOS + 2):
+            token = self._enviar(client, f"m{i}", token).json()["conversacion"]
+        self._enviar(client, "fin", token)
+        historial = self.historiales[-1]
+        self.assertEqual(len(historial), 2 * MAXIMO_TURNOS)
+        self.assertEqual(historial[0], "Usuario: m2")
+
+    def test_token_alterado_empieza_otra_conversacion(self):
+        client = APIClient()
+        token = self._enviar(client, "hola").json()["conversacion"]
+        resp = self._enviar(client, "sigo", token[:-1] + ("A" if token[-1] != "A" else "B"))
+        self.assertEqual(self.historiales[-1], [])
+        self.assertNotEqual(resp.json()["conversacion"], token)
+
+
 class CitasAPITests(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -78,6 +296,37 @@ class CitasAPITests(TestCase):
             base += timedelta(days=1)
         return base
 
+    def test_crear_cita_queda_trazada_con_request_id(self):
+        with tempfile.TemporaryDirectory() as directorio, self.settings(TRAZAS_HABILITADO=True, TRAZAS_DIR=directorio):
+            resp = self.client.post(
+                reverse("api_crear_cita"),
+                {"servicio_id": self.servicio.id, "fecha": self.fecha.isoformat(), "hora": "10:00"},
+                format="json",
+                HTTP_X_REQUEST_ID="req-42",
+            )
+            self.assertEqual(resp.status_code, 201, resp.content)
+            self.assertEqual(resp["X-Request-ID"], "req-42")
+            trazas = leer_trazas(directorio)
+
+            salida = StringIO()
+            call_command("trazas", dir=directorio, stdout=salida)
+
+        self.assertEqual(len(trazas), 1)
+        spans = {s["nombre"]: s for s in trazas[0]["spans"]}
+        raiz = trazas[0]["spans"][0]
+        self.assertEqual(raiz["nombre"], "POST api_crear_cita")
+        self.assertEqual(raiz["atributos"]["request.id"], "req-42")
+        self.assertEqual(raiz["atributos"]["http.status_code"], 201)
+        reserva = spans["domain.reservas.reservar_cita"]
+        self.assertEqual(reserva["padre"], raiz["id"])
+        self.assertEqual(spans["pago.crear"]["padre"], reserva["id"])
+        self.assertIn("domain.notifications.enviar_correo_confirmacion_cita", spans)
+        self.assertIn("POST api_crear_cita", salida.getvalue())
+
+    def test_request_id_invalido_se_reemplaza(self):
+        resp = self.client.get(reverse("api_listar_citas"), HTTP_X_REQUEST_ID="no valido\n")
+        self.assertEqual(len(resp["X-Request-ID"]), 32)
+
     def test_crear_cita_api_ok(self):
         url = reverse("api_crear_cita")
         resp = self.client.post(
@@ -97,6 +346,41 @@ class CitasAPITests(TestCase):
         self.assertEqual(cita.estado, "PENDIENTE")
         self.assertTrue(Pago.objects.filter(cita=cita, estado="PENDIENTE").exists())
 
+    def test_cita_sin_checkout_no_vence(self):
+        resp = self.client.post(
+            reverse("api_crear_cita"),
+            {"servicio_id": self.servicio.id, "fecha": self.fecha.isoformat(), "hora": "10:00"},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 201, resp.content)
+
+        # La app no pasa por MercadoPago: sin retención, ningún barrido la cancela
+        self.assertFalse(ReservaTemporal.objects.exists())
+        self.assertEqual(vencer_retenciones(), (0, 0))
+        self.assertEqual(Cita.objects.get().estado, "PENDIENTE")
+
+    @override_settings(SEND_EMAILS=True, DEFAULT_FROM_EMAIL="consultorio@test")
+    def test_checkout_vencido_cancela_y_avisa(self):
+        self.user.email = "paciente@test"
+        self.user.save(update_fields=["email"])
+        resp = self.client.post(
+            reverse("api_crear_cita"),
+            {"servicio_id": self.servicio.id, "fecha": self.fecha.isoformat(), "hora": "10:00", "checkout": True},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 201, resp.content)
+        ReservaTemporal.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        mail.outbox.clear()
+        AvisoDentista.objects.all().delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(vencer_retenciones(), (1, 1))
+
+        self.assertEqual(Cita.objects.get().estado, "CANCELADA")
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["paciente@test"])
+        self.assertIn("Cita cancelada", AvisoDentista.objects.get(dentista=self.dentista).mensaje)
+
     def test_crear_cita_bloqueado_por_penalizacion(self):
         cita_prev = Cita.objects.create(
             dentista=self.dentista,
@@ -148,6 +432,32 @@ class CitasAPITests(TestCase):
         body = resp.json()
         self.assertIn("slots", body)
 
+    def test_primer_espacio_mezcla_dentistas(self):
+        otro = Dentista.objects.create(user=User.objects.create_user(username="doctor2", password="pass123"), nombre="Dr Temprano")
+        Servicio.objects.create(dentista=otro, nombre="limpieza", precio=450, duracion_estimada=30, activo=True)
+        Horario.objects.create(dentista=otro, dia_semana=self.fecha.isoweekday(), hora_inicio=time(8, 0), hora_fin=time(12, 0))
+        Cita.objects.create(
+            dentista=otro,
+            paciente=self.paciente,
+            servicio=self.servicio,
+            fecha=self.fecha,
+            hora_inicio=time(8, 0),
+            hora_fin=time(8, 30),
+            estado="PENDIENTE",
+        )
+        url = reverse("api_primer_espacio")
+
+        resp = self.client.get(url, {"servicio_id": self.servicio.id})
+        self.assertEqual(resp.status_code, 200, resp.content)
+        espacio = resp.json()["espacios"][0]
+        self.assertEqual((espacio["fecha"], espacio["hora"]), (self.fecha.isoformat(), "09:00"))
+        self.assertEqual(espacio["dentista"]["id"], self.dentista.id)
+
+        resp = self.client.get(url, {"servicio_id": self.servicio.id, "cualquier_dentista": "1"})
+        espacio = resp.json()["espacios"][0]
+        self.assertEqual((espacio["fecha"], espacio["hora"]), (self.fecha.isoformat(), "08:30"))
+        self.assertEqual(espacio["dentista"]["id"], otro.id)
+
     def test_slots_rechaza_fecha_pasada(self):
         url = reverse("api_slots")
         resp = self.client.get(
@@ -160,6 +470,78 @@ class CitasAPITests(TestCase):
         )
         self.assertEqual(resp.status_code, 400)
 
+    def test_listar_citas_pagina_historial_por_cursor(self):
+        pasado = timezone.localdate() - timedelta(days=30)
+        for i in range(3):
+            Cita.objects.create(
+                dentista=self.dentista, paciente=self.paciente, servicio=self.servicio,
+                fecha=pasado + timedelta(days=i), hora_inicio=time(9, 0), hora_fin=time(9, 30), estado="COMPLETADA",
+            )
+        resp = self.client.get(reverse("api_listar_citas"), {"limite": 2})
+        self.assertEqual(len(resp.data["historial"]), 2)
+        resp = self.client.get(reverse("api_listar_citas"), {"limite": 2, "cursor": resp.data["historial_siguiente"]})
+        self.assertEqual([c["fecha"] for c in resp.data["historial"]], [pasado.isoformat()])
+        self.assertIsNone(resp.data["historial_siguiente"])
+        self.assertEqual(self.client.get(reverse("api_listar_citas"), {"cursor": "x"}).status_code, 400)
+
+    def test_respuestas_condicionales_304_hasta_que_cambian_los_datos(self):
+        url = reverse("api_listar_citas")
+        resp = self.client.get(url)
+        etag = resp["ETag"]
+        self.assertIn("no-cache", resp["Cache-Control"])
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.content, b"")
+
+        Cita.objects.create(
+            dentista=self.dentista, paciente=self.paciente, servicio=self.servicio,
+            fecha=self.fecha, hora_inicio=time(10, 0), hora_fin=time(10, 30), estado="PENDIENTE",
+        )
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.data["proximas"]), 1)
+
+        # Slots: un checkout vencido que libera su hueco cambia el validador
+        params = {"fecha": self.fecha.isoformat(), "servicio_id": self.servicio.id, "dentista_id": self.dentista.id}
+        etag = self.client.get(reverse("api_slots"), params)["ETag"]
+        self.assertEqual(self.client.get(reverse("api_slots"), params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        cita = Cita.objects.get(fecha=self.fecha, hora_inicio=time(10, 0))
+        ReservaTemporal.objects.create(
+            dentista=self.dentista, cita=cita, fecha=self.fecha, hora_inicio=time(10, 0), hora_fin=time(10, 30),
+            expires_at=timezone.now() - timedelta(minutes=1),
+        )
+        self.assertEqual(vencer_retenciones(), (1, 1))
+        self.assertEqual(self.client.get(reverse("api_slots"), params, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_catalogo_de_servicios_en_cache_y_304_sin_consultas(self):
+        otro = Dentista.objects.create(user=User.objects.create_user(username="doctor3"), nombre="Dr Otro")
+        Servicio.objects.create(dentista=otro, nombre="Endodoncia", precio=1500, duracion_estimada=60)
+        anon = APIClient()
+        resp = anon.get(reverse("api_servicios"))
+        etag = resp["ETag"]
+        self.assertIn("public", resp["Cache-Control"])
+        self.assertEqual(
+            resp.json(),
+            [
+                {"id": Servicio.objects.get(nombre="Endodoncia").id, "nombre": "Endodoncia", "descripcion": "", "precio": "1500.00", "duracion_estimada": 60, "activo": True},
+                {"id": self.servicio.id, "nombre": "Limpieza", "descripcion": "", "precio": "500.00", "duracion_estimada": 30, "activo": True},
+            ],
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(anon.get(reverse("api_servicios"), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            # Sin validador: los bytes salen del catálogo en caché
+            self.assertEqual(anon.get(reverse("api_servicios")).content, resp.content)
+
+        resp = anon.get(reverse("api_servicios"), {"dentista_id": otro.id})
+        self.assertEqual([s["nombre"] for s in resp.json()], ["Endodoncia"])
+        self.assertEqual(anon.get(reverse("api_servicios"), {"dentista_id": "x"}).status_code, 400)
+
+        self.servicio.activo = False
+        self.servicio.save()
+        resp = anon.get(reverse("api_servicios"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([s["nombre"] for s in resp.json()], ["Endodoncia"])
+
     def test_cancelar_cita_permiso(self):
         cita = Cita.objects.create(
             dentista=self.dentista,
@@ -209,3 +591,296 @@ class CitasAPITests(TestCase):
         url = reverse("api_cancelar_cita", args=[cita.id])
         resp = anon.post(url)
         self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def _cita(self, hora):
+        return Cita.objects.create(
+            dentista=self.dentista,
+            paciente=self.paciente,
+            servicio=self.servicio,
+            fecha=self.fecha,
+            hora_inicio=time(hora, 0),
+            hora_fin=time(hora, 30),
+            estado="PENDIENTE",
+        )
+
+    def test_sync_manda_solo_los_cambios_y_los_borrados(self):
+        a, b, c = self._cita(9), self._cita(10), self._cita(11)
+        Notificacion.objects.create(usuario=self.user, titulo="Hola", mensaje="Bienvenido")
+        # Lo anterior al margen de solapamiento no se reenvía
+        hace_rato = timezone.now() - timedelta(minutes=10)
+        Cita.objects.update(updated_at=hace_rato)
+        Notificacion.objects.update(updated_at=hace_rato)
+
+        resp = self.client.get(reverse("api_sync"))
+        self.assertEqual(resp.status_code, 200, resp.content)
+        datos = resp.json()
+        self.assertTrue(datos["reinicio"])
+        self.assertFalse(datos["mas"])
+        self.assertEqual(sorted(x["id"] for x in datos["citas"]), [a.id, b.id, c.id])
+        self.assertEqual(len(datos["notificaciones"]), 1)
+
+        resp = self.client.get(reverse("api_sync"), {"since": datos["token"]})
+        vacio = resp.json()
+        self.assertFalse(vacio["reinicio"])
+        self.assertEqual(vacio["citas"], [])
+        self.assertEqual(vacio["borrados"], {})
+
+        a.estado = "CONFIRMADA"
+        a.save(update_fields=["estado"])
+        borrada = b.id
+        b.delete()
+        resp = self.client.get(reverse("api_sync"), {"since": vacio["token"]})
+        delta = resp.json()
+        self.assertEqual([x["id"] for x in delta["citas"]], [a.id])
+        self.assertEqual(delta["citas"][0]["estado"], "CONFIRMADA")
+        self.assertEqual(delta["borrados"], {"citas": [borrada]})
+        self.assertEqual(delta["notificaciones"], [])
+
+    def test_sync_corta_por_limite(self):
+        citas = [self._cita(h) for h in (9, 10, 11)]
+        resp = self.client.get(reverse("api_sync"), {"limite": 2})
+        datos = resp.json()
+        self.assertTrue(datos["mas"])
+        self.assertEqual([x["id"] for x in datos["citas"]], [c.id for c in citas[:2]])
+
+        resp = self.client.get(reverse("api_sync"), {"since": datos["token"], "limite": 2})
+        resto = resp.json()
+        self.assertFalse(resto["mas"])
+        self.assertEqual([x["id"] for x in resto["citas"]], [citas[2].id])
+
+    def test_sync_token_invalido_o_ajeno(self):
+        resp = self.client.get(reverse("api_sync"), {"since": "no-es-un-token"})
+        self.assertEqual(resp.status_code, 400)
+
+        token = self.client.get(reverse("api_sync")).json()["token"]
+        otro_user = User.objects.create_user(username="otro_sync", password="pass")
+        Paciente.objects.create(user=otro_user, dentista=self.dentista, nombre="Otro Sync")
+        otro = APIClient()
+        otro.force_authenticate(user=otro_user)
+        self.assertEqual(otro.get(reverse("api_sync"), {"since": token}).status_code, 400)
+
+    def test_sync_reinicia_si_el_token_supera_la_retencion(self):
+        token = self.client.get(reverse("api_sync")).json()["token"]
+        with self.settings(SYNC_RETENCION_BORRADOS_DIAS=0):
+            datos = self.client.get(reverse("api_sync"), {"since": token}).json()
+        self.assertTrue(datos["reinicio"])
+
+    def test_purgar_borrados(self):
+        self._cita(9).delete()
+        self.assertEqual(RegistroBorrado.objects.count(), 1)
+        RegistroBorrado.objects.update(borrado_en=timezone.now() - timedelta(days=31))
+        salida = StringIO()
+        call_command("purgar_borrados", stdout=salida)
+        self.assertEqual(RegistroBorrado.objects.count(), 0)
+
+    def test_borrado_en_cascada_inserta_las_lapidas_juntas(self):
+        for hora in (9, 10, 11):
+            Pago.objects.create(cita=self._cita(hora), monto=500)
+        Notificacion.objects.create(usuario=self.user, titulo="Hola", mensaje="Bienvenido")
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.paciente.delete()
+        inserts = [q["sql"] for q in consultas.captured_queries if q["sql"].startswith('INSERT INTO "domain_registroborrado"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(
+            sorted(RegistroBorrado.objects.values_list("modelo", flat=True)),
+            ["citas"] * 3 + ["pagos"] * 3,
+        )
+
+        # Las purgas con sin_lapidas no dejan rastro
+        with sin_lapidas():
+            Notificacion.objects.filter(usuario=self.user).delete()
+        self.assertEqual(RegistroBorrado.objects.count(), 6)
+
+
+class PrincipalJWTTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="movil", password="pass123")
+        doc_user = User.objects.create_user(username="doc_movil", password="pass123")
+        self.dentista = Dentista.objects.create(user=doc_user, nombre="Dr Movil")
+        self.paciente = Paciente.objects.create(user=self.user, dentista=self.dentista, nombre="Paciente Movil")
+        resp = APIClient().post(reverse("token_obtain_pair"), {"username": "movil", "password": "pass123"}, format="json")
+        self.assertEqual(resp.status_code, 200, resp.content)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {resp.json()['access']}")
+
+    def test_token_lleva_el_perfil_y_no_consulta_usuario_ni_rol(self):
+        self.assertEqual(self.client.get(reverse("api_listar_citas")).status_code, 200)
+        with CaptureQueriesContext(connection) as consultas:
+            resp = self.client.get(reverse("api_listar_citas"))
+        self.assertEqual(resp.status_code, 200)
+        sql = " ".join(q["sql"] for q in consultas.captured_queries)
+        self.assertNotIn('"auth_user"', sql)
+        self.assertNotIn('WHERE "domain_dentista"."user_id"', sql)
+        self.assertNotIn('WHERE "domain_paciente"."user_id"', sql)
+
+    def test_suspension_corta_el_acceso_de_inmediato(self):
+        self.assertEqual(self.client.get(reverse("api_listar_citas")).status_code, 200)
+        # Igual que procesar_inasistencia
+        self.user.is_active = False
+        self.user.save(update_fields=["is_active"])
+        self.assertEqual(self.client.get(reverse("api_listar_citas")).status_code, 401)
+
+    def test_claims_desactualizados_resuelven_desde_la_bd(self):
+        self.assertEqual(self.client.get(reverse("api_listar_citas")).status_code, 200)
+        self.paciente.user = None
+        self.paciente.save()
+        nuevo = Paciente.objects.create(user=self.user, dentista=self.dentista, nombre="Paciente Nuevo")
+        cita = Cita.objects.create(
+            dentista=self.dentista,
+            paciente=nuevo,
+            servicio=Servicio.objects.create(dentista=self.dentista, nombre="Limpieza", precio=500, duracion_estimada=30),
+            fecha=timezone.localdate() + timedelta(days=3),
+            hora_inicio=time(10, 0),
+            hora_fin=time(10, 30),
+            estado="PENDIENTE",
+        )
+        resp = self.client.get(reverse("api_listar_citas"))
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn(cita.id, [c["id"] for c in resp.json()["proximas"]])
+
+    def test_guardar_usuario_cacheado_no_pisa_la_contrasena(self):
+        user = principal(self.user.id)
+        user.first_name = "Movil"
+        user.save()
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password("pass123"))
+        self.assertEqual(self.user.first_name, "Movil")
+
+
+class ReservaConcurrenteTests(LiveServerTestCase):
+    """
+    Dispara reservas en paralelo contra el servidor (threaded) para comprobar que
+    el candado por (dentista, fecha) deja ganar solo a una por hueco.
+    """
+
+    N = 8
+    # Lo que una reserva tiene tomado el candado de su agenda en el throughput medido
+    RETENCION_S = 0.03
+
+    def setUp(self):
+        self.dentista = Dentista.objects.create(
+            user=User.objects.create_user(username="doc_conc", password="pwd"),
+            nombre="Dr Concurrente",
+        )
+        self.servicio = Servicio.objects.create(
+            dentista=self.dentista, nombre="Limpieza", precio=500, duracion_estimada=30, activo=True
+        )
+        self.fecha = timezone.localdate() + timedelta(days=2)
+        while self.fecha.weekday() == 6:
+            self.fecha += timedelta(days=1)
+        Horario.objects.create(
+            dentista=self.dentista,
+            dia_semana=self.fecha.isoweekday(),
+            hora_inicio=time(9, 0),
+            hora_fin=time(17, 0),
+        )
+        self.tokens = []
+        for i in range(self.N):
+            user = User.objects.create_user(username=f"pac_conc_{i}", password="pwd")
+            Paciente.objects.create(user=user, dentista=self.dentista, nombre=f"Paciente {i}")
+            self.tokens.append(str(RefreshToken.for_user(user).access_token))
+
+    def _reservar(self, token, hora, servicio=None):
+        body = json.dumps({
+            "servicio_id": (servicio or self.servicio).id,
+            "fecha": self.fecha.isoformat(),
+            "hora": hora,
+        }).encode()
+        req = urllib.request.Request(
+            f"{self.live_server_url}{reverse('api_crear_cita')}",
+            data=body,
+            method="POST",
+            headers={"Content-Type": "application/json", "Authorization": f"Bearer {token}"},
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=30) as resp:
+                return resp.status
+        except urllib.error.HTTPError as exc:
+            return exc.code
+
+    def test_mismo_hueco_solo_una_reserva_gana(self):
+        with ThreadPoolExecutor(max_workers=self.N) as pool:
+            codigos = list(pool.map(lambda t: self._reservar(t, "10:00"), self.tokens))
+
+        self.assertEqual(codigos.count(201), 1, codigos)
+        self.assertEqual(codigos.count(409), self.N - 1, codigos)
+        self.assertEqual(
+            Cita.objects.filter(dentista=self.dentista, fecha=self.fecha, hora_inicio=time(10, 0)).count(),
+            1,
+        )
+
+    def test_agendas_distintas_reservan_en_paralelo(self):
+        # Un dentista por paciente: ninguna reserva compite por la misma agenda. La BD
+        # en memoria de los tests comparte conexión y serializa; el paralelismo real del
+        # candado lo miden test_throughput_agendas_distintas_frente_a_la_misma y
+        # test_candado_local_solo_espera_a_la_misma_agenda
+        servicios = []
+        for i in range(self.N):
+            dentista = Dentista.objects.create(
+                user=User.objects.create_user(username=f"doc_par_{i}", password="pwd"), nombre=f"Dr {i}"
+            )
+            Horario.objects.create(
+                dentista=dentista, dia_semana=self.fecha.isoweekday(), hora_inicio=time(9, 0), hora_fin=time(17, 0)
+            )
+            servicios.append(Servicio.objects.create(
+                dentista=dentista, nombre="Limpieza", precio=500, duracion_estimada=30, activo=True
+            ))
+        with ThreadPoolExecutor(max_workers=self.N) as pool:
+            codigos = list(pool.map(lambda par: self._reservar(par[0], "10:00", par[1]), zip(self.tokens, servicios)))
+
+        self.assertEqual(codigos, [201] * self.N)
+        self.assertEqual(Cita.objects.filter(fecha=self.fecha, hora_inicio=time(10, 0)).count(), self.N)
+
+    def test_throughput_agendas_distintas_frente_a_la_misma(self):
+        # Reservas por segundo con el candado tomado RETENCION_S por reserva (en lugar de la
+        # transacción, que la BD en memoria serializa): la misma agenda da ~1/RETENCION_S,
+        # agendas distintas en paralelo se acercan a N/RETENCION_S
+        misma = self._reservas_por_segundo(lambda i: 1)
+        distintas = self._reservas_por_segundo(lambda i: i)
+        self.assertGreaterEqual(
+            distintas, 3 * misma, f"agendas distintas {distintas:.0f} res/s, misma agenda {misma:.0f} res/s"
+        )
+
+    def _reservas_por_segundo(self, dentista_de):
+        def reservar(i):
+            with candado_local(dentista_de(i), self.fecha):
+                time_mod.sleep(self.RETENCION_S)
+
+        inicio = time_mod.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.N) as pool:
+            list(pool.map(reservar, range(self.N)))
+        return self.N / (time_mod.perf_counter() - inicio)
+
+    def test_candado_local_solo_espera_a_la_misma_agenda(self):
+        fecha = self.fecha
+        tomado, soltar = threading.Event(), threading.Event()
+
+        def retener():
+            with candado_local(1, fecha):
+                tomado.set()
+                soltar.wait(5)
+
+        hilo = threading.Thread(target=retener)
+        hilo.start()
+        tomado.wait(5)
+        try:
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                otra_agenda = pool.submit(self._tomar_candado, 2, fecha)
+                otro_dia = pool.submit(self._tomar_candado, 1, fecha + timedelta(days=1))
+                misma = pool.submit(self._tomar_candado, 1, fecha)
+                self.assertTrue(otra_agenda.result(timeout=1))
+                self.assertTrue(otro_dia.result(timeout=1))
+                time_mod.sleep(0.2)
+                self.assertFalse(misma.done())
+                soltar.set()
+                self.assertTrue(misma.result(timeout=5))
+        finally:
+            soltar.set()
+            hilo.join()
+
+    @staticmethod
+    def _tomar_candado(dentista_id, fecha):
+        with candado_local(dentista_id, fecha):
+            return True
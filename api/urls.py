@@ -1,12 +1,16 @@
 from django.urls import path
+from proyecto_rc.presupuestos import presupuesto_consultas
 from . import views
 
 urlpatterns = [
     # Healthcheck (sin auth)
     path('health/', views.health_check, name='api_health'),
 
+    # Métricas Prometheus (token en METRICAS_TOKEN)
+    path('metrics/', views.metricas_prometheus, name='api_metrics'),
+
     # API para obtener lista de servicios (opcional)
-    path('servicios/', views.ServicioListAPIView.as_view(), name='api_servicios'),
+    path('servicios/', presupuesto_consultas(max=3)(views.ServicioListAPIView.as_view()), name='api_servicios'),
 
     # API para el Chatbot
     path('chatbot/', views.chatbot_api, name='chatbot_api'),
@@ -14,6 +18,7 @@ urlpatterns = [
     # API PRINCIPAL DE HORARIOS
     # Esta es la que usa el calendario para saber qué horas están libres
     path('slots/', views.api_slots_disponibles, name='api_slots'),
+    path('slots/primero/', views.api_primer_espacio, name='api_primer_espacio'),
 
     # API para crear citas desde móvil
     path('citas/', views.api_crear_cita, name='api_crear_cita'),
@@ -22,4 +27,7 @@ urlpatterns = [
     path('citas/listar/', views.api_listar_citas, name='api_listar_citas'),
     path('citas/<int:cita_id>/cancelar/', views.api_cancelar_cita, name='api_cancelar_cita'),
     path('citas/<int:cita_id>/reprogramar/', views.api_reprogramar_cita, name='api_reprogramar_cita'),
+
+    # Sincronización incremental de la app móvil (?since=<token>)
+    path('sync/', views.api_sync, name='api_sync'),
 ]
@@ -3,28 +3,43 @@ import os
 import hmac
 from datetime import datetime, timedelta
 from django.core.cache import cache
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.utils.dateparse import parse_date
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.conf import settings
 from django.db import models
-from rest_framework import generics, permissions, serializers
+from rest_framework import permissions
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework import status
-from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from accounts.principal import JWTPrincipalAuthentication
 
 # IMPORTANTE: Importamos los modelos correctos desde 'domain'
 # Agregamos 'Dentista' para poder buscarlo por ID
 from domain.models import Servicio, Horario, Dentista
 from domain.notifications import enviar_correo_confirmacion_cita
 from domain.ai_services import (
+    buscar_primer_espacio,
+    es_dia_laboral,
+    firma_slots,
     obtener_slots_disponibles,
     calcular_penalizacion_paciente,
 )
-from domain.models import Cita, Pago
+from domain.models import Cita, Pago, ReservaTemporal
+from domain.conversaciones import abrir_conversacion, agregar_turno, historial_plano
+from domain.paginacion import CursorInvalido, paginar
+from domain.reservas import HorarioNoDisponible, liberar_retencion, reprogramar_cita, reservar_cita
+from domain.sincronizacion import LIMITE as LIMITE_SYNC, TokenInvalido, cambios_paciente
+from domain.catalogo import catalogo_servicios, etag_catalogo
+from domain.versiones import versiones_datos_dentistas
+from proyecto_rc import metricas
+from proyecto_rc.condicional import con_validadores, etag_de, no_modificada
+from proyecto_rc.presupuestos import presupuesto_consultas
+from proyecto_rc.trazas import anotar
 
 # Servicios auxiliares con fallback
 try:
@@ -43,6 +58,7 @@ except Exception:
 # ---------------------------------------------------------
 # Healthcheck simple
 # ---------------------------------------------------------
+@presupuesto_consultas(max=2)
 @api_view(["GET"])
 @authentication_classes([])
 @permission_classes([permissions.AllowAny])
@@ -62,37 +78,99 @@ def health_check(request):
 
 
 # ---------------------------------------------------------
-# Serializer DRF para Servicio (para la API de servicios)
+# Métricas Prometheus
 # ---------------------------------------------------------
-class ServicioSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Servicio
-        fields = ("id", "nombre", "precio", "duracion_estimada", "activo")
+def _gauges_dominio():
+    ahora = timezone.localtime()
+    fin_ventana = ahora + timedelta(hours=25)
+    recordatorios = (
+        Cita.objects.filter(
+            estado__in=["PENDIENTE", "CONFIRMADA"],
+            recordatorio_24h_enviado=False,
+            fecha__lte=fin_ventana.date(),
+        )
+        .filter(models.Q(fecha__gt=ahora.date()) | models.Q(fecha=ahora.date(), hora_inicio__gte=ahora.time()))
+        .count()
+    )
+    return {
+        "rc_reservas_temporales_activas": (
+            "Huecos retenidos mientras el paciente paga (no vencidos).",
+            ReservaTemporal.objects.filter(expires_at__gt=timezone.now()).count(),
+        ),
+        "rc_recordatorios_pendientes": (
+            "Citas de las próximas 25 h sin recordatorio enviado (cola de correo).",
+            recordatorios,
+        ),
+    }
+
+
+@presupuesto_consultas(max=2)
+@require_http_methods(["GET"])
+def metricas_prometheus(request):
+    """
+    Exposición para Prometheus. Requiere Authorization: Bearer <METRICAS_TOKEN>;
+    sin token configurado solo responde con DEBUG.
+    """
+    esperado = getattr(settings, "METRICAS_TOKEN", "")
+    if not esperado and not settings.DEBUG:
+        return JsonResponse({"detail": "Métricas no configuradas"}, status=503)
+    if esperado:
+        cabecera = request.headers.get("Authorization", "")
+        provisto = cabecera[7:] if cabecera.startswith("Bearer ") else ""
+        if not (provisto and hmac.compare_digest(provisto, esperado)):
+            return JsonResponse({"detail": "Forbidden"}, status=403)
+
+    return HttpResponse(
+        metricas.exponer(gauges=_gauges_dominio()),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
 
 
 # ---------------------------------------------------------
 # Lista de servicios activos
 # ---------------------------------------------------------
-class ServicioListAPIView(generics.ListAPIView):
+class ServicioListAPIView(APIView):
     """
     API para listar los servicios activos del consultorio.
     El frontend puede consumirla para llenar selects, etc.
+    El formato lo define api.serializers.ServicioSerializer (domain/catalogo.py lo usa).
     """
-    queryset = Servicio.objects.filter(activo=True).order_by("nombre")
-    serializer_class = ServicioSerializer
     permission_classes = [permissions.AllowAny]
 
+    def get(self, request, *args, **kwargs):
+        """
+        Sirve los bytes ya serializados de domain/catalogo.py (?dentista_id=N
+        para el catálogo de un dentista). El 304 no toca la base ni el catálogo.
+        """
+        dentista_id = request.GET.get("dentista_id") or None
+        if dentista_id is not None and not dentista_id.isdigit():
+            return Response({"detail": "dentista_id inválido."}, status=status.HTTP_400_BAD_REQUEST)
+        dentista_id = int(dentista_id) if dentista_id else None
+
+        max_age = int(getattr(settings, "CATALOGO_SERVICIOS_MAX_AGE", 60))
+        etag = etag_catalogo(dentista_id)
+        vigente = no_modificada(request, etag, publica=True, max_age=max_age)
+        if vigente:
+            return vigente
+        catalogo = catalogo_servicios(dentista_id)
+        respuesta = HttpResponse(catalogo.json, content_type="application/json")
+        return con_validadores(respuesta, catalogo.etag, publica=True, max_age=max_age)
+
 
 # ---------------------------------------------------------
 # Chatbot
 # ---------------------------------------------------------
+@presupuesto_consultas(max=10)
 @csrf_exempt
 @require_http_methods(["GET", "POST"])
 def chatbot_api(request):
     """
     API que recibe mensajes del chat y devuelve respuestas.
-    Espera JSON: {"query": "texto del usuario"}
-    Responde: {"message": "respuesta del bot"}
+    Espera JSON: {"query": "texto del usuario", "conversacion": "<token>"}
+    Responde: {"message": "respuesta del bot", "conversacion": "<token>"}
+
+    "conversacion" es opcional: sin él (o si venció) empieza una conversación
+    nueva. El cliente manda el último que recibió para conservar el contexto.
     """
     # IP real (respeta X-Forwarded-For si existe)
     ip = (request.META.get("HTTP_X_FORWARDED_FOR") or "").split(",")[0].strip() or request.META.get("REMOTE_ADDR", "anon")
@@ -120,6 +198,7 @@ def chatbot_api(request):
     try:
         if request.method == "GET":
             mensaje = (request.GET.get("query") or "").strip()
+            token = request.GET.get("conversacion")
             if not mensaje:
                 return JsonResponse(
                     {"message": "Usa POST con JSON {'query': '...'} o GET ?query=texto."},
@@ -128,20 +207,17 @@ def chatbot_api(request):
         else:
             data = json.loads(request.body)
             mensaje = data.get("query", "").strip()
+            token = data.get("conversacion")
 
             if not mensaje:
                 return JsonResponse({"message": "Request body requires 'query'."}, status=400)
 
-        # Historial breve por sesión (anónimo o logueado).
-        history = []
-        try:
-            history = request.session.get("chatbot_history", []) or []
-        except Exception:
-            history = []
+        # Historial breve en caché por token de conversación (domain/conversaciones.py), sin sesión
+        token, turnos = abrir_conversacion(token)
 
         lang = getattr(request, "LANGUAGE_CODE", "es") or "es"
         if responder_chatbot:
-            payload = responder_chatbot(mensaje, history=history, lang_code=lang)
+            payload = responder_chatbot(mensaje, history=historial_plano(turnos), lang_code=lang)
             respuesta = payload.get("message")
             source = payload.get("source", "local")
             source_detail = payload.get("source_detail")
@@ -151,15 +227,9 @@ def chatbot_api(request):
             source = "local"
             source_detail = None
 
-        # Guardar historial (máx 6 mensajes combinados User/Bot)
-        try:
-            history.append(f"Usuario: {mensaje}")
-            history.append(f"Asistente: {respuesta}")
-            request.session["chatbot_history"] = history[-6:]
-            request.session.modified = True
-        except Exception:
-            pass
-        resp_payload = {"message": respuesta, "source": source}
+        agregar_turno(token, turnos, mensaje, respuesta)
+        metricas.incrementar("rc_chatbot_respuestas_total", source=source)
+        resp_payload = {"message": respuesta, "source": source, "conversacion": token}
         if source_detail:
             resp_payload["source_detail"] = source_detail
         # Log ligero sin datos sensibles
@@ -176,8 +246,9 @@ def chatbot_api(request):
 # ---------------------------------------------------------
 # Slots disponibles para una fecha / servicio
 # ---------------------------------------------------------
+@presupuesto_consultas(max=8)
 @api_view(["GET"])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([JWTPrincipalAuthentication])
 @permission_classes([permissions.IsAuthenticated])
 def api_slots_disponibles(request):
     """
@@ -189,7 +260,7 @@ def api_slots_disponibles(request):
       - dentista_id           [opcional]
 
     Si NO viene dentista_id:
-      - Se usa request.user.perfil_dentista (si existe).
+      - Se usa el perfil de dentista del usuario (request.perfil.dentista).
 
     Respuesta:
       { "slots": ["09:00", "09:15", ...] }
@@ -218,8 +289,6 @@ def api_slots_disponibles(request):
         return JsonResponse({"detail": "No se permiten fechas pasadas."}, status=400)
     if fecha > limite:
         return JsonResponse({"detail": "Fuera de rango (60 días)."}, status=400)
-    if fecha.isoweekday() == 7:
-        return JsonResponse({"detail": "No se atiende los domingos."}, status=400)
 
     # ---------------- Resolver dentista ----------------
     if dentista_id:
@@ -233,10 +302,8 @@ def api_slots_disponibles(request):
                 status=404,
             )
     else:
-        # Intentamos obtener el dentista del usuario logueado
-        # Nota: En tu modelo Dentista la relación es 'dentista' (related_name='dentista' o 'perfil_dentista')
-        # Ajusta según tu models.py. Usaré lo común:
-        dentista = getattr(request.user, "dentista", None)
+        # Intentamos obtener el dentista del usuario logueado (perfil resuelto por el middleware)
+        dentista = request.perfil.dentista
 
         if dentista is None:
             return JsonResponse(
@@ -244,6 +311,9 @@ def api_slots_disponibles(request):
                 status=400,
             )
 
+    if not es_dia_laboral(dentista, fecha):
+        return JsonResponse({"detail": "El dentista no atiende ese día."}, status=400)
+
     # ---------------- Obtener servicio ----------------
     servicio = Servicio.objects.filter(id=servicio_id, activo=True).first()
     if not servicio:
@@ -254,21 +324,91 @@ def api_slots_disponibles(request):
 
     # ---------------- Calcular slots ----------------
     # Esta función debe venir de tu 'domain/ai_services.py'
+    etag = etag_de("slots", *firma_slots(dentista, fecha, servicio))
+    vigente = no_modificada(request, etag)
+    if vigente:
+        return vigente
+
     try:
         slots = obtener_slots_disponibles(dentista, fecha, servicio)
         if not slots:
-            return JsonResponse({"slots": [], "detail": "Sin horarios disponibles para esa fecha."})
-        return JsonResponse({"slots": slots})
+            return con_validadores(JsonResponse({"slots": [], "detail": "Sin horarios disponibles para esa fecha."}), etag)
+        return con_validadores(JsonResponse({"slots": slots}), etag)
     except Exception as e:
         print(f"Error calculando slots: {e}")
         return JsonResponse({"slots": []})
 
 
+# ---------------------------------------------------------
+# Primer espacio disponible (varios días / dentistas)
+# ---------------------------------------------------------
+# Peor caso medido: 13 (60 días sin huecos = 9 bloques de citas, cachés frías)
+@presupuesto_consultas(max=15)
+@api_view(["GET"])
+@authentication_classes([JWTPrincipalAuthentication])
+@permission_classes([permissions.IsAuthenticated])
+def api_primer_espacio(request):
+    """
+    Busca el hueco libre más próximo para un servicio sin iterar día por día en el cliente.
+
+    Parámetros GET:
+      - servicio_id           [obligatorio]
+      - desde (YYYY-MM-DD)    [opcional, por defecto ahora]
+      - cualquier_dentista    [opcional, 1/true: cualquier dentista que ofrezca el servicio]
+      - limite                [opcional, 1..10]
+
+    Respuesta:
+      { "espacios": [{"fecha", "hora", "dentista": {...}, "servicio": {...}}, ...] }
+    """
+    servicio_id = request.GET.get("servicio_id")
+    if not servicio_id:
+        return Response({"detail": "servicio_id es obligatorio."}, status=status.HTTP_400_BAD_REQUEST)
+
+    servicio = Servicio.objects.filter(id=servicio_id, activo=True).select_related("dentista").first()
+    if not servicio:
+        return Response({"detail": "Servicio no encontrado o inactivo."}, status=status.HTTP_404_NOT_FOUND)
+
+    hoy = timezone.localdate()
+    desde = None
+    desde_str = request.GET.get("desde")
+    if desde_str:
+        fecha_desde = parse_date(desde_str)
+        if not fecha_desde:
+            return Response({"detail": "Fecha inválida (YYYY-MM-DD)."}, status=status.HTTP_400_BAD_REQUEST)
+        if fecha_desde > hoy:
+            desde = datetime.combine(fecha_desde, datetime.min.time())
+
+    try:
+        limite = min(max(int(request.GET.get("limite", 1)), 1), 10)
+    except ValueError:
+        return Response({"detail": "limite inválido."}, status=status.HTTP_400_BAD_REQUEST)
+
+    cualquier_dentista = (request.GET.get("cualquier_dentista") or "").lower() in ("1", "true", "si", "sí")
+
+    # Mismo horizonte que el alta de citas: hasta 60 días desde hoy
+    dias = 60 - ((desde.date() - hoy).days if desde else 0)
+    if dias < 0:
+        return Response({"detail": "Fuera de rango (60 días)."}, status=status.HTTP_400_BAD_REQUEST)
+
+    espacios = buscar_primer_espacio(
+        servicio,
+        desde=desde,
+        dias=dias,
+        cualquier_dentista=cualquier_dentista,
+        limite=limite,
+    )
+    return Response({"espacios": [e.como_dict() for e in espacios]})
+
+
 # ---------------------------------------------------------
 # Crear cita (API móvil)
 # ---------------------------------------------------------
+# Peor caso medido: 22 con los datos sintéticos del bench (token sin claims, cachés frías,
+# checkout, BloqueoAgenda nuevo); 25 en tests, donde TestCase suma los SAVEPOINT y es la
+# primera cita del día (IngresoDiario nuevo)
+@presupuesto_consultas(max=26)
 @api_view(["POST"])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([JWTPrincipalAuthentication])
 @permission_classes([permissions.IsAuthenticated])
 def api_crear_cita(request):
     """
@@ -277,23 +417,26 @@ def api_crear_cita(request):
       {
         "servicio_id": 1,
         "fecha": "2025-01-15",
-        "hora": "09:30"
+        "hora": "09:30",
+        "checkout": false   # opcional
       }
+    Con "checkout": true el cliente va directo a pagar en línea: el hueco queda
+    retenido RESERVA_TEMPORAL_MINUTOS y la cita se cancela si no se paga.
     Responde 201 con info básica de la cita.
     """
-    user = request.user
-    if not hasattr(user, "paciente_perfil"):
+    paciente = request.perfil.paciente
+    if paciente is None:
         return Response({"detail": "Perfil de paciente requerido."}, status=status.HTTP_400_BAD_REQUEST)
 
     data = request.data or {}
     servicio_id = data.get("servicio_id")
     fecha_str = data.get("fecha")
     hora_str = data.get("hora")
+    checkout = str(data.get("checkout") or "").lower() in ("1", "true")
 
     if not (servicio_id and fecha_str and hora_str):
         return Response({"detail": "servicio_id, fecha y hora son obligatorios."}, status=status.HTTP_400_BAD_REQUEST)
 
-    paciente = user.paciente_perfil
     penal_info = calcular_penalizacion_paciente(paciente)
     if penal_info.get("estado") in ["pending", "disabled"]:
         return Response(
@@ -321,49 +464,36 @@ def api_crear_cita(request):
         return Response({"detail": "No se permiten fechas pasadas."}, status=status.HTTP_400_BAD_REQUEST)
     if fecha_obj > limite:
         return Response({"detail": "Solo se permite agendar 60 días hacia adelante."}, status=status.HTTP_400_BAD_REQUEST)
-    if fecha_obj.weekday() == 6:
-        return Response({"detail": "No se atiende los domingos."}, status=status.HTTP_400_BAD_REQUEST)
+    if not es_dia_laboral(servicio.dentista_id, fecha_obj):
+        return Response({"detail": "El dentista no atiende ese día."}, status=status.HTTP_400_BAD_REQUEST)
 
     now_local = timezone.localtime()
     if fecha_obj == now_local.date() and hora_inicio <= now_local.time():
         return Response({"detail": "No puedes agendar en una hora que ya pasó."}, status=status.HTTP_400_BAD_REQUEST)
 
     dentista = servicio.dentista
-    duracion = servicio.duracion_estimada or 30
-    fin_dt = datetime.combine(fecha_obj, hora_inicio) + timedelta(minutes=duracion)
-
-    slots_libres = set(
-        obtener_slots_disponibles(
-            dentista,
-            fecha_obj,
-            servicio,
-            minutos_bloque=15,
-        )
-    )
     slot_key = hora_inicio.strftime("%H:%M")
-    if slot_key not in slots_libres:
-        return Response({"detail": "Ese horario ya no está disponible."}, status=status.HTTP_409_CONFLICT)
-
-    cita = paciente.cita_set.create(
-        dentista=dentista,
-        servicio=servicio,
-        fecha=fecha_obj,
-        hora_inicio=hora_inicio,
-        hora_fin=fin_dt.time(),
-        estado="PENDIENTE",
-    )
 
+    # Validación y alta bajo candado de la agenda (evita doble reserva concurrente)
     try:
-        Pago.objects.get_or_create(
-            cita=cita,
-            defaults={
+        cita = reservar_cita(
+            dentista,
+            paciente,
+            servicio,
+            fecha_obj,
+            hora_inicio,
+            pago_defaults={
                 "monto": servicio.precio,
                 "metodo": "MERCADOPAGO",
                 "estado": "PENDIENTE",
             },
+            # Solo si el cliente manda la cita al checkout de MercadoPago
+            retener=checkout,
         )
-    except Exception as exc:
-        print(f"[WARN] No se pudo crear pago pendiente: {exc}")
+    except HorarioNoDisponible:
+        anotar(resultado="ocupado")
+        return Response({"detail": "Ese horario ya no está disponible."}, status=status.HTTP_409_CONFLICT)
+    anotar(cita_id=cita.id, servicio_id=servicio.id, dentista_id=dentista.id)
 
     try:
         enviar_correo_confirmacion_cita(cita)
@@ -395,70 +525,198 @@ def api_crear_cita(request):
 # ---------------------------------------------------------
 # Listar citas (próximas e historial)
 # ---------------------------------------------------------
+def _serializar_cita(c):
+    return {
+        "id": c.id,
+        "servicio": {"id": c.servicio_id, "nombre": c.servicio.nombre},
+        "fecha": c.fecha.isoformat(),
+        "hora": c.hora_inicio.strftime("%H:%M"),
+        "estado": c.estado,
+        "dentista": {"id": c.dentista_id, "nombre": c.dentista.nombre},
+        "puede_reprogramar": c.estado in ["PENDIENTE", "CONFIRMADA"],
+        "puede_cancelar": c.estado in ["PENDIENTE", "CONFIRMADA"],
+    }
+
+
+@presupuesto_consultas(max=6)
 @api_view(["GET"])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([JWTPrincipalAuthentication])
 @permission_classes([permissions.IsAuthenticated])
 def api_listar_citas(request):
     """
     Devuelve próximas citas (PENDIENTE/CONFIRMADA futuras) e historial (pasadas/canceladas).
     """
-    user = request.user
-    if not hasattr(user, "paciente_perfil"):
+    paciente = request.perfil.paciente
+    if paciente is None:
         return Response({"detail": "Perfil de paciente requerido."}, status=status.HTTP_400_BAD_REQUEST)
 
-    paciente = user.paciente_perfil
     hoy = timezone.localdate()
     now_time = timezone.localtime().time()
+    es_proxima = (
+        models.Q(estado__in=["PENDIENTE", "CONFIRMADA"])
+        & (models.Q(fecha__gt=hoy) | models.Q(fecha=hoy, hora_inicio__gte=now_time))
+    )
 
     proximas_qs = (
-        Cita.objects.filter(
-            paciente=paciente,
-            estado__in=["PENDIENTE", "CONFIRMADA"]
-        )
-        .filter(models.Q(fecha__gt=hoy) | models.Q(fecha=hoy, hora_inicio__gte=now_time))
+        Cita.objects.filter(paciente=paciente)
+        .filter(es_proxima)
         .select_related("servicio", "dentista")
         .order_by("fecha", "hora_inicio")
     )
 
-    historial_qs = (
+    try:
+        limite = int(request.GET.get("limite", 10))
+    except ValueError:
+        return Response({"detail": "limite inválido."}, status=status.HTTP_400_BAD_REQUEST)
+
+    etag = etag_de("citas", paciente.id, request.GET.get("cursor"), limite, _firma_citas(paciente, es_proxima))
+    vigente = no_modificada(request, etag)
+    if vigente:
+        return vigente
+
+    # Historial por cursor: ?cursor=<historial_siguiente> pide la página siguiente
+    try:
+        historial = paginar(
+            Cita.objects.filter(paciente=paciente)
+            .exclude(id__in=proximas_qs.values_list("id", flat=True))
+            .select_related("servicio", "dentista"),
+            ("-fecha", "-hora_inicio", "-id"),
+            cursor=request.GET.get("cursor"),
+            tamano=limite,
+        )
+    except CursorInvalido as exc:
+        return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return con_validadores(
+        Response(
+            {
+                "proximas": [_serializar_cita(c) for c in proximas_qs],
+                "historial": [_serializar_cita(c) for c in historial],
+                "historial_siguiente": historial.siguiente,
+            }
+        ),
+        etag,
+    )
+
+
+def _firma_citas(paciente, es_proxima):
+    """
+    Validador de api_listar_citas en una consulta agrupada por dentista: las
+    versiones de datos de esos dentistas cubren altas, cambios y bajas de citas
+    y servicios; el número de próximas cubre el paso del tiempo (sin cambios en
+    los datos solo baja, cuando una cita pasa al historial).
+    """
+    filas = list(
         Cita.objects.filter(paciente=paciente)
-        .exclude(id__in=proximas_qs.values_list("id", flat=True))
-        .select_related("servicio", "dentista")
-        .order_by("-fecha", "-hora_inicio")[:10]
+        .values("dentista_id")
+        .annotate(proximas=models.Count("id", filter=es_proxima))
+        .order_by("dentista_id")
+        .values_list("dentista_id", "proximas")
     )
+    versiones = versiones_datos_dentistas([dentista_id for dentista_id, _ in filas])
+    return tuple((dentista_id, proximas, versiones[dentista_id]) for dentista_id, proximas in filas)
 
-    def serialize_cita(c):
-        return {
-            "id": c.id,
-            "servicio": {"id": c.servicio_id, "nombre": c.servicio.nombre},
-            "fecha": c.fecha.isoformat(),
-            "hora": c.hora_inicio.strftime("%H:%M"),
-            "estado": c.estado,
-            "dentista": {"id": c.dentista_id, "nombre": c.dentista.nombre},
-            "puede_reprogramar": c.estado in ["PENDIENTE", "CONFIRMADA"],
-            "puede_cancelar": c.estado in ["PENDIENTE", "CONFIRMADA"],
-        }
 
-    return Response(
-        {
-            "proximas": [serialize_cita(c) for c in proximas_qs],
-            "historial": [serialize_cita(c) for c in historial_qs],
-        }
+# ---------------------------------------------------------
+# Sincronización incremental (app móvil)
+# ---------------------------------------------------------
+def _serializar_pago(p):
+    return {
+        "id": p.id,
+        "cita_id": p.cita_id,
+        "monto": str(p.monto),
+        "metodo": p.metodo,
+        "estado": p.estado,
+        "created_at": p.created_at.isoformat(),
+    }
+
+
+def _serializar_penalizacion(p):
+    return {
+        "id": p.id,
+        "accion": p.accion,
+        "motivo": p.motivo,
+        "monto": str(p.monto) if p.monto is not None else None,
+        "created_at": p.created_at.isoformat(),
+    }
+
+
+def _serializar_notificacion(n):
+    return {
+        "id": n.id,
+        "titulo": n.titulo,
+        "mensaje": n.mensaje,
+        "leida": n.leida,
+        "created_at": n.created_at.isoformat(),
+    }
+
+
+SERIALIZADORES_SYNC = {
+    "citas": _serializar_cita,
+    "pagos": _serializar_pago,
+    "penalizaciones": _serializar_penalizacion,
+    "notificaciones": _serializar_notificacion,
+}
+
+
+@presupuesto_consultas(max=10)
+@api_view(["GET"])
+@authentication_classes([JWTPrincipalAuthentication])
+@permission_classes([permissions.IsAuthenticated])
+def api_sync(request):
+    """
+    Cambios del paciente desde el último token (domain/sincronizacion.py).
+
+    Parámetros GET:
+      - since    [opcional] token de la respuesta anterior; sin él, todo
+      - limite   [opcional, 1..500] cambios por flujo
+
+    Respuesta:
+      { "citas": [...], "pagos": [...], "penalizaciones": [...], "notificaciones": [...],
+        "borrados": {"citas": [ids], ...}, "reinicio": bool, "mas": bool, "token": "..." }
+
+    Con "reinicio" la app borra su copia antes de aplicar; con "mas" vuelve a
+    pedir enseguida con el token nuevo.
+    """
+    paciente = request.perfil.paciente
+    if paciente is None:
+        return Response({"detail": "Perfil de paciente requerido."}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limite = max(1, min(int(request.GET.get("limite", LIMITE_SYNC)), 500))
+    except ValueError:
+        return Response({"detail": "limite inválido."}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        cambios = cambios_paciente(paciente, request.user, request.GET.get("since"), limite)
+    except TokenInvalido as exc:
+        return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    datos = {
+        nombre: [serializar(fila) for fila in cambios["flujos"][nombre]]
+        for nombre, serializar in SERIALIZADORES_SYNC.items()
+    }
+    datos.update(
+        borrados=cambios["borrados"],
+        reinicio=cambios["reinicio"],
+        mas=cambios["mas"],
+        token=cambios["token"],
     )
+    anotar(sync_reinicio=cambios["reinicio"], sync_cambios=sum(len(v) for v in cambios["flujos"].values()))
+    return Response(datos)
 
 
 # ---------------------------------------------------------
 # Cancelar cita
 # ---------------------------------------------------------
+@presupuesto_consultas(max=12)
 @api_view(["POST"])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([JWTPrincipalAuthentication])
 @permission_classes([permissions.IsAuthenticated])
 def api_cancelar_cita(request, cita_id: int):
-    user = request.user
-    if not hasattr(user, "paciente_perfil"):
+    paciente = request.perfil.paciente
+    if paciente is None:
         return Response({"detail": "Perfil de paciente requerido."}, status=status.HTTP_400_BAD_REQUEST)
 
-    paciente = user.paciente_perfil
     cita = Cita.objects.filter(id=cita_id, paciente=paciente).select_related("servicio", "dentista").first()
     if not cita:
         return Response({"detail": "Cita no encontrada."}, status=status.HTTP_404_NOT_FOUND)
@@ -473,6 +731,7 @@ def api_cancelar_cita(request, cita_id: int):
 
     cita.estado = "CANCELADA"
     cita.save(update_fields=["estado"])
+    liberar_retencion(cita)
 
     try:
         crear_aviso_por_cita(cita, "CANCELADA", "Cita cancelada desde la app móvil.")
@@ -493,18 +752,20 @@ def api_cancelar_cita(request, cita_id: int):
 # ---------------------------------------------------------
 # Reprogramar cita
 # ---------------------------------------------------------
+# Peor caso medido con los datos sintéticos del bench: 18 (token sin claims, cachés frías,
+# BloqueoAgenda nuevo)
+@presupuesto_consultas(max=20)
 @api_view(["POST"])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([JWTPrincipalAuthentication])
 @permission_classes([permissions.IsAuthenticated])
 def api_reprogramar_cita(request, cita_id: int):
     """
     Requiere JSON: {"fecha": "YYYY-MM-DD", "hora": "HH:MM"}
     """
-    user = request.user
-    if not hasattr(user, "paciente_perfil"):
+    paciente = request.perfil.paciente
+    if paciente is None:
         return Response({"detail": "Perfil de paciente requerido."}, status=status.HTTP_400_BAD_REQUEST)
 
-    paciente = user.paciente_perfil
     cita = Cita.objects.filter(id=cita_id, paciente=paciente).select_related("servicio", "dentista").first()
     if not cita:
         return Response({"detail": "Cita no encontrada."}, status=status.HTTP_404_NOT_FOUND)
@@ -530,8 +791,8 @@ def api_reprogramar_cita(request, cita_id: int):
         return Response({"detail": "No se permiten fechas pasadas."}, status=status.HTTP_400_BAD_REQUEST)
     if nueva_fecha > limite:
         return Response({"detail": "Fuera de rango (60 días)."}, status=status.HTTP_400_BAD_REQUEST)
-    if nueva_fecha.weekday() == 6:
-        return Response({"detail": "No se atiende domingos."}, status=status.HTTP_400_BAD_REQUEST)
+    if not es_dia_laboral(cita.dentista_id, nueva_fecha):
+        return Response({"detail": "El dentista no atiende ese día."}, status=status.HTTP_400_BAD_REQUEST)
 
     now_local = timezone.localtime()
     if nueva_fecha == now_local.date() and nueva_hora <= now_local.time():
@@ -539,27 +800,12 @@ def api_reprogramar_cita(request, cita_id: int):
 
     servicio = cita.servicio
     dentista = cita.dentista
-    duracion = servicio.duracion_estimada or 30
-    fin_dt = datetime.combine(nueva_fecha, nueva_hora) + timedelta(minutes=duracion)
-
-    slots_libres = set(
-        obtener_slots_disponibles(
-            dentista,
-            nueva_fecha,
-            servicio,
-            minutos_bloque=15,
-        )
-    )
     slot_key = nueva_hora.strftime("%H:%M")
-    if slot_key not in slots_libres:
-        return Response({"detail": "Ese horario ya no está disponible."}, status=status.HTTP_409_CONFLICT)
 
-    cita.fecha = nueva_fecha
-    cita.hora_inicio = nueva_hora
-    cita.hora_fin = fin_dt.time()
-    cita.estado = "PENDIENTE"
-    cita.veces_reprogramada = (cita.veces_reprogramada or 0) + 1
-    cita.save(update_fields=["fecha", "hora_inicio", "hora_fin", "estado", "veces_reprogramada"])
+    try:
+        reprogramar_cita(cita, nueva_fecha, nueva_hora)
+    except HorarioNoDisponible:
+        return Response({"detail": "Ese horario ya no está disponible."}, status=status.HTTP_409_CONFLICT)
 
     try:
         enviar_correo_confirmacion_cita(cita)
@@ -0,0 +1,10 @@
+"""
+Benchmarks de las rutas calientes (manage.py bench).
+
+- casos.py: qué se mide (servicios de dominio y vistas vía el cliente de pruebas).
+- medicion.py: cómo se mide (p50/p95, consultas SQL, memoria pico) y la
+  comparación contra la línea base guardada en baseline.json.
+
+El comando crea una base de datos de prueba temporal, la llena con
+domain.sinteticos y la destruye al terminar; nunca toca la base configurada.
+"""
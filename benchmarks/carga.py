@@ -0,0 +1,411 @@
+"""
+Generador de carga HTTP contra el stack real (gunicorn + base de datos).
+
+A diferencia de manage.py bench (una petición a la vez, en proceso), aquí
+varios usuarios virtuales (hilos) inician sesión con JWT y reproducen una
+mezcla de tráfico de la app móvil contra un servidor local, para ver cómo se
+comportan los workers síncronos bajo concurrencia.
+
+Uso:
+    python -m benchmarks.carga benchmarks/escenarios/lunes_9am.json --url http://127.0.0.1:8000
+    python -m benchmarks.carga benchmarks/escenarios/lunes_9am.json --iniciar --workers 3
+
+Con --iniciar se levanta gunicorn igual que ops/run_prod.sh (con el entorno
+actual, p. ej. SQLITE_PATH) y se detiene al terminar. Las cuentas son las de
+generar_datos_sinteticos: se prueban usuarios `prefijo + número` con la
+contraseña indicada hasta reunir uno por usuario virtual.
+
+Escenario (JSON):
+    usuarios          usuarios virtuales concurrentes
+    duracion_s        duración de la fase medida
+    rampa_s           los usuarios arrancan escalonados en este lapso
+    pausa_ms          [min, max] de espera entre acciones de un usuario
+    dias              [min, max] días hacia adelante que se consultan/reservan
+    ip_por_usuario    manda X-Forwarded-For distinto por usuario (el chatbot limita por IP)
+    cuentas           {"prefijo", "desde", "hasta", "password"}
+    mezcla            {acción: peso}; acciones: slots, reservar, listar, cancelar, reprogramar, chatbot
+    preguntas_chatbot textos que se envían al chatbot
+
+Reporta por endpoint: peticiones, throughput, p50/p90/p95/p99, errores
+(5xx o sin respuesta) y los 409 (choque de horario) y 429 (límite de tasa).
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from urllib import error, parse, request
+
+from benchmarks.medicion import percentil
+
+RAIZ = Path(__file__).resolve().parent.parent
+ACCIONES = ("slots", "reservar", "listar", "cancelar", "reprogramar", "chatbot")
+
+ESCENARIO_DEFAULTS = {
+    "usuarios": 20,
+    "duracion_s": 60,
+    "rampa_s": 5,
+    "pausa_ms": [200, 1000],
+    "dias": [1, 7],
+    "ip_por_usuario": True,
+    "cuentas": {"prefijo": "sintetico.pac", "desde": 1, "hasta": 5000, "password": "Sintetico123!"},
+    "preguntas_chatbot": ["¿Qué horarios tienen disponibles?"],
+}
+
+
+def cargar_escenario(ruta):
+    escenario = dict(ESCENARIO_DEFAULTS)
+    escenario.update(json.loads(Path(ruta).read_text(encoding="utf-8")))
+    escenario["cuentas"] = {**ESCENARIO_DEFAULTS["cuentas"], **escenario["cuentas"]}
+    mezcla = escenario.get("mezcla") or {}
+    desconocidas = set(mezcla) - set(ACCIONES)
+    if not mezcla or desconocidas:
+        raise ValueError(f"Mezcla inválida en {ruta}: {sorted(desconocidas) or 'vacía'}")
+    return escenario
+
+
+# ---------------------------------------------------------
+# Estadísticas
+# ---------------------------------------------------------
+class Estadisticas:
+    """Latencias y códigos por endpoint; segura entre hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._datos = {}
+
+    def registrar(self, endpoint, estado, ms):
+        with self._lock:
+            datos = self._datos.setdefault(endpoint, {"latencias": [], "estados": {}})
+            datos["latencias"].append(ms)
+            datos["estados"][estado] = datos["estados"].get(estado, 0) + 1
+
+    def resumen(self, segundos):
+        with self._lock:
+            datos = {endpoint: (list(d["latencias"]), dict(d["estados"])) for endpoint, d in self._datos.items()}
+
+        resumen = {}
+        for endpoint, (latencias, estados) in sorted(datos.items()):
+            total = len(latencias)
+            errores = sum(n for estado, n in estados.items() if estado == 0 or estado >= 500)
+            resumen[endpoint] = {
+                "peticiones": total,
+                "rps": round(total / segundos, 2) if segundos else 0.0,
+                "p50_ms": round(percentil(latencias, 50), 1),
+                "p90_ms": round(percentil(latencias, 90), 1),
+                "p95_ms": round(percentil(latencias, 95), 1),
+                "p99_ms": round(percentil(latencias, 99), 1),
+                "max_ms": round(max(latencias), 1),
+                "errores": errores,
+                "tasa_error": round(errores / total, 4),
+                "409": estados.get(409, 0),
+                "429": estados.get(429, 0),
+                "estados": {str(estado): n for estado, n in sorted(estados.items())},
+            }
+        return resumen
+
+
+def imprimir_resumen(titulo, resumen, segundos):
+    print(f"\n{titulo} ({segundos:.1f}s)")
+    print(f"{'endpoint':<38}{'n':>7}{'req/s':>8}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}{'err':>6}{'409':>6}{'429':>6}")
+    for endpoint, r in resumen.items():
+        print(
+            f"{endpoint:<38}{r['peticiones']:>7}{r['rps']:>8.1f}{r['p50_ms']:>8.0f}{r['p95_ms']:>8.0f}"
+            f"{r['p99_ms']:>8.0f}{r['max_ms']:>8.0f}{r['errores']:>6}{r['409']:>6}{r['429']:>6}"
+        )
+
+
+# ---------------------------------------------------------
+# Cliente HTTP
+# ---------------------------------------------------------
+class Cliente:
+    def __init__(self, base_url, estadisticas, timeout=30, ip=None):
+        self.base_url = base_url.rstrip("/")
+        self.estadisticas = estadisticas
+        self.timeout = timeout
+        self.token = None
+        self.ip = ip
+
+    def pedir(self, metodo, ruta, endpoint=None, params=None, cuerpo=None, cabeceras=None):
+        """Devuelve (código, json o None). Código 0 = sin respuesta (conexión o timeout)."""
+        url = self.base_url + ruta
+        if params:
+            url += "?" + parse.urlencode(params)
+        headers = {"Accept": "application/json", **(cabeceras or {})}
+        datos = None
+        if cuerpo is not None:
+            datos = json.dumps(cuerpo).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        if self.ip:
+            headers["X-Forwarded-For"] = self.ip
+
+        inicio = time.perf_counter()
+        try:
+            with request.urlopen(request.Request(url, data=datos, headers=headers, method=metodo), timeout=self.timeout) as resp:
+                estado, crudo = resp.status, resp.read()
+        except error.HTTPError as exc:
+            estado, crudo = exc.code, exc.read()
+        except (error.URLError, OSError):
+            estado, crudo = 0, b""
+        self.estadisticas.registrar(endpoint or f"{metodo} {ruta}", estado, (time.perf_counter() - inicio) * 1000)
+
+        try:
+            return estado, json.loads(crudo) if crudo else None
+        except ValueError:
+            return estado, None
+
+
+# ---------------------------------------------------------
+# Usuario virtual
+# ---------------------------------------------------------
+class UsuarioVirtual:
+    def __init__(self, cliente, escenario, rng):
+        self.cliente = cliente
+        self.escenario = escenario
+        self.rng = rng
+        self.acciones = list(escenario["mezcla"])
+        self.pesos = [escenario["mezcla"][accion] for accion in self.acciones]
+        self.dentista_id = None
+        self.servicios = []
+
+    def preparar(self):
+        """Toma dentista y servicios del historial del paciente (la API no expone su dentista)."""
+        _, datos = self.cliente.pedir("GET", "/api/citas/listar/")
+        citas = (datos or {}).get("proximas", []) + (datos or {}).get("historial", [])
+        if citas:
+            self.dentista_id = citas[0]["dentista"]["id"]
+            self.servicios = sorted({c["servicio"]["id"] for c in citas if c["dentista"]["id"] == self.dentista_id})
+
+    def correr(self, fin):
+        pausa_min, pausa_max = self.escenario["pausa_ms"]
+        while time.monotonic() < fin:
+            accion = self.rng.choices(self.acciones, weights=self.pesos)[0]
+            getattr(self, f"_{accion}")()
+            time.sleep(self.rng.uniform(pausa_min, pausa_max) / 1000)
+
+    def _fecha(self):
+        minimo, maximo = self.escenario["dias"]
+        fecha = date.today() + timedelta(days=self.rng.randint(minimo, maximo))
+        if fecha.weekday() == 6:
+            fecha += timedelta(days=1)
+        return fecha.isoformat()
+
+    def _buscar_slots(self, servicio_id, dentista_id):
+        fecha = self._fecha()
+        _, datos = self.cliente.pedir(
+            "GET", "/api/slots/", params={"fecha": fecha, "servicio_id": servicio_id, "dentista_id": dentista_id}
+        )
+        return fecha, (datos or {}).get("slots") or []
+
+    def _slots(self):
+        if self.servicios:
+            self._buscar_slots(self.rng.choice(self.servicios), self.dentista_id)
+
+    def _reservar(self):
+        if not self.servicios:
+            return
+        servicio_id = self.rng.choice(self.servicios)
+        fecha, slots = self._buscar_slots(servicio_id, self.dentista_id)
+        if slots:
+            # En la hora pico casi todos eligen los primeros huecos: ahí salen los 409
+            hora = self.rng.choice(slots[:3])
+            self.cliente.pedir("POST", "/api/citas/", cuerpo={"servicio_id": servicio_id, "fecha": fecha, "hora": hora})
+
+    def _proximas(self):
+        _, datos = self.cliente.pedir("GET", "/api/citas/listar/")
+        return (datos or {}).get("proximas") or []
+
+    def _listar(self):
+        self._proximas()
+
+    def _cancelar(self):
+        proximas = [c for c in self._proximas() if c.get("puede_cancelar")]
+        if proximas:
+            cita = self.rng.choice(proximas)
+            self.cliente.pedir("POST", f"/api/citas/{cita['id']}/cancelar/", endpoint="POST /api/citas/{id}/cancelar/", cuerpo={})
+
+    def _reprogramar(self):
+        proximas = [c for c in self._proximas() if c.get("puede_reprogramar")]
+        if not proximas:
+            return
+        cita = self.rng.choice(proximas)
+        fecha, slots = self._buscar_slots(cita["servicio"]["id"], cita["dentista"]["id"])
+        if slots:
+            self.cliente.pedir(
+                "POST", f"/api/citas/{cita['id']}/reprogramar/", endpoint="POST /api/citas/{id}/reprogramar/",
+                cuerpo={"fecha": fecha, "hora": self.rng.choice(slots[:3])},
+            )
+
+    def _chatbot(self):
+        cabeceras = {}
+        secreto = os.getenv("CHATBOT_API_SECRET")
+        if secreto:
+            cabeceras["X-CHATBOT-SECRET"] = secreto
+        pregunta = self.rng.choice(self.escenario["preguntas_chatbot"])
+        self.cliente.pedir("POST", "/api/chatbot/", cuerpo={"query": pregunta}, cabeceras=cabeceras)
+
+
+# ---------------------------------------------------------
+# Orquestación
+# ---------------------------------------------------------
+def iniciar_sesiones(escenario, base_url, estadisticas, semilla):
+    """
+    Un login JWT por usuario virtual, en paralelo. Los candidatos sin cuenta
+    (401) se descartan; estos intentos quedan en las estadísticas del login.
+    """
+    cuentas = escenario["cuentas"]
+    candidatos = iter(range(cuentas["desde"], cuentas["hasta"] + 1))
+    lock = threading.Lock()
+    usuarios = []
+
+    def trabajar(indice):
+        ip = f"10.{indice // 250}.{indice % 250}.1" if escenario["ip_por_usuario"] else None
+        cliente = Cliente(base_url, estadisticas, ip=ip)
+        while True:
+            with lock:
+                if len(usuarios) >= escenario["usuarios"]:
+                    return
+                numero = next(candidatos, None)
+            if numero is None:
+                return
+            estado, datos = cliente.pedir(
+                "POST", "/api/token/",
+                cuerpo={"username": f"{cuentas['prefijo']}{numero}", "password": cuentas["password"]},
+            )
+            if estado == 200 and datos and datos.get("access"):
+                cliente.token = datos["access"]
+                with lock:
+                    if len(usuarios) < escenario["usuarios"]:
+                        usuarios.append(cliente)
+                return
+            if estado == 0 or estado >= 500:
+                return
+
+    hilos = [threading.Thread(target=trabajar, args=(i,), daemon=True) for i in range(escenario["usuarios"])]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    rng = random.Random(semilla)
+    return [UsuarioVirtual(cliente, escenario, random.Random(rng.random())) for cliente in usuarios]
+
+
+def ejecutar(escenario, base_url, semilla=1):
+    login = Estadisticas()
+    inicio = time.perf_counter()
+    usuarios = iniciar_sesiones(escenario, base_url, login, semilla)
+    segundos_login = time.perf_counter() - inicio
+    if not usuarios:
+        raise SystemExit("Ningún inicio de sesión fue exitoso: ¿existen los datos sintéticos y la contraseña es correcta?")
+
+    # La preparación no cuenta para la fase medida
+    preparacion, medidas = Estadisticas(), Estadisticas()
+    for usuario in usuarios:
+        usuario.cliente.estadisticas = preparacion
+        usuario.preparar()
+        usuario.cliente.estadisticas = medidas
+
+    inicio = time.perf_counter()
+    fin = time.monotonic() + escenario["duracion_s"]
+    paso = escenario["rampa_s"] / len(usuarios)
+
+    def arrancar(usuario, retraso):
+        time.sleep(retraso)
+        usuario.correr(fin)
+
+    hilos = [
+        threading.Thread(target=arrancar, args=(usuario, i * paso), daemon=True)
+        for i, usuario in enumerate(usuarios)
+    ]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    segundos = time.perf_counter() - inicio
+
+    return {
+        "escenario": escenario.get("nombre"),
+        "url": base_url,
+        "usuarios": len(usuarios),
+        "login": {"segundos": round(segundos_login, 2), "endpoints": login.resumen(segundos_login)},
+        "carga": {"segundos": round(segundos, 2), "endpoints": medidas.resumen(segundos)},
+    }
+
+
+def esperar_servidor(base_url, segundos=30):
+    limite = time.monotonic() + segundos
+    while time.monotonic() < limite:
+        try:
+            with request.urlopen(base_url.rstrip("/") + "/api/health/", timeout=2):
+                return True
+        except error.HTTPError:
+            return True
+        except (error.URLError, OSError):
+            time.sleep(0.5)
+    return False
+
+
+def iniciar_gunicorn(puerto, workers):
+    comando = [
+        "gunicorn", "proyecto_rc.wsgi:application",
+        "--bind", f"127.0.0.1:{puerto}",
+        "--workers", str(workers),
+        "--timeout", "120",
+        "--log-level", "warning",
+    ]
+    entorno = {**os.environ, "DJANGO_SETTINGS_MODULE": "proyecto_rc.settings", "PYTHONPATH": str(RAIZ)}
+    try:
+        return subprocess.Popen(comando, cwd=RAIZ, env=entorno)
+    except FileNotFoundError:
+        raise SystemExit("No se encontró gunicorn. Instálalo con: pip install gunicorn")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga HTTP con escenarios de tráfico.")
+    parser.add_argument("escenario", help="Archivo JSON del escenario (ver benchmarks/escenarios/).")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--iniciar", action="store_true", help="Levanta gunicorn localmente durante la prueba.")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--usuarios", type=int, help="Sobrescribe los usuarios del escenario.")
+    parser.add_argument("--duracion", type=int, help="Sobrescribe duracion_s del escenario.")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--salida", help="Guarda el resultado en JSON.")
+    args = parser.parse_args(argv)
+
+    escenario = cargar_escenario(args.escenario)
+    if args.usuarios:
+        escenario["usuarios"] = args.usuarios
+    if args.duracion:
+        escenario["duracion_s"] = args.duracion
+
+    servidor = None
+    if args.iniciar:
+        puerto = parse.urlsplit(args.url).port or 8000
+        servidor = iniciar_gunicorn(puerto, args.workers)
+    try:
+        if not esperar_servidor(args.url):
+            raise SystemExit(f"El servidor no responde en {args.url}")
+        print(f"Escenario: {escenario.get('nombre', args.escenario)} — {escenario['usuarios']} usuarios, {escenario['duracion_s']}s")
+        resultado = ejecutar(escenario, args.url, semilla=args.semilla)
+    finally:
+        if servidor:
+            servidor.terminate()
+            servidor.wait(timeout=30)
+
+    imprimir_resumen(f"Inicio de sesión ({resultado['usuarios']} usuarios)", resultado["login"]["endpoints"], resultado["login"]["segundos"])
+    imprimir_resumen("Carga", resultado["carga"]["endpoints"], resultado["carga"]["segundos"])
+    if args.salida:
+        Path(args.salida).write_text(json.dumps(resultado, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        print(f"\nResultado: {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Casos del benchmark. Cada caso ejecuta una iteración sobre el Contexto
+(datos sintéticos ya cargados) y falla con AssertionError si la respuesta
+no es la esperada, para no medir páginas de error.
+"""
+
+from datetime import timedelta
+
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.principal import TokenConPerfilSerializer
+from domain.ai_services import calcular_penalizacion_paciente, calcular_score_riesgo, obtener_slots_disponibles
+from domain.horarios import turnos_del_dia
+from domain.models import Dentista, Paciente, Servicio
+from domain.versiones import invalidar_datos_dentista
+
+# nombre -> función(contexto)
+CASOS = {}
+
+
+def caso(nombre):
+    def registrar(funcion):
+        CASOS[nombre] = funcion
+        return funcion
+    return registrar
+
+
+class Contexto:
+    """Objetos representativos del conjunto de datos y clientes ya autenticados."""
+
+    def __init__(self):
+        # El dentista y el paciente con más citas: el peor caso realista
+        self.dentista = Dentista.objects.annotate(n=Count("cita")).order_by("-n", "id").first()
+        self.servicio = Servicio.objects.filter(dentista=self.dentista).order_by("id").first()
+        pacientes = Paciente.objects.filter(dentista=self.dentista).annotate(n=Count("cita")).order_by("-n", "id")
+        self.paciente = pacientes.first()
+        self.paciente_con_cuenta = pacientes.filter(user__isnull=False).first()
+
+        self.fecha_slots = timezone.localdate() + timedelta(days=1)
+        while not turnos_del_dia(self.dentista, self.fecha_slots):
+            self.fecha_slots += timedelta(days=1)
+
+        self.cliente_dentista = Client()
+        self.cliente_dentista.force_login(self.dentista.user)
+
+        self.cliente_api = APIClient()
+        # Mismo token que emite /api/token/ (con los claims de perfil)
+        token = TokenConPerfilSerializer.get_token(self.paciente_con_cuenta.user).access_token
+        self.cliente_api.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        self.cliente_anonimo = Client()
+
+    def get(self, cliente, url, **params):
+        respuesta = cliente.get(url, params)
+        assert respuesta.status_code == 200, f"GET {url} -> {respuesta.status_code}"
+        # Consumimos el cuerpo para medir también las respuestas en streaming
+        if respuesta.streaming:
+            b"".join(respuesta.streaming_content)
+        return respuesta
+
+
+# ---------------------------------------------------------
+# Servicios de dominio
+# ---------------------------------------------------------
+@caso("obtener_slots_disponibles")
+def slots_disponibles(ctx):
+    obtener_slots_disponibles(ctx.dentista, ctx.fecha_slots, ctx.servicio)
+
+
+@caso("calcular_score_riesgo")
+def score_riesgo(ctx):
+    calcular_score_riesgo(ctx.paciente)
+
+
+@caso("calcular_penalizacion_paciente")
+def penalizacion_paciente(ctx):
+    calcular_penalizacion_paciente(ctx.paciente)
+
+
+# ---------------------------------------------------------
+# Vistas del dentista
+# ---------------------------------------------------------
+def _dashboard_completo(ctx):
+    # El esqueleto y los paneles que su JavaScript pide después
+    ctx.get(ctx.cliente_dentista, reverse("dentista:dashboard"))
+    for nombre in ("kpis", "calendario", "proxima_cita", "pagos", "avisos"):
+        ctx.get(ctx.cliente_dentista, reverse("dentista:dashboard_panel", args=[nombre]))
+
+
+@caso("dashboard_dentista")
+def dashboard_dentista(ctx):
+    _dashboard_completo(ctx)
+
+
+@caso("dashboard_dentista_frio")
+def dashboard_dentista_frio(ctx):
+    # Paneles recalculados: como la primera carga tras un cambio en citas/pagos
+    invalidar_datos_dentista(ctx.dentista.id)
+    _dashboard_completo(ctx)
+
+
+@caso("agenda_modo")
+def agenda_modo(ctx):
+    ctx.get(ctx.cliente_dentista, reverse("dentista:agenda_modo", args=["mes"]))
+
+
+@caso("penalizaciones")
+def penalizaciones(ctx):
+    ctx.get(ctx.cliente_dentista, reverse("dentista:penalizaciones"))
+    ctx.get(ctx.cliente_dentista, reverse("dentista:penalizaciones_grupos"))
+
+
+@caso("reportes")
+def reportes(ctx):
+    ctx.get(ctx.cliente_dentista, reverse("dentista:reportes"))
+
+
+@caso("reporte_csv")
+def reporte_csv(ctx):
+    ctx.get(ctx.cliente_dentista, reverse("dentista:reporte_csv"))
+
+
+@caso("reporte_pdf")
+def reporte_pdf(ctx):
+    ctx.get(ctx.cliente_dentista, reverse("dentista:reporte_pdf"))
+
+
+# ---------------------------------------------------------
+# API
+# ---------------------------------------------------------
+@caso("api_listar_citas")
+def api_listar_citas(ctx):
+    ctx.get(ctx.cliente_api, reverse("api_listar_citas"))
+
+
+@caso("chatbot_api")
+def chatbot_api(ctx):
+    # Modo local (sin IA): el comando desactiva CHATBOT_IA_ENABLED durante la corrida
+    respuesta = ctx.cliente_anonimo.post(
+        reverse("chatbot_api"), {"query": "¿Qué horarios tienen disponibles?"}, content_type="application/json"
+    )
+    assert respuesta.status_code == 200, f"POST chatbot -> {respuesta.status_code}"
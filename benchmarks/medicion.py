@@ -0,0 +1,122 @@
+"""
+Medición de casos y comparación contra la línea base.
+
+Por caso: latencia p50/p95/media (perf_counter, tras unas iteraciones de
+calentamiento), número de consultas SQL por iteración y memoria pico de
+Python (tracemalloc, en una pasada aparte para no inflar los tiempos).
+"""
+
+import json
+import math
+import statistics
+import time
+import tracemalloc
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.db import connections
+
+
+def percentil(valores, p):
+    """Percentil con interpolación lineal (p en 0-100)."""
+    ordenados = sorted(valores)
+    if not ordenados:
+        return 0.0
+    posicion = (len(ordenados) - 1) * p / 100
+    bajo, alto = math.floor(posicion), math.ceil(posicion)
+    if bajo == alto:
+        return ordenados[bajo]
+    return ordenados[bajo] + (ordenados[alto] - ordenados[bajo]) * (posicion - bajo)
+
+
+class _ContadorConsultas:
+    def __init__(self):
+        self.total = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.total += 1
+        return execute(sql, params, many, context)
+
+
+def _contando_consultas(funcion, contexto):
+    contador = _ContadorConsultas()
+    with ExitStack() as stack:
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(contador))
+        funcion(contexto)
+    return contador.total
+
+
+def medir_caso(funcion, contexto, repeticiones=15, calentamiento=2, segundos_max=None):
+    """
+    Ejecuta el caso y devuelve sus métricas. Con segundos_max se corta antes de
+    completar las repeticiones (mínimo 3) para que un caso lento no domine la corrida.
+    """
+    for _ in range(calentamiento):
+        funcion(contexto)
+
+    tiempos, consultas = [], []
+    inicio_total = time.perf_counter()
+    for i in range(repeticiones):
+        inicio = time.perf_counter()
+        consultas.append(_contando_consultas(funcion, contexto))
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        if segundos_max and i >= 2 and time.perf_counter() - inicio_total > segundos_max:
+            break
+
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        funcion(contexto)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "iteraciones": len(tiempos),
+        "p50_ms": round(percentil(tiempos, 50), 3),
+        "p95_ms": round(percentil(tiempos, 95), 3),
+        "media_ms": round(statistics.fmean(tiempos), 3),
+        "consultas": max(consultas),
+        "memoria_pico_kb": round(pico / 1024, 1),
+    }
+
+
+def comparar(actual, baseline, umbral=0.25, tolerancia_ms=1.0):
+    """
+    Regresiones de `actual` frente a `baseline` (dicts con la clave "casos").
+    - p95 o memoria pico más de `umbral` (fracción) por encima de la base;
+      en tiempo se ignoran diferencias menores a tolerancia_ms (ruido).
+    - cualquier consulta SQL extra (los conteos son deterministas).
+    Devuelve {caso: [motivos]} solo con los casos que empeoraron.
+    """
+    regresiones = {}
+    casos_base = baseline.get("casos", {})
+    for nombre, metricas in actual.get("casos", {}).items():
+        base = casos_base.get(nombre)
+        if not base or "error" in metricas or "error" in base:
+            continue
+        motivos = []
+        limite_p95 = base["p95_ms"] * (1 + umbral)
+        if metricas["p95_ms"] > limite_p95 and metricas["p95_ms"] - base["p95_ms"] > tolerancia_ms:
+            motivos.append(f"p95 {metricas['p95_ms']:.1f} ms > {base['p95_ms']:.1f} ms (+{umbral:.0%})")
+        if metricas["consultas"] > base["consultas"]:
+            motivos.append(f"consultas {metricas['consultas']} > {base['consultas']}")
+        if metricas["memoria_pico_kb"] > base["memoria_pico_kb"] * (1 + umbral):
+            motivos.append(f"memoria {metricas['memoria_pico_kb']:.0f} KB > {base['memoria_pico_kb']:.0f} KB (+{umbral:.0%})")
+        if motivos:
+            regresiones[nombre] = motivos
+    return regresiones
+
+
+def cargar(ruta):
+    ruta = Path(ruta)
+    if not ruta.exists():
+        return None
+    return json.loads(ruta.read_text(encoding="utf-8"))
+
+
+def guardar(ruta, datos):
+    ruta = Path(ruta)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    ruta.write_text(json.dumps(datos, indent=2, ensure_ascii=False, sort_keys=True) + "\n", encoding="utf-8")
@@ -0,0 +1,235 @@
+"""
+Paneles del dashboard del dentista, cacheados por versión de datos.
+
+Cada panel se guarda bajo (dentista, panel, versión de datos, día). Un cambio en
+citas, pagos, pacientes, avisos o servicios del dentista cambia la versión
+(domain/versiones.py) y el panel se recalcula en la siguiente carga; mientras
+tanto una carga repetida solo lee la versión y los paneles de la caché.
+
+Los paneles que dependen de la hora (próxima cita, citas ya pasadas en el
+calendario) además caducan justo cuando su contenido cambiaría por el paso del
+tiempo, y todos caducan al cambiar el día (va en la clave).
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.db.models import Q, Sum
+
+from domain.ai_services import calcular_penalizaciones_pacientes, calcular_scores_riesgo
+from domain.models import AvisoDentista, Cita, IngresoDiario, Paciente, Pago, PenalizacionLog
+from domain.versiones import version_datos_dentista
+from proyecto_rc.metricas import incrementar
+
+# Tope de vida de cualquier panel aunque no cambie la versión
+TTL_MAXIMO = 60 * 60
+DIAS_CALENDARIO = 60
+DIAS_ES = ["LUN", "MAR", "MIE", "JUE", "VIE", "SAB", "DOM"]
+
+# nombre -> función(dentista, hoy, hora_actual) -> (valor, segundos de vida)
+PANELES = {}
+
+_FALTA = object()
+
+
+def panel(nombre):
+    def registrar(funcion):
+        PANELES[nombre] = funcion
+        return funcion
+    return registrar
+
+
+def _clave(dentista_id, nombre, version, hoy):
+    return f"dashboard:{dentista_id}:{nombre}:{version}:{hoy.isoformat()}"
+
+
+def _segundos_hasta(fecha, hora, hoy, hora_actual):
+    """Vida del panel hasta fecha+hora (mínimo 1 s, máximo TTL_MAXIMO)."""
+    restante = datetime.combine(fecha, hora) - datetime.combine(hoy, hora_actual)
+    return max(1, min(TTL_MAXIMO, int(restante.total_seconds()) + 1))
+
+
+def obtener_paneles(dentista, hoy, hora_actual, nombres=None):
+    """{nombre: valor} de los paneles pedidos (todos por defecto), de la caché o recalculados."""
+    nombres = list(nombres or PANELES)
+    version = version_datos_dentista(dentista.id)
+    claves = {nombre: _clave(dentista.id, nombre, version, hoy) for nombre in nombres}
+    guardados = cache.get_many(list(claves.values()))
+
+    paneles = {}
+    for nombre in nombres:
+        valor = guardados.get(claves[nombre], _FALTA)
+        if valor is _FALTA:
+            incrementar("rc_cache_paneles_total", panel=nombre, resultado="miss")
+            valor, ttl = PANELES[nombre](dentista, hoy, hora_actual)
+            cache.set(claves[nombre], valor, timeout=ttl)
+        else:
+            incrementar("rc_cache_paneles_total", panel=nombre, resultado="hit")
+        paneles[nombre] = valor
+    return paneles
+
+
+# ---------------------------------------------------------
+# Cálculos
+# ---------------------------------------------------------
+def citas_por_dia(dentista, start_date, end_date):
+    """Citas no canceladas del rango agrupadas por fecha (una sola consulta)."""
+    citas = (
+        Cita.objects.filter(dentista=dentista, fecha__range=(start_date, end_date))
+        .exclude(estado="CANCELADA")
+        .select_related("paciente", "servicio")
+        .order_by("fecha", "hora_inicio")
+    )
+    por_dia = defaultdict(list)
+    for c in citas:
+        por_dia[c.fecha].append(c)
+    return por_dia
+
+
+def calcular_riesgo_paciente(paciente, riesgo_percent=None):
+    """
+    Reusa la lógica central de riesgo (domain.ai_services) para mostrar
+    porcentaje y nivel en el dashboard del dentista.
+    Si ya se calculó el score (p. ej. por lotes) se puede pasar directo.
+    """
+    from domain.ai_services import calcular_score_riesgo
+
+    if riesgo_percent is None:
+        riesgo_percent = calcular_score_riesgo(paciente)
+
+    if riesgo_percent >= 70:
+        lvl, col = "Alto", "badge-red"
+    elif riesgo_percent >= 35:
+        lvl, col = "Medio", "badge-yellow"
+    else:
+        lvl, col = "Bajo", "badge-green"
+
+    return {"paciente": paciente.nombre, "porcentaje": riesgo_percent, "nivel": lvl, "color": col}
+
+
+def optimizar_agenda(citas_dia):
+    sugerencias = []
+    citas = sorted(citas_dia, key=lambda x: x.hora_inicio)
+    for i in range(len(citas) - 1):
+        fin = datetime.combine(citas[i].fecha, citas[i].hora_fin)
+        ini = datetime.combine(citas[i+1].fecha, citas[i+1].hora_inicio)
+        # Si hay hueco mayor a 20 min
+        if (ini - fin).seconds // 60 >= 20:
+            sugerencias.append(f"Hueco libre entre {citas[i].paciente.nombre} y {citas[i+1].paciente.nombre}.")
+    return sugerencias
+
+
+def grupos_penalizacion(dentista):
+    """
+    Pacientes del dentista clasificados por estado de penalización (todo por
+    lotes: sin consultas por paciente). Sin caché: las acciones de la página
+    de penalizaciones deben verse en la siguiente carga.
+    """
+    pacientes = Paciente.objects.filter(dentista=dentista).select_related("user").order_by("nombre")
+    infos = calcular_penalizaciones_pacientes(pacientes, dentista)
+    con_advertencia = set(
+        PenalizacionLog.objects.filter(paciente__dentista=dentista, accion="ADVERTENCIA")
+        .values_list("paciente_id", flat=True)
+    )
+    grupos = {"penalizadas": [], "advertidas": [], "inhabilitadas": [], "activas": []}
+    for p in pacientes:
+        info = infos[p.pk]
+        estado = info.get("estado")
+        if not getattr(getattr(p, "user", None), "is_active", True) or estado == "disabled":
+            grupo = "inhabilitadas"
+        elif estado in ("pending", "warning") or p.pk in con_advertencia:
+            # Pendiente (manual o automática) o con advertencia manual: columna de advertidas
+            grupo = "advertidas"
+        else:
+            grupo = "activas"
+        grupos[grupo].append({"paciente": p, "info": info})
+    return grupos
+
+
+# ---------------------------------------------------------
+# Paneles
+# ---------------------------------------------------------
+@panel("kpis")
+def _kpis(dentista, hoy, hora_actual):
+    ingresos = (
+        IngresoDiario.objects.filter(dentista=dentista, estado="COMPLETADO", fecha__gte=hoy.replace(day=1))
+        .aggregate(Sum("total"))["total__sum"] or 0
+    )
+    return {
+        "pacientes": Paciente.objects.filter(dentista=dentista).count(),
+        "pendientes": Cita.objects.filter(dentista=dentista, estado="PENDIENTE").count(),
+        "ingresos_mes": ingresos,
+    }, TTL_MAXIMO
+
+
+@panel("citas_hoy")
+def _citas_hoy(dentista, hoy, hora_actual):
+    citas = list(
+        Cita.objects.filter(dentista=dentista, fecha=hoy)
+        .exclude(estado__in=["CANCELADA", "INASISTENCIA"])
+        .select_related("paciente", "servicio")
+        .order_by("hora_inicio")
+    )
+    return {"citas": citas, "sugerencias": optimizar_agenda(citas)}, TTL_MAXIMO
+
+
+@panel("proxima_cita")
+def _proxima_cita(dentista, hoy, hora_actual):
+    prox = (
+        Cita.objects.filter(dentista=dentista, estado__in=["PENDIENTE", "CONFIRMADA"])
+        .filter(Q(fecha__gt=hoy) | Q(fecha=hoy, hora_fin__gt=hora_actual))
+        .select_related("paciente", "servicio")
+        .order_by("fecha", "hora_inicio")
+        .first()
+    )
+    # Deja de ser la próxima cuando termina
+    ttl = _segundos_hasta(prox.fecha, prox.hora_fin, hoy, hora_actual) if prox else TTL_MAXIMO
+    return prox, ttl
+
+
+@panel("calendario")
+def _calendario(dentista, hoy, hora_actual):
+    end_date = hoy + timedelta(days=DIAS_CALENDARIO)
+    por_dia = citas_por_dia(dentista, hoy, end_date)
+
+    calendario = []
+    for i in range(DIAS_CALENDARIO + 1):
+        f = hoy + timedelta(days=i)
+        procesadas = []
+        for c in por_dia.get(f, []):
+            pasada = f == hoy and c.hora_fin < hora_actual
+            procesadas.append({
+                "paciente": c.paciente.nombre,
+                "hora": c.hora_inicio.strftime("%H:%M"),
+                "servicio": c.servicio.nombre if c.servicio else "",
+                "clase_estado": "cita-pasada" if pasada else c.estado.lower()
+            })
+        calendario.append({
+            "dia": f,
+            "label_dia": DIAS_ES[f.weekday()],
+            "clases": "hoy" if f == hoy else "",
+            "citas": procesadas,
+        })
+
+    # Vence cuando la siguiente cita de hoy pase a "cita-pasada"
+    fines = [c.hora_fin for c in por_dia.get(hoy, []) if c.hora_fin >= hora_actual]
+    ttl = _segundos_hasta(hoy, min(fines), hoy, hora_actual) if fines else TTL_MAXIMO
+    return calendario, ttl
+
+
+@panel("riesgos")
+def _riesgos(dentista, hoy, hora_actual):
+    pacientes = list(Paciente.objects.filter(dentista=dentista))
+    scores = calcular_scores_riesgo(pacientes)
+    return [calcular_riesgo_paciente(p, scores[p.pk]) for p in pacientes], TTL_MAXIMO
+
+
+@panel("pagos")
+def _pagos(dentista, hoy, hora_actual):
+    return list(Pago.objects.filter(dentista=dentista).order_by("-created_at")[:5]), TTL_MAXIMO
+
+
+@panel("avisos")
+def _avisos(dentista, hoy, hora_actual):
+    return list(AvisoDentista.objects.filter(dentista=dentista).order_by("-created_at")[:15]), TTL_MAXIMO
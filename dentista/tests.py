@@ -1,11 +1,14 @@
+import json
 from datetime import date, time
 
 from django.contrib.auth.models import User
+from django.db import connection
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
-from domain.models import Cita, Dentista, Horario, Paciente, Servicio
+from domain.models import Cita, Dentista, Diente, Horario, Paciente, Pago, PenalizacionLog, Servicio
 
 
 class AgendaTests(TestCase):
@@ -53,3 +56,210 @@ class AgendaTests(TestCase):
         today = date.today().strftime("%Y-%m-%d")
         resp = self.client.get(reverse("dentista:get_slots"), {"fecha": today, "servicio_id": other_service.id})
         self.assertJSONEqual(resp.content.decode(), {"slots": []})
+
+    def test_dashboard_reusa_paneles_hasta_que_cambian_los_datos(self):
+        url = reverse("dentista:dashboard_panel", args=["kpis"])
+        self.assertEqual(self.client.get(url).context["kpi_pendientes"], 0)
+
+        with CaptureQueriesContext(connection) as consultas:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        tablas_de_paneles = ("domain_cita", "domain_pago", "domain_ingresodiario", "domain_avisodentista")
+        self.assertEqual([q["sql"] for q in consultas if any(t in q["sql"] for t in tablas_de_paneles)], [])
+
+        manana = date.today() + timezone.timedelta(days=1)
+        Cita.objects.create(dentista=self.dentista, paciente=self.paciente, servicio=self.servicio,
+                            fecha=manana, hora_inicio=time(10, 0), hora_fin=time(10, 30))
+        resp = self.client.get(url)
+        self.assertEqual(resp.context["kpi_pendientes"], 1)
+        resp = self.client.get(reverse("dentista:dashboard_panel", args=["proxima_cita"]))
+        self.assertEqual(resp.context["proxima_cita"].fecha, manana)
+
+    def test_dashboard_esqueleto_sin_paneles_y_paneles_revalidables(self):
+        with CaptureQueriesContext(connection) as consultas:
+            resp = self.client.get(reverse("dentista:dashboard"))
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn("domain_cita", " ".join(q["sql"] for q in consultas))
+        self.assertContains(resp, reverse("dentista:dashboard_panel", args=["calendario"]))
+
+        url = reverse("dentista:dashboard_panel", args=["avisos"])
+        resp = self.client.get(url)
+        self.assertIn("no-cache", resp["Cache-Control"])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=resp["ETag"]).status_code, 304)
+
+        resp = self.client.get(reverse("dentista:dashboard_panel", args=["riesgos"]))
+        self.assertEqual(resp.json()["riesgos"][0]["paciente"], "Rodolfo Castellon")
+        self.assertEqual(self.client.get(reverse("dentista:dashboard_panel", args=["otro"])).status_code, 404)
+
+
+class BusquedaPacientesTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="doc", password="pass123")
+        self.dentista = Dentista.objects.create(user=user, nombre="Dr. Test")
+        self.paciente = Paciente.objects.create(dentista=self.dentista, nombre="José  Núñez Ávila", telefono="5512345678")
+        Paciente.objects.create(dentista=self.dentista, nombre="Ana Torres", telefono="3300000000")
+        self.client = Client()
+        self.client.login(username="doc", password="pass123")
+
+    def _sugerencias(self, q):
+        resp = self.client.get(reverse("dentista:sugerencias_pacientes"), {"q": q})
+        self.assertEqual(resp.status_code, 200)
+        return [p["nombre"] for p in resp.json()["pacientes"]]
+
+    def test_sugiere_por_prefijo_contenido_y_telefono_sin_acentos(self):
+        self.assertEqual(self.paciente.nombre_normalizado, "jose nunez avila")
+        self.assertEqual(self._sugerencias("JOSE"), ["José  Núñez Ávila"])
+        self.assertEqual(self._sugerencias("nuñez av"), ["José  Núñez Ávila"])
+        self.assertEqual(self._sugerencias("551 234"), ["José  Núñez Ávila"])
+        self.assertEqual(self._sugerencias("zav"), [])
+
+        self.paciente.nombre = "José Pérez"
+        self.paciente.save(update_fields=["nombre"])
+        self.assertEqual(self._sugerencias("nunez"), [])
+        self.assertEqual(self._sugerencias("perez"), ["José Pérez"])
+
+    def test_duplicado_de_nombre_ignora_acentos_y_mayusculas(self):
+        resp = self.client.post(reverse("dentista:registrar_paciente"), {
+            "email": "otro@example.com", "password": "pass123", "nombre": "JOSE NUNEZ avila", "telefono": "5599999999",
+        })
+        self.assertContains(resp, "Ya existe un paciente con ese nombre.")
+        self.assertEqual(Paciente.objects.filter(dentista=self.dentista).count(), 2)
+
+        resp = self.client.get(reverse("dentista:pacientes"), {"q": "torr"})
+        self.assertEqual([p.nombre for p in resp.context["pacientes"]], ["Ana Torres"])
+
+
+class OdontogramaLoteTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="doc", password="pass123")
+        self.dentista = Dentista.objects.create(user=user, nombre="Dr. Test")
+        self.paciente = Paciente.objects.create(dentista=self.dentista, nombre="Rodolfo Castellon")
+        Diente.objects.create(paciente=self.paciente, numero="3", estado="caries", nota="")
+        Diente.objects.create(paciente=self.paciente, numero="8", estado="corona", nota="")
+        self.url = reverse("dentista:odontograma_guardar_lote", args=[self.paciente.id])
+        self.client = Client()
+        self.client.login(username="doc", password="pass123")
+
+    def _lote(self, cambios, version=None):
+        return self.client.post(self.url, data=json.dumps({"version": version, "cambios": cambios}),
+                                content_type="application/json")
+
+    def test_aplica_el_diff_completo_en_pocas_consultas(self):
+        resp = self.client.get(reverse("dentista:odontograma_data", args=[self.paciente.id]))
+        self.assertEqual(resp["X-Odontograma-Version"], "0")
+
+        cambios = [{"diente": str(n), "estado": "ortodoncia", "nota": "arco"} for n in range(9, 25)]
+        cambios += [{"diente": "3", "estado": "corona", "nota": "cambio"}, {"diente": "8", "estado": "sano"}]
+        # presupuesto_consultas de la vista (estricto en tests) acota las consultas del lote
+        resp = self._lote(cambios, version=0)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json(), {"status": "success", "version": 1, "creados": 16, "actualizados": 1, "borrados": 1})
+
+        estados = dict(Diente.objects.filter(paciente=self.paciente).values_list("numero", "estado"))
+        self.assertEqual(len(estados), 17)
+        self.assertEqual(estados["3"], "corona")
+        self.assertEqual(estados["9"], "bracket")
+        self.assertNotIn("8", estados)
+
+        # Sin cambios reales la versión no avanza
+        self.assertEqual(self._lote([{"diente": "3", "estado": "corona", "nota": "cambio"}], version=1).json()["version"], 1)
+
+    def test_odontograma_data_revalida_con_la_version(self):
+        url = reverse("dentista:odontograma_data", args=[self.paciente.id])
+        etag = self.client.get(url)["ETag"]
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+
+        self._lote([{"diente": "3", "estado": "sano"}])
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["X-Odontograma-Version"], "1")
+        self.assertIn("Last-Modified", resp)
+        self.assertEqual([d["diente"] for d in resp.json()], ["8"])
+
+    def test_rechaza_version_vieja_y_datos_invalidos(self):
+        self.assertEqual(self._lote([{"diente": "5", "estado": "caries"}]).json()["version"], 1)
+        # El guardado de un diente también cuenta como versión nueva
+        resp = self.client.post(reverse("dentista:odontograma_guardar", args=[self.paciente.id]),
+                                data=json.dumps({"diente": "6", "estado": "caries"}), content_type="application/json")
+        self.assertEqual(resp.json()["version"], 2)
+
+        resp = self._lote([{"diente": "5", "estado": "sano"}], version=1)
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(resp.json()["version"], 2)
+        self.assertTrue(Diente.objects.filter(paciente=self.paciente, numero="5").exists())
+
+        self.assertEqual(self._lote([{"diente": "", "estado": "caries"}]).status_code, 400)
+        self.assertEqual(self._lote("no es lista").status_code, 400)
+
+        otro = Dentista.objects.create(user=User.objects.create_user(username="otro"), nombre="Otro")
+        ajeno = Paciente.objects.create(dentista=otro, nombre="Ajeno")
+        url = reverse("dentista:odontograma_guardar_lote", args=[ajeno.id])
+        self.assertEqual(self.client.post(url, data="{}", content_type="application/json").status_code, 404)
+
+
+class PresupuestoConsultasDentistaTests(TestCase):
+    """Las vistas del dentista no deben crecer en consultas con el número de pacientes/citas."""
+
+    PACIENTES = 30  # más filas que cualquier presupuesto: un N+1 siempre lo excede
+
+    def setUp(self):
+        user = User.objects.create_user(username="doc", password="pass123")
+        self.dentista = Dentista.objects.create(user=user, nombre="Dr. Test")
+        servicio = Servicio.objects.create(dentista=self.dentista, nombre="Limpieza", precio=100, duracion_estimada=30)
+        for dia in range(1, 7):
+            Horario.objects.create(dentista=self.dentista, dia_semana=dia, hora_inicio=time(8, 0), hora_fin=time(20, 0))
+
+        hoy = date.today()
+        for i in range(self.PACIENTES):
+            paciente_user = User.objects.create(username=f"pac{i}")
+            paciente = Paciente.objects.create(user=paciente_user, dentista=self.dentista, nombre=f"Paciente {i}")
+            hora = time(8 + i % 12, 0)
+            for delta, estado in ((-3, "INASISTENCIA"), (0, "CONFIRMADA"), (2, "PENDIENTE")):
+                cita = Cita.objects.create(
+                    dentista=self.dentista, paciente=paciente, servicio=servicio,
+                    fecha=hoy + timezone.timedelta(days=delta), hora_inicio=hora,
+                    hora_fin=time(8 + i % 12, 30), estado=estado,
+                )
+                Pago.objects.create(cita=cita, monto=300 if delta < 0 else 100, metodo="EFECTIVO", estado="PENDIENTE")
+            PenalizacionLog.objects.create(dentista=self.dentista, paciente=paciente, accion="ADVERTENCIA", monto=300)
+
+        self.client = Client()
+        self.client.login(username="doc", password="pass123")
+
+    def test_vistas_dentro_de_presupuesto(self):
+        # PRESUPUESTO_CONSULTAS_ESTRICTO está activo en tests: exceder lanza PresupuestoExcedido
+        rutas = [
+            reverse("dentista:dashboard"),
+            *(reverse("dentista:dashboard_panel", args=[nombre])
+              for nombre in ("kpis", "calendario", "proxima_cita", "pagos", "avisos", "riesgos", "sugerencias")),
+            reverse("dentista:agenda"),
+            reverse("dentista:agenda_modo", args=["semana"]),
+            reverse("dentista:sugerencias_pacientes") + "?q=pac",
+            reverse("dentista:penalizaciones"),
+            reverse("dentista:penalizaciones_grupos"),
+            reverse("dentista:reportes"),
+            reverse("dentista:pagos"),
+        ]
+        for ruta in rutas:
+            with self.subTest(ruta=ruta):
+                self.assertEqual(self.client.get(ruta).status_code, 200)
+
+    def test_pagos_por_paginas_de_cursor(self):
+        resp = self.client.get(reverse("dentista:pagos"))
+        primera = resp.context["pagos"]
+        self.assertEqual(resp.context["total_transacciones"], self.PACIENTES * 3)
+        self.assertContains(resp, "Siguientes")
+
+        resp = self.client.get(reverse("dentista:pagos") + primera.url_siguiente)
+        segunda = resp.context["pagos"]
+        self.assertEqual(len(segunda), len(primera))
+        self.assertFalse({p.id for p in primera} & {p.id for p in segunda})
+        self.assertIsNotNone(segunda.url_primera)
+
+    def test_penalizaciones_agrupa_sin_consultas_por_paciente(self):
+        resp = self.client.get(reverse("dentista:penalizaciones_grupos"))
+        grupos = resp.context["estado_grupos"]
+        # Todos tienen un cargo de $300 pendiente y reciente
+        self.assertEqual(len(grupos["advertidas"]), self.PACIENTES)
+        self.assertTrue(all(item["info"]["estado"] == "pending" for item in grupos["advertidas"]))
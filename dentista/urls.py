@@ -8,6 +8,7 @@ urlpatterns = [
     # DASHBOARD
     # ==========================
     path("dashboard/", views.dashboard_dentista, name="dashboard"),
+    path("dashboard/paneles/<str:nombre>/", views.dashboard_panel, name="dashboard_panel"),
     path("agenda/semana/", views.agenda_modo, {"modo": "semana"}, name="agenda_semana"),
     # ==========================
     # AGENDA Y CITAS
@@ -20,6 +21,7 @@ urlpatterns = [
     # API para obtener horas libres (AJAX)
     path("api/slots/", views.obtener_slots_disponibles, name="obtener_slots"),
     path("api/get-slots/", views.obtener_slots_disponibles, name="get_slots"),
+    path("api/pacientes/buscar/", views.sugerencias_pacientes, name="sugerencias_pacientes"),
 
     # ==========================
     # CONSULTA MÉDICA
@@ -48,6 +50,7 @@ urlpatterns = [
     # Odontograma (APIs)
     path("pacientes/<int:id>/odontograma/data/", views.odontograma_data, name="odontograma_data"),
     path("pacientes/<int:id>/odontograma/guardar/", views.odontograma_guardar, name="odontograma_guardar"),
+    path("pacientes/<int:id>/odontograma/lote/", views.odontograma_guardar_lote, name="odontograma_guardar_lote"),
 
     # ==========================
     # FINANZAS (PAGOS)
@@ -63,6 +66,7 @@ urlpatterns = [
     path("configuracion/horario/<int:id>/eliminar/", views.eliminar_horario, name="eliminar_horario"),
     path("soporte/", views.soporte, name="soporte"),
     path("penalizaciones/", views.penalizaciones, name="penalizaciones"),
+    path("penalizaciones/grupos/", views.penalizaciones_grupos, name="penalizaciones_grupos"),
 
     # ==========================
     # REPORTES
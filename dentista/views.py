@@ -4,6 +4,7 @@
 
 import json
 import csv
+from collections import defaultdict
 from datetime import date, datetime, timedelta
 import re
 from decimal import Decimal
@@ -22,15 +23,16 @@ from django.db.models import Sum, Q, Count
 from django.http import HttpResponse, JsonResponse, FileResponse, Http404
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
+from django.utils.cache import set_response_etag
 from django.views.decorators.http import require_POST
 
 # IMPORTAMOS TODOS LOS MODELOS
 from domain.models import (
     PenalizacionLog,
-    AvisoDentista,
     Cita,
     Dentista,
     Horario,
+    IngresoDiario,
     ComprobantePago,
     Paciente,
     Pago,
@@ -38,7 +40,18 @@ from domain.models import (
     Diente,
     TicketSoporte,
 )
-from domain.ai_services import calcular_penalizacion_paciente, procesar_inasistencia
+from domain.ai_services import procesar_inasistencia
+from accounts.perfiles import dentista_o_404
+from proyecto_rc.condicional import con_validadores, etag_de, no_modificada
+from proyecto_rc.presupuestos import presupuesto_consultas
+from domain.busqueda import LIMITE_SUGERENCIAS, buscar_pacientes, existe_nombre, sugerir_pacientes
+from domain.catalogo import catalogo_servicios
+from domain.horarios import semana_dentista, turnos_del_dia
+from domain.odontograma import OdontogramaDesactualizado, aplicar_cambios, version_odontograma
+from domain.paginacion import paginar_request
+from dentista.paneles import citas_por_dia, grupos_penalizacion, obtener_paneles
+from domain.reservas import HorarioNoDisponible, reservar_cita
+from domain.sincronizacion import lapidas_en_lote
 from domain.notifications import (
     enviar_correo_confirmacion_cita,
     enviar_correo_penalizacion,
@@ -94,23 +107,24 @@ def _build_weeks(dentista, start_date, end_date, hoy, hora_actual):
     """
     dias = []
     total_dias = (end_date - start_date).days + 1
+    semana = semana_dentista(dentista)
+    por_dia = citas_por_dia(dentista, start_date, end_date)
 
     for offset in range(total_dias):
         fecha = start_date + timedelta(days=offset)
-        citas_dia = Cita.objects.filter(dentista=dentista, fecha=fecha).exclude(estado="CANCELADA").order_by("hora_inicio")
 
         citas_info = []
-        for c in citas_dia:
+        for c in por_dia.get(fecha, []):
             pasada = (fecha < hoy) or (fecha == hoy and c.hora_fin < hora_actual)
             citas_info.append({
                 "obj": c,
-                "es_mia": c.dentista == dentista,
+                "es_mia": c.dentista_id == dentista.id,
                 "clase_extra": "ghost-mode" if pasada else "",
             })
 
         dias.append({
             "fecha": fecha,
-            "tipo_dia": "laboral" if Horario.objects.filter(dentista=dentista, dia_semana=fecha.isoweekday()).exists() else "descanso",
+            "tipo_dia": "laboral" if semana[fecha.isoweekday() - 1] else "descanso",
             "citas": citas_info,
         })
 
@@ -124,8 +138,8 @@ def _build_resumenes(dentista, hoy, hora_actual):
         .exclude(estado="CANCELADA")
         .order_by("hora_inicio")
     )
-    en_curso = citas_hoy.filter(hora_inicio__lte=hora_actual, hora_fin__gt=hora_actual).first()
-    siguiente = citas_hoy.filter(hora_inicio__gt=hora_actual).first()
+    en_curso = citas_hoy.filter(hora_inicio__lte=hora_actual, hora_fin__gt=hora_actual).select_related("paciente", "servicio").first()
+    siguiente = citas_hoy.filter(hora_inicio__gt=hora_actual).select_related("paciente", "servicio").first()
     resumen_agenda = {
         "paciente": en_curso.paciente.nombre if en_curso else (siguiente.paciente.nombre if siguiente else None),
         "servicio": en_curso.servicio.nombre if en_curso else (siguiente.servicio.nombre if siguiente else None),
@@ -255,115 +269,92 @@ def _enviar_html(asunto, template, contexto, destinatario):
 # ============================================================
 #  2. FUNCIONES DE IA / CÁLCULOS
 # ============================================================
-
-def calcular_riesgo_paciente(paciente):
-    """
-    Reusa la lógica central de riesgo (domain.ai_services) para mostrar
-    porcentaje y nivel en el dashboard del dentista.
-    """
-    from domain.ai_services import calcular_score_riesgo
-
-    riesgo_percent = calcular_score_riesgo(paciente)
-
-    if riesgo_percent >= 70:
-        lvl, col = "Alto", "badge-red"
-    elif riesgo_percent >= 35:
-        lvl, col = "Medio", "badge-yellow"
-    else:
-        lvl, col = "Bajo", "badge-green"
-
-    return {"paciente": paciente.nombre, "porcentaje": riesgo_percent, "nivel": lvl, "color": col}
-
-def optimizar_agenda(citas_dia):
-    sugerencias = []
-    citas = sorted(citas_dia, key=lambda x: x.hora_inicio)
-    for i in range(len(citas) - 1):
-        fin = datetime.combine(citas[i].fecha, citas[i].hora_fin)
-        ini = datetime.combine(citas[i+1].fecha, citas[i+1].hora_inicio)
-        # Si hay hueco mayor a 20 min
-        if (ini - fin).seconds // 60 >= 20:
-            sugerencias.append(f"Hueco libre entre {citas[i].paciente.nombre} y {citas[i+1].paciente.nombre}.")
-    return sugerencias
-
+# Los cálculos del dashboard (riesgo, huecos de agenda) viven en dentista/paneles.py
 
 # ============================================================
 #  3. DASHBOARD Y AGENDA
 # ============================================================
 
+@presupuesto_consultas(max=4)
 @login_required
 def dashboard_dentista(request):
-    dentista = Dentista.objects.filter(user=request.user).first()
+    dentista = request.perfil.dentista
     if not dentista:
         # Si el usuario no es dentista, redirige a su panel de paciente
         return redirect("paciente:dashboard")
-    hoy = date.today()
-    hora_actual = timezone.localtime().time()
-
-    citas_hoy = (
-        Cita.objects.filter(dentista=dentista, fecha=hoy)
-        .exclude(estado__in=["CANCELADA", "INASISTENCIA"])
-        .select_related("paciente", "servicio")
-        .order_by("hora_inicio")
-    )
-    inicio_mes = hoy.replace(day=1)
-    
-    # KPIs
-    kpi_pacs = Paciente.objects.filter(dentista=dentista).count()
-    kpi_pend = Cita.objects.filter(dentista=dentista, estado="PENDIENTE").count()
-    ingresos = Pago.objects.filter(cita__dentista=dentista, estado="COMPLETADO", created_at__date__gte=inicio_mes).aggregate(Sum("monto"))["monto__sum"] or 0
+    # Solo el esqueleto: cada panel se pide aparte a dashboard_panel
+    return render(request, "dentista/dashboard.html", {"dentista": dentista})
+
+
+# Fragmentos HTML del dashboard: plantilla y paneles (dentista/paneles.py) que usa
+FRAGMENTOS_DASHBOARD = {
+    "kpis": ("dentista/paneles/kpis.html", ("kpis", "citas_hoy")),
+    "calendario": ("dentista/paneles/calendario.html", ("calendario",)),
+    "proxima_cita": ("dentista/paneles/proxima_cita.html", ("proxima_cita",)),
+    "pagos": ("dentista/paneles/pagos.html", ("pagos",)),
+    "avisos": ("dentista/paneles/avisos.html", ("avisos",)),
+}
+# Paneles que solo se sirven como JSON: nombre -> (panel, función que extrae el dato)
+DATOS_DASHBOARD = {
+    "riesgos": ("riesgos", lambda valor: valor),
+    "sugerencias": ("citas_hoy", lambda valor: valor["sugerencias"]),
+}
+
+
+def _respuesta_panel(request, respuesta):
+    """
+    ETag del contenido y revalidación obligatoria: el navegador conserva el
+    fragmento y, si no cambió, el servidor responde 304 sin cuerpo.
+    """
+    set_response_etag(respuesta)
+    return no_modificada(request, respuesta["ETag"]) or con_validadores(respuesta, respuesta["ETag"])
 
-    # Próxima Cita
-    prox = Cita.objects.filter(dentista=dentista, estado__in=["PENDIENTE", "CONFIRMADA"]).filter(Q(fecha__gt=hoy)|Q(fecha=hoy, hora_fin__gt=hora_actual)).order_by("fecha", "hora_inicio").first()
 
-    # Radar (Mini calendario de 30 días)
-    if inicio_mes.month == 12: sig = inicio_mes.replace(year=inicio_mes.year+1, month=1, day=1)
-    else: sig = inicio_mes.replace(month=inicio_mes.month+1, day=1)
-    
-    calendario = []
-    # Rango de 60 días a partir de hoy (incluye hoy)
-    start_date = hoy
-    end_date = hoy + timedelta(days=60)
-    total_dias = (end_date - start_date).days + 1
-    dias_es = ["LUN", "MAR", "MIE", "JUE", "VIE", "SAB", "DOM"]
-
-    for i in range(total_dias):
-        f = start_date + timedelta(days=i)
-        cs = (
-            Cita.objects.filter(dentista=dentista, fecha=f)
-            .exclude(estado="CANCELADA")
-            .select_related("paciente", "servicio")
-            .order_by("hora_inicio")
+def _contexto_panel(paneles, hoy):
+    contexto = {"fecha_actual": hoy}
+    if "kpis" in paneles:
+        kpis = paneles["kpis"]
+        contexto.update(
+            kpi_pacientes=kpis["pacientes"], kpi_pendientes=kpis["pendientes"], ingresos_mes=kpis["ingresos_mes"],
         )
-        procesadas = []
-        for c in cs:
-            pasada = (f < hoy) or (f == hoy and c.hora_fin < hora_actual)
-            procesadas.append({
-                "paciente": c.paciente.nombre,
-                "hora": c.hora_inicio.strftime("%H:%M"),
-                "servicio": c.servicio.nombre if c.servicio else "",
-                "clase_estado": "cita-pasada" if pasada else c.estado.lower()
-            })
-        calendario.append({
-            "dia": f,
-            "label_dia": dias_es[f.weekday()],
-            "clases": "hoy" if f == hoy else "",
-            "citas": procesadas,
-        })
-
-    avisos = AvisoDentista.objects.filter(dentista=dentista).order_by("-created_at")[:15]
+    if "citas_hoy" in paneles:
+        contexto["citas_hoy"] = paneles["citas_hoy"]["citas"]
+    if "proxima_cita" in paneles:
+        contexto["proxima_cita"] = paneles["proxima_cita"]
+    if "calendario" in paneles:
+        contexto["calendario_dias"] = paneles["calendario"]
+    if "pagos" in paneles:
+        contexto["pagos"] = paneles["pagos"]
+    if "avisos" in paneles:
+        contexto["notificaciones"] = paneles["avisos"]
+    return contexto
+
+
+@presupuesto_consultas(max=8)
+@login_required
+def dashboard_panel(request, nombre):
+    """Un panel del dashboard: fragmento HTML o, para riesgos/sugerencias, JSON."""
+    dentista = dentista_o_404(request)
+    hoy = date.today()
+    hora_actual = timezone.localtime().time()
 
-    return render(request, "dentista/dashboard.html", {
-        "dentista": dentista, "citas_hoy": citas_hoy, "kpi_pacientes": kpi_pacs, "kpi_pendientes": kpi_pend,
-        "ingresos_mes": ingresos, "proxima_cita": prox, "calendario_dias": calendario,
-        "riesgos": [calcular_riesgo_paciente(p) for p in Paciente.objects.filter(dentista=dentista)],
-        "sugerencias": optimizar_agenda(citas_hoy),
-        "pagos": Pago.objects.filter(cita__dentista=dentista).order_by("-created_at")[:5],
-        "notificaciones": avisos,
-    })
+    if nombre in FRAGMENTOS_DASHBOARD:
+        plantilla, usados = FRAGMENTOS_DASHBOARD[nombre]
+        # Cada panel sale de la caché mientras no cambien los datos del dentista
+        paneles = obtener_paneles(dentista, hoy, hora_actual, usados)
+        respuesta = render(request, plantilla, _contexto_panel(paneles, hoy))
+    elif nombre in DATOS_DASHBOARD:
+        usado, extraer = DATOS_DASHBOARD[nombre]
+        valor = obtener_paneles(dentista, hoy, hora_actual, [usado])[usado]
+        respuesta = JsonResponse({nombre: extraer(valor)})
+    else:
+        raise Http404("Panel desconocido.")
+    return _respuesta_panel(request, respuesta)
 
+@presupuesto_consultas(max=15)
 @login_required
 def agenda_dentista(request):
-    dentista = get_object_or_404(Dentista, user=request.user)
+    dentista = dentista_o_404(request)
     hoy = date.today()
     hora_actual = timezone.localtime().time()
     fin_rango = hoy + timedelta(days=60)
@@ -381,13 +372,14 @@ def agenda_dentista(request):
     })
 
 
+@presupuesto_consultas(max=15)
 @login_required
 def agenda_modo(request, modo):
     """
     Vista ligera para alternar modos de la agenda (día, semana, mes).
     Se reutilizan datos simples para que los enlaces en las plantillas no rompan.
     """
-    dentista = get_object_or_404(Dentista, user=request.user)
+    dentista = dentista_o_404(request)
     hoy = date.today()
     hora_actual = timezone.localtime().time()
     fin_rango = hoy + timedelta(days=60)
@@ -449,7 +441,7 @@ def agenda_modo(request, modo):
 
 @login_required
 def crear_cita_manual(request):
-    dentista = get_object_or_404(Dentista, user=request.user)
+    dentista = dentista_o_404(request)
     
     if request.method == "POST":
         p_id = request.POST.get("paciente")
@@ -484,28 +476,26 @@ def crear_cita_manual(request):
                 if metodo_pago not in ["EFECTIVO", "TRANSFERENCIA", "TARJETA", "MERCADOPAGO"]:
                     metodo_pago = "EFECTIVO"
                 
-                # Crear la cita
-                nueva_cita = Cita.objects.create(
-                    dentista=dentista,
-                    paciente=paciente_obj,
-                    servicio=s,
-                    fecha=f,
-                    hora_inicio=h,
-                    hora_fin=(datetime.combine(f, h) + timedelta(minutes=s.duracion_estimada)).time(),
-                    estado="PENDIENTE"
-                )
-                # Crear pago pendiente para reflejarlo en paneles
+                # Crear la cita (y su pago pendiente para reflejarlo en paneles)
+                # bajo el candado de la agenda; el dentista puede usar cualquier
+                # hora, pero nunca empalmar con otra cita activa.
                 try:
-                    Pago.objects.get_or_create(
-                        cita=nueva_cita,
-                        defaults={
+                    nueva_cita = reservar_cita(
+                        dentista,
+                        paciente_obj,
+                        s,
+                        f,
+                        h,
+                        validar_slot=False,
+                        pago_defaults={
                             "monto": monto_decimal,
                             "metodo": metodo_pago,
                             "estado": "PENDIENTE",
                         },
                     )
-                except Exception as exc:
-                    print(f"[WARN] No se pudo crear pago pendiente: {exc}")
+                except HorarioNoDisponible:
+                    messages.error(request, "Ese horario se empalma con otra cita. Elige otra hora.")
+                    return redirect("dentista:crear_cita_manual")
 
                 _guardar_aviso(
                     dentista,
@@ -532,7 +522,7 @@ def crear_cita_manual(request):
     return render(request, "dentista/crear_cita_manual.html", {
         "dentista": dentista,
         "pacientes": Paciente.objects.filter(dentista=dentista),
-        "servicios": Servicio.objects.filter(dentista=dentista, activo=True),
+        "servicios": catalogo_servicios(dentista.id).servicios,
         "fecha_min": date.today().strftime("%Y-%m-%d"),
         "fecha_max": (date.today()+timedelta(days=60)).strftime("%Y-%m-%d")
     })
@@ -592,7 +582,7 @@ def consulta(request, id):
 @login_required
 def obtener_slots_disponibles(request):
     """API para obtener horas libres en crear_cita_manual"""
-    dentista = get_object_or_404(Dentista, user=request.user)
+    dentista = dentista_o_404(request)
     fecha_str, s_id = request.GET.get('fecha'), request.GET.get('servicio_id')
     
     if not fecha_str or not s_id:
@@ -607,16 +597,16 @@ def obtener_slots_disponibles(request):
     except Exception:
         return JsonResponse({'slots': []})
 
-    horarios = Horario.objects.filter(dentista=dentista, dia_semana=fecha.isoweekday())
+    horarios = turnos_del_dia(dentista, fecha)
     if not horarios: return JsonResponse({'slots': [], 'mensaje': 'Día no laboral'})
 
     ocupados = [(datetime.combine(fecha, c.hora_inicio), datetime.combine(fecha, c.hora_fin)) 
                 for c in Cita.objects.filter(dentista=dentista, fecha=fecha).exclude(estado__in=['CANCELADA', 'INASISTENCIA'])]
     
     slots = []
-    for h in horarios:
-        cursor = datetime.combine(fecha, h.hora_inicio)
-        fin = datetime.combine(fecha, h.hora_fin)
+    for h_inicio, h_fin in horarios:
+        cursor = datetime.combine(fecha, h_inicio)
+        fin = datetime.combine(fecha, h_fin)
         while cursor + timedelta(minutes=duracion) <= fin:
             fin_slot = cursor + timedelta(minutes=duracion)
             if not any(cursor < o_fin and fin_slot > o_ini for o_ini, o_fin in ocupados):
@@ -634,7 +624,7 @@ def obtener_slots_disponibles(request):
 
 @login_required
 def servicios(request):
-    dentista = get_object_or_404(Dentista, user=request.user)
+    dentista = dentista_o_404(request)
     q = request.GET.get("q", "").strip()
     qs = Servicio.objects.filter(dentista=dentista).order_by("nombre")
     
@@ -670,7 +660,7 @@ def servicios(request):
 
 @login_required
 def servicio_crear(request):
-    dentista = get_object_or_404(Dentista, user=request.user)
+    dentista = dentista_o_404(request)
     if request.method == "POST":
         try:
             Servicio.objects.create(
@@ -688,7 +678,7 @@ def servicio_crear(request):
 
 @login_required
 def servicio_editar(request, id):
-    dentista = get_object_or_404(Dentista, user=request.user)
+    dentista = dentista_o_404(request)
     servicio = get_object_or_404(Servicio, id=id, dentista=dentista)
 
     if request.method == "POST":
@@ -706,7 +696,7 @@ def servicio_editar(request, id):
 
 @login_required
 def servicio_toggle_estado(request, id):
-    dentista = get_object_or_404(Dentista, user=request.user)
+    dentista = dentista_o_404(request)
     servicio = get_object_or_404(Servicio, id=id, dentista=dentista)
     if request.method == "POST":
         servicio.activo = not servicio.activo
@@ -716,7 +706,7 @@ def servicio_toggle_estado(request, id):
 
 @login_required
 def servicio_eliminar(request, id):
-    dentista = get_object_or_404(Dentista, user=request.user)
+    dentista = dentista_o_404(request)
     servicio = get_object_or_404(Servicio, id=id, dentista=dentista)
     if request.method == "POST":
         servicio.delete()
@@ -730,15 +720,27 @@ def servicio_eliminar(request, id):
 
 @login_required
 def pacientes(request):
-    d = get_object_or_404(Dentista, user=request.user)
-    qs = Paciente.objects.filter(dentista=d).order_by("nombre")
-    if q := request.GET.get("q", "").strip(): 
-        qs = qs.filter(Q(nombre__icontains=q) | Q(telefono__icontains=q))
-    return render(request, "dentista/pacientes.html", {"dentista": d, "pacientes": qs, "query": q})
+    d = dentista_o_404(request)
+    q = request.GET.get("q", "").strip()
+    # Prefijo/trigramas sobre el nombre normalizado y prefijo de teléfono (domain/busqueda.py)
+    qs = buscar_pacientes(d, q)
+    return render(request, "dentista/pacientes.html", {
+        "dentista": d, "query": q, "total_pacientes": qs.count(),
+        "pacientes": paginar_request(request, qs, ("nombre", "id")),
+    })
+
+@presupuesto_consultas(max=6)
+@login_required
+def sugerencias_pacientes(request):
+    """Autocompletar: ?q=texto&limite=N -> {"pacientes": [{id, nombre, telefono}, ...]}."""
+    dentista = dentista_o_404(request)
+    limite = request.GET.get("limite", "")
+    limite = int(limite) if limite.isdigit() else LIMITE_SUGERENCIAS
+    return JsonResponse({"pacientes": sugerir_pacientes(dentista, request.GET.get("q", ""), limite)})
 
 @login_required
 def registrar_paciente(request):
-    dentista = get_object_or_404(Dentista, user=request.user)
+    dentista = dentista_o_404(request)
     
     if request.method == "POST":
         # 1. Obtener datos del formulario
@@ -757,7 +759,7 @@ def registrar_paciente(request):
         if Paciente.objects.filter(dentista=dentista, telefono=telefono_validado).exists():
             messages.error(request, "Ya existe un paciente con este teléfono.")
             return render(request, "dentista/registrar_paciente.html", {"dentista": dentista})
-        if Paciente.objects.filter(dentista=dentista, nombre__iexact=nombre).exists():
+        if existe_nombre(dentista, nombre):
             messages.error(request, "Ya existe un paciente con ese nombre.")
             return render(request, "dentista/registrar_paciente.html", {"dentista": dentista})
             
@@ -832,7 +834,7 @@ def editar_paciente(request, id):
             p.direccion = direccion
             p.antecedentes = antecedentes
             return render(request, "dentista/editar_paciente.html", {"dentista": request.user.dentista, "paciente": p})
-        if Paciente.objects.filter(dentista=request.user.dentista, nombre__iexact=nombre).exclude(id=p.id).exists():
+        if existe_nombre(request.user.dentista, nombre, excluir_id=p.id):
             messages.error(request, "Ya existe otro paciente con ese nombre.")
             p.nombre = nombre
             p.telefono = telefono
@@ -856,7 +858,7 @@ def editar_paciente(request, id):
 def detalle_paciente(request, id):
     p = get_object_or_404(Paciente, id=id, dentista__user=request.user)
     h = Cita.objects.filter(paciente=p).order_by("-fecha")
-    tp = Pago.objects.filter(cita__paciente=p, estado="COMPLETADO").aggregate(Sum("monto"))["monto__sum"] or 0
+    tp = Pago.objects.filter(paciente=p, estado="COMPLETADO").aggregate(Sum("monto"))["monto__sum"] or 0
     return render(request, "dentista/detalle_paciente.html", {"dentista": request.user.dentista, "paciente": p, "historial": h, "total_citas": h.count(), "total_pagado": tp})
 
 @login_required
@@ -866,19 +868,32 @@ def eliminar_paciente(request, id):
     usuario = paciente.user  # Guardamos referencia antes de borrar el perfil clínico
 
     # Borramos el perfil del paciente y limpiamos también su cuenta de usuario
-    paciente.delete()
-    if usuario:
-        usuario.delete()
+    # juntos: las lápidas de citas, pagos y notificaciones entran en un solo INSERT
+    with lapidas_en_lote():
+        paciente.delete()
+        if usuario:
+            usuario.delete()
 
     messages.success(request, "Paciente eliminado junto con su cuenta de acceso.")
     return redirect("dentista:pacientes")
 
+@presupuesto_consultas(max=6)
 @login_required
 def odontograma_data(request, id):
     paciente = get_object_or_404(Paciente, id=id, dentista=request.user.dentista)
+    # Validadores desde OdontogramaVersion: si el cliente ya tiene esta versión, 304 sin leer dientes
+    version, actualizado = version_odontograma(paciente.id)
+    etag = etag_de("odontograma", paciente.id, version)
+    vigente = no_modificada(request, etag, ultima_modificacion=actualizado)
+    if vigente:
+        return vigente
+
     dientes = Diente.objects.filter(paciente=paciente)
     data = [{"diente": d.numero, "estado": d.estado, "nota": d.nota or ""} for d in dientes]
-    return JsonResponse(data, safe=False)
+    respuesta = JsonResponse(data, safe=False)
+    # El cliente la devuelve al guardar por lotes para detectar ediciones cruzadas
+    respuesta["X-Odontograma-Version"] = version
+    return con_validadores(respuesta, etag, ultima_modificacion=actualizado)
 
 @login_required
 def odontograma_guardar(request, id):
@@ -886,51 +901,76 @@ def odontograma_guardar(request, id):
         try:
             paciente = get_object_or_404(Paciente, id=id, dentista=request.user.dentista)
             body = json.loads(request.body)
-            num = body.get('diente') or body.get('tooth')
-            estado = body.get('estado') or body.get('status')
-            nota = body.get('nota', '')
-
-            if not num: return JsonResponse({'status': 'error', 'msg': 'Falta número'}, status=400)
+            if not (body.get('diente') or body.get('tooth')):
+                return JsonResponse({'status': 'error', 'msg': 'Falta número'}, status=400)
 
-            # Normalización
-            if estado == 'ortodoncia': estado = 'bracket'
-            if estado == 'restauracion': estado = 'caries'
-            if estado == 'observacion': estado = 'corona'
-
-            if estado == 'sano':
-                Diente.objects.filter(paciente=paciente, numero=num).delete()
-            else:
-                Diente.objects.update_or_create(
-                    paciente=paciente, numero=num,
-                    defaults={'estado': estado, 'nota': nota}
-                )
-            return JsonResponse({'status': 'success'})
+            # Un diente es un lote de uno: misma normalización y misma versión
+            version, _ = aplicar_cambios(paciente, [body])
+            return JsonResponse({'status': 'success', 'version': version})
         except Exception as e:
             return JsonResponse({'status': 'error', 'msg': str(e)}, status=400)
     return JsonResponse({'status': 'error'}, status=400)
 
+# Fijo sin importar cuántos dientes: el primer guardado además crea OdontogramaVersion
+@presupuesto_consultas(max=16)
+@login_required
+@require_POST
+def odontograma_guardar_lote(request, id):
+    """
+    Guarda todo el diff del odontograma en una transacción:
+    {"version": 3, "cambios": [{"diente": "12", "estado": "caries", "nota": ""}, ...]}.
+    "version" es opcional; si no coincide con la vigente responde 409 con la actual.
+    """
+    paciente = get_object_or_404(Paciente, id=id, dentista=dentista_o_404(request))
+    try:
+        body = json.loads(request.body)
+        version, resumen = aplicar_cambios(paciente, body.get("cambios"), body.get("version"))
+    except OdontogramaDesactualizado as e:
+        return JsonResponse({'status': 'conflict', 'msg': str(e), 'version': e.version}, status=409)
+    except (ValueError, TypeError, AttributeError) as e:
+        # CambioInvalido, JSON mal formado o version no numérica
+        return JsonResponse({'status': 'error', 'msg': str(e)}, status=400)
+    return JsonResponse({'status': 'success', 'version': version, **resumen})
+
 
 # ============================================================
 #  7. PAGOS Y FACTURACIÓN
 # ============================================================
 
+@presupuesto_consultas(max=12)
 @login_required
 def pagos(request):
-    dentista = get_object_or_404(Dentista, user=request.user)
+    dentista = dentista_o_404(request)
     if request.method == "POST": return redirect("dentista:registrar_pago")
 
-    qs = Pago.objects.filter(cita__dentista=dentista).order_by("-created_at")
+    # Por páginas (domain/paginacion.py): el historial completo no pasa por la plantilla
+    pagos_pagina = paginar_request(
+        request,
+        Pago.objects.filter(dentista=dentista).select_related("cita__paciente", "cita__servicio"),
+        ("-created_at", "-id"),
+    )
     hoy = timezone.localdate()
     inicio_mes = hoy.replace(day=1)
     
-    kpi_mes = qs.filter(created_at__date__gte=inicio_mes, estado="COMPLETADO").aggregate(Sum("monto"))["monto__sum"] or 0
-    kpi_hoy = qs.filter(created_at__date=hoy, estado="COMPLETADO").aggregate(Sum("monto"))["monto__sum"] or 0
-    kpi_efectivo = qs.filter(metodo="EFECTIVO", estado="COMPLETADO").aggregate(Sum("monto"))["monto__sum"] or 0
-    kpi_digital = qs.filter(metodo__in=["TARJETA", "TRANSFERENCIA"], estado="COMPLETADO").aggregate(Sum("monto"))["monto__sum"] or 0
-    kpi_total = qs.filter(estado="COMPLETADO").aggregate(Sum("monto"))["monto__sum"] or 0
+    # Una sola consulta sobre el rollup diario (domain/ingresos.py) en vez de cinco sobre todos los pagos
+    completado = Q(estado="COMPLETADO")
+    kpis = IngresoDiario.objects.filter(dentista=dentista).aggregate(
+        mes=Sum("total", filter=completado & Q(fecha__gte=inicio_mes)),
+        hoy=Sum("total", filter=completado & Q(fecha=hoy)),
+        efectivo=Sum("total", filter=completado & Q(metodo="EFECTIVO")),
+        digital=Sum("total", filter=completado & Q(metodo__in=["TARJETA", "TRANSFERENCIA"])),
+        total=Sum("total", filter=completado),
+        transacciones=Sum("cantidad"),
+    )
+    kpi_mes = kpis["mes"] or 0
+    kpi_hoy = kpis["hoy"] or 0
+    kpi_efectivo = kpis["efectivo"] or 0
+    kpi_digital = kpis["digital"] or 0
+    kpi_total = kpis["total"] or 0
 
     return render(request, "dentista/pagos.html", {
-        "dentista": dentista, "pagos": qs,
+        "dentista": dentista, "pagos": pagos_pagina,
+        "total_transacciones": kpis["transacciones"] or 0,
         "kpi_mes": kpi_mes, "kpi_efectivo": kpi_efectivo,
         "kpi_digital": kpi_digital, "kpi_total": kpi_total,
         "kpi_hoy": kpi_hoy,
@@ -938,7 +978,7 @@ def pagos(request):
 
 @login_required
 def registrar_pago(request):
-    dentista = get_object_or_404(Dentista, user=request.user)
+    dentista = dentista_o_404(request)
     cita_preseleccionada = request.GET.get("cita_id") or request.POST.get("cita_id")
     base_citas = Cita.objects.filter(dentista=dentista)
     citas_pendientes = (
@@ -1042,7 +1082,7 @@ def descargar_comprobante(request, pago_id):
     pago = get_object_or_404(
         Pago.objects.select_related("cita", "cita__dentista"),
         id=pago_id,
-        cita__dentista__user=request.user,
+        dentista__user=request.user,
     )
 
     # Regeneramos siempre para asegurar diseño y datos actualizados
@@ -1202,7 +1242,7 @@ def _pdf_recibo_lindo(pago, folio):
 
 @login_required
 def configuracion(request):
-    dentista = get_object_or_404(Dentista, user=request.user)
+    dentista = dentista_o_404(request)
     if request.method == "POST":
         action = request.POST.get("action")
         if action == "add_schedule":
@@ -1246,7 +1286,7 @@ def eliminar_horario(request, id):
 
 @login_required
 def soporte(request):
-    dentista = get_object_or_404(Dentista, user=request.user)
+    dentista = dentista_o_404(request)
     if request.method == "POST":
         TicketSoporte.objects.create(dentista=dentista, asunto=request.POST.get("asunto"), mensaje=request.POST.get("mensaje"), estado="ABIERTO")
         try:
@@ -1257,40 +1297,13 @@ def soporte(request):
         return redirect("dentista:soporte")
     return render(request, "dentista/soporte.html", {"dentista": dentista, "tickets": TicketSoporte.objects.filter(dentista=dentista).order_by("-created_at")[:10]})
 
+# Peor caso medido con los datos sintéticos del bench: 15 (POST "penalizar" cuya inasistencia
+# genera el cargo, cachés frías); el GET hace 6
+@presupuesto_consultas(max=17)
 @login_required
 def penalizaciones(request):
-    dentista = get_object_or_404(Dentista, user=request.user)
-    # Lógica para mostrar logs de penalización si existen
-    logs = PenalizacionLog.objects.filter(paciente__dentista=dentista).order_by("-created_at")[:20]
-    pendientes = Pago.objects.filter(cita__dentista=dentista, estado="PENDIENTE")
-    pacientes = Paciente.objects.filter(dentista=dentista).select_related("user").order_by("nombre")
-
-    # Clasificamos pacientes por estado de penalización
-    estado_grupos = {"penalizadas": [], "advertidas": [], "inhabilitadas": [], "activas": []}
-    for p in pacientes:
-        info = calcular_penalizacion_paciente(p, dentista)
-        estado = info.get("estado")
-        if not getattr(getattr(p, "user", None), "is_active", True) or estado == "disabled":
-            grupo = "inhabilitadas"
-        elif estado == "pending":
-            # Tratamos pendiente (manual o automática) como advertida para mantenerla en esa columna
-            grupo = "advertidas"
-        elif estado == "warning":
-            grupo = "advertidas"
-        else:
-            # Si tiene una advertencia manual, mantener en advertidas
-            ultima_advertencia = (
-                PenalizacionLog.objects.filter(paciente=p, accion="ADVERTENCIA")
-                .order_by("-created_at")
-                .first()
-            )
-            if ultima_advertencia:
-                grupo = "advertidas"
-            else:
-                grupo = "activas"
+    dentista = dentista_o_404(request)
 
-        estado_grupos[grupo].append({"paciente": p, "info": info})
-    
     # Procesar acciones manuales si se envían
     if request.method == "POST":
         accion = request.POST.get("accion")
@@ -1442,44 +1455,69 @@ def penalizaciones(request):
 
         messages.info(request, "Acción no reconocida.")
 
+    # Historial y pagos pendientes por páginas (domain/paginacion.py)
+    pendientes = Pago.objects.filter(dentista=dentista, estado="PENDIENTE")
     return render(request, "dentista/penalizaciones.html", {
         "dentista": dentista,
-        "logs": logs,
-        "pendientes": pendientes,
-        "pacientes": pacientes,
-        "estado_grupos": estado_grupos,
+        "logs": paginar_request(
+            request,
+            PenalizacionLog.objects.filter(dentista=dentista).select_related("paciente"),
+            ("-created_at", "-id"), parametro="cursor_historial", tamano=20,
+        ),
+        "pendientes": paginar_request(
+            request,
+            pendientes.select_related("cita__paciente", "cita__servicio"),
+            ("-created_at", "-id"), parametro="cursor_pendientes",
+        ),
+        "total_pendientes": pendientes.count(),
+    })
+
+
+@presupuesto_consultas(max=10)
+@login_required
+def penalizaciones_grupos(request):
+    """Fragmento con los pacientes agrupados por estado; la página lo pide aparte."""
+    dentista = dentista_o_404(request)
+    respuesta = render(request, "dentista/paneles/penalizaciones_grupos.html", {
+        "estado_grupos": grupos_penalizacion(dentista),
     })
+    return _respuesta_panel(request, respuesta)
 
+@presupuesto_consultas(max=12)
 @login_required
 def reportes(request):
-    dentista = get_object_or_404(Dentista, user=request.user)
+    dentista = dentista_o_404(request)
     hoy = timezone.localdate()
     fi = datetime.strptime(request.GET.get("inicio") or (hoy - timedelta(30)).strftime("%Y-%m-%d"), "%Y-%m-%d").date()
     ff = datetime.strptime(request.GET.get("fin") or hoy.strftime("%Y-%m-%d"), "%Y-%m-%d").date()
-    citas = (
-        Cita.objects.filter(dentista=dentista, fecha__range=(fi, ff))
-        .select_related("paciente", "servicio")
-        .prefetch_related("encuestasatisfaccion_set")
-        .order_by("-fecha")
-    )
-    pagos = (
-        Pago.objects.filter(cita__dentista=dentista, created_at__date__range=(fi, ff))
-        .select_related("cita", "cita__paciente", "cita__servicio")
-        .order_by("-created_at")
+    citas = Cita.objects.filter(dentista=dentista, fecha__range=(fi, ff))
+    pagos = Pago.objects.filter(dentista=dentista, created_at__date__range=(fi, ff))
+    total_cobrado = (
+        IngresoDiario.objects.filter(dentista=dentista, estado="COMPLETADO", fecha__range=(fi, ff))
+        .aggregate(Sum("total"))["total__sum"] or 0
     )
-    total_cobrado = pagos.filter(estado="COMPLETADO").aggregate(Sum("monto"))["monto__sum"] or 0
+    # Cada tabla pagina por su cuenta; los totales siguen siendo del rango completo
     return render(request, "dentista/reportes.html", {
-        "dentista": dentista, "citas": citas, "fecha_inicio": fi, "fecha_fin": ff,
+        "dentista": dentista, "fecha_inicio": fi, "fecha_fin": ff,
+        "citas": paginar_request(
+            request,
+            citas.select_related("paciente", "servicio", "pago_relacionado").prefetch_related("encuestasatisfaccion_set"),
+            ("-fecha", "-hora_inicio", "-id"), parametro="cursor_citas",
+        ),
+        "pagos": paginar_request(
+            request,
+            pagos.select_related("cita", "cita__paciente", "cita__servicio"),
+            ("-created_at", "-id"), parametro="cursor_pagos",
+        ),
         "total_monto": total_cobrado,
         "total_citas": citas.count(),
         "total_pacientes": citas.values("paciente_id").distinct().count(),
-        "pagos": pagos,
     })
 
 @login_required
 def reporte_csv(request):
     # Generación simple de CSV
-    dentista = get_object_or_404(Dentista, user=request.user)
+    dentista = dentista_o_404(request)
     response = HttpResponse(content_type='text/csv')
     response['Content-Disposition'] = 'attachment; filename="reporte.csv"'
     writer = csv.writer(response)
@@ -1491,7 +1529,7 @@ def reporte_csv(request):
 
 @login_required
 def reporte_pdf(request):
-    dentista = get_object_or_404(Dentista, user=request.user)
+    dentista = dentista_o_404(request)
     hoy = timezone.localdate()
     fi = datetime.strptime(
         request.GET.get("inicio") or (hoy - timedelta(30)).strftime("%Y-%m-%d"),
@@ -1507,13 +1545,17 @@ def reporte_pdf(request):
         .order_by("fecha", "hora_inicio")
     )
     pagos = (
-        Pago.objects.filter(cita__dentista=dentista, created_at__date__range=(fi, ff))
+        Pago.objects.filter(dentista=dentista, created_at__date__range=(fi, ff))
         .select_related("cita", "cita__paciente", "cita__servicio")
         .order_by("-created_at")
     )
 
-    total_monto = pagos.filter(estado="COMPLETADO").aggregate(Sum("monto"))["monto__sum"] or 0
-    total_pendiente = pagos.filter(estado="PENDIENTE").aggregate(Sum("monto"))["monto__sum"] or 0
+    totales = IngresoDiario.objects.filter(dentista=dentista, fecha__range=(fi, ff)).aggregate(
+        completado=Sum("total", filter=Q(estado="COMPLETADO")),
+        pendiente=Sum("total", filter=Q(estado="PENDIENTE")),
+    )
+    total_monto = totales["completado"] or 0
+    total_pendiente = totales["pendiente"] or 0
     total_citas = citas.count()
     total_pacientes = citas.values("paciente_id").distinct().count()
 
@@ -4,6 +4,7 @@ Chatbot con RAG liviano y opción de IA (Gemini).
 - Usa una base de conocimiento local (YAML) y recupera contexto por similitud de tokens.
 - Si CHATBOT_IA_ENABLED y GEMINI_API_KEY están configurados, llama a Gemini con el contexto.
 - Si falla el modelo o no hay llave, responde con la base local y plantillas seguras.
+- Preguntas de "primer espacio disponible" se responden con la agenda real.
 """
 from __future__ import annotations
 
@@ -15,6 +16,9 @@ from typing import List, Dict
 import yaml
 from django.conf import settings
 
+from proyecto_rc.metricas import cronometro
+from proyecto_rc.trazas import trazar
+
 BASE_DIR = Path(settings.BASE_DIR)  # type: ignore
 KNOWLEDGE_PATH = BASE_DIR / "docs" / "chatbot_knowledge.yaml"
 CONOCIMIENTO_CARGADO = False
@@ -86,6 +90,59 @@ def _acciones_sugeridas(pregunta: str, lang: str = "es") -> str:
     return "¿Necesitas ayuda para agendar, pagar o revisar tu penalización?"
 
 
+FRASES_PRIMER_ESPACIO = (
+    "primer espacio",
+    "primer hueco",
+    "proximo espacio",
+    "próximo espacio",
+    "mas pronto",
+    "más pronto",
+    "primera cita disponible",
+    "next available",
+    "earliest",
+)
+
+
+@trazar()
+def _respuesta_primer_espacio(pregunta: str, lang: str = "es") -> str | None:
+    """
+    Intent de agenda: busca el hueco más próximo para el servicio mencionado.
+    Devuelve None si la pregunta no es de este tipo.
+    """
+    q = pregunta.lower()
+    if not any(frase in q for frase in FRASES_PRIMER_ESPACIO):
+        return None
+
+    from domain.ai_services import buscar_primer_espacio
+    from domain.models import Servicio
+
+    tokens_q = set(_tokenizar(q))
+    servicios = list(Servicio.objects.filter(activo=True).select_related("dentista").order_by("id"))
+    servicio = next(
+        (s for s in servicios if set(_tokenizar(s.nombre)) and set(_tokenizar(s.nombre)) <= tokens_q),
+        None,
+    )
+    en = lang.startswith("en")
+    if servicio is None:
+        nombres = ", ".join(sorted({s.nombre for s in servicios})[:5])
+        if en:
+            return f"Which treatment do you need? For example: {nombres}." if nombres else "There are no active services right now."
+        return f"¿Para qué tratamiento buscas lugar? Por ejemplo: {nombres}." if nombres else "Por ahora no hay servicios activos."
+
+    espacios = buscar_primer_espacio(servicio, cualquier_dentista=True)
+    if not espacios:
+        if en:
+            return f"There are no openings for {servicio.nombre} in the next 60 days. Please contact the clinic."
+        return f"No hay espacios para {servicio.nombre} en los próximos 60 días. Contacta al consultorio."
+
+    e = espacios[0]
+    fecha_txt = e.inicio.strftime("%d/%m/%Y")
+    hora_txt = e.inicio.strftime("%H:%M")
+    if en:
+        return f"The earliest opening for {servicio.nombre} is {fecha_txt} at {hora_txt} with Dr. {e.dentista.nombre}. You can book it from your dashboard."
+    return f"El primer espacio para {servicio.nombre} es el {fecha_txt} a las {hora_txt} con el Dr. {e.dentista.nombre}. Puedes agendarlo desde tu panel."
+
+
 def _respuesta_local(pregunta: str, lang: str = "es") -> str:
     contextos = _rank_contexto(pregunta, top_k=1)
     cuerpo = (contextos[0].strip() if contextos else "").strip()
@@ -102,6 +159,7 @@ def _respuesta_local(pregunta: str, lang: str = "es") -> str:
     return " ".join([intro, cuerpo, cta, cierre]).strip()[:400]
 
 
+@trazar()
 def _respuesta_gemini(pregunta: str, contextos: List[str]) -> str:
     api_key = getattr(settings, "GEMINI_API_KEY", "")
     if not api_key:
@@ -133,7 +191,8 @@ def _respuesta_gemini(pregunta: str, contextos: List[str]) -> str:
                 "top_k": 40,
             },
         )
-        resp = model.generate_content(prompt)
+        with cronometro("rc_chatbot_llm_segundos"):
+            resp = model.generate_content(prompt)
         texto = (getattr(resp, "text", "") or "").strip()
         if not texto:
             raise RuntimeError("Respuesta vacía")
@@ -142,6 +201,7 @@ def _respuesta_gemini(pregunta: str, contextos: List[str]) -> str:
         raise RuntimeError(f"Gemini error: {exc}")
 
 
+@trazar()
 def responder_chatbot(
     pregunta: str,
     history: List[str] | None = None,
@@ -159,6 +219,14 @@ def responder_chatbot(
             base = "Type your question and I'll help with schedule, payments, penalties, or services."
         return {"message": base, "source": "local"}
 
+    try:
+        agenda = _respuesta_primer_espacio(pregunta, lang=lang_code or "es")
+    except Exception as exc:
+        print(f"[CHATBOT] No se pudo consultar la agenda: {exc}")
+        agenda = None
+    if agenda:
+        return {"message": agenda, "source": "agenda"}
+
     contextos = _rank_contexto(pregunta, top_k=getattr(settings, "CHATBOT_MAX_CONTEXT", 3))
     history = history or []
     history_ctx = history[-4:] if history else []
@@ -1,12 +1,19 @@
 # domain/ai_services.py
 
+import heapq
+from collections import defaultdict, namedtuple
 from datetime import datetime, time, timedelta
 from decimal import Decimal
+from itertools import repeat
 
 from django.utils import timezone
 from django.utils.timezone import localtime
 from django.conf import settings
+from django.db.models import Count, Q
+from domain.horarios import semanas_dentistas, turnos_del_dia, version_horarios
 from domain.notifications import enviar_correo_penalizacion
+from domain.versiones import version_datos_dentista
+from proyecto_rc.trazas import trazar
 
 # CORRECCIÓN 1: Importamos Horario en lugar de Disponibilidad
 from domain.models import Cita, Paciente, Servicio, Horario, PenalizacionLog, Pago
@@ -15,18 +22,27 @@ from domain.models import Cita, Paciente, Servicio, Horario, PenalizacionLog, Pa
 # ============================================================
 # HORARIO DEL DENTISTA (Antes Disponibilidad, ahora Horario)
 # ============================================================
+# Duración de un servicio sin duracion_estimada: la misma para slots, búsqueda y reserva
+DURACION_POR_DEFECTO = 30
+
+
+def duracion_servicio(servicio):
+    """Minutos que ocupa el servicio en la agenda."""
+    return int(getattr(servicio, "duracion_estimada", None) or DURACION_POR_DEFECTO)
+
+
+def es_dia_laboral(dentista, fecha):
+    """True si el dentista (instancia o id) tiene turnos en Horario ese día de la semana; no hay otra regla."""
+    return bool(turnos_del_dia(dentista, fecha))
+
 
 def obtener_turnos_dentista_en_fecha(dentista, fecha):
     """
-    Devuelve los turnos (Horario) del dentista para un día concreto.
+    Devuelve los turnos del dentista para un día concreto como lista de
+    tuplas (hora_inicio, hora_fin), desde la caché de horarios.
     - fecha: date
     """
-    # CORRECCIÓN: Usamos el modelo Horario
-    return Horario.objects.filter(
-        dentista=dentista,
-        # isoweekday() => lunes=1 ... domingo=7 (match con modelo)
-        dia_semana=fecha.isoweekday()
-    ).order_by("hora_inicio")
+    return turnos_del_dia(dentista, fecha)
 
 
 def es_horario_laboral_dentista(dentista, fecha, hora):
@@ -34,27 +50,24 @@ def es_horario_laboral_dentista(dentista, fecha, hora):
     True si 'hora' cae dentro de alguno de los bloques de Horario
     del dentista para ese día.
     """
-    turnos = obtener_turnos_dentista_en_fecha(dentista, fecha)
-    if not turnos.exists():
-        return False
-
-    for t in turnos:
-        if t.hora_inicio <= hora < t.hora_fin:
+    for inicio, fin in obtener_turnos_dentista_en_fecha(dentista, fecha):
+        if inicio <= hora < fin:
             return True
     return False
 
 
-def obtener_slots_disponibles(dentista, fecha, servicio, minutos_bloque=15):
+@trazar()
+def obtener_slots_disponibles(dentista, fecha, servicio, minutos_bloque=15, excluir_cita_id=None):
     """
     Devuelve una lista de strings 'HH:MM' con TODOS los horarios libres
     para ese día.
+    - excluir_cita_id: cita que no cuenta como ocupada (ej. la que se reprograma).
     """
     tz = timezone.get_current_timezone()
-    # Seguridad: si el servicio no tiene duración, usamos 45 min por defecto
-    dur_minutos = int(getattr(servicio, "duracion_estimada", 45) or 45)
+    dur_minutos = duracion_servicio(servicio)
 
     turnos = obtener_turnos_dentista_en_fecha(dentista, fecha)
-    if not turnos.exists():
+    if not turnos:
         return []
 
     # Citas ya reservadas de ese día
@@ -73,6 +86,8 @@ def obtener_slots_disponibles(dentista, fecha, servicio, minutos_bloque=15):
         )
         .order_by("hora_inicio") # <--- Ordenamos por hora
     )
+    if excluir_cita_id:
+        citas = citas.exclude(id=excluir_cita_id)
 
     # Preparamos lista de tuplas (datetime_inicio, datetime_fin) con zona horaria
     ocupados = []
@@ -85,13 +100,13 @@ def obtener_slots_disponibles(dentista, fecha, servicio, minutos_bloque=15):
     step = timedelta(minutes=minutos_bloque)
     libres = []
 
-    for turno in turnos:
+    for turno_inicio, turno_fin in turnos:
         actual = timezone.make_aware(
-            datetime.combine(fecha, turno.hora_inicio),
+            datetime.combine(fecha, turno_inicio),
             tz
         )
         jornada_fin = timezone.make_aware(
-            datetime.combine(fecha, turno.hora_fin),
+            datetime.combine(fecha, turno_fin),
             tz
         )
 
@@ -130,148 +145,278 @@ def obtener_slots_disponibles(dentista, fecha, servicio, minutos_bloque=15):
     return libres
 
 
-def sugerir_horario_cita(dentista, fecha, servicio, hora_deseada):
+def firma_slots(dentista, fecha, servicio):
     """
-    Usa obtener_slots_disponibles y devuelve el PRIMER datetime disponible
-    >= hora_deseada. Si no hay, devuelve None.
+    Lo que decide obtener_slots_disponibles sin calcular los huecos, para
+    validadores de respuestas condicionales (proyecto_rc/condicional.py): las
+    versiones de citas/servicios y de turnos del dentista (cachés, sin SQL).
+    Acepta la instancia del dentista o su id.
     """
-    tz = timezone.get_current_timezone()
-    slots = obtener_slots_disponibles(dentista, fecha, servicio, minutos_bloque=15)
+    dentista_id = getattr(dentista, "id", dentista)
+    return (
+        dentista_id, fecha.isoformat(), servicio.id, servicio.duracion_estimada,
+        version_datos_dentista(dentista_id), version_horarios(dentista_id),
+    )
+
 
-    if not slots:
+def sugerir_horario_cita(dentista, fecha, servicio, hora_deseada):
+    """
+    Devuelve el PRIMER datetime disponible >= hora_deseada en esa fecha.
+    Si no hay, sugiere el primer hueco del día; si el día está lleno o ya
+    pasó, None (la búsqueda arranca en "ahora" y saltaría a otro día).
+    """
+    if fecha < timezone.localdate():
         return None
+    candidatos = [(dentista, servicio)]
+    espacios = _buscar_espacios(candidatos, datetime.combine(fecha, hora_deseada), dias=0)
+    if not espacios:
+        espacios = _buscar_espacios(candidatos, datetime.combine(fecha, time.min), dias=0)
+    return espacios[0].inicio if espacios else None
 
-    deseada_min = hora_deseada.hour * 60 + hora_deseada.minute
 
-    mejor_slot = None
-    mejor_min = None
+# ============================================================
+# PRIMER ESPACIO DISPONIBLE (varios días / varios dentistas)
+# ============================================================
 
-    for s in slots:
-        try:
-            hh, mm = map(int, s.split(":"))
-        except ValueError:
-            continue
-        total_min = hh * 60 + mm
-
-        if total_min >= deseada_min:
-            if mejor_min is None or total_min < mejor_min:
-                mejor_min = total_min
-                mejor_slot = time(hh, mm)
-
-    if mejor_slot is None:
-        # Si no hay nada >= hora_deseada, sugerimos el primer slot del día
-        primero = slots[0]
-        hh, mm = map(int, primero.split(":"))
-        mejor_slot = time(hh, mm)
-
-    inicio = timezone.make_aware(
-        datetime.combine(fecha, mejor_slot),
-        tz
-    )
-    return inicio
+class EspacioDisponible(namedtuple("EspacioDisponible", ["inicio", "dentista", "servicio"])):
+    __slots__ = ()
 
+    def como_dict(self):
+        return {
+            "fecha": self.inicio.date().isoformat(),
+            "hora": self.inicio.strftime("%H:%M"),
+            "dentista": {"id": self.dentista.id, "nombre": self.dentista.nombre},
+            "servicio": {"id": self.servicio.id, "nombre": self.servicio.nombre},
+        }
 
-# ============================================================
-# RIESGO / PENALIZACIONES
-# ============================================================
 
-def calcular_score_riesgo(paciente, dentista=None):
+def _a_minutos(hora):
+    return hora.hour * 60 + hora.minute
+
+
+def _alinear(minuto, minutos_bloque):
+    # Redondea hacia arriba al siguiente múltiplo del bloque (00, 15, 30, 45)
+    return -(-minuto // minutos_bloque) * minutos_bloque
+
+
+def _huecos_del_dia(turnos, ocupados, duracion, minutos_bloque, desde_min):
     """
-    Calcula un score de riesgo de 0 a 100 combinando:
-    - Inasistencias (peso alto)
-    - Cancelaciones (peso medio)
-    - Pagos pendientes (peso medio)
-    - Frecuencia de reprogramaciones (peso bajo)
+    Generador perezoso de minutos (desde medianoche) en los que cabe el servicio.
+    Cuando choca con un bloque ocupado salta directo a su final.
     """
-    qs = Cita.objects.filter(paciente=paciente)
-    if dentista is not None:
-        qs = qs.filter(dentista=dentista)
+    for t_ini, t_fin in turnos:
+        actual = _alinear(max(t_ini, desde_min), minutos_bloque)
+        while actual + duracion <= t_fin:
+            fin = actual + duracion
+            choque = next((fi for ini, fi in ocupados if actual < fi and fin > ini), None)
+            if choque is None:
+                yield actual
+                actual += minutos_bloque
+            else:
+                actual = _alinear(choque, minutos_bloque)
+
+
+def _ocupados_por_dia(dentista_ids, fecha_ini, fecha_fin):
+    """Citas activas del rango, agrupadas por (dentista_id, fecha)."""
+    citas = Cita.objects.filter(
+        dentista_id__in=dentista_ids,
+        fecha__range=(fecha_ini, fecha_fin),
+        estado__in=["PENDIENTE", "CONFIRMADA"],
+    ).values_list("dentista_id", "fecha", "hora_inicio", "hora_fin")
+
+    ocupados = defaultdict(list)
+    for dentista_id, fecha, ini, fin in citas:
+        ocupados[(dentista_id, fecha)].append((_a_minutos(ini), _a_minutos(fin)))
+    return ocupados
+
+
+def _buscar_espacios(candidatos, desde, dias=60, limite=1, minutos_bloque=15, dias_por_bloque=7):
+    """
+    Núcleo de la búsqueda. candidatos: lista de (dentista, servicio).
+    - Horarios: desde la caché de horarios (una consulta solo si no están vigentes).
+    - Citas: una consulta por bloque de `dias_por_bloque` días.
+    - Por día, los huecos de cada dentista se mezclan con heapq.merge y se corta
+      en cuanto se juntan `limite` resultados.
+    """
+    if not candidatos:
+        return []
 
-    total = qs.count()
-    if total == 0:
-        return 0
+    tz = timezone.get_current_timezone()
+    ahora = timezone.localtime().replace(tzinfo=None)
+    if timezone.is_aware(desde):
+        desde = timezone.localtime(desde).replace(tzinfo=None)
+    desde = max(desde, ahora)
+
+    dentista_ids = {d.id for d, _ in candidatos}
+    turnos = {
+        (dentista_id, dia + 1): [(_a_minutos(ini), _a_minutos(fin)) for ini, fin in turnos_dia]
+        for dentista_id, semana in semanas_dentistas(dentista_ids).items()
+        for dia, turnos_dia in enumerate(semana)
+        if turnos_dia
+    }
+
+    resultados = []
+    fecha_fin = desde.date() + timedelta(days=dias)
+    bloque_ini = desde.date()
+    while bloque_ini <= fecha_fin and len(resultados) < limite:
+        bloque_fin = min(bloque_ini + timedelta(days=dias_por_bloque - 1), fecha_fin)
+        ocupados = _ocupados_por_dia(dentista_ids, bloque_ini, bloque_fin)
+
+        fecha = bloque_ini
+        while fecha <= bloque_fin and len(resultados) < limite:
+            desde_min = 0
+            if fecha == desde.date():
+                # Si partimos de "ahora", la hora en curso ya no cuenta
+                desde_min = _a_minutos(desde) + (1 if desde == ahora else 0)
+
+            iteradores = []
+            for idx, (dentista, servicio) in enumerate(candidatos):
+                turnos_dia = turnos.get((dentista.id, fecha.isoweekday()))
+                if not turnos_dia:
+                    # Día no laboral según Horario (misma regla que obtener_slots_disponibles)
+                    continue
+                duracion = duracion_servicio(servicio)
+                huecos = _huecos_del_dia(
+                    turnos_dia,
+                    ocupados.get((dentista.id, fecha), []),
+                    duracion,
+                    minutos_bloque,
+                    desde_min,
+                )
+                iteradores.append(zip(huecos, repeat(idx)))
+
+            for minuto, idx in heapq.merge(*iteradores):
+                dentista, servicio = candidatos[idx]
+                inicio = timezone.make_aware(
+                    datetime.combine(fecha, time(minuto // 60, minuto % 60)),
+                    tz,
+                )
+                resultados.append(EspacioDisponible(inicio, dentista, servicio))
+                if len(resultados) >= limite:
+                    break
+            fecha += timedelta(days=1)
+        bloque_ini = bloque_fin + timedelta(days=1)
+
+    return resultados
+
+
+@trazar()
+def buscar_primer_espacio(servicio, desde=None, dias=60, cualquier_dentista=False, limite=1):
+    """
+    Primeros `limite` huecos libres para el servicio a partir de `desde`
+    (datetime; por defecto ahora), avanzando día a día hasta `dias` días.
+    - cualquier_dentista=True: incluye a todos los dentistas que ofrecen un
+      servicio activo con el mismo nombre; gana el hueco más temprano.
+    Devuelve una lista de EspacioDisponible (vacía si no hay lugar).
+    """
+    if cualquier_dentista:
+        servicios = (
+            Servicio.objects
+            .filter(nombre__iexact=servicio.nombre, activo=True)
+            .select_related("dentista")
+            .order_by("dentista_id")
+        )
+        candidatos = [(s.dentista, s) for s in servicios]
+    else:
+        candidatos = [(servicio.dentista, servicio)]
+
+    return _buscar_espacios(candidatos, desde or timezone.localtime(), dias=dias, limite=limite)
+
+
+# ============================================================
+# RIESGO / PENALIZACIONES
+# ============================================================
 
-    inasistencias = qs.filter(estado="INASISTENCIA").count()
-    canceladas = qs.filter(estado="CANCELADA").count()
-    reprogramadas = qs.filter(veces_reprogramada__gte=1).count()
-    pagos_pend = Pago.objects.filter(cita__paciente=paciente, estado="PENDIENTE").count()
+# Pesos del score de riesgo
+PESO_INASISTENCIA = 5
+PESO_CANCELADA = 2
+PESO_REPROGRAMADA = 1
+PESO_PAGO_PENDIENTE = 3
 
-    # Pesos ajustados
-    peso_inasistencia = 5
-    peso_cancelada = 2
-    peso_reprog = 1
-    peso_pago = 3
 
+def _score_desde_conteos(total, inasistencias, canceladas, reprogramadas, pagos_pend):
+    if total == 0:
+        return 0
     score_bruto = (
-        inasistencias * peso_inasistencia
-        + canceladas * peso_cancelada
-        + reprogramadas * peso_reprog
-        + pagos_pend * peso_pago
+        inasistencias * PESO_INASISTENCIA
+        + canceladas * PESO_CANCELADA
+        + reprogramadas * PESO_REPROGRAMADA
+        + pagos_pend * PESO_PAGO_PENDIENTE
     )
     # Normalizamos: cada punto suma ~8 hasta un máximo de 100
-    score = min(100, score_bruto * 8)
-    return score
+    return min(100, score_bruto * 8)
 
 
-def calcular_penalizacion_paciente(paciente, dentista=None):
+@trazar()
+def calcular_scores_riesgo(pacientes, dentista=None):
     """
-    Devuelve un dict con el estado de penalización del paciente.
+    Versión por lotes de calcular_score_riesgo: {paciente_id: score} con dos
+    consultas agrupadas, sin importar cuántos pacientes sean.
+    """
+    ids = [getattr(p, "pk", p) for p in pacientes]
+    if not ids:
+        return {}
 
-    Regla:
-    - 1ra inasistencia confirmada: advertencia (warning)
-    - 2da inasistencia confirmada: suspensión automática + cuota $300
-      (se mantiene en pending hasta 5 días, luego pasa a disabled)
+    citas = Cita.objects.filter(paciente_id__in=ids)
+    if dentista is not None:
+        citas = citas.filter(dentista=dentista)
+    conteos = {
+        fila["paciente_id"]: fila
+        for fila in citas.values("paciente_id").annotate(
+            total=Count("id"),
+            inasistencias=Count("id", filter=Q(estado="INASISTENCIA")),
+            canceladas=Count("id", filter=Q(estado="CANCELADA")),
+            reprogramadas=Count("id", filter=Q(veces_reprogramada__gte=1)),
+        ).order_by()
+    }
+    pagos_pend = dict(
+        Pago.objects.filter(paciente_id__in=ids, estado="PENDIENTE")
+        .values_list("paciente_id")
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+
+    scores = {}
+    for paciente_id in ids:
+        fila = conteos.get(paciente_id)
+        if not fila:
+            scores[paciente_id] = 0
+            continue
+        scores[paciente_id] = _score_desde_conteos(
+            fila["total"], fila["inasistencias"], fila["canceladas"],
+            fila["reprogramadas"], pagos_pend.get(paciente_id, 0),
+        )
+    return scores
+
+
+def calcular_score_riesgo(paciente, dentista=None):
     """
-    if not paciente or not getattr(paciente, "pk", None):
-        return {
-            "estado": "sin_penalizacion",
-            "recargo": 0,
-            "dias_restantes": None,
-            "inasistencias": 0,
-            "fecha_limite": None,
-        }
+    Calcula un score de riesgo de 0 a 100 combinando:
+    - Inasistencias (peso alto)
+    - Cancelaciones (peso medio)
+    - Pagos pendientes (peso medio)
+    - Frecuencia de reprogramaciones (peso bajo)
+    """
+    return calcular_scores_riesgo([paciente], dentista).get(paciente.pk, 0)
 
-    hoy = timezone.localdate()
 
-    qs = Cita.objects.filter(
-        paciente=paciente,
-        estado="INASISTENCIA",
-    )
-    if dentista is not None:
-        qs = qs.filter(dentista=dentista)
+def _sin_penalizacion():
+    return {
+        "estado": "sin_penalizacion",
+        "recargo": 0,
+        "dias_restantes": None,
+        "inasistencias": 0,
+        "fecha_limite": None,
+    }
 
-    qs = qs.order_by("-fecha", "-hora_inicio")
-    inasistencias_count = qs.count()
 
-    # Datos base
+def _estado_penalizacion(inasistencias_count, penalizacion, penalizacion_pagada, advert_manual, hoy):
+    """Reglas de penalización a partir de los datos ya consultados del paciente."""
     estado = "sin_penalizacion"
     recargo = 0
     dias_restantes = None
     fecha_limite = None
 
-    # Revisamos si hay un cargo pendiente de penalización
-    penalizacion = (
-        Pago.objects.filter(
-            cita__paciente=paciente,
-            cita__estado="INASISTENCIA",
-            estado="PENDIENTE",
-            monto__gte=Decimal("300"),
-        )
-        .order_by("-created_at")
-        .first()
-    )
-
-    penalizacion_pagada = (
-        Pago.objects.filter(
-            cita__paciente=paciente,
-            cita__estado="INASISTENCIA",
-            estado="COMPLETADO",
-            monto__gte=Decimal("300"),
-        )
-        .order_by("-created_at")
-        .first()
-    )
-
     if penalizacion:
         recargo = float(penalizacion.monto)
         fecha_penal = penalizacion.created_at.date()
@@ -290,11 +435,6 @@ def calcular_penalizacion_paciente(paciente, dentista=None):
         dias_restantes = 5
 
     # Advertencia manual con cargo: trata como pendiente para bloquear agenda y mostrar monto
-    advert_manual = (
-        PenalizacionLog.objects.filter(paciente=paciente, accion="ADVERTENCIA", monto__gte=Decimal("300"))
-        .order_by("-created_at")
-        .first()
-    )
     if advert_manual and estado not in ("pending", "disabled"):
         estado = "pending"
         recargo = 300
@@ -315,6 +455,78 @@ def calcular_penalizacion_paciente(paciente, dentista=None):
     }
 
 
+def _mas_reciente_por_paciente(qs, campo_paciente):
+    """Primer registro por paciente de un queryset ya ordenado por -created_at."""
+    resultado = {}
+    for obj in qs:
+        resultado.setdefault(getattr(obj, campo_paciente), obj)
+    return resultado
+
+
+@trazar()
+def calcular_penalizaciones_pacientes(pacientes, dentista=None):
+    """
+    Versión por lotes de calcular_penalizacion_paciente: {paciente_id: info}
+    con un número fijo de consultas para toda la lista.
+    """
+    ids = [p.pk for p in pacientes if getattr(p, "pk", None)]
+    if not ids:
+        return {}
+
+    hoy = timezone.localdate()
+
+    inasistencias = Cita.objects.filter(paciente_id__in=ids, estado="INASISTENCIA")
+    if dentista is not None:
+        inasistencias = inasistencias.filter(dentista=dentista)
+    conteos = dict(inasistencias.values_list("paciente_id").annotate(n=Count("id")).order_by())
+
+    # Cargos de penalización (pendientes y pagados) en una sola consulta
+    cargos = (
+        Pago.objects.filter(
+            paciente_id__in=ids,
+            cita__estado="INASISTENCIA",
+            estado__in=["PENDIENTE", "COMPLETADO"],
+            monto__gte=Decimal("300"),
+        )
+        .order_by("-created_at")
+    )
+    pendientes = _mas_reciente_por_paciente((c for c in cargos if c.estado == "PENDIENTE"), "paciente_id")
+    pagadas = _mas_reciente_por_paciente((c for c in cargos if c.estado == "COMPLETADO"), "paciente_id")
+
+    advertencias = _mas_reciente_por_paciente(
+        PenalizacionLog.objects.filter(paciente_id__in=ids, accion="ADVERTENCIA", monto__gte=Decimal("300"))
+        .order_by("-created_at"),
+        "paciente_id",
+    )
+
+    return {
+        paciente_id: _estado_penalizacion(
+            conteos.get(paciente_id, 0),
+            pendientes.get(paciente_id),
+            pagadas.get(paciente_id),
+            advertencias.get(paciente_id),
+            hoy,
+        )
+        for paciente_id in ids
+    }
+
+
+@trazar()
+def calcular_penalizacion_paciente(paciente, dentista=None):
+    """
+    Devuelve un dict con el estado de penalización del paciente.
+
+    Regla:
+    - 1ra inasistencia confirmada: advertencia (warning)
+    - 2da inasistencia confirmada: suspensión automática + cuota $300
+      (se mantiene en pending hasta 5 días, luego pasa a disabled)
+    """
+    if not paciente or not getattr(paciente, "pk", None):
+        return _sin_penalizacion()
+    return calcular_penalizaciones_pacientes([paciente], dentista)[paciente.pk]
+
+
+@trazar()
 def procesar_inasistencia(cita):
     """
     Marca una cita como INASISTENCIA y devuelve un mensaje legible para el dentista.
@@ -4,3 +4,7 @@ class DomainConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "domain"
     verbose_name = "Gestión Clínica"
+
+    def ready(self):
+        # Señales: caché de horarios, rollup de ingresos y versión de datos por dentista
+        from . import signals  # noqa: F401
@@ -0,0 +1,284 @@
+"""
+Catálogo de consultas calientes para `manage.py auditar_indices`.
+
+Cada entrada arma el mismo queryset que usa el código de origen (con valores
+de muestra tomados de la base actual) para pedirle su plan con EXPLAIN. El
+análisis del plan depende del motor:
+
+- SQLite (EXPLAIN QUERY PLAN): "SCAN <tabla>" sin índice es un recorrido
+  completo; "USE TEMP B-TREE FOR ORDER BY" es un ordenamiento en memoria.
+- MySQL (EXPLAIN FORMAT=JSON): access_type "ALL" es un recorrido completo;
+  using_filesort es un filesort.
+
+Con tablas casi vacías el optimizador de MySQL puede preferir el recorrido
+completo aunque exista el índice: conviene auditar con volumen realista
+(`manage.py generar_datos_sinteticos`).
+"""
+
+import json
+import re
+from datetime import timedelta
+
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import (
+    AvisoDentista,
+    Cita,
+    Dentista,
+    Notificacion,
+    Paciente,
+    PacienteTrigrama,
+    Pago,
+    PenalizacionLog,
+    ReservaTemporal,
+)
+from .paginacion import codificar_cursor, consulta_pagina
+from .sincronizacion import FLUJOS, consulta_flujo
+
+# nombre -> (origen, función(muestra) -> queryset)
+CONSULTAS = {}
+
+MOTORES_SOPORTADOS = ("sqlite", "mysql")
+
+_RE_SCAN_SQLITE = re.compile(r"\bSCAN (?:TABLE )?(\w+)(.*)$")
+
+
+def consulta(nombre, origen):
+    def registrar(funcion):
+        CONSULTAS[nombre] = (origen, funcion)
+        return funcion
+    return registrar
+
+
+class Muestra:
+    """Valores representativos para los filtros (o ids inexistentes si la base está vacía)."""
+
+    def __init__(self):
+        dentista = Dentista.objects.annotate(n=Count("cita")).order_by("-n", "id").first()
+        paciente = Paciente.objects.annotate(n=Count("cita")).order_by("-n", "id").first()
+        self.dentista_id = dentista.pk if dentista else 0
+        self.paciente_id = paciente.pk if paciente else 0
+        self.usuario_id = (paciente.user_id if paciente else None) or 0
+        self.pacientes_ids = list(
+            Paciente.objects.filter(dentista_id=self.dentista_id).order_by("id").values_list("id", flat=True)[:50]
+        ) or [0]
+        self.hoy = timezone.localdate()
+        self.ahora = timezone.now()
+
+
+# ---------------------------------------------------------
+# Citas
+# ---------------------------------------------------------
+@consulta("kpis_citas_por_estado", "dentista/views.py dashboard")
+def _kpis(m):
+    return Cita.objects.filter(dentista_id=m.dentista_id, estado="PENDIENTE")
+
+
+@consulta("proximas_citas_dentista", "dentista/views.py dashboard")
+def _proximas(m):
+    return (
+        Cita.objects.filter(dentista_id=m.dentista_id, estado__in=["PENDIENTE", "CONFIRMADA"], fecha__gte=m.hoy)
+        .order_by("fecha", "hora_inicio")
+    )
+
+
+@consulta("agenda_del_dia", "dentista/views.py agenda")
+def _agenda_dia(m):
+    return Cita.objects.filter(dentista_id=m.dentista_id, fecha=m.hoy).order_by("hora_inicio")
+
+
+@consulta("historial_paciente", "paciente/views.py mis_citas")
+def _historial(m):
+    return Cita.objects.filter(paciente_id=m.paciente_id).order_by("-fecha")
+
+
+@consulta("inasistencias_por_paciente", "domain/ai_services.py calcular_penalizaciones_pacientes")
+def _inasistencias(m):
+    return (
+        Cita.objects.filter(paciente_id__in=m.pacientes_ids, estado="INASISTENCIA")
+        .values_list("paciente_id")
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+
+
+@consulta("recordatorios_24h", "paciente/management/commands/enviar_recordatorios.py")
+def _recordatorios(m):
+    return Cita.objects.filter(
+        fecha=m.hoy + timedelta(days=1),
+        estado="PENDIENTE",
+        recordatorio_24h_enviado=False,
+    )
+
+
+@consulta("gauge_recordatorios_pendientes", "api/views.py _gauges_dominio")
+def _gauge_recordatorios(m):
+    return Cita.objects.filter(
+        estado__in=["PENDIENTE", "CONFIRMADA"],
+        recordatorio_24h_enviado=False,
+        fecha__gte=m.hoy,
+        fecha__lte=m.hoy + timedelta(days=2),
+    )
+
+
+# ---------------------------------------------------------
+# Penalizaciones, avisos y notificaciones
+# ---------------------------------------------------------
+@consulta("advertencia_paciente", "paciente/views.py dashboard")
+def _advertencia(m):
+    return PenalizacionLog.objects.filter(paciente_id=m.paciente_id, accion="ADVERTENCIA").order_by("-created_at")
+
+
+@consulta("ultima_reactivacion", "paciente/views.py y dentista/views.py (penalización vigente)")
+def _reactivacion(m):
+    return PenalizacionLog.objects.filter(paciente_id=m.paciente_id, accion="REACTIVAR").order_by("-created_at")
+
+
+@consulta("avisos_dentista", "dentista/views.py dashboard")
+def _avisos(m):
+    return AvisoDentista.objects.filter(dentista_id=m.dentista_id).order_by("-created_at")[:15]
+
+
+@consulta("notificaciones_no_leidas", "notificaciones del usuario")
+def _notificaciones(m):
+    return Notificacion.objects.filter(usuario_id=m.usuario_id, leida=False)
+
+
+# ---------------------------------------------------------
+# Búsqueda de pacientes
+# ---------------------------------------------------------
+@consulta("sugerencias_prefijo", "domain/busqueda.py sugerir_pacientes")
+def _sugerencias_prefijo(m):
+    return (
+        Paciente.objects.filter(dentista_id=m.dentista_id, nombre_normalizado__gte="mar", nombre_normalizado__lt="mas")
+        .order_by("nombre_normalizado", "id")[:10]
+    )
+
+
+@consulta("sugerencias_contiene", "domain/busqueda.py sugerir_pacientes")
+def _sugerencias_contiene(m):
+    return Paciente.objects.filter(
+        dentista_id=m.dentista_id,
+        nombre_normalizado__contains="rez",
+        id__in=PacienteTrigrama.objects.filter(dentista_id=m.dentista_id, trigrama="rez").values("paciente_id"),
+    )[:10]
+
+
+# ---------------------------------------------------------
+# Pagos y reservas
+# ---------------------------------------------------------
+@consulta("pagos_pendientes_dentista", "dentista/views.py penalizaciones")
+def _pagos_pendientes(m):
+    return Pago.objects.filter(dentista_id=m.dentista_id, estado="PENDIENTE")
+
+
+@consulta("pagos_pendientes_paciente", "paciente/views.py dashboard")
+def _pagos_paciente(m):
+    return Pago.objects.filter(paciente_id=m.paciente_id, estado="PENDIENTE").order_by("-created_at")[:3]
+
+
+@consulta("pagos_dentista_pagina", "dentista/views.py pagos (cursor)")
+def _pagos_pagina(m):
+    orden = ("-created_at", "-id")
+    return consulta_pagina(Pago.objects.filter(dentista_id=m.dentista_id), orden, codificar_cursor([m.ahora, 0], orden))
+
+
+@consulta("historial_penalizaciones_pagina", "dentista/views.py penalizaciones (cursor)")
+def _penalizaciones_pagina(m):
+    orden = ("-created_at", "-id")
+    return consulta_pagina(
+        PenalizacionLog.objects.filter(dentista_id=m.dentista_id), orden, codificar_cursor([m.ahora, 0], orden),
+    )
+
+
+@consulta("reporte_citas_pagina", "dentista/views.py reportes (cursor)")
+def _reporte_citas_pagina(m):
+    orden = ("-fecha", "-hora_inicio", "-id")
+    return consulta_pagina(
+        Cita.objects.filter(dentista_id=m.dentista_id, fecha__range=(m.hoy - timedelta(days=30), m.hoy)),
+        orden, codificar_cursor([m.hoy, "12:00:00", 0], orden),
+    )
+
+
+@consulta("retenciones_vencidas", "domain/reservas.py vencer_retenciones (al reservar)")
+def _retenciones(m):
+    return ReservaTemporal.objects.filter(dentista_id=m.dentista_id, fecha=m.hoy, expires_at__lte=m.ahora)
+
+
+# ---------------------------------------------------------
+# Sincronización de la app móvil
+# ---------------------------------------------------------
+def _registrar_flujos():
+    for nombre in FLUJOS:
+        def funcion(m, nombre=nombre):
+            marca = (m.ahora - timedelta(minutes=5), 0)
+            return consulta_flujo(nombre, m.paciente_id, m.usuario_id, marca)
+        consulta(f"sync_{nombre}", "api/views.py api_sync")(funcion)
+
+
+_registrar_flujos()
+
+
+# ---------------------------------------------------------
+# Análisis del plan
+# ---------------------------------------------------------
+def explicar(queryset, motor):
+    if motor == "mysql":
+        return queryset.explain(format="json")
+    return queryset.explain()
+
+
+def _hallazgos_sqlite(plan):
+    hallazgos = []
+    for linea in plan.splitlines():
+        coincidencia = _RE_SCAN_SQLITE.search(linea)
+        if coincidencia and "INDEX" not in coincidencia.group(2) and "PRIMARY KEY" not in coincidencia.group(2):
+            hallazgos.append(f"recorrido completo de {coincidencia.group(1)}")
+        if "USE TEMP B-TREE" in linea:
+            hallazgos.append("ordenamiento temporal (" + linea.split("USE TEMP B-TREE", 1)[1].strip().lower() + ")")
+    return hallazgos
+
+
+def _hallazgos_mysql(plan):
+    hallazgos = []
+
+    def recorrer(nodo):
+        if isinstance(nodo, dict):
+            if nodo.get("access_type") == "ALL":
+                hallazgos.append(f"recorrido completo de {nodo.get('table_name', '?')}")
+            if nodo.get("using_filesort"):
+                hallazgos.append("filesort")
+            if nodo.get("using_temporary_table"):
+                hallazgos.append("tabla temporal")
+            for valor in nodo.values():
+                recorrer(valor)
+        elif isinstance(nodo, list):
+            for valor in nodo:
+                recorrer(valor)
+
+    recorrer(json.loads(plan))
+    return hallazgos
+
+
+def analizar_plan(plan, motor):
+    """Lista de problemas del plan (vacía si usa índices y no ordena aparte)."""
+    if motor == "mysql":
+        return _hallazgos_mysql(plan)
+    return _hallazgos_sqlite(plan)
+
+
+def auditar(motor, nombres=None):
+    """[{nombre, origen, plan, hallazgos}] para las consultas pedidas (todas por defecto)."""
+    muestra = Muestra()
+    resultados = []
+    for nombre in nombres or CONSULTAS:
+        origen, construir = CONSULTAS[nombre]
+        plan = explicar(construir(muestra), motor)
+        resultados.append({
+            "nombre": nombre,
+            "origen": origen,
+            "plan": plan,
+            "hallazgos": analizar_plan(plan, motor),
+        })
+    return resultados
@@ -0,0 +1,180 @@
+"""
+Búsqueda de pacientes por nombre y teléfono sin recorrer la tabla.
+
+- Paciente.nombre_normalizado (minúsculas, sin acentos, espacios colapsados)
+  con índice (dentista, nombre_normalizado): prefijos y duplicados.
+- Teléfono: ya es de 10 dígitos con índice único (dentista, telefono), así
+  que un prefijo de dígitos usa ese índice.
+- PacienteTrigrama: los trigramas del nombre normalizado. "Contiene" se queda
+  con los pacientes que tienen el primer y el último trigrama del texto (dos
+  búsquedas en el índice (dentista, trigrama, paciente)) y confirma el texto
+  completo solo sobre esos candidatos. Intersecar todos los trigramas filtra
+  un poco más pero obliga a agrupar miles de filas con apellidos comunes.
+
+Paciente.save mantiene ambas cosas; lo que entra con bulk_create o
+QuerySet.update necesita `manage.py reindexar_pacientes`.
+"""
+
+import re
+import unicodedata
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Paciente, PacienteTrigrama
+
+# Con menos letras un trigrama no aporta: se busca por prefijo
+MINIMO_TRIGRAMA = 3
+LIMITE_SUGERENCIAS = 10
+MAXIMO_SUGERENCIAS = 25
+
+_RE_ESPACIOS = re.compile(r"\s+")
+_RE_NO_DIGITOS = re.compile(r"\D")
+
+
+def normalizar(texto):
+    """Minúsculas, sin acentos ni diéresis y con espacios simples: "José  Núñez" -> "jose nunez"."""
+    descompuesto = unicodedata.normalize("NFKD", texto or "")
+    sin_acentos = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return _RE_ESPACIOS.sub(" ", sin_acentos).strip().lower()
+
+
+def trigramas(texto_normalizado):
+    return {texto_normalizado[i:i + 3] for i in range(len(texto_normalizado) - 2)}
+
+
+def filas_trigramas(pacientes):
+    """PacienteTrigrama sin guardar para pacientes ya insertados (cargas masivas)."""
+    return [
+        PacienteTrigrama(dentista_id=p.dentista_id, paciente_id=p.pk, trigrama=t)
+        for p in pacientes
+        for t in trigramas(p.nombre_normalizado)
+    ]
+
+
+# ---------------------------------------------------------
+# Mantenimiento
+# ---------------------------------------------------------
+def indexar_paciente(paciente):
+    """Deja los trigramas del paciente iguales a su nombre actual (solo escribe la diferencia)."""
+    deseados = {(t, paciente.dentista_id) for t in trigramas(paciente.nombre_normalizado)}
+    actuales = set(PacienteTrigrama.objects.filter(paciente=paciente).values_list("trigrama", "dentista_id"))
+    sobrantes = [t for t, dentista_id in actuales - deseados]
+    if sobrantes:
+        PacienteTrigrama.objects.filter(paciente=paciente, trigrama__in=sobrantes).delete()
+    faltantes = deseados - actuales
+    if faltantes:
+        PacienteTrigrama.objects.bulk_create([
+            PacienteTrigrama(dentista_id=dentista_id, paciente_id=paciente.pk, trigrama=t)
+            for t, dentista_id in faltantes
+        ])
+
+
+def reindexar_pacientes(dentista_ids=None, lote=2000):
+    """
+    Recalcula nombre_normalizado y trigramas desde Paciente.nombre (todos los
+    dentistas por defecto). Devuelve cuántos pacientes se indexaron.
+    """
+    pacientes = Paciente.objects.all()
+    trigramas_qs = PacienteTrigrama.objects.all()
+    if dentista_ids is not None:
+        pacientes = pacientes.filter(dentista_id__in=dentista_ids)
+        trigramas_qs = trigramas_qs.filter(dentista_id__in=dentista_ids)
+
+    def volcar(cambiados, filas):
+        if cambiados:
+            Paciente.objects.bulk_update(cambiados, ["nombre_normalizado"], batch_size=lote)
+        PacienteTrigrama.objects.bulk_create(filas, batch_size=lote)
+
+    total = 0
+    with transaction.atomic():
+        trigramas_qs.delete()
+        cambiados, filas = [], []
+        for paciente in pacientes.only("id", "dentista_id", "nombre", "nombre_normalizado").iterator(chunk_size=lote):
+            normalizado = normalizar(paciente.nombre)
+            if paciente.nombre_normalizado != normalizado:
+                paciente.nombre_normalizado = normalizado
+                cambiados.append(paciente)
+            filas += filas_trigramas([paciente])
+            total += 1
+            if len(filas) >= lote:
+                volcar(cambiados, filas)
+                cambiados, filas = [], []
+        volcar(cambiados, filas)
+    return total
+
+
+# ---------------------------------------------------------
+# Consultas
+# ---------------------------------------------------------
+def _prefijo(campo, texto):
+    """
+    campo >= texto AND campo < texto con el último carácter incrementado: un
+    rango que ambos motores resuelven con el índice (LIKE 'x%' no siempre).
+    """
+    tope = texto[:-1] + chr(ord(texto[-1]) + 1)
+    return Q(**{f"{campo}__gte": texto, f"{campo}__lt": tope})
+
+
+def existe_nombre(dentista, nombre, excluir_id=None):
+    """Duplicado de nombre sin distinguir mayúsculas ni acentos (usa el índice normalizado)."""
+    qs = Paciente.objects.filter(dentista=dentista, nombre_normalizado=normalizar(nombre))
+    if excluir_id:
+        qs = qs.exclude(id=excluir_id)
+    return qs.exists()
+
+
+def _contiene(dentista, normalizado):
+    condicion = Q(nombre_normalizado__contains=normalizado)
+    for trigrama in {normalizado[:3], normalizado[-3:]}:
+        condicion &= Q(id__in=PacienteTrigrama.objects.filter(dentista=dentista, trigrama=trigrama).values("paciente_id"))
+    return condicion
+
+
+def buscar_pacientes(dentista, texto):
+    """
+    Queryset de pacientes del dentista cuyo nombre empieza por o contiene
+    `texto` (sin acentos ni mayúsculas) o cuyo teléfono empieza por sus dígitos.
+    Sin texto devuelve todos. Se puede ordenar y paginar encima.
+    """
+    qs = Paciente.objects.filter(dentista=dentista)
+    normalizado = normalizar(texto)
+    if not normalizado:
+        return qs
+
+    condicion = _prefijo("nombre_normalizado", normalizado)
+    if len(normalizado) >= MINIMO_TRIGRAMA:
+        condicion |= _contiene(dentista, normalizado)
+    digitos = _RE_NO_DIGITOS.sub("", texto)
+    if len(digitos) >= MINIMO_TRIGRAMA:
+        condicion |= _prefijo("telefono", digitos)
+    return qs.filter(condicion)
+
+
+def sugerir_pacientes(dentista, texto, limite=LIMITE_SUGERENCIAS):
+    """
+    Los mejores `limite` resultados para autocompletar: primero los nombres que
+    empiezan por el texto, luego los que lo contienen y luego los teléfonos.
+    Cada grupo es una consulta acotada por índice; solo se pide el siguiente si
+    faltan resultados (un OR entre los tres obligaría a recorrer los pacientes).
+    """
+    normalizado = normalizar(texto)
+    if not normalizado:
+        return []
+    limite = max(1, min(int(limite), MAXIMO_SUGERENCIAS))
+    base = Paciente.objects.filter(dentista=dentista).values("id", "nombre", "telefono")
+
+    consultas = [base.filter(_prefijo("nombre_normalizado", normalizado)).order_by("nombre_normalizado", "id")]
+    if len(normalizado) >= MINIMO_TRIGRAMA:
+        consultas.append(base.filter(_contiene(dentista, normalizado)))
+    digitos = _RE_NO_DIGITOS.sub("", texto)
+    if len(digitos) >= MINIMO_TRIGRAMA:
+        consultas.append(base.filter(_prefijo("telefono", digitos)).order_by("telefono"))
+
+    resultados = {}
+    for consulta in consultas:
+        for fila in consulta[:limite]:
+            resultados.setdefault(fila["id"], fila)
+        if len(resultados) >= limite:
+            break
+    return list(resultados.values())[:limite]
@@ -0,0 +1,77 @@
+"""
+Catálogo de servicios activos en caché (global y por dentista).
+
+/api/servicios/ y los formularios de reserva (paciente: dashboard y
+agendar_cita; dentista: crear_cita_manual) muestran el mismo catálogo, que
+cambia muy poco. Cada entrada guarda:
+
+- servicios: instancias de Servicio con su dentista (para las plantillas),
+- json: los bytes de /api/servicios/ (api.serializers.ServicioSerializer
+  renderizado con el JSONRenderer de DRF),
+- etag: el validador de esos bytes (proyecto_rc/condicional.py).
+
+La validez la da version_catalogo() (domain/versiones.py), que cambian las
+señales de Servicio y Dentista: un cambio deja inalcanzables todas las
+entradas a la vez, el catálogo de todos los dentistas incluido. Cada worker
+además conserva la última entrada que usó para no deserializarla en cada
+request (mismo esquema que domain/horarios.py).
+"""
+
+from collections import namedtuple
+
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+
+from api.serializers import ServicioSerializer
+from domain.models import Servicio
+from domain.versiones import version_catalogo
+from proyecto_rc.condicional import etag_de
+from proyecto_rc.metricas import incrementar
+
+CATALOGO_KEY = "catalogo:{}:{}"
+TODOS = "todos"
+
+Catalogo = namedtuple("Catalogo", ["servicios", "json", "etag"])
+
+# alcance -> (version, Catalogo)
+_catalogos_locales = {}
+
+
+def etag_catalogo(dentista_id=None, version=None):
+    """Validador sin cargar el catálogo (una lectura de caché)."""
+    return etag_de("servicios", dentista_id or TODOS, version or version_catalogo())
+
+
+def _serializar(servicios):
+    # El serializer de la API es la única fuente del formato; aquí solo se renderiza una vez
+    return JSONRenderer().render(ServicioSerializer(servicios, many=True).data)
+
+
+def _construir(dentista_id, version):
+    servicios = Servicio.objects.filter(activo=True).select_related("dentista").order_by("nombre", "id")
+    if dentista_id:
+        servicios = servicios.filter(dentista_id=dentista_id)
+    servicios = list(servicios)
+    return Catalogo(servicios, _serializar(servicios), etag_catalogo(dentista_id, version))
+
+
+def catalogo_servicios(dentista_id=None):
+    """Catálogo de servicios activos (ordenados por nombre) de un dentista o de todos."""
+    alcance = dentista_id or TODOS
+    version = version_catalogo()
+    local = _catalogos_locales.get(alcance)
+    if local and local[0] == version:
+        incrementar("rc_cache_catalogo_total", resultado="hit")
+        return local[1]
+
+    clave = CATALOGO_KEY.format(version, alcance)
+    catalogo = cache.get(clave)
+    if catalogo is None:
+        incrementar("rc_cache_catalogo_total", resultado="miss")
+        catalogo = _construir(dentista_id, version)
+        # Las entradas de versiones viejas ya no se leen y caducan solas
+        cache.set(clave, catalogo, timeout=24 * 3600)
+    else:
+        incrementar("rc_cache_catalogo_total", resultado="hit")
+    _catalogos_locales[alcance] = (version, catalogo)
+    return catalogo
@@ -0,0 +1,72 @@
+"""
+Historial corto del chatbot fuera de la sesión.
+
+chatbot_api guardaba los últimos mensajes en request.session: con sesiones
+en BD cada mensaje escribía una fila de django_session, y cada visitante
+anónimo de la landing creaba una. Ahora la conversación vive en la caché
+compartida bajo un id aleatorio:
+
+- El cliente recibe "conversacion" (el id firmado con django.core.signing)
+  en la respuesta y lo devuelve en el siguiente mensaje. Un token alterado
+  o vencido empieza una conversación nueva; nunca es un error.
+- Se guardan los últimos MAXIMO_TURNOS turnos (pregunta, respuesta) y la
+  entrada caduca tras CHATBOT_HISTORIAL_TTL segundos sin mensajes.
+
+Sin sesión ni BD: un mensaje cuesta un get y un set de caché.
+"""
+
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+CONVERSACION_KEY = "chatbot:conversacion:{}"
+MAXIMO_TURNOS = 6
+# Cada texto se recorta: el modelo solo ve los últimos mensajes y la caché no debe crecer por uno largo
+LARGO_MAXIMO = 1000
+
+_SALT = "domain.conversaciones"
+
+
+def ttl_conversacion():
+    return int(getattr(settings, "CHATBOT_HISTORIAL_TTL", 1800))
+
+
+def _id_de_token(token):
+    if not token or not isinstance(token, str):
+        return None
+    try:
+        return signing.Signer(salt=_SALT).unsign(token)
+    except signing.BadSignature:
+        return None
+
+
+def abrir_conversacion(token=None):
+    """
+    (token, turnos) de la conversación del token; con token inválido o
+    vencido, un token nuevo y ningún turno.
+    """
+    conversacion_id = _id_de_token(token)
+    if conversacion_id:
+        turnos = cache.get(CONVERSACION_KEY.format(conversacion_id))
+        if turnos is not None:
+            return token, turnos
+    conversacion_id = uuid.uuid4().hex
+    return signing.Signer(salt=_SALT).sign(conversacion_id), []
+
+
+def historial_plano(turnos):
+    """Turnos en el formato que espera responder_chatbot ("Usuario: ..." / "Asistente: ...")."""
+    lineas = []
+    for pregunta, respuesta in turnos:
+        lineas += [f"Usuario: {pregunta}", f"Asistente: {respuesta}"]
+    return lineas
+
+
+def agregar_turno(token, turnos, pregunta, respuesta):
+    """Guarda el turno y descarta los más viejos; renueva el TTL."""
+    turno = ((pregunta or "")[:LARGO_MAXIMO], (respuesta or "")[:LARGO_MAXIMO])
+    turnos = (list(turnos) + [turno])[-MAXIMO_TURNOS:]
+    cache.set(CONVERSACION_KEY.format(_id_de_token(token)), turnos, timeout=ttl_conversacion())
+    return turnos
@@ -0,0 +1,114 @@
+# domain/horarios.py
+"""
+Caché en proceso de los horarios semanales (Horario).
+
+Los turnos cambian muy poco y se consultan en cada cálculo de agenda, así que
+cada worker guarda dentista_id -> 7 listas de (inicio, fin) (lunes=0 ... domingo=6).
+La validez se controla con una versión por dentista en la caché compartida:
+las señales de Horario la cambian y todos los workers recargan en su siguiente
+consulta (un cache.get en lugar de una consulta SQL).
+"""
+
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+from domain.models import Horario
+from proyecto_rc.metricas import incrementar
+
+VERSION_KEY = "horarios:version:{}"
+
+# dentista_id -> (version, semana)
+_semanas_locales = {}
+
+
+def _clave(dentista_id):
+    return VERSION_KEY.format(dentista_id)
+
+
+def _nueva_version():
+    return uuid.uuid4().hex
+
+
+def _versiones(dentista_ids):
+    """Versión vigente por dentista; si se perdió en la caché compartida se crea una nueva."""
+    claves = {dentista_id: _clave(dentista_id) for dentista_id in dentista_ids}
+    encontradas = cache.get_many(list(claves.values()))
+    versiones = {}
+    for dentista_id, clave in claves.items():
+        version = encontradas.get(clave)
+        if version is None:
+            cache.add(clave, _nueva_version(), timeout=None)
+            version = cache.get(clave)
+        versiones[dentista_id] = version
+    return versiones
+
+
+def _cargar(dentista_ids):
+    semanas = {dentista_id: tuple([] for _ in range(7)) for dentista_id in dentista_ids}
+    turnos = (
+        Horario.objects
+        .filter(dentista_id__in=dentista_ids)
+        .order_by("hora_inicio")
+        .values_list("dentista_id", "dia_semana", "hora_inicio", "hora_fin")
+    )
+    for dentista_id, dia_semana, inicio, fin in turnos:
+        semanas[dentista_id][dia_semana - 1].append((inicio, fin))
+    return semanas
+
+
+def semanas_dentistas(dentista_ids):
+    """
+    Devuelve {dentista_id: semana} para varios dentistas con una sola consulta
+    (solo para los que no estén ya vigentes en este proceso).
+    """
+    dentista_ids = set(dentista_ids)
+    if not dentista_ids:
+        return {}
+
+    versiones = _versiones(dentista_ids)
+    resultado = {}
+    faltantes = []
+    for dentista_id in dentista_ids:
+        local = _semanas_locales.get(dentista_id)
+        if local and local[0] == versiones[dentista_id]:
+            resultado[dentista_id] = local[1]
+        else:
+            faltantes.append(dentista_id)
+
+    if resultado:
+        incrementar("rc_cache_horarios_total", len(resultado), resultado="hit")
+    if faltantes:
+        incrementar("rc_cache_horarios_total", len(faltantes), resultado="miss")
+        for dentista_id, semana in _cargar(faltantes).items():
+            _semanas_locales[dentista_id] = (versiones[dentista_id], semana)
+            resultado[dentista_id] = semana
+    return resultado
+
+
+def semana_dentista(dentista):
+    """Los 7 días de turnos del dentista (acepta instancia o id)."""
+    dentista_id = getattr(dentista, "id", dentista)
+    return semanas_dentistas([dentista_id])[dentista_id]
+
+
+def version_horarios(dentista_id):
+    """Versión vigente de los turnos del dentista (validadores de respuestas condicionales)."""
+    return _versiones([dentista_id])[dentista_id]
+
+
+def turnos_del_dia(dentista, fecha):
+    """Lista de (hora_inicio, hora_fin) del dentista para esa fecha, ordenada."""
+    return semana_dentista(dentista)[fecha.isoweekday() - 1]
+
+
+def invalidar_horarios(dentista_id):
+    """
+    Cambia la versión del dentista para que todos los workers recarguen.
+    Se repite al confirmar la transacción: si otro worker recargó antes del
+    commit (leyendo los turnos viejos), la segunda versión lo vuelve a invalidar.
+    """
+    _semanas_locales.pop(dentista_id, None)
+    cache.set(_clave(dentista_id), _nueva_version(), timeout=None)
+    transaction.on_commit(lambda: cache.set(_clave(dentista_id), _nueva_version(), timeout=None))
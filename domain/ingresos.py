@@ -0,0 +1,118 @@
+"""
+Rollup diario de ingresos (IngresoDiario): suma y cantidad de pagos por
+dentista, día (fecha local de created_at), método y estado.
+
+Se mantiene en la misma transacción que el pago: Pago.save aplica la
+diferencia entre el estado anterior y el nuevo, y la señal post_delete resta
+los pagos borrados (también los que caen en cascada). Lo que no pasa fila a
+fila por el ORM (bulk_create, QuerySet.update) no lo ve:
+`manage.py reconstruir_ingresos` recalcula desde Pago.
+
+Los KPIs de pagos suman filas de aquí en lugar de recorrer todos los pagos.
+"""
+
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import IngresoDiario, Pago
+
+CAMPOS_INGRESO = ("dentista_id", "created_at", "metodo", "estado", "monto")
+
+_suspendido = contextvars.ContextVar("ingresos_suspendido", default=False)
+
+
+@contextmanager
+def sin_rollup():
+    """Desactiva el mantenimiento incremental (borrados masivos que luego se reconstruyen)."""
+    token = _suspendido.set(True)
+    try:
+        yield
+    finally:
+        _suspendido.reset(token)
+
+
+def _fecha_local(momento):
+    return timezone.localdate(momento) if timezone.is_aware(momento) else momento.date()
+
+
+def _clave(valores):
+    return valores["dentista_id"], _fecha_local(valores["created_at"]), valores["metodo"], valores["estado"]
+
+
+def aplicar_cambio_ingresos(anterior, actual):
+    """
+    Ajusta el rollup por el paso de `anterior` a `actual` (dicts con
+    CAMPOS_INGRESO; None para alta o baja).
+    """
+    if _suspendido.get():
+        return
+    deltas = defaultdict(lambda: [Decimal("0"), 0])
+    for valores, signo in ((anterior, -1), (actual, 1)):
+        if valores and valores["dentista_id"] and valores["created_at"]:
+            delta = deltas[_clave(valores)]
+            delta[0] += signo * Decimal(valores["monto"])
+            delta[1] += signo
+    for clave, (total, cantidad) in deltas.items():
+        if total or cantidad:
+            _acumular(clave, total, cantidad)
+
+
+def _acumular(clave, total, cantidad):
+    dentista_id, fecha, metodo, estado = clave
+    filas = IngresoDiario.objects.filter(dentista_id=dentista_id, fecha=fecha, metodo=metodo, estado=estado)
+    if filas.update(total=F("total") + total, cantidad=F("cantidad") + cantidad) or cantidad <= 0:
+        # Una resta sin fila previa es un pago que nunca entró al rollup (o su dentista ya se borró)
+        return
+    try:
+        with transaction.atomic():
+            IngresoDiario.objects.create(
+                dentista_id=dentista_id, fecha=fecha, metodo=metodo, estado=estado, total=total, cantidad=cantidad
+            )
+    except IntegrityError:
+        # Otra transacción creó la fila entre el update y el insert
+        filas.update(total=F("total") + total, cantidad=F("cantidad") + cantidad)
+
+
+def _inicio_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def reconstruir_ingresos(dentista_ids=None, desde=None, hasta=None, lote=2000):
+    """
+    Recalcula el rollup desde Pago para los dentistas y días indicados
+    (todos por defecto). Devuelve cuántas filas quedaron.
+    """
+    pagos = Pago.objects.filter(dentista__isnull=False)
+    rollup = IngresoDiario.objects.all()
+    if dentista_ids is not None:
+        pagos = pagos.filter(dentista_id__in=dentista_ids)
+        rollup = rollup.filter(dentista_id__in=dentista_ids)
+    if desde:
+        pagos = pagos.filter(created_at__gte=_inicio_dia(desde))
+        rollup = rollup.filter(fecha__gte=desde)
+    if hasta:
+        pagos = pagos.filter(created_at__lt=_inicio_dia(hasta + timedelta(days=1)))
+        rollup = rollup.filter(fecha__lte=hasta)
+
+    with transaction.atomic():
+        acumulado = defaultdict(lambda: [Decimal("0"), 0])
+        for valores in pagos.values(*CAMPOS_INGRESO).iterator(chunk_size=lote):
+            fila = acumulado[_clave(valores)]
+            fila[0] += valores["monto"]
+            fila[1] += 1
+        rollup.delete()
+        IngresoDiario.objects.bulk_create(
+            [
+                IngresoDiario(dentista_id=dentista_id, fecha=fecha, metodo=metodo, estado=estado, total=total, cantidad=cantidad)
+                for (dentista_id, fecha, metodo, estado), (total, cantidad) in acumulado.items()
+            ],
+            batch_size=lote,
+        )
+    return len(acumulado)
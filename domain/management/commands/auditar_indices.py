@@ -0,0 +1,56 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from domain.auditoria_indices import CONSULTAS, MOTORES_SOPORTADOS, auditar
+
+
+class Command(BaseCommand):
+    help = (
+        "Ejecuta EXPLAIN sobre el catálogo de consultas calientes (domain/auditoria_indices.py) "
+        "contra la base actual y marca recorridos completos y ordenamientos sin índice."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--consultas", help=f"Lista separada por comas. Disponibles: {', '.join(CONSULTAS)}")
+        parser.add_argument("--planes", action="store_true", help="Muestra el plan completo de cada consulta.")
+        parser.add_argument("--json", action="store_true", help="Salida en JSON (para CI).")
+        parser.add_argument("--estricto", action="store_true", help="Sale con error si alguna consulta tiene hallazgos.")
+
+    def handle(self, *args, **options):
+        motor = connection.vendor
+        if motor not in MOTORES_SOPORTADOS:
+            raise CommandError(f"Motor no soportado: {motor} (soportados: {', '.join(MOTORES_SOPORTADOS)}).")
+
+        nombres = None
+        if options["consultas"]:
+            nombres = [n.strip() for n in options["consultas"].split(",") if n.strip()]
+            desconocidas = [n for n in nombres if n not in CONSULTAS]
+            if desconocidas:
+                raise CommandError(f"Consultas desconocidas: {', '.join(desconocidas)}")
+
+        resultados = auditar(motor, nombres)
+        con_problemas = [r for r in resultados if r["hallazgos"]]
+
+        if options["json"]:
+            self.stdout.write(json.dumps({"motor": motor, "consultas": resultados}, ensure_ascii=False, indent=2))
+        else:
+            self.stdout.write(f"Motor: {motor} — {len(resultados)} consultas auditadas\n")
+            for r in resultados:
+                if r["hallazgos"]:
+                    self.stdout.write(self.style.WARNING(f"✗ {r['nombre']:<32} {'; '.join(r['hallazgos'])}"))
+                else:
+                    self.stdout.write(f"✓ {r['nombre']:<32} usa índice")
+                self.stdout.write(f"    {r['origen']}")
+                if options["planes"] or r["hallazgos"]:
+                    for linea in r["plan"].splitlines():
+                        self.stdout.write(f"      {linea}")
+            self.stdout.write("")
+            if con_problemas:
+                self.stdout.write(self.style.WARNING(f"{len(con_problemas)} consultas con recorridos completos u ordenamientos."))
+            else:
+                self.stdout.write(self.style.SUCCESS("Todas las consultas del catálogo usan índices."))
+
+        if con_problemas and options["estricto"]:
+            raise CommandError(f"{len(con_problemas)} consultas con hallazgos.")
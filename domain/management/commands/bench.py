@@ -0,0 +1,153 @@
+import io
+import platform
+import subprocess
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from benchmarks import medicion
+from benchmarks.casos import CASOS, Contexto
+from domain.sinteticos import GeneradorConsultorio
+
+DIR_BENCHMARKS = Path(settings.BASE_DIR) / "benchmarks"
+
+
+def _commit_actual():
+    try:
+        salida = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5,
+        )
+        return salida.stdout.strip() or None
+    except Exception:
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide las rutas calientes (servicios de dominio y vistas) sobre un conjunto de datos sintético "
+        "en una base de prueba temporal. Guarda p50/p95, consultas y memoria pico en JSON y compara "
+        "contra benchmarks/baseline.json."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--casos", help=f"Lista separada por comas. Disponibles: {', '.join(CASOS)}")
+        parser.add_argument("--repeticiones", type=int, default=15)
+        parser.add_argument("--calentamiento", type=int, default=2)
+        parser.add_argument("--segundos-por-caso", type=float, default=20.0,
+                            help="Corta las repeticiones de un caso lento (mínimo 3).")
+        parser.add_argument("--dentistas", type=int, default=2)
+        parser.add_argument("--pacientes", type=int, default=2000)
+        parser.add_argument("--meses", type=int, default=12)
+        parser.add_argument("--semilla", type=int, default=1)
+        parser.add_argument("--salida", help="JSON de resultados (por defecto benchmarks/resultados/bench-<fecha>.json).")
+        parser.add_argument("--baseline", default=str(DIR_BENCHMARKS / "baseline.json"))
+        parser.add_argument("--umbral", type=float, default=0.25, help="Regresión tolerada (0.25 = 25%%).")
+        parser.add_argument("--guardar-baseline", action="store_true", help="Sobrescribe la línea base con esta corrida.")
+        parser.add_argument("--no-fallar", action="store_true", help="Reporta regresiones sin salir con error.")
+
+    def handle(self, *args, **options):
+        nombres = list(CASOS)
+        if options["casos"]:
+            nombres = [n.strip() for n in options["casos"].split(",") if n.strip()]
+            desconocidos = [n for n in nombres if n not in CASOS]
+            if desconocidos:
+                raise CommandError(f"Casos desconocidos: {', '.join(desconocidos)}")
+
+        dataset = {
+            "dentistas": options["dentistas"],
+            "pacientes": options["pacientes"],
+            "meses": options["meses"],
+            "semilla": options["semilla"],
+        }
+        resultados = {
+            "meta": {
+                "fecha": datetime.now().isoformat(timespec="seconds"),
+                "commit": _commit_actual(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "bd": connection.vendor,
+                "dataset": dataset,
+                "repeticiones": options["repeticiones"],
+            },
+            "casos": {},
+        }
+
+        setup_test_environment()
+        nombre_original = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.stdout.write(f"Generando datos sintéticos {dataset} ...")
+            GeneradorConsultorio(**dataset).generar()
+            contexto = Contexto()
+            self._correr(nombres, contexto, options, resultados["casos"])
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            teardown_test_environment()
+
+        salida = options["salida"] or DIR_BENCHMARKS / "resultados" / f"bench-{datetime.now():%Y%m%d-%H%M%S}.json"
+        medicion.guardar(salida, resultados)
+        self.stdout.write(f"Resultados: {salida}")
+
+        if options["guardar_baseline"]:
+            medicion.guardar(options["baseline"], resultados)
+            self.stdout.write(self.style.SUCCESS(f"Línea base actualizada: {options['baseline']}"))
+            return
+
+        self._comparar(resultados, options)
+
+    def _correr(self, nombres, contexto, options, casos):
+        # Chatbot en modo local y sin límites de tasa; presupuestos solo como aviso
+        ajustes = override_settings(
+            CHATBOT_IA_ENABLED=False,
+            CHATBOT_REQUIRE_SECRET=False,
+            CHATBOT_API_SECRET="",
+            CHATBOT_RATE_LIMIT_MAX=10**9,
+            PRESUPUESTO_CONSULTAS_ESTRICTO=False,
+        )
+        with ajustes:
+            for nombre in nombres:
+                try:
+                    # Los prints de las vistas no deben ensuciar la salida del comando
+                    with redirect_stdout(io.StringIO()):
+                        metricas = medicion.medir_caso(
+                            CASOS[nombre], contexto,
+                            repeticiones=options["repeticiones"],
+                            calentamiento=options["calentamiento"],
+                            segundos_max=options["segundos_por_caso"],
+                        )
+                except Exception as exc:
+                    metricas = {"error": f"{type(exc).__name__}: {exc}"}
+                    self.stdout.write(self.style.ERROR(f"{nombre:<32} ERROR {metricas['error']}"))
+                else:
+                    self.stdout.write(
+                        f"{nombre:<32} p50 {metricas['p50_ms']:9.2f} ms  p95 {metricas['p95_ms']:9.2f} ms  "
+                        f"consultas {metricas['consultas']:5d}  memoria {metricas['memoria_pico_kb']:9.1f} KB"
+                    )
+                casos[nombre] = metricas
+
+    def _comparar(self, resultados, options):
+        baseline = medicion.cargar(options["baseline"])
+        if baseline is None:
+            self.stdout.write(self.style.WARNING(
+                f"Sin línea base en {options['baseline']}; usa --guardar-baseline para crearla."
+            ))
+            return
+        if baseline.get("meta", {}).get("dataset") != resultados["meta"]["dataset"]:
+            self.stdout.write(self.style.WARNING("La línea base se generó con otro dataset; la comparación es orientativa."))
+
+        regresiones = medicion.comparar(resultados, baseline, umbral=options["umbral"])
+        errores = [nombre for nombre, metricas in resultados["casos"].items() if "error" in metricas]
+        for nombre, motivos in regresiones.items():
+            self.stdout.write(self.style.ERROR(f"REGRESIÓN {nombre}: {'; '.join(motivos)}"))
+        if not regresiones and not errores:
+            self.stdout.write(self.style.SUCCESS("Sin regresiones frente a la línea base."))
+            return
+        if not options["no_fallar"]:
+            raise CommandError(f"{len(regresiones)} regresiones, {len(errores)} casos con error.")
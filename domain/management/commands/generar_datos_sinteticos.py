@@ -0,0 +1,63 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from domain.sinteticos import GeneradorConsultorio, hay_datos_sinteticos, limpiar_datos_sinteticos
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera un consultorio sintético con volumen realista (pacientes, horarios, citas, pagos, "
+        "penalizaciones, encuestas y odontograma) para pruebas de rendimiento. "
+        "El número de citas crece con --dentistas × --meses (≈2,200 citas por dentista y año "
+        "con la ocupación por defecto); p. ej. --dentistas 200 --meses 24 ronda el millón."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dentistas", type=int, default=5)
+        parser.add_argument("--pacientes", type=int, default=20000, help="Total, repartido entre dentistas.")
+        parser.add_argument("--meses", type=int, default=24, help="Meses de historial (más 60 días de agenda futura).")
+        parser.add_argument("--semilla", type=int, default=1, help="Misma semilla y --hasta = mismos datos.")
+        parser.add_argument("--hasta", help="Fecha 'actual' del conjunto de datos (YYYY-MM-DD). Por defecto hoy.")
+        parser.add_argument("--ocupacion", type=float, default=0.75, help="Fracción de la agenda ocupada (0-1).")
+        parser.add_argument("--lote", type=int, default=2000, help="Tamaño de lote de bulk_create.")
+        parser.add_argument("--password", default="Sintetico123!", help="Contraseña de los usuarios sintéticos (dentistas y pacientes con cuenta).")
+        parser.add_argument("--limpiar", action="store_true", help="Borra los datos sintéticos previos antes de generar.")
+
+    def handle(self, *args, **options):
+        if options["dentistas"] < 1 or options["pacientes"] < options["dentistas"]:
+            raise CommandError("Se requiere al menos un dentista y un paciente por dentista.")
+        if not 0 < options["ocupacion"] <= 1:
+            raise CommandError("--ocupacion debe estar entre 0 y 1.")
+
+        hasta = None
+        if options["hasta"]:
+            try:
+                hasta = datetime.strptime(options["hasta"], "%Y-%m-%d").date()
+            except ValueError:
+                raise CommandError("--hasta debe tener formato YYYY-MM-DD.")
+
+        if hay_datos_sinteticos():
+            if not options["limpiar"]:
+                raise CommandError("Ya existen datos sintéticos. Usa --limpiar para regenerarlos.")
+            borrados = limpiar_datos_sinteticos()
+            self.stdout.write(self.style.WARNING(f"Datos sintéticos previos eliminados ({borrados} dentistas)."))
+
+        inicio = time.perf_counter()
+        conteos = GeneradorConsultorio(
+            dentistas=options["dentistas"],
+            pacientes=options["pacientes"],
+            meses=options["meses"],
+            semilla=options["semilla"],
+            hasta=hasta,
+            lote=options["lote"],
+            ocupacion=options["ocupacion"],
+            password=options["password"],
+            log=self.stdout.write,
+        ).generar()
+
+        resumen = ", ".join(f"{modelo}={total}" for modelo, total in conteos.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Datos sintéticos generados en {time.perf_counter() - inicio:.1f}s: {resumen}"
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from domain.reservas import limpiar_retenciones_vencidas
+
+
+class Command(BaseCommand):
+    help = (
+        "Vence las retenciones de checkout (ReservaTemporal) expiradas: cancela sus citas "
+        "sin pago completado y libera el hueco. Conviene correrlo cada minuto."
+    )
+
+    def handle(self, *args, **options):
+        eliminadas, canceladas = limpiar_retenciones_vencidas()
+        self.stdout.write(self.style.SUCCESS(
+            f"Retenciones vencidas eliminadas: {eliminadas} (citas canceladas sin pago: {canceladas})"
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from domain.sincronizacion import purgar_borrados, retencion_borrados
+
+
+class Command(BaseCommand):
+    help = "Elimina las lápidas de sincronización (RegistroBorrado) más viejas que SYNC_RETENCION_BORRADOS_DIAS."
+
+    def handle(self, *args, **options):
+        eliminadas = purgar_borrados()
+        self.stdout.write(self.style.SUCCESS(
+            f"Lápidas eliminadas: {eliminadas} (retención {retencion_borrados().days} días)"
+        ))
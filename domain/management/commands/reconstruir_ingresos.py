@@ -0,0 +1,34 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from domain.ingresos import reconstruir_ingresos
+
+
+def _fecha(valor):
+    try:
+        return datetime.strptime(valor, "%Y-%m-%d").date()
+    except ValueError:
+        raise CommandError(f"Fecha inválida: {valor} (formato YYYY-MM-DD)")
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula el rollup IngresoDiario desde Pago (tras cargas masivas, QuerySet.update "
+        "o para verificar que no se desvió). Sin filtros reconstruye todo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dentista", type=int, action="append", help="Id de dentista (se puede repetir).")
+        parser.add_argument("--desde", type=_fecha, help="Primer día (YYYY-MM-DD).")
+        parser.add_argument("--hasta", type=_fecha, help="Último día (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        if options["desde"] and options["hasta"] and options["desde"] > options["hasta"]:
+            raise CommandError("--desde no puede ser posterior a --hasta.")
+        filas = reconstruir_ingresos(
+            dentista_ids=options["dentista"],
+            desde=options["desde"],
+            hasta=options["hasta"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Rollup de ingresos reconstruido: {filas} filas."))
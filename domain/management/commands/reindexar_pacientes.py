@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from domain.busqueda import reindexar_pacientes
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula el nombre normalizado y los trigramas de búsqueda de los pacientes "
+        "(tras cargas masivas o QuerySet.update sobre Paciente). Sin filtros reindexa todo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dentista", type=int, action="append", help="Id de dentista (se puede repetir).")
+
+    def handle(self, *args, **options):
+        total = reindexar_pacientes(dentista_ids=options["dentista"])
+        self.stdout.write(self.style.SUCCESS(f"Índice de búsqueda reconstruido: {total} pacientes."))
@@ -0,0 +1,92 @@
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from proyecto_rc.trazas import leer_trazas
+
+
+class Command(BaseCommand):
+    help = (
+        "Resume las trazas exportadas (TRAZAS_DIR): las más lentas como árbol de spans "
+        "con barras proporcionales y el tiempo propio acumulado por span."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dir", default=None, help="Directorio de trazas (por defecto TRAZAS_DIR).")
+        parser.add_argument("--top", type=int, default=10, help="Cuántas trazas mostrar.")
+        parser.add_argument("--filtro", help="Solo trazas cuyo span raíz contenga este texto (p. ej. api_crear_cita).")
+        parser.add_argument("--min-ms", type=float, default=0, help="Oculta spans más cortos que esto.")
+        parser.add_argument("--ancho", type=int, default=30, help="Ancho de las barras.")
+
+    def handle(self, *args, **options):
+        directorio = Path(options["dir"] or settings.TRAZAS_DIR)
+        if not directorio.is_dir():
+            raise CommandError(f"No existe {directorio}. ¿Está activo TRAZAS_HABILITADO?")
+
+        trazas = leer_trazas(directorio)
+        if options["filtro"]:
+            trazas = [t for t in trazas if options["filtro"] in t["spans"][0]["nombre"]]
+        if not trazas:
+            self.stdout.write("No hay trazas que mostrar.")
+            return
+
+        trazas.sort(key=lambda t: t["spans"][0]["duracion_ms"], reverse=True)
+        seleccion = trazas[: options["top"]]
+        self.stdout.write(f"{len(trazas)} trazas en {directorio}; las {len(seleccion)} más lentas:\n")
+        for posicion, traza in enumerate(seleccion, start=1):
+            self._imprimir_traza(posicion, traza, options)
+        self._imprimir_tiempo_propio(seleccion)
+
+    def _imprimir_traza(self, posicion, traza, options):
+        spans = traza["spans"]
+        raiz = spans[0]
+        hijos = defaultdict(list)
+        for s in spans[1:]:
+            hijos[s["padre"]].append(s)
+
+        atributos = raiz["atributos"]
+        inicio = datetime.fromtimestamp(raiz["inicio_ns"] / 1e9).strftime("%Y-%m-%d %H:%M:%S")
+        self.stdout.write(
+            f"#{posicion} {raiz['duracion_ms']:.1f} ms  {raiz['nombre']}  "
+            f"status={atributos.get('http.status_code', '-')}  request={atributos.get('request.id', '-')}  {inicio}"
+        )
+        total = raiz["duracion_ms"] or 1
+
+        def recorrer(s, nivel):
+            if nivel and s["duracion_ms"] < options["min_ms"]:
+                return
+            # La barra arranca donde empezó el span dentro de la traza (estilo flame/cascada)
+            desfase = round((s["inicio_ns"] - raiz["inicio_ns"]) / 1e6 / total * options["ancho"])
+            largo = max(1, round(s["duracion_ms"] / total * options["ancho"]))
+            barra = (" " * desfase + "█" * largo).ljust(options["ancho"])[: options["ancho"]]
+            error = f"  ✗ {s['error']}" if s["error"] else ""
+            self.stdout.write(
+                f"  {s['duracion_ms']:9.1f} ms {s['duracion_ms'] / total:5.0%} |{barra}| {'  ' * nivel}{s['nombre']}{error}"
+            )
+            for hijo in sorted(hijos[s["id"]], key=lambda h: h["inicio_ns"]):
+                recorrer(hijo, nivel + 1)
+
+        recorrer(raiz, 0)
+        self.stdout.write("")
+
+    def _imprimir_tiempo_propio(self, trazas):
+        """Tiempo propio (sin hijos) por nombre de span: dónde se fue realmente el tiempo."""
+        llamadas = defaultdict(int)
+        propio = defaultdict(float)
+        for traza in trazas:
+            de_hijos = defaultdict(float)
+            for s in traza["spans"]:
+                if s["padre"]:
+                    de_hijos[s["padre"]] += s["duracion_ms"]
+            for s in traza["spans"]:
+                llamadas[s["nombre"]] += 1
+                propio[s["nombre"]] += max(s["duracion_ms"] - de_hijos[s["id"]], 0)
+
+        total = sum(propio.values()) or 1
+        self.stdout.write("Tiempo propio acumulado por span:")
+        self.stdout.write(f"  {'ms':>10} {'%':>6} {'llamadas':>9}  span")
+        for nombre, ms in sorted(propio.items(), key=lambda par: par[1], reverse=True)[:15]:
+            self.stdout.write(f"  {ms:10.1f} {ms / total:6.1%} {llamadas[nombre]:9d}  {nombre}")
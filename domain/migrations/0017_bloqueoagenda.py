@@ -0,0 +1,26 @@
+# Generated by Django 5.0.6 on 2026-10-19 15:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domain', '0016_cita_domain_cita_dentist_33b1d7_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BloqueoAgenda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('dentista', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='domain.dentista')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='bloqueoagenda',
+            constraint=models.UniqueConstraint(fields=('dentista', 'fecha'), name='uniq_bloqueo_agenda_dentista_fecha'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-19 15:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domain', '0017_bloqueoagenda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaTemporal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('hora_inicio', models.TimeField()),
+                ('hora_fin', models.TimeField()),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('cita', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reservas_temporales', to='domain.cita')),
+                ('dentista', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_temporales', to='domain.dentista')),
+                ('paciente', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='domain.paciente')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['dentista', 'fecha', 'expires_at'], name='domain_rese_dentist_3c1c25_idx')],
+            },
+        ),
+    ]
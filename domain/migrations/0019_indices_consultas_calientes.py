@@ -0,0 +1,39 @@
+# Generated by Django 5.0.6 on 2026-10-19 16:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domain', '0018_reservatemporal'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='avisodentista',
+            index=models.Index(fields=['dentista', 'created_at'], name='domain_avis_dentist_7ab3f9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['dentista', 'estado', 'fecha'], name='domain_cita_dentist_f31e94_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['paciente', 'estado'], name='domain_cita_pacient_92a345_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['fecha', 'estado', 'recordatorio_24h_enviado'], name='domain_cita_fecha_e27bd4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['usuario', 'leida'], name='domain_noti_usuario_a4bc66_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='penalizacionlog',
+            index=models.Index(fields=['paciente', 'accion', 'created_at'], name='domain_pena_pacient_8aea7e_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.0.6 on 2026-10-19 16:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+LOTE = 2000
+
+
+def copiar_dentista_paciente(apps, schema_editor):
+    """Rellena Pago.dentista/paciente desde la cita, por rangos de id para no bloquear la tabla entera."""
+    Pago = apps.get_model("domain", "Pago")
+    Cita = apps.get_model("domain", "Cita")
+    cita = Cita.objects.filter(pk=OuterRef("cita_id"))
+    pendientes = Pago.objects.filter(dentista__isnull=True)
+    ultimo = pendientes.order_by("-pk").values_list("pk", flat=True).first()
+    if ultimo is None:
+        return
+    desde = pendientes.order_by("pk").values_list("pk", flat=True).first()
+    while desde <= ultimo:
+        pendientes.filter(pk__gte=desde, pk__lt=desde + LOTE).update(
+            dentista_id=Subquery(cita.values("dentista_id")[:1]),
+            paciente_id=Subquery(cita.values("paciente_id")[:1]),
+        )
+        desde += LOTE
+
+
+class Migration(migrations.Migration):
+    # Cada lote se confirma por separado
+    atomic = False
+
+    dependencies = [
+        ('domain', '0019_indices_consultas_calientes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pago',
+            name='dentista',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pagos', to='domain.dentista'),
+        ),
+        migrations.AddField(
+            model_name='pago',
+            name='paciente',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pagos', to='domain.paciente'),
+        ),
+        migrations.RunPython(copiar_dentista_paciente, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['dentista', 'estado', 'created_at'], name='domain_pago_dentist_b2b4be_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['paciente', 'estado', 'created_at'], name='domain_pago_pacient_9cb9c5_idx'),
+        ),
+    ]
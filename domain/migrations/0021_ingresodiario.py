@@ -0,0 +1,56 @@
+# Generated by Django 5.0.6 on 2026-10-19 16:24
+
+from collections import defaultdict
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def poblar_ingresos(apps, schema_editor):
+    """Carga inicial del rollup (después lo mantiene Pago.save; ver domain/ingresos.py)."""
+    Pago = apps.get_model("domain", "Pago")
+    IngresoDiario = apps.get_model("domain", "IngresoDiario")
+    acumulado = defaultdict(lambda: [Decimal("0"), 0])
+    campos = ("dentista_id", "created_at", "metodo", "estado", "monto")
+    for dentista_id, creado, metodo, estado, monto in (
+        Pago.objects.filter(dentista__isnull=False).values_list(*campos).iterator(chunk_size=2000)
+    ):
+        fila = acumulado[(dentista_id, timezone.localdate(creado), metodo, estado)]
+        fila[0] += monto
+        fila[1] += 1
+    IngresoDiario.objects.bulk_create(
+        [
+            IngresoDiario(dentista_id=dentista_id, fecha=fecha, metodo=metodo, estado=estado, total=total, cantidad=cantidad)
+            for (dentista_id, fecha, metodo, estado), (total, cantidad) in acumulado.items()
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domain', '0020_pago_dentista_paciente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngresoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('metodo', models.CharField(choices=[('EFECTIVO', 'Efectivo'), ('TRANSFERENCIA', 'Transferencia'), ('TARJETA', 'Tarjeta'), ('MERCADOPAGO', 'MercadoPago'), ('MERCADOPAGO_FAKE', 'MercadoPago (fake)')], max_length=20)),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('COMPLETADO', 'Completado')], max_length=20)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('dentista', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingresos_diarios', to='domain.dentista')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='ingresodiario',
+            constraint=models.UniqueConstraint(fields=('dentista', 'fecha', 'metodo', 'estado'), name='uniq_ingreso_diario'),
+        ),
+        migrations.RunPython(poblar_ingresos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.6 on 2026-10-19 16:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domain', '0021_ingresodiario'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['dentista', 'created_at'], name='domain_pago_dentist_d389bf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='penalizacionlog',
+            index=models.Index(fields=['dentista', 'created_at'], name='domain_pena_dentist_724ba1_idx'),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.0.6 on 2026-10-19 16:40
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+LOTE = 2000
+
+
+def _normalizar(texto):
+    # Copia de domain.busqueda.normalizar: la migración no depende del código vivo
+    descompuesto = unicodedata.normalize("NFKD", texto or "")
+    sin_acentos = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", sin_acentos).strip().lower()
+
+
+def indexar_pacientes(apps, schema_editor):
+    """Carga inicial de nombre_normalizado y trigramas (después los mantiene Paciente.save)."""
+    Paciente = apps.get_model("domain", "Paciente")
+    PacienteTrigrama = apps.get_model("domain", "PacienteTrigrama")
+    cambiados, filas = [], []
+    for paciente in Paciente.objects.only("id", "dentista_id", "nombre").iterator(chunk_size=LOTE):
+        paciente.nombre_normalizado = _normalizar(paciente.nombre)
+        cambiados.append(paciente)
+        texto = paciente.nombre_normalizado
+        filas += [
+            PacienteTrigrama(dentista_id=paciente.dentista_id, paciente_id=paciente.pk, trigrama=t)
+            for t in {texto[i:i + 3] for i in range(len(texto) - 2)}
+        ]
+        if len(cambiados) >= LOTE:
+            Paciente.objects.bulk_update(cambiados, ["nombre_normalizado"])
+            PacienteTrigrama.objects.bulk_create(filas, batch_size=LOTE)
+            cambiados, filas = [], []
+    Paciente.objects.bulk_update(cambiados, ["nombre_normalizado"])
+    PacienteTrigrama.objects.bulk_create(filas, batch_size=LOTE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domain', '0022_indices_paginacion_cursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PacienteTrigrama',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigrama', models.CharField(max_length=3)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='paciente',
+            name='nombre_normalizado',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        migrations.AddIndex(
+            model_name='paciente',
+            index=models.Index(fields=['dentista', 'nombre_normalizado'], name='domain_paci_dentist_fab844_idx'),
+        ),
+        migrations.AddField(
+            model_name='pacientetrigrama',
+            name='dentista',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='domain.dentista'),
+        ),
+        migrations.AddField(
+            model_name='pacientetrigrama',
+            name='paciente',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigramas', to='domain.paciente'),
+        ),
+        migrations.AddIndex(
+            model_name='pacientetrigrama',
+            index=models.Index(fields=['dentista', 'trigrama', 'paciente'], name='domain_paci_dentist_650f5a_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='pacientetrigrama',
+            constraint=models.UniqueConstraint(fields=('paciente', 'trigrama'), name='uniq_trigrama_paciente'),
+        ),
+        migrations.RunPython(indexar_pacientes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.6 on 2026-10-19 16:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domain', '0023_busqueda_pacientes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OdontogramaVersion',
+            fields=[
+                ('paciente', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='version_odontograma', serialize=False, to='domain.paciente')),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
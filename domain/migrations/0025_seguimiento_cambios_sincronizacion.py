@@ -0,0 +1,72 @@
+# Generated by Django 5.0.6 on 2026-10-19 16:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domain', '0024_odontograma_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroBorrado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=20)),
+                ('objeto_id', models.BigIntegerField()),
+                ('paciente_id', models.BigIntegerField(blank=True, null=True)),
+                ('usuario_id', models.BigIntegerField(blank=True, null=True)),
+                ('borrado_en', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='cita',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='notificacion',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='pago',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='penalizacionlog',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['paciente', 'updated_at'], name='domain_cita_pacient_14f0e6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['usuario', 'updated_at'], name='domain_noti_usuario_e6b90b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['paciente', 'updated_at'], name='domain_pago_pacient_b7d250_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='penalizacionlog',
+            index=models.Index(fields=['paciente', 'updated_at'], name='domain_pena_pacient_2a7175_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registroborrado',
+            index=models.Index(fields=['paciente_id', 'borrado_en'], name='domain_regi_pacient_42904a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registroborrado',
+            index=models.Index(fields=['usuario_id', 'borrado_en'], name='domain_regi_usuario_6b88dc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registroborrado',
+            index=models.Index(fields=['borrado_en'], name='domain_regi_borrado_94789e_idx'),
+        ),
+    ]
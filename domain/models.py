@@ -2,15 +2,91 @@
 #  MODELOS DE BASE DE DATOS (DOMAIN) — RC DENTAL PRO
 # ============================================================
 
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from datetime import datetime
 from django.utils import timezone
 
+# ============================================================
+# 0. SEGUIMIENTO DE CAMBIOS (sincronización de la app móvil)
+# ============================================================
+class BorradoEnLoteQuerySet(models.QuerySet):
+    """delete() inserta las lápidas de toda la cascada en un solo bulk_create."""
+
+    def delete(self):
+        from domain.sincronizacion import lapidas_en_lote
+
+        with lapidas_en_lote():
+            return super().delete()
+
+
+class BorradoEnLote(models.Model):
+    """
+    Base de los modelos sincronizados y de los que borran en cascada hacia
+    ellos (Paciente, Dentista): sus borrados, de una fila o de un QuerySet,
+    juntan las lápidas de RegistroBorrado en lugar de un INSERT por fila.
+    """
+
+    objects = BorradoEnLoteQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def delete(self, *args, **kwargs):
+        from domain.sincronizacion import lapidas_en_lote
+
+        with lapidas_en_lote():
+            return super().delete(*args, **kwargs)
+
+
+class ConCambios(BorradoEnLote):
+    """
+    updated_at para la sincronización incremental (domain/sincronizacion.py).
+    auto_now no se aplica con save(update_fields=...) si el campo no va en la
+    lista, así que save lo agrega siempre. QuerySet.update no pasa por save:
+    quien lo use sobre estos modelos debe poner updated_at=timezone.now().
+    """
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {*kwargs["update_fields"], "updated_at"}
+        super().save(*args, **kwargs)
+
+
+class RegistroBorrado(models.Model):
+    """
+    Lápida de una fila borrada de un modelo sincronizado, para que la app
+    móvil la quite de su copia local. Guarda ids sueltos (sin FK): debe
+    sobrevivir al borrado. Se purgan con `manage.py purgar_borrados`.
+    """
+
+    modelo = models.CharField(max_length=20)
+    objeto_id = models.BigIntegerField()
+    # Dueño de la fila: paciente (citas, pagos, penalizaciones) o usuario (notificaciones)
+    paciente_id = models.BigIntegerField(null=True, blank=True)
+    usuario_id = models.BigIntegerField(null=True, blank=True)
+    borrado_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["paciente_id", "borrado_en"]),
+            models.Index(fields=["usuario_id", "borrado_en"]),
+            models.Index(fields=["borrado_en"]),
+        ]
+
+    def __str__(self):
+        return f"{self.modelo} {self.objeto_id} borrado {self.borrado_en:%Y-%m-%d %H:%M}"
+
+
 # ============================================================
 # 1. PERFIL DEL DENTISTA
 # ============================================================
-class Dentista(models.Model):
+class Dentista(BorradoEnLote):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='dentista')
     nombre = models.CharField(max_length=200, help_text="Nombre completo del doctor")
     telefono = models.CharField(max_length=20, blank=True, null=True)
@@ -39,10 +115,12 @@ class Servicio(models.Model):
 # ============================================================
 # 3. PACIENTES
 # ============================================================
-class Paciente(models.Model):
+class Paciente(BorradoEnLote):
     dentista = models.ForeignKey(Dentista, on_delete=models.CASCADE)
     user = models.OneToOneField(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='paciente_perfil')
     nombre = models.CharField(max_length=200)
+    # Minúsculas y sin acentos (domain/busqueda.py): búsqueda por prefijo y duplicados
+    nombre_normalizado = models.CharField(max_length=200, blank=True, default="", editable=False)
     telefono = models.CharField(max_length=10, blank=True, null=True)
     direccion = models.TextField(blank=True)
     fecha_nacimiento = models.DateField(null=True, blank=True)
@@ -55,6 +133,19 @@ class Paciente(models.Model):
 
     def __str__(self):
         return self.nombre
+
+    def save(self, *args, **kwargs):
+        from domain.busqueda import indexar_paciente, normalizar
+
+        self.nombre_normalizado = normalizar(self.nombre)
+        campos = kwargs.get("update_fields")
+        if campos is not None and "nombre" in campos:
+            kwargs["update_fields"] = {*campos, "nombre_normalizado"}
+        # Los trigramas de búsqueda cambian con el nombre, en la misma transacción
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            if campos is None or "nombre" in campos:
+                indexar_paciente(self)
     
     @property
     def edad(self):
@@ -75,6 +166,25 @@ class Paciente(models.Model):
                 name="uniq_paciente_nombre_por_dentista",
             )
         ]
+        indexes = [
+            models.Index(fields=["dentista", "nombre_normalizado"]),
+        ]
+
+
+class PacienteTrigrama(models.Model):
+    """Trigramas del nombre normalizado: búsqueda "contiene" sin recorrer pacientes (domain/busqueda.py)."""
+
+    dentista = models.ForeignKey(Dentista, on_delete=models.CASCADE, related_name='+')
+    paciente = models.ForeignKey(Paciente, on_delete=models.CASCADE, related_name='trigramas')
+    trigrama = models.CharField(max_length=3)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["paciente", "trigrama"], name="uniq_trigrama_paciente"),
+        ]
+        indexes = [
+            models.Index(fields=["dentista", "trigrama", "paciente"]),
+        ]
 
 # ============================================================
 # 4. HORARIOS DE TRABAJO
@@ -98,7 +208,7 @@ class Horario(models.Model):
 # ============================================================
 # 5. CITAS CLÍNICAS
 # ============================================================
-class Cita(models.Model):
+class Cita(ConCambios):
     ESTADOS = [
         ('PENDIENTE', 'Pendiente'),
         ('CONFIRMADA', 'Confirmada'),
@@ -134,12 +244,18 @@ class Cita(models.Model):
         indexes = [
             models.Index(fields=["dentista", "fecha", "hora_inicio"]),
             models.Index(fields=["paciente", "fecha"]),
+            # KPIs y próximas citas por estado; recordatorios; inasistencias por paciente
+            models.Index(fields=["dentista", "estado", "fecha"]),
+            models.Index(fields=["paciente", "estado"]),
+            models.Index(fields=["fecha", "estado", "recordatorio_24h_enviado"]),
+            # Sincronización incremental (domain/sincronizacion.py)
+            models.Index(fields=["paciente", "updated_at"]),
         ]
 
 # ============================================================
 # 6. PAGOS
 # ============================================================
-class Pago(models.Model):
+class Pago(ConCambios):
     METODOS = [
         ('EFECTIVO', 'Efectivo'),
         ('TRANSFERENCIA', 'Transferencia'),
@@ -153,6 +269,9 @@ class Pago(models.Model):
     ]
     
     cita = models.OneToOneField(Cita, on_delete=models.CASCADE, related_name='pago_relacionado')
+    # Copias de cita.dentista / cita.paciente (se llenan en save) para filtrar pagos sin el join
+    dentista = models.ForeignKey(Dentista, on_delete=models.CASCADE, null=True, blank=True, editable=False, related_name='pagos')
+    paciente = models.ForeignKey(Paciente, on_delete=models.CASCADE, null=True, blank=True, editable=False, related_name='pagos')
     monto = models.DecimalField(max_digits=10, decimal_places=2)
     metodo = models.CharField(max_length=20, choices=METODOS, default='EFECTIVO')
     estado = models.CharField(max_length=20, choices=ESTADOS_PAGO, default='PENDIENTE')
@@ -161,10 +280,50 @@ class Pago(models.Model):
     def __str__(self):
         return f"Pago ${self.monto} - {self.cita}"
 
+    def save(self, *args, **kwargs):
+        from domain.ingresos import CAMPOS_INGRESO, aplicar_cambio_ingresos
+
+        if self.cita_id and (self.dentista_id is None or self.paciente_id is None):
+            self.dentista_id = self.cita.dentista_id
+            self.paciente_id = self.cita.paciente_id
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "dentista", "paciente"}
+        # El rollup de ingresos se ajusta en la misma transacción que el pago
+        # (sin savepoint: dentro de una transacción mayor, un error la invalida completa)
+        with transaction.atomic(savepoint=False):
+            anterior = None
+            if not self._state.adding and self.pk:
+                anterior = Pago.objects.select_for_update().filter(pk=self.pk).values(*CAMPOS_INGRESO).first()
+            super().save(*args, **kwargs)
+            aplicar_cambio_ingresos(anterior, {campo: getattr(self, campo) for campo in CAMPOS_INGRESO})
+
     class Meta:
         indexes = [
             models.Index(fields=["estado", "created_at"]),
             models.Index(fields=["metodo", "estado"]),
+            models.Index(fields=["dentista", "estado", "created_at"]),
+            models.Index(fields=["paciente", "estado", "created_at"]),
+            # Listados paginados por cursor (domain/paginacion.py)
+            models.Index(fields=["dentista", "created_at"]),
+            models.Index(fields=["paciente", "updated_at"]),
+        ]
+
+class IngresoDiario(models.Model):
+    """Rollup de pagos por dentista, día, método y estado (ver domain/ingresos.py)."""
+
+    dentista = models.ForeignKey(Dentista, on_delete=models.CASCADE, related_name='ingresos_diarios')
+    fecha = models.DateField()
+    metodo = models.CharField(max_length=20, choices=Pago.METODOS)
+    estado = models.CharField(max_length=20, choices=Pago.ESTADOS_PAGO)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    cantidad = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.dentista} {self.fecha} {self.metodo}/{self.estado}: ${self.total}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["dentista", "fecha", "metodo", "estado"], name="uniq_ingreso_diario"),
         ]
 
 # ============================================================
@@ -181,7 +340,7 @@ class ComprobantePago(models.Model):
     def __str__(self):
         return f"Comprobante {self.folio}"
 
-class PenalizacionLog(models.Model):
+class PenalizacionLog(ConCambios):
     ACCIONES = [
         ("ADVERTENCIA", "Advertencia"),
         ("AUTO_PENALIZAR", "Penalización automática"),
@@ -197,6 +356,11 @@ class PenalizacionLog(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["paciente", "accion", "created_at"]),
+            models.Index(fields=["dentista", "created_at"]),
+            models.Index(fields=["paciente", "updated_at"]),
+        ]
 
     def __str__(self):
         return f"{self.get_accion_display()} - {self.paciente.nombre}"
@@ -216,13 +380,19 @@ class EncuestaSatisfaccion(models.Model):
     def __str__(self):
         return f"Encuesta {self.paciente} - {self.puntuacion}"
 
-class Notificacion(models.Model):
+class Notificacion(ConCambios):
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notificaciones')
     titulo = models.CharField(max_length=200)
     mensaje = models.TextField()
     leida = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
-    
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["usuario", "leida"]),
+            models.Index(fields=["usuario", "updated_at"]),
+        ]
+
     def __str__(self):
         return self.titulo
 
@@ -230,7 +400,12 @@ class AvisoDentista(models.Model):
     dentista = models.ForeignKey(Dentista, on_delete=models.CASCADE)
     mensaje = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
-    
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["dentista", "created_at"]),
+        ]
+
     def __str__(self):
         return f"Aviso para {self.dentista}"
 
@@ -298,5 +473,73 @@ class Diente(models.Model):
 
     def __str__(self):
         return f"{self.paciente} - Diente {self.numero}: {self.estado}"
+
+
+class OdontogramaVersion(models.Model):
+    """
+    Versión del odontograma de un paciente (domain/odontograma.py). Cada
+    guardado la incrementa dentro de la misma transacción que los dientes; el
+    cliente la manda de vuelta para detectar ediciones concurrentes.
+    """
+
+    paciente = models.OneToOneField(Paciente, on_delete=models.CASCADE, primary_key=True, related_name='version_odontograma')
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Odontograma de {self.paciente_id} (v{self.version})"
     
     
+
+
+# ============================================================
+# 11. BLOQUEO DE AGENDA (reservas concurrentes)
+# ============================================================
+class BloqueoAgenda(models.Model):
+    """
+    Fila-candado por (dentista, fecha). Las reservas toman SELECT ... FOR UPDATE
+    sobre ella antes de validar el hueco, así solo esperan entre sí las reservas
+    que compiten por el mismo día del mismo dentista.
+    """
+    dentista = models.ForeignKey(Dentista, on_delete=models.CASCADE)
+    fecha = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dentista", "fecha"],
+                name="uniq_bloqueo_agenda_dentista_fecha",
+            )
+        ]
+
+    def __str__(self):
+        return f"Bloqueo {self.dentista} {self.fecha}"
+
+
+# ============================================================
+# 12. RESERVA TEMPORAL (hueco retenido durante el checkout)
+# ============================================================
+class ReservaTemporal(models.Model):
+    """
+    Plazo de pago de una cita enviada al checkout en línea (MercadoPago).
+    La cita PENDIENTE ya ocupa el hueco; si expires_at pasa sin pago completado
+    domain/reservas.vencer_retenciones cancela la cita y borra la retención.
+    """
+    dentista = models.ForeignKey(Dentista, on_delete=models.CASCADE, related_name="reservas_temporales")
+    cita = models.ForeignKey(
+        Cita, on_delete=models.CASCADE, related_name="reservas_temporales", null=True, blank=True
+    )
+    paciente = models.ForeignKey(Paciente, on_delete=models.CASCADE, null=True, blank=True)
+    fecha = models.DateField()
+    hora_inicio = models.TimeField()
+    hora_fin = models.TimeField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["dentista", "fecha", "expires_at"]),
+        ]
+
+    def __str__(self):
+        return f"Retención {self.dentista} {self.fecha} {self.hora_inicio}-{self.hora_fin}"
@@ -7,6 +7,9 @@ from django.utils.html import strip_tags
 from django.core.signing import TimestampSigner
 from django.urls import reverse
 
+from proyecto_rc.metricas import incrementar
+from proyecto_rc.trazas import span, trazar
+
 from .models import AvisoDentista
 
 def _get_email_paciente(cita):
@@ -31,23 +34,32 @@ def _enviar_email(subject, text_body, html_body, destinatarios):
     """
     if not getattr(settings, "SEND_EMAILS", True):
         print("[EMAIL] SEND_EMAILS=False; correo omitido.")
+        incrementar("rc_emails_total", resultado="omitido")
         return
 
     remitente = getattr(settings, "DEFAULT_FROM_EMAIL", None) or getattr(settings, "EMAIL_HOST_USER", None)
     if not remitente:
         print("[EMAIL] Sin remitente configurado; correo omitido.")
+        incrementar("rc_emails_total", resultado="omitido")
         return
 
-    send_mail(
-        subject=subject,
-        message=text_body,
-        from_email=remitente,
-        recipient_list=destinatarios,
-        html_message=html_body,
-        fail_silently=False,
-    )
+    try:
+        with span("email.smtp", destinatarios=len(destinatarios)):
+            send_mail(
+                subject=subject,
+                message=text_body,
+                from_email=remitente,
+                recipient_list=destinatarios,
+                html_message=html_body,
+                fail_silently=False,
+            )
+    except Exception:
+        incrementar("rc_emails_total", resultado="error")
+        raise
+    incrementar("rc_emails_total", resultado="enviado")
 
 
+@trazar()
 def enviar_correo_confirmacion_cita(cita):
     """
     Se llama justo cuando se crea la cita.
@@ -78,6 +90,7 @@ def enviar_correo_confirmacion_cita(cita):
     _enviar_email(subject, text_body, html_body, [to_email])
 
 
+@trazar()
 def enviar_correo_recordatorio_cita(cita):
     """
     Se llama ~24 horas antes de la cita.
@@ -107,6 +120,30 @@ def enviar_correo_recordatorio_cita(cita):
 
     _enviar_email(subject, text_body, html_body, [to_email])
 
+@trazar()
+def enviar_correo_cancelacion_cita(cita, motivo=""):
+    """
+    Avisa al paciente que su cita se canceló sin que él la cancelara
+    (p. ej. venció el plazo del pago en línea).
+    """
+    to_email = _get_email_paciente(cita)
+    if not to_email:
+        return
+
+    contexto = {
+        "cita": cita,
+        "paciente": cita.paciente,
+        "dentista": cita.dentista,
+        "motivo": motivo,
+    }
+
+    subject = "Cita cancelada – Consultorio Dental Rodolfo Castellón"
+    text_body = render_to_string("emails/cita_cancelacion.txt", contexto)
+    html_body = render_to_string("emails/cita_cancelacion.html", contexto)
+
+    _enviar_email(subject, text_body, html_body, [to_email])
+
+@trazar()
 def enviar_correo_penalizacion(
     email_destino: str,
     nombre_paciente: str,
@@ -142,6 +179,7 @@ def enviar_correo_penalizacion(
     _enviar_email(subject, mensaje, None, [email_destino])
 
 
+@trazar()
 def enviar_correo_ticket_soporte(dentista, asunto: str, mensaje: str):
     """
     Envía un correo al buzón de soporte interno cuando se crea un ticket.
@@ -163,6 +201,7 @@ def enviar_correo_ticket_soporte(dentista, asunto: str, mensaje: str):
     _enviar_email(subject, text_body, html_body, [destino])
 
 
+@trazar()
 def registrar_aviso_dentista(dentista, mensaje: str):
     """
     Guarda un aviso para el panel del dentista. Se mantiene simple para evitar
@@ -183,3 +222,31 @@ def registrar_aviso_dentista(dentista, mensaje: str):
     except Exception as exc:
         print(f"[WARN] No se pudo registrar aviso: {exc}")
         return None
+
+
+@trazar()
+def crear_aviso_por_cita(cita, tipo, mensaje):
+    """
+    Crea un AvisoDentista asociado a una cita y a su dentista.
+    """
+    if cita is None or cita.dentista is None:
+        return None
+
+    def _fmt_fecha_hora(c):
+        fecha_txt = c.fecha.strftime("%d/%m") if getattr(c, "fecha", None) else ""
+        hora_txt = c.hora_inicio.strftime("%H:%M") if getattr(c, "hora_inicio", None) else ""
+        return f"{fecha_txt} {hora_txt}".strip()
+
+    tipo_map = {
+        "NUEVA_CITA": "Nueva cita agendada",
+        "REPROGRAMADA": "Cita reprogramada",
+        "CANCELADA": "Cita cancelada",
+        "PAGO": "Pago registrado",
+    }
+
+    encabezado = tipo_map.get(tipo, "Actualización de cita")
+    cuerpo = f"{cita.paciente.nombre} - {cita.servicio.nombre} ({_fmt_fecha_hora(cita)})"
+    extra = mensaje.strip() if mensaje else ""
+    texto = " • ".join([p for p in [encabezado, cuerpo, extra] if p])
+
+    return registrar_aviso_dentista(cita.dentista, texto)
@@ -0,0 +1,124 @@
+"""
+Guardado del odontograma por lotes.
+
+El cliente edita varios dientes en local y manda el diff completo de una vez:
+[{"diente": "12", "estado": "caries", "nota": "..."}, ...]. Estado "sano"
+borra el diente (el odontograma solo guarda hallazgos). aplicar_cambios lo
+aplica en una transacción con un bulk_create, un bulk_update y un delete
+por número, sin importar cuántos dientes traiga.
+
+OdontogramaVersion lleva un contador por paciente que sube en cada guardado.
+Si el cliente manda la versión con la que empezó a editar y ya no es la
+vigente, el lote se rechaza (OdontogramaDesactualizado) y el cliente recarga.
+"""
+
+from django.db import transaction
+
+from .models import Diente, OdontogramaVersion
+
+ESTADO_SANO = "sano"
+# Nombres del odontograma anterior (OdontogramaEntrada) que el SVG aún manda
+ALIAS_ESTADOS = {
+    "ortodoncia": "bracket",
+    "restauracion": "caries",
+    "observacion": "corona",
+}
+MAXIMO_DIENTES = 64
+_LARGO_NUMERO = Diente._meta.get_field("numero").max_length
+_LARGO_ESTADO = Diente._meta.get_field("estado").max_length
+
+
+class CambioInvalido(ValueError):
+    pass
+
+
+class OdontogramaDesactualizado(Exception):
+    def __init__(self, version):
+        super().__init__(f"El odontograma cambió (versión {version}).")
+        self.version = version
+
+
+def normalizar_estado(estado):
+    estado = (estado or "").strip().lower()
+    return ALIAS_ESTADOS.get(estado, estado)
+
+
+def validar_cambios(cambios):
+    """
+    Convierte el diff recibido en {numero: (estado, nota)}. Si un diente se
+    repite gana el último, como si se hubieran mandado uno tras otro.
+    """
+    if not isinstance(cambios, list):
+        raise CambioInvalido("'cambios' debe ser una lista.")
+    if len(cambios) > MAXIMO_DIENTES:
+        raise CambioInvalido(f"Máximo {MAXIMO_DIENTES} dientes por lote.")
+
+    limpios = {}
+    for cambio in cambios:
+        if not isinstance(cambio, dict):
+            raise CambioInvalido("Cada cambio debe ser un objeto.")
+        numero = str(cambio.get("diente") or cambio.get("tooth") or "").strip()
+        estado = normalizar_estado(cambio.get("estado") or cambio.get("status"))
+        nota = cambio.get("nota") or ""
+        if not numero or len(numero) > _LARGO_NUMERO:
+            raise CambioInvalido("Número de diente inválido.")
+        if not estado or len(estado) > _LARGO_ESTADO:
+            raise CambioInvalido(f"Estado inválido para el diente {numero}.")
+        if not isinstance(nota, str):
+            raise CambioInvalido(f"Nota inválida para el diente {numero}.")
+        limpios[numero] = (estado, nota.strip())
+    return limpios
+
+
+def version_odontograma(paciente_id):
+    """(versión, fecha del último guardado) sin bloquear; (0, None) si nunca se guardó."""
+    return (
+        OdontogramaVersion.objects.filter(paciente_id=paciente_id)
+        .values_list("version", "updated_at")
+        .first()
+    ) or (0, None)
+
+
+def aplicar_cambios(paciente, cambios, version_base=None):
+    """
+    Aplica el diff validado en una transacción y devuelve
+    (version_nueva, {"creados": n, "actualizados": n, "borrados": n}).
+
+    La fila de OdontogramaVersion se toma con SELECT ... FOR UPDATE: dos lotes
+    del mismo paciente se aplican uno detrás de otro y la comprobación de
+    version_base no compite con otro guardado.
+    """
+    limpios = validar_cambios(cambios)
+    with transaction.atomic():
+        registro, _ = OdontogramaVersion.objects.select_for_update().get_or_create(paciente=paciente)
+        if version_base is not None and int(version_base) != registro.version:
+            raise OdontogramaDesactualizado(registro.version)
+
+        existentes = {
+            d.numero: d
+            for d in Diente.objects.filter(paciente=paciente, numero__in=limpios.keys())
+        }
+        nuevos, modificados, borrar = [], [], []
+        for numero, (estado, nota) in limpios.items():
+            diente = existentes.get(numero)
+            if estado == ESTADO_SANO:
+                if diente:
+                    borrar.append(numero)
+            elif diente is None:
+                nuevos.append(Diente(paciente=paciente, numero=numero, estado=estado, nota=nota))
+            elif (diente.estado, diente.nota or "") != (estado, nota):
+                diente.estado, diente.nota = estado, nota
+                modificados.append(diente)
+
+        if borrar:
+            Diente.objects.filter(paciente=paciente, numero__in=borrar).delete()
+        if nuevos:
+            Diente.objects.bulk_create(nuevos)
+        if modificados:
+            Diente.objects.bulk_update(modificados, ["estado", "nota"])
+
+        resumen = {"creados": len(nuevos), "actualizados": len(modificados), "borrados": len(borrar)}
+        if nuevos or modificados or borrar:
+            registro.version += 1
+            registro.save(update_fields=["version", "updated_at"])
+    return registro.version, resumen
@@ -0,0 +1,142 @@
+"""
+Paginación por cursor (keyset) para listados que crecen con el historial.
+
+En vez de OFFSET, cada página filtra "después de la última fila vista" sobre
+un orden total (p. ej. -created_at, -id): la página N cuesta lo mismo que la
+primera porque la base entra por el índice justo donde se quedó.
+
+El cursor es opaco: los valores de orden de la última fila, firmados con
+django.core.signing (no se pueden fabricar ni modificar a mano). Los campos
+del orden deben ser no nulos y terminar en uno único (id).
+"""
+
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.core import signing
+from django.db.models import Q
+
+TAMANO_PAGINA = 25
+TAMANO_MAXIMO = 100
+PARAMETRO = "cursor"
+
+_SALT = "domain.paginacion"
+
+
+class CursorInvalido(ValueError):
+    """Cursor alterado, de otro listado o con otro orden."""
+
+
+class Pagina:
+    def __init__(self, items, siguiente):
+        self.items = items
+        # Cursor de la página siguiente (None si es la última)
+        self.siguiente = siguiente
+        self.url_siguiente = None
+        self.url_primera = None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+
+# ---------------------------------------------------------
+# Cursor
+# ---------------------------------------------------------
+def _a_texto(valor):
+    # isoformat conserva los microsegundos (DjangoJSONEncoder los recorta)
+    if isinstance(valor, (date, datetime, time)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+def _campos(orden):
+    return [campo.lstrip("-") for campo in orden]
+
+
+def codificar_cursor(valores, orden):
+    return signing.dumps({"o": list(orden), "v": [_a_texto(v) for v in valores]}, salt=_SALT, compress=True)
+
+
+def decodificar_cursor(cursor, orden):
+    try:
+        datos = signing.loads(cursor, salt=_SALT)
+    except signing.BadSignature:
+        raise CursorInvalido("Cursor inválido.")
+    if datos.get("o") != list(orden) or len(datos.get("v", [])) != len(orden):
+        raise CursorInvalido("El cursor no corresponde a este listado.")
+    return datos["v"]
+
+
+def _despues_de(orden, valores):
+    """(a > x) OR (a = x AND b > y) OR ... con < en los campos descendentes."""
+    condicion = Q()
+    iguales = {}
+    for campo, valor in zip(orden, valores):
+        nombre = campo.lstrip("-")
+        operador = "lt" if campo.startswith("-") else "gt"
+        condicion |= Q(**iguales, **{f"{nombre}__{operador}": valor})
+        iguales[nombre] = valor
+    return condicion
+
+
+def _valores_de(item, orden):
+    if isinstance(item, dict):
+        return [item[campo] for campo in _campos(orden)]
+    return [getattr(item, campo) for campo in _campos(orden)]
+
+
+# ---------------------------------------------------------
+# API
+# ---------------------------------------------------------
+def consulta_pagina(queryset, orden, cursor=None, tamano=TAMANO_PAGINA):
+    """Queryset (sin ejecutar) de tamano+1 filas después de `cursor`; sirve para EXPLAIN."""
+    qs = queryset.order_by(*orden)
+    if cursor:
+        qs = qs.filter(_despues_de(orden, decodificar_cursor(cursor, orden)))
+    return qs[:tamano + 1]
+
+
+def paginar(queryset, orden, cursor=None, tamano=TAMANO_PAGINA):
+    """
+    Página de `queryset` ordenada por `orden` (tupla de campos, "-" = descendente)
+    que empieza después de `cursor`. Una sola consulta: pide tamano+1 filas para
+    saber si hay siguiente. Lanza CursorInvalido si el cursor no es válido.
+    """
+    orden = tuple(orden)
+    tamano = max(1, min(int(tamano), TAMANO_MAXIMO))
+    filas = list(consulta_pagina(queryset, orden, cursor, tamano))
+    siguiente = None
+    if len(filas) > tamano:
+        filas = filas[:tamano]
+        siguiente = codificar_cursor(_valores_de(filas[-1], orden), orden)
+    return Pagina(filas, siguiente)
+
+
+def paginar_request(request, queryset, orden, parametro=PARAMETRO, tamano=TAMANO_PAGINA):
+    """
+    Para vistas HTML: lee el cursor de request.GET[parametro] (uno inválido
+    vuelve a la primera página) y arma url_siguiente conservando el resto de
+    parámetros (filtros, otros cursores); url_primera solo si no es la primera.
+    """
+    cursor = request.GET.get(parametro)
+    try:
+        pagina = paginar(queryset, orden, cursor, tamano)
+    except CursorInvalido:
+        cursor = None
+        pagina = paginar(queryset, orden, None, tamano)
+    params = request.GET.copy()
+    if pagina.siguiente:
+        params[parametro] = pagina.siguiente
+        pagina.url_siguiente = f"?{params.urlencode()}"
+    if cursor:
+        params.pop(parametro, None)
+        pagina.url_primera = f"?{params.urlencode()}"
+    return pagina
@@ -0,0 +1,292 @@
+# domain/reservas.py
+"""
+Servicio de reservas de citas sin condiciones de carrera.
+
+Todas las altas y reprogramaciones pasan por aquí: dentro de una transacción
+se bloquea la fila BloqueoAgenda del (dentista, fecha) con SELECT ... FOR UPDATE,
+se vuelve a validar el hueco y solo entonces se escribe la cita. Dos pacientes
+que piden el mismo día del mismo dentista se serializan; el resto no se espera.
+
+Las citas que se mandan al checkout de MercadoPago (iniciar_pago, o
+api_crear_cita con "checkout": true) llevan una ReservaTemporal con plazo de
+RESERVA_TEMPORAL_MINUTOS para pagar. La cita PENDIENTE ya ocupa el hueco; la
+retención solo marca hasta cuándo: si vence sin pago completado la cita se
+cancela (con aviso al dentista y correo al paciente) y el hueco vuelve a la
+agenda. Una cita que nunca fue al checkout no tiene retención y no vence.
+Vencen de forma perezosa (al reservar o reprogramar ese día del dentista) y
+con el comando limpiar_reservas_temporales. El pago aprobado o la
+cancelación las quitan.
+"""
+
+import threading
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from domain.ai_services import duracion_servicio, obtener_slots_disponibles
+from domain.models import BloqueoAgenda, Cita, Pago, ReservaTemporal
+from domain.notifications import crear_aviso_por_cita, enviar_correo_cancelacion_cita
+from domain.versiones import invalidar_datos_dentista
+from proyecto_rc.trazas import span, trazar
+
+# Estados que ocupan la agenda (mismos que usa obtener_slots_disponibles)
+ESTADOS_OCUPADOS = ["PENDIENTE", "CONFIRMADA"]
+
+# SQLite ignora FOR UPDATE; en ese caso (tests/dev) cada (dentista, fecha) tiene
+# un candado local del proceso. Las entradas se quitan cuando nadie las usa.
+# La BD en memoria de los tests es una sola conexión compartida por todos los
+# hilos: ahí no caben dos transacciones a la vez y el candado es uno solo.
+_candados_locales = {}
+_candados_mutex = threading.Lock()
+
+
+class HorarioNoDisponible(Exception):
+    """El hueco solicitado ya está ocupado o no cabe en la jornada."""
+
+
+@contextmanager
+def candado_local(dentista_id, fecha):
+    """Candado en proceso solo para ese (dentista, fecha): otras agendas no esperan."""
+    clave = (dentista_id, fecha)
+    with _candados_mutex:
+        entrada = _candados_locales.setdefault(clave, [threading.Lock(), 0])
+        entrada[1] += 1
+    entrada[0].acquire()
+    try:
+        yield
+    finally:
+        entrada[0].release()
+        with _candados_mutex:
+            entrada[1] -= 1
+            if not entrada[1]:
+                _candados_locales.pop(clave, None)
+
+
+@contextmanager
+def bloquear_agenda(dentista, fecha):
+    """
+    Abre una transacción y toma el candado de la agenda del dentista para esa fecha.
+    """
+    usa_for_update = connection.features.has_select_for_update
+    dentista_id = getattr(dentista, "id", dentista)
+    with ExitStack() as stack:
+        # El span mide la espera por el candado: ahí se ve la contención de la hora pico
+        with span("agenda.bloqueo", dentista_id=dentista_id, fecha=str(fecha)):
+            # is_in_memory_db solo existe en el backend de SQLite
+            en_memoria = not usa_for_update and connection.is_in_memory_db()
+            if not usa_for_update:
+                clave = (None, None) if en_memoria else (dentista_id, fecha)
+                stack.enter_context(candado_local(*clave))
+            stack.enter_context(transaction.atomic())
+            if not usa_for_update and not en_memoria:
+                # SQLite: una escritura como primera sentencia toma el candado de escritura de la BD
+                # esperando su turno; leer primero y escribir después choca con otro escritor
+                # ("database is locked") en lugar de esperar.
+                BloqueoAgenda.objects.filter(dentista=dentista, fecha=fecha).update(fecha=fecha)
+            BloqueoAgenda.objects.get_or_create(dentista=dentista, fecha=fecha)
+            BloqueoAgenda.objects.select_for_update().get(dentista=dentista, fecha=fecha)
+        yield
+
+
+def calcular_hora_fin(fecha, hora_inicio, servicio):
+    return (datetime.combine(fecha, hora_inicio) + timedelta(minutes=duracion_servicio(servicio))).time()
+
+
+def hay_traslape(dentista, fecha, hora_inicio, hora_fin, excluir_cita_id=None):
+    """True si alguna cita activa del dentista se empalma con [hora_inicio, hora_fin)."""
+    qs = Cita.objects.filter(
+        dentista=dentista,
+        fecha=fecha,
+        estado__in=ESTADOS_OCUPADOS,
+        hora_inicio__lt=hora_fin,
+        hora_fin__gt=hora_inicio,
+    )
+    if excluir_cita_id:
+        qs = qs.exclude(id=excluir_cita_id)
+    return qs.exists()
+
+
+def _validar_hueco(dentista, fecha, hora_inicio, hora_fin, servicio, validar_slot, excluir_cita_id=None):
+    if validar_slot:
+        libres = obtener_slots_disponibles(
+            dentista,
+            fecha,
+            servicio,
+            minutos_bloque=15,
+            excluir_cita_id=excluir_cita_id,
+        )
+        if hora_inicio.strftime("%H:%M") not in libres:
+            raise HorarioNoDisponible("Ese horario ya no está disponible.")
+    elif hay_traslape(dentista, fecha, hora_inicio, hora_fin, excluir_cita_id):
+        raise HorarioNoDisponible("Ese horario se empalma con otra cita.")
+
+
+@trazar()
+def reservar_cita(
+    dentista,
+    paciente,
+    servicio,
+    fecha,
+    hora_inicio,
+    estado="PENDIENTE",
+    validar_slot=True,
+    pago_defaults=None,
+    retener=False,
+):
+    """
+    Crea la cita (y opcionalmente su Pago) solo si el hueco sigue libre.
+
+    - validar_slot=True: exige que la hora sea un slot del motor de disponibilidad
+      (paciente / app móvil).
+    - validar_slot=False: solo impide empalmes (agenda manual del dentista).
+    - retener=True: la cita va directo al checkout en línea; si no se paga en
+      RESERVA_TEMPORAL_MINUTOS se cancela (vencer_retenciones).
+    Lanza HorarioNoDisponible si otra reserva ganó el hueco.
+    """
+    hora_fin = calcular_hora_fin(fecha, hora_inicio, servicio)
+    with bloquear_agenda(dentista, fecha):
+        vencer_retenciones(dentista_id=dentista.id, fecha=fecha)
+        _validar_hueco(dentista, fecha, hora_inicio, hora_fin, servicio, validar_slot)
+        cita = Cita.objects.create(
+            dentista=dentista,
+            paciente=paciente,
+            servicio=servicio,
+            fecha=fecha,
+            hora_inicio=hora_inicio,
+            hora_fin=hora_fin,
+            estado=estado,
+        )
+        if pago_defaults:
+            # La cita acaba de crearse: no puede tener pago previo (sin get_or_create)
+            with span("pago.crear", cita_id=cita.id):
+                Pago.objects.create(cita=cita, **pago_defaults)
+        if retener:
+            _guardar_retencion(cita)
+    return cita
+
+
+@trazar()
+def reprogramar_cita(cita, fecha, hora_inicio, extra_update_fields=None):
+    """
+    Mueve la cita a otra fecha/hora bajo el candado de la agenda destino.
+    La propia cita no cuenta como ocupada, así se puede desplazar sobre su hueco.
+    """
+    hora_fin = calcular_hora_fin(fecha, hora_inicio, cita.servicio)
+    with bloquear_agenda(cita.dentista, fecha):
+        vencer_retenciones(dentista_id=cita.dentista_id, fecha=fecha)
+        _validar_hueco(
+            cita.dentista,
+            fecha,
+            hora_inicio,
+            hora_fin,
+            cita.servicio,
+            validar_slot=True,
+            excluir_cita_id=cita.id,
+        )
+        cita.fecha = fecha
+        cita.hora_inicio = hora_inicio
+        cita.hora_fin = hora_fin
+        cita.estado = "PENDIENTE"
+        cita.veces_reprogramada = (cita.veces_reprogramada or 0) + 1
+        campos = ["fecha", "hora_inicio", "hora_fin", "estado", "veces_reprogramada"]
+        campos += list(extra_update_fields or [])
+        cita.save(update_fields=campos)
+        # Reprogramada por el paciente: ya no es un checkout abandonado, sin plazo de pago
+        ReservaTemporal.objects.filter(cita=cita).delete()
+    return cita
+
+
+# ---------------------------------------------------------
+# Retenciones temporales (checkout MercadoPago)
+# ---------------------------------------------------------
+def _plazo(minutos=None):
+    minutos = minutos or int(getattr(settings, "RESERVA_TEMPORAL_MINUTOS", 15))
+    return timezone.now() + timedelta(minutes=minutos)
+
+
+def _guardar_retencion(cita, minutos=None):
+    # Sin update_or_create: reservar_cita crea la cita en la misma transacción y
+    # retener_hueco ya intentó renovar bajo el candado de la agenda
+    return ReservaTemporal.objects.create(
+        cita=cita,
+        dentista=cita.dentista,
+        paciente=cita.paciente,
+        fecha=cita.fecha,
+        hora_inicio=cita.hora_inicio,
+        hora_fin=cita.hora_fin,
+        expires_at=_plazo(minutos),
+    )
+
+
+@trazar()
+def retener_hueco(cita, minutos=None):
+    """
+    Abre o renueva el plazo de pago de la cita al mandarla al checkout
+    (iniciar_pago). Desde aquí, si el plazo vence sin pago, la cita se cancela.
+    """
+    with bloquear_agenda(cita.dentista, cita.fecha):
+        if not ReservaTemporal.objects.filter(cita=cita).update(expires_at=_plazo(minutos)):
+            _guardar_retencion(cita, minutos)
+
+
+def liberar_retencion(cita):
+    """Quita las retenciones de la cita (pago aprobado o cita cancelada)."""
+    ReservaTemporal.objects.filter(cita=cita).delete()
+
+
+MOTIVO_VENCIDA = "No se completó el pago en línea a tiempo; el horario se liberó."
+
+
+def vencer_retenciones(**filtros):
+    """
+    Cancela las citas PENDIENTE sin pago completado cuya retención venció y
+    borra esas retenciones (filtros opcionales: dentista_id, fecha).
+    Devuelve (retenciones borradas, citas canceladas).
+
+    Cada cancelación es un UPDATE condicionado al estado del pago: si el
+    webhook lo aprueba al mismo tiempo, la cita no se cancela. Las canceladas
+    se avisan como cualquier otra (aviso al dentista y correo al paciente) al
+    confirmar la transacción.
+    """
+    vencidas = list(
+        ReservaTemporal.objects.filter(expires_at__lte=timezone.now(), **filtros).values_list("id", "cita_id")
+    )
+    if not vencidas:
+        return 0, 0
+    cita_ids = [cita_id for _, cita_id in vencidas if cita_id]
+    pendientes = (
+        Cita.objects.filter(id__in=cita_ids, estado="PENDIENTE")
+        .exclude(pago_relacionado__estado="COMPLETADO")
+    )
+    canceladas = []
+    for cita in pendientes.select_related("paciente__user", "servicio", "dentista"):
+        if pendientes.filter(id=cita.id).update(estado="CANCELADA", updated_at=timezone.now()):
+            cita.estado = "CANCELADA"
+            canceladas.append(cita)
+    ReservaTemporal.objects.filter(id__in=[id_ for id_, _ in vencidas]).delete()
+    # QuerySet.update no dispara señales: paneles y slots se invalidan a mano
+    for dentista_id in {cita.dentista_id for cita in canceladas}:
+        invalidar_datos_dentista(dentista_id)
+    if canceladas:
+        transaction.on_commit(lambda: _avisar_canceladas(canceladas))
+    return len(vencidas), len(canceladas)
+
+
+def _avisar_canceladas(citas):
+    for cita in citas:
+        try:
+            crear_aviso_por_cita(cita, "CANCELADA", MOTIVO_VENCIDA)
+        except Exception as exc:
+            print(f"[WARN] No se pudo crear aviso de cancelación: {exc}")
+        try:
+            enviar_correo_cancelacion_cita(cita, motivo=MOTIVO_VENCIDA)
+        except Exception as exc:
+            print(f"[WARN] No se pudo enviar correo de cancelación: {exc}")
+
+
+def limpiar_retenciones_vencidas():
+    """Vence todas las retenciones (comando limpiar_reservas_temporales)."""
+    return vencer_retenciones()
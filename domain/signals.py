@@ -0,0 +1,66 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from domain.horarios import invalidar_horarios
+from domain.ingresos import CAMPOS_INGRESO, aplicar_cambio_ingresos
+from domain.models import AvisoDentista, Cita, Dentista, Horario, Notificacion, Paciente, Pago, PenalizacionLog, Servicio
+from domain.sincronizacion import registrar_borrado
+from domain.versiones import invalidar_catalogo, invalidar_datos_dentista
+
+
+@receiver(post_save, sender=Horario)
+@receiver(post_delete, sender=Horario)
+def invalidar_cache_horarios(sender, instance, **kwargs):
+    """Cualquier alta/cambio/baja de turnos invalida la caché de horarios del dentista."""
+    invalidar_horarios(instance.dentista_id)
+
+
+@receiver(post_save, sender=Dentista)
+@receiver(post_delete, sender=Dentista)
+def invalidar_cache_horarios_dentista(sender, instance, created=False, **kwargs):
+    """
+    Un dentista nuevo o borrado no debe heredar turnos ni paneles cacheados de un id reutilizado
+    (p. ej. tras un rollback, donde las bajas no disparan señales). Sus datos cambian con cualquier edición.
+    """
+    if created or kwargs.get("signal") is post_delete:
+        invalidar_horarios(instance.id)
+    # El nombre del dentista va en las respuestas de citas y en el catálogo de servicios
+    invalidar_datos_dentista(instance.id)
+    invalidar_catalogo()
+
+
+@receiver(post_delete, sender=Pago)
+def restar_pago_de_ingresos(sender, instance, **kwargs):
+    """Las altas y cambios los aplica Pago.save; aquí solo las bajas (incluidas las cascadas)."""
+    aplicar_cambio_ingresos({campo: getattr(instance, campo) for campo in CAMPOS_INGRESO}, None)
+
+
+@receiver(post_save, sender=Cita)
+@receiver(post_delete, sender=Cita)
+@receiver(post_save, sender=Pago)
+@receiver(post_delete, sender=Pago)
+@receiver(post_save, sender=Paciente)
+@receiver(post_delete, sender=Paciente)
+@receiver(post_save, sender=AvisoDentista)
+@receiver(post_delete, sender=AvisoDentista)
+@receiver(post_save, sender=Servicio)
+@receiver(post_delete, sender=Servicio)
+def invalidar_paneles_dentista(sender, instance, **kwargs):
+    """Cualquier cambio en los datos del dentista invalida sus paneles cacheados (dentista/paneles.py)."""
+    invalidar_datos_dentista(instance.dentista_id)
+
+
+@receiver(post_save, sender=Servicio)
+@receiver(post_delete, sender=Servicio)
+def invalidar_catalogo_servicios(sender, instance, **kwargs):
+    """Catálogo en caché (domain/catalogo.py): una versión global para todos los dentistas."""
+    invalidar_catalogo()
+
+
+@receiver(post_delete, sender=Cita)
+@receiver(post_delete, sender=Pago)
+@receiver(post_delete, sender=PenalizacionLog)
+@receiver(post_delete, sender=Notificacion)
+def registrar_borrado_sincronizado(sender, instance, **kwargs):
+    """Lápida para que la app móvil quite la fila de su copia (domain/sincronizacion.py)."""
+    registrar_borrado(instance)
@@ -0,0 +1,194 @@
+"""
+Sincronización incremental de la app móvil (GET /api/sync/?since=<token>).
+
+Cada flujo (citas, pagos, penalizaciones, notificaciones y las lápidas de
+RegistroBorrado) se lee por su índice (dueño, updated_at) a partir de una
+marca (updated_at, id): solo viaja lo que cambió desde la última vez.
+
+El token es opaco y firmado (django.core.signing, como los cursores de
+domain/paginacion.py). Lleva la marca de cada flujo y el paciente al que
+pertenece. Sin token se manda todo y "reinicio" indica que la app debe
+reemplazar su copia local; lo mismo si el token es más viejo que la
+retención de las lápidas (ya no se puede saber qué se borró).
+
+Un flujo al día deja su marca en ahora - MARGEN, no en la última fila: una
+transacción que confirme tarde con un updated_at anterior se ve en la
+siguiente sincronización. Esas filas pueden llegar dos veces; la app hace
+upsert por id. Si un flujo tiene más de `limite` cambios se corta ahí,
+"mas" es true y la app vuelve a pedir con el token nuevo.
+"""
+
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Cita, Notificacion, Pago, PenalizacionLog, RegistroBorrado
+
+LIMITE = 200
+MARGEN = timedelta(seconds=60)
+
+_SALT = "domain.sincronizacion"
+
+
+class TokenInvalido(ValueError):
+    """Token alterado o de otro paciente."""
+
+
+def retencion_borrados():
+    return timedelta(days=int(getattr(settings, "SYNC_RETENCION_BORRADOS_DIAS", 30)))
+
+
+# nombre -> (modelo, campo de orden, dueño(paciente_id, usuario_id) -> Q)
+FLUJOS = {
+    "citas": (Cita, "updated_at", lambda p, u: Q(paciente_id=p)),
+    "pagos": (Pago, "updated_at", lambda p, u: Q(paciente_id=p)),
+    "penalizaciones": (PenalizacionLog, "updated_at", lambda p, u: Q(paciente_id=p)),
+    "notificaciones": (Notificacion, "updated_at", lambda p, u: Q(usuario_id=u)),
+    # Lápidas: un flujo por dueño para que cada uno siga su índice (un OR obliga a ordenar)
+    "borrados_paciente": (RegistroBorrado, "borrado_en", lambda p, u: Q(paciente_id=p)),
+    "borrados_usuario": (RegistroBorrado, "borrado_en", lambda p, u: Q(usuario_id=u)),
+}
+BORRADOS = ("borrados_paciente", "borrados_usuario")
+
+# Modelo sincronizado -> nombre del flujo (RegistroBorrado.modelo)
+FLUJO_DE_MODELO = {modelo: nombre for nombre, (modelo, _, _) in FLUJOS.items() if nombre not in BORRADOS}
+
+
+# ---------------------------------------------------------
+# Token
+# ---------------------------------------------------------
+def codificar_token(paciente_id, marcas):
+    datos = {"p": paciente_id, "m": {nombre: [t.isoformat(), i] for nombre, (t, i) in marcas.items()}}
+    return signing.dumps(datos, salt=_SALT, compress=True)
+
+
+def decodificar_token(token, paciente_id):
+    try:
+        datos = signing.loads(token, salt=_SALT)
+    except signing.BadSignature:
+        raise TokenInvalido("Token de sincronización inválido.")
+    if datos.get("p") != paciente_id:
+        raise TokenInvalido("El token no corresponde a este paciente.")
+    return {nombre: (datetime.fromisoformat(t), int(i)) for nombre, (t, i) in datos["m"].items()}
+
+
+# ---------------------------------------------------------
+# Consultas
+# ---------------------------------------------------------
+def consulta_flujo(nombre, paciente_id, usuario_id, marca=None, limite=LIMITE):
+    """Queryset (sin ejecutar) de hasta limite+1 cambios del flujo después de `marca`."""
+    modelo, campo, dueno = FLUJOS[nombre]
+    qs = modelo.objects.filter(dueno(paciente_id, usuario_id))
+    if marca:
+        t, ultimo_id = marca
+        qs = qs.filter(Q(**{f"{campo}__gt": t}) | Q(**{campo: t, "id__gt": ultimo_id}))
+    if modelo is Cita:
+        qs = qs.select_related("servicio", "dentista")
+    return qs.order_by(campo, "id")[:limite + 1]
+
+
+def cambios_paciente(paciente, usuario, token=None, limite=LIMITE):
+    """
+    {"flujos": {nombre: [instancias]}, "borrados": {flujo: [ids]}, "reinicio",
+    "mas", "token"}. Lanza TokenInvalido si el token no es válido.
+    """
+    ahora = timezone.now()
+    corte = ahora - MARGEN
+    marcas = decodificar_token(token, paciente.id) if token else None
+    if marcas and min(marcas.get(nombre, (ahora, 0))[0] for nombre in BORRADOS) < ahora - retencion_borrados():
+        marcas = None
+    reinicio = marcas is None
+    marcas = marcas or {}
+
+    flujos, nuevas, mas = {}, {}, False
+    for nombre, (_, campo, _) in FLUJOS.items():
+        # En un reinicio la app reemplaza todo: las lápidas anteriores no hacen falta
+        if reinicio and nombre in BORRADOS:
+            flujos[nombre], nuevas[nombre] = [], (corte, 0)
+            continue
+        filas = list(consulta_flujo(nombre, paciente.id, usuario.id, marcas.get(nombre), limite))
+        if len(filas) > limite:
+            filas = filas[:limite]
+            nuevas[nombre] = (getattr(filas[-1], campo), filas[-1].id)
+            mas = True
+        else:
+            nuevas[nombre] = (corte, 0)
+        flujos[nombre] = filas
+
+    borrados = {}
+    for nombre in BORRADOS:
+        for registro in flujos.pop(nombre):
+            borrados.setdefault(registro.modelo, []).append(registro.objeto_id)
+    return {
+        "flujos": flujos,
+        "borrados": borrados,
+        "reinicio": reinicio,
+        "mas": mas,
+        "token": codificar_token(paciente.id, nuevas),
+    }
+
+
+# ---------------------------------------------------------
+# Lápidas
+# ---------------------------------------------------------
+# Lápidas pendientes del borrado en curso (None: se insertan una por una)
+_pendientes = contextvars.ContextVar("lapidas_pendientes", default=None)
+_suspendido = contextvars.ContextVar("lapidas_suspendido", default=False)
+
+
+@contextmanager
+def lapidas_en_lote():
+    """
+    Junta las lápidas de un borrado (con toda su cascada) y las inserta con un
+    bulk_create al terminar, en la misma transacción que el borrado. Lo usan
+    los delete() de BorradoEnLote; anidado no hace nada.
+    """
+    if _pendientes.get() is not None:
+        yield
+        return
+    pendientes = []
+    with transaction.atomic(savepoint=False):
+        token = _pendientes.set(pendientes)
+        try:
+            yield
+        finally:
+            _pendientes.reset(token)
+        RegistroBorrado.objects.bulk_create(pendientes, batch_size=500)
+
+
+@contextmanager
+def sin_lapidas():
+    """Desactiva las lápidas (purgas de datos que ninguna app tiene, p. ej. los sintéticos)."""
+    token = _suspendido.set(True)
+    try:
+        yield
+    finally:
+        _suspendido.reset(token)
+
+
+def registrar_borrado(instancia):
+    if _suspendido.get():
+        return
+    lapida = RegistroBorrado(
+        modelo=FLUJO_DE_MODELO[type(instancia)],
+        objeto_id=instancia.pk,
+        paciente_id=getattr(instancia, "paciente_id", None),
+        usuario_id=getattr(instancia, "usuario_id", None),
+    )
+    pendientes = _pendientes.get()
+    if pendientes is None:
+        lapida.save()
+    else:
+        pendientes.append(lapida)
+
+
+def purgar_borrados():
+    """Borra las lápidas más viejas que la retención; los tokens anteriores reinician."""
+    eliminadas, _ = RegistroBorrado.objects.filter(borrado_en__lt=timezone.now() - retencion_borrados()).delete()
+    return eliminadas
@@ -0,0 +1,453 @@
+# domain/sinteticos.py
+"""
+Generador de datos sintéticos de consultorio (manage.py generar_datos_sinteticos).
+
+Sirve para reproducir localmente el rendimiento con volumen realista:
+dentistas con su horario semanal y catálogo, pacientes (algunos con cuenta),
+citas que llenan la agenda con mezcla de estados (completadas, canceladas,
+inasistencias, reprogramadas y futuras), pagos, penalizaciones, encuestas y
+odontograma.
+
+Todo se inserta con bulk_create por lotes, en una transacción por dentista.
+Con la misma semilla y la misma fecha final el resultado es idéntico.
+Los usuarios generados llevan PREFIJO_USUARIO para poder borrarlos después.
+"""
+
+import random
+import time as time_mod
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from domain.busqueda import filas_trigramas, normalizar
+from domain.horarios import invalidar_horarios
+from domain.ingresos import reconstruir_ingresos, sin_rollup
+from domain.models import (
+    Cita,
+    Dentista,
+    Diente,
+    EncuestaSatisfaccion,
+    Horario,
+    IngresoDiario,
+    Paciente,
+    PacienteTrigrama,
+    Pago,
+    PenalizacionLog,
+    Servicio,
+)
+from domain.sincronizacion import sin_lapidas
+
+PREFIJO_USUARIO = "sintetico."
+
+# Las citas futuras llegan hasta el mismo límite que permite la agenda
+DIAS_FUTUROS = 60
+
+NOMBRES = [
+    "María", "José", "Guadalupe", "Juan", "Fernanda", "Luis", "Ana", "Carlos", "Sofía", "Miguel",
+    "Valeria", "Jorge", "Daniela", "Ricardo", "Camila", "Alejandro", "Regina", "Diego", "Lucía", "Andrés",
+    "Paola", "Fernando", "Ximena", "Roberto", "Renata", "Eduardo", "Mariana", "Sergio", "Natalia", "Héctor",
+]
+APELLIDOS = [
+    "Hernández", "García", "Martínez", "López", "González", "Pérez", "Rodríguez", "Sánchez", "Ramírez", "Cruz",
+    "Flores", "Gómez", "Morales", "Vázquez", "Reyes", "Jiménez", "Torres", "Díaz", "Gutiérrez", "Ruiz",
+    "Mendoza", "Aguilar", "Ortiz", "Castillo", "Moreno", "Romero", "Álvarez", "Chávez", "Rivera", "Juárez",
+]
+
+# (nombre, precio, duración en minutos)
+SERVICIOS = [
+    ("Consulta de valoración", 400, 30),
+    ("Limpieza dental", 600, 30),
+    ("Ajuste de ortodoncia", 800, 30),
+    ("Resina", 900, 45),
+    ("Extracción", 1200, 60),
+    ("Blanqueamiento", 2500, 60),
+    ("Endodoncia", 3500, 90),
+    ("Corona", 4500, 60),
+]
+
+# Plantillas de turnos de lunes a viernes; el sábado es opcional
+TURNOS_SEMANA = [
+    [(time(9, 0), time(14, 0)), (time(16, 0), time(20, 0))],
+    [(time(8, 0), time(15, 0))],
+    [(time(10, 0), time(19, 0))],
+]
+TURNOS_SABADO = [(time(9, 0), time(14, 0))]
+
+DIENTES = [f"{cuadrante}{n}" for cuadrante in (1, 2, 3, 4) for n in range(1, 9)]
+ESTADOS_DIENTE = ["caries", "bracket", "corona"]
+
+# Mezclas (valor, peso)
+MEZCLA_PASADA = (("COMPLETADA", 80), ("CANCELADA", 9), ("INASISTENCIA", 6), ("CONFIRMADA", 5))
+MEZCLA_FUTURA = (("PENDIENTE", 55), ("CONFIRMADA", 40), ("CANCELADA", 5))
+MEZCLA_METODOS = (("EFECTIVO", 45), ("TARJETA", 25), ("TRANSFERENCIA", 15), ("MERCADOPAGO", 15))
+MEZCLA_PUNTUACION = ((5, 55), (4, 25), (3, 10), (2, 5), (1, 5))
+COMENTARIOS = ["", "", "Excelente atención.", "Muy puntuales.", "Tuve que esperar un poco.", "Todo bien, gracias."]
+
+PROB_CUENTA_PACIENTE = 0.35
+PROB_REPROGRAMADA = 0.08
+PROB_PAGO_ANTICIPADO = 0.6
+PROB_ENCUESTA = 0.25
+PROB_ODONTOGRAMA = 0.5
+PROB_PENALIZACION_PAGADA = 0.75
+
+
+class _Mezcla:
+    """Elección ponderada con pesos acumulados precalculados."""
+
+    def __init__(self, opciones):
+        self.valores = [valor for valor, _ in opciones]
+        self.acumulados = []
+        total = 0
+        for _, peso in opciones:
+            total += peso
+            self.acumulados.append(total)
+
+    def elegir(self, rng):
+        return rng.choices(self.valores, cum_weights=self.acumulados)[0]
+
+
+@contextmanager
+def _fechas_manuales(*modelos):
+    """Desactiva auto_now_add de created_at para poder fijar fechas históricas."""
+    campos = [modelo._meta.get_field("created_at") for modelo in modelos]
+    previos = [campo.auto_now_add for campo in campos]
+    for campo in campos:
+        campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, previo in zip(campos, previos):
+            campo.auto_now_add = previo
+
+
+def _insertar(modelo, objs, lote, clave=None, **ambito):
+    """
+    bulk_create por lotes. Con `clave` (campos que identifican cada fila dentro
+    de `ambito`) los objetos quedan con pk también en backends sin RETURNING en
+    inserts masivos (MySQL): se releen por esa clave, no como "los últimos ids
+    de la tabla", que con otras inserciones concurrentes serían de otras filas.
+    """
+    if not objs:
+        return objs
+    modelo.objects.bulk_create(objs, batch_size=lote)
+    if clave and objs[0].pk is None:
+        for inicio in range(0, len(objs), lote):
+            bloque = objs[inicio:inicio + lote]
+            filtro = {f"{clave[0]}__in": {getattr(obj, clave[0]) for obj in bloque}, **ambito}
+            ids = {
+                tuple(fila[1:]): fila[0]
+                for fila in modelo.objects.filter(**filtro).values_list("pk", *clave)
+            }
+            for obj in bloque:
+                obj.pk = ids[tuple(getattr(obj, campo) for campo in clave)]
+    return objs
+
+
+def hay_datos_sinteticos():
+    return User.objects.filter(username__startswith=PREFIJO_USUARIO).exists()
+
+
+def limpiar_datos_sinteticos():
+    """Borra todo lo generado (de las hojas hacia arriba para evitar cascadas fila a fila)."""
+    usuarios = User.objects.filter(username__startswith=PREFIJO_USUARIO)
+    dentista_ids = list(Dentista.objects.filter(user__in=usuarios).values_list("id", flat=True))
+    # Sin rollup (se borra entero) ni lápidas (ninguna app sincroniza datos sintéticos)
+    with transaction.atomic(), sin_rollup(), sin_lapidas():
+        IngresoDiario.objects.filter(dentista_id__in=dentista_ids).delete()
+        EncuestaSatisfaccion.objects.filter(dentista_id__in=dentista_ids).delete()
+        PenalizacionLog.objects.filter(dentista_id__in=dentista_ids).delete()
+        Pago.objects.filter(dentista_id__in=dentista_ids).delete()
+        Cita.objects.filter(dentista_id__in=dentista_ids).delete()
+        Diente.objects.filter(paciente__dentista_id__in=dentista_ids).delete()
+        PacienteTrigrama.objects.filter(dentista_id__in=dentista_ids).delete()
+        Paciente.objects.filter(dentista_id__in=dentista_ids).delete()
+        Horario.objects.filter(dentista_id__in=dentista_ids).delete()
+        Servicio.objects.filter(dentista_id__in=dentista_ids).delete()
+        Dentista.objects.filter(id__in=dentista_ids).delete()
+        usuarios.delete()
+    for dentista_id in dentista_ids:
+        invalidar_horarios(dentista_id)
+    return len(dentista_ids)
+
+
+class GeneradorConsultorio:
+    """
+    Genera los datos de varios dentistas. Se recorre cada día laboral del
+    periodo y la agenda se llena por turno con la ocupación indicada, así que
+    no hay citas traslapadas y el número de citas crece con dentistas × meses.
+    """
+
+    def __init__(self, dentistas=5, pacientes=20000, meses=24, semilla=1, hasta=None,
+                 lote=2000, ocupacion=0.75, password="Sintetico123!", log=None):
+        self.dentistas = dentistas
+        self.pacientes = pacientes
+        self.meses = meses
+        self.rng = random.Random(semilla)
+        self.hasta = hasta or timezone.localdate()
+        self.desde = self.hasta - timedelta(days=round(meses * 30.44))
+        self.lote = lote
+        self.ocupacion = ocupacion
+        self.password = password
+        self.log = log or (lambda mensaje: None)
+
+        self.tz = timezone.get_current_timezone()
+        # "Ahora" del conjunto de datos: lo anterior a `hasta` ya ocurrió
+        self.referencia = self._aware(self.hasta, time(8, 0))
+        self.mezcla_pasada = _Mezcla(MEZCLA_PASADA)
+        self.mezcla_futura = _Mezcla(MEZCLA_FUTURA)
+        self.mezcla_metodos = _Mezcla(MEZCLA_METODOS)
+        self.mezcla_puntuacion = _Mezcla(MEZCLA_PUNTUACION)
+        self.conteos = {
+            "dentistas": 0, "pacientes": 0, "usuarios": 0, "servicios": 0, "horarios": 0,
+            "citas": 0, "pagos": 0, "penalizaciones": 0, "encuestas": 0, "dientes": 0,
+        }
+        self._siguiente_paciente = 0
+
+    def _aware(self, fecha, hora):
+        return timezone.make_aware(datetime.combine(fecha, hora), self.tz)
+
+    def _pasado(self, momento):
+        return min(momento, self.referencia)
+
+    # ---------------------------------------------------------
+    # Orquestación
+    # ---------------------------------------------------------
+    def generar(self):
+        # Un solo hash para todos: los pacientes con cuenta también pueden
+        # iniciar sesión (p. ej. las pruebas de carga con JWT)
+        self._hash = make_password(self.password)
+        base, resto = divmod(self.pacientes, self.dentistas)
+
+        with _fechas_manuales(Paciente, Cita, Pago, PenalizacionLog, EncuestaSatisfaccion):
+            for indice in range(self.dentistas):
+                inicio = time_mod.perf_counter()
+                with transaction.atomic():
+                    dentista = self._crear_dentista(indice)
+                    servicios = self._crear_servicios(dentista)
+                    semana = self._crear_horarios(dentista)
+                    pacientes = self._crear_pacientes(dentista, base + (1 if indice < resto else 0))
+                    citas = self._crear_citas(dentista, servicios, semana, pacientes)
+                    # Los pagos entran con bulk_create, que no pasa por Pago.save
+                    reconstruir_ingresos(dentista_ids=[dentista.id], lote=self.lote)
+                invalidar_horarios(dentista.id)
+                self.log(
+                    f"{dentista.nombre}: {len(pacientes)} pacientes, {citas} citas "
+                    f"({time_mod.perf_counter() - inicio:.1f}s)"
+                )
+        return self.conteos
+
+    # ---------------------------------------------------------
+    # Catálogos
+    # ---------------------------------------------------------
+    def _crear_dentista(self, indice):
+        rng = self.rng
+        nombre = f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)}"
+        user = User.objects.create(
+            username=f"{PREFIJO_USUARIO}doc{indice + 1}",
+            email=f"sintetico.doc{indice + 1}@example.com",
+            first_name=nombre,
+            password=self._hash,
+        )
+        self.conteos["usuarios"] += 1
+        self.conteos["dentistas"] += 1
+        return Dentista.objects.create(user=user, nombre=nombre, telefono=f"55{indice:08d}")
+
+    def _crear_servicios(self, dentista):
+        rng = self.rng
+        elegidos = rng.sample(SERVICIOS, rng.randint(5, len(SERVICIOS)))
+        servicios = [
+            Servicio(
+                dentista=dentista,
+                nombre=nombre,
+                precio=Decimal(precio + rng.randrange(0, 300, 50)),
+                duracion_estimada=duracion,
+            )
+            for nombre, precio, duracion in elegidos
+        ]
+        self.conteos["servicios"] += len(servicios)
+        return _insertar(Servicio, servicios, self.lote, clave=("nombre",), dentista=dentista)
+
+    def _crear_horarios(self, dentista):
+        """Crea el Horario semanal y devuelve los turnos por isoweekday (índice 0 = lunes)."""
+        rng = self.rng
+        plantilla = rng.choice(TURNOS_SEMANA)
+        semana = [list(plantilla) for _ in range(5)]
+        semana.append(list(TURNOS_SABADO) if rng.random() < 0.7 else [])
+        semana.append([])  # domingo
+        horarios = [
+            Horario(dentista=dentista, dia_semana=dia + 1, hora_inicio=inicio, hora_fin=fin)
+            for dia, turnos in enumerate(semana)
+            for inicio, fin in turnos
+        ]
+        self.conteos["horarios"] += len(horarios)
+        _insertar(Horario, horarios, self.lote)
+        return semana
+
+    def _crear_pacientes(self, dentista, total):
+        rng = self.rng
+        usados = set()
+        pacientes, usuarios = [], []
+        for _ in range(total):
+            self._siguiente_paciente += 1
+            numero = self._siguiente_paciente
+            nombre = f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}"
+            if nombre in usados:
+                nombre = f"{nombre} {numero}"
+            usados.add(nombre)
+
+            alta = self.desde - timedelta(days=rng.randint(0, 730))
+            paciente = Paciente(
+                dentista=dentista,
+                nombre=nombre,
+                nombre_normalizado=normalizar(nombre),
+                telefono=f"{numero:010d}",
+                fecha_nacimiento=self.hasta - timedelta(days=rng.randint(5 * 365, 85 * 365)),
+                created_at=self._aware(alta, time(rng.randint(9, 19), rng.randrange(0, 60, 5))),
+            )
+            if rng.random() < PROB_CUENTA_PACIENTE:
+                usuario = User(
+                    username=f"{PREFIJO_USUARIO}pac{numero}",
+                    email=f"sintetico.pac{numero}@example.com",
+                    first_name=nombre,
+                    password=self._hash,
+                )
+                usuarios.append((paciente, usuario))
+            pacientes.append(paciente)
+
+        _insertar(User, [usuario for _, usuario in usuarios], self.lote, clave=("username",))
+        for paciente, usuario in usuarios:
+            paciente.user = usuario
+        _insertar(Paciente, pacientes, self.lote, clave=("nombre",), dentista=dentista)
+        # bulk_create no pasa por Paciente.save: los trigramas de búsqueda van aparte
+        _insertar(PacienteTrigrama, filas_trigramas(pacientes), self.lote)
+        self.conteos["usuarios"] += len(usuarios)
+        self.conteos["pacientes"] += len(pacientes)
+
+        dientes = []
+        for paciente in pacientes:
+            if rng.random() < PROB_ODONTOGRAMA:
+                for numero in rng.sample(DIENTES, rng.randint(1, 6)):
+                    dientes.append(Diente(paciente=paciente, numero=numero, estado=rng.choice(ESTADOS_DIENTE)))
+        _insertar(Diente, dientes, self.lote)
+        self.conteos["dientes"] += len(dientes)
+        return pacientes
+
+    # ---------------------------------------------------------
+    # Agenda
+    # ---------------------------------------------------------
+    def _crear_citas(self, dentista, servicios, semana, pacientes):
+        rng = self.rng
+        paciente_ids = [p.pk for p in pacientes]
+        inasistencias = {}
+        pendientes = []
+        total = 0
+        fecha = self.desde
+        fin = self.hasta + timedelta(days=DIAS_FUTUROS)
+        while fecha <= fin:
+            for inicio, fin_turno in semana[fecha.weekday()]:
+                minuto = inicio.hour * 60 + inicio.minute
+                limite = fin_turno.hour * 60 + fin_turno.minute
+                while minuto < limite:
+                    servicio = rng.choice(servicios)
+                    duracion = servicio.duracion_estimada
+                    if minuto + duracion > limite:
+                        break
+                    if rng.random() >= self.ocupacion:
+                        minuto += 30
+                        continue
+                    pendientes.append(self._nueva_cita(dentista, servicio, rng.choice(paciente_ids), fecha, minuto, duracion))
+                    minuto += duracion
+            if len(pendientes) >= self.lote * 5:
+                total += self._volcar_citas(dentista, pendientes, inasistencias)
+                pendientes = []
+            fecha += timedelta(days=1)
+        total += self._volcar_citas(dentista, pendientes, inasistencias)
+        return total
+
+    def _nueva_cita(self, dentista, servicio, paciente_id, fecha, minuto, duracion):
+        rng = self.rng
+        pasada = fecha < self.hasta
+        estado = (self.mezcla_pasada if pasada else self.mezcla_futura).elegir(rng)
+        reprogramada = 0
+        if rng.random() < PROB_REPROGRAMADA:
+            reprogramada = 2 if rng.random() < 0.15 else 1
+        fin = minuto + duracion
+        solicitada = self._aware(fecha - timedelta(days=rng.randint(1, 30)), time(rng.randint(8, 21), rng.randrange(0, 60, 5)))
+        return Cita(
+            dentista=dentista,
+            servicio=servicio,
+            paciente_id=paciente_id,
+            fecha=fecha,
+            hora_inicio=time(minuto // 60, minuto % 60),
+            hora_fin=time(fin // 60, fin % 60),
+            estado=estado,
+            veces_reprogramada=reprogramada,
+            recordatorio_24h_enviado=pasada,
+            created_at=self._pasado(solicitada),
+        )
+
+    def _volcar_citas(self, dentista, citas, inasistencias):
+        """Inserta un bloque de citas y sus pagos / penalizaciones / encuestas."""
+        rng = self.rng
+        # Sin traslapes: (fecha, hora_inicio) identifica la cita en la agenda del dentista
+        _insertar(Cita, citas, self.lote, clave=("fecha", "hora_inicio"), dentista=dentista)
+        pagos, logs, encuestas = [], [], []
+        for cita in citas:
+            terminada = self._aware(cita.fecha, cita.hora_fin)
+            if cita.estado == "COMPLETADA":
+                pagos.append(Pago(
+                    cita=cita, dentista=dentista, paciente_id=cita.paciente_id, monto=cita.servicio.precio, metodo=self.mezcla_metodos.elegir(rng),
+                    estado="COMPLETADO", created_at=self._pasado(terminada),
+                ))
+                if rng.random() < PROB_ENCUESTA:
+                    encuestas.append(EncuestaSatisfaccion(
+                        paciente_id=cita.paciente_id, dentista=dentista, cita=cita,
+                        puntuacion=self.mezcla_puntuacion.elegir(rng), comentario=rng.choice(COMENTARIOS),
+                        created_at=self._pasado(terminada + timedelta(days=1)),
+                    ))
+            elif cita.estado in ("PENDIENTE", "CONFIRMADA") and cita.fecha >= self.hasta:
+                if rng.random() < PROB_PAGO_ANTICIPADO:
+                    pagos.append(Pago(
+                        cita=cita, dentista=dentista, paciente_id=cita.paciente_id, monto=cita.servicio.precio, metodo="MERCADOPAGO",
+                        estado="PENDIENTE", created_at=cita.created_at,
+                    ))
+            elif cita.estado == "INASISTENCIA":
+                # Misma regla que procesar_inasistencia: advertencia y luego cargo de $300
+                veces = inasistencias.get(cita.paciente_id, 0) + 1
+                inasistencias[cita.paciente_id] = veces
+                registrada = self._pasado(terminada + timedelta(hours=2))
+                if veces == 1:
+                    logs.append(PenalizacionLog(
+                        dentista=dentista, paciente_id=cita.paciente_id, accion="ADVERTENCIA",
+                        motivo="Primera inasistencia confirmada.", monto=Decimal("0"), created_at=registrada,
+                    ))
+                else:
+                    pagada = (self.hasta - cita.fecha).days > 7 and rng.random() < PROB_PENALIZACION_PAGADA
+                    pagos.append(Pago(
+                        cita=cita, dentista=dentista, paciente_id=cita.paciente_id, monto=Decimal("300.00"), metodo="EFECTIVO",
+                        estado="COMPLETADO" if pagada else "PENDIENTE", created_at=registrada,
+                    ))
+                    logs.append(PenalizacionLog(
+                        dentista=dentista, paciente_id=cita.paciente_id, accion="AUTO_PENALIZAR",
+                        motivo="Inasistencia reiterada. Cargo automático.", monto=Decimal("300.00"),
+                        created_at=registrada,
+                    ))
+
+        _insertar(Pago, pagos, self.lote)
+        _insertar(PenalizacionLog, logs, self.lote)
+        _insertar(EncuestaSatisfaccion, encuestas, self.lote)
+        self.conteos["citas"] += len(citas)
+        self.conteos["pagos"] += len(pagos)
+        self.conteos["penalizaciones"] += len(logs)
+        self.conteos["encuestas"] += len(encuestas)
+        return len(citas)
+
+
+def generar_datos_sinteticos(**opciones):
+    """Atajo: GeneradorConsultorio(**opciones).generar() -> conteos por modelo."""
+    return GeneradorConsultorio(**opciones).generar()
@@ -1,13 +1,33 @@
 from datetime import datetime, timedelta, time, date
+from io import StringIO
+from pathlib import Path
 from unittest.mock import patch
 
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, QuerySet
 from django.test import TestCase
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.core.management import call_command
+from django.core.management.base import CommandError
 
-from domain.ai_services import calcular_score_riesgo, calcular_penalizacion_paciente
-from domain.models import Dentista, Paciente, Cita, Pago, Servicio
+from domain.auditoria_indices import analizar_plan
+from domain.ai_services import (
+    buscar_primer_espacio,
+    calcular_penalizacion_paciente,
+    calcular_score_riesgo,
+    obtener_slots_disponibles,
+    sugerir_horario_cita,
+)
+from domain.horarios import turnos_del_dia
+from domain.paginacion import CursorInvalido, paginar
+from domain.reservas import reservar_cita
+from domain.models import Dentista, Paciente, Cita, Pago, Servicio, Horario, IngresoDiario, ReservaTemporal
+from domain.sinteticos import generar_datos_sinteticos, limpiar_datos_sinteticos
+from benchmarks.carga import Estadisticas, cargar_escenario
+from benchmarks.casos import CASOS, Contexto
+from benchmarks.medicion import comparar, medir_caso, percentil
 
 
 class RiesgoYPenalizacionTests(TestCase):
@@ -73,6 +93,52 @@ class RiesgoYPenalizacionTests(TestCase):
         self.assertEqual(info["recargo"], 300)
         self.assertGreaterEqual(info["dias_restantes"], 0)
 
+    def test_pago_copia_dentista_y_paciente_de_la_cita(self):
+        cita = Cita.objects.create(
+            dentista=self.dentista,
+            paciente=self.paciente,
+            servicio=self.servicio,
+            fecha=date.today(),
+            hora_inicio=time(12, 0),
+            hora_fin=time(12, 30),
+        )
+        pago = Pago.objects.create(cita=cita, monto=100)
+        self.assertEqual((pago.dentista_id, pago.paciente_id), (self.dentista.id, self.paciente.id))
+
+        # Filas sin las copias (anteriores a la migración) se completan al guardar, aun con update_fields
+        Pago.objects.filter(pk=pago.pk).update(dentista=None, paciente=None)
+        pago = Pago.objects.get(pk=pago.pk)
+        pago.estado = "COMPLETADO"
+        pago.save(update_fields=["estado"])
+        self.assertTrue(Pago.objects.filter(pk=pago.pk, dentista=self.dentista, paciente=self.paciente).exists())
+
+    def test_rollup_de_ingresos_se_mantiene_y_reconstruye(self):
+        def nueva_cita(hora):
+            return Cita.objects.create(
+                dentista=self.dentista, paciente=self.paciente, servicio=self.servicio,
+                fecha=date.today(), hora_inicio=time(hora, 0), hora_fin=time(hora, 30),
+            )
+
+        def rollup():
+            return {
+                (i.metodo, i.estado): (i.total, i.cantidad)
+                for i in IngresoDiario.objects.filter(dentista=self.dentista, cantidad__gt=0)
+            }
+
+        efectivo = Pago.objects.create(cita=nueva_cita(12), monto=100, metodo="EFECTIVO", estado="COMPLETADO")
+        Pago.objects.create(cita=nueva_cita(13), monto=150, metodo="EFECTIVO", estado="COMPLETADO")
+        tarjeta = Pago.objects.create(cita=nueva_cita(14), monto=300, metodo="TARJETA", estado="PENDIENTE")
+        tarjeta.estado = "COMPLETADO"
+        tarjeta.monto = 350
+        tarjeta.save()
+        efectivo.cita.delete()  # el pago cae en cascada
+
+        esperado = {("EFECTIVO", "COMPLETADO"): (150, 1), ("TARJETA", "COMPLETADO"): (350, 1)}
+        self.assertEqual(rollup(), esperado)
+        IngresoDiario.objects.all().delete()
+        call_command("reconstruir_ingresos", stdout=StringIO())
+        self.assertEqual(rollup(), esperado)
+
 
 class RecordatoriosCommandTests(TestCase):
     def setUp(self):
@@ -105,3 +171,298 @@ class RecordatoriosCommandTests(TestCase):
         cita = Cita.objects.first()
         cita.refresh_from_db()
         self.assertTrue(cita.recordatorio_24h_enviado)
+
+
+class ReservaTemporalTests(TestCase):
+    def setUp(self):
+        self.dentista = Dentista.objects.create(user=User.objects.create_user(username="doc_rt", password="pwd"), nombre="Dr Retención")
+        self.paciente = Paciente.objects.create(dentista=self.dentista, nombre="Pac Retención")
+        self.servicio = Servicio.objects.create(dentista=self.dentista, nombre="Consulta", precio=100, duracion_estimada=30)
+        self.fecha = date(2030, 1, 7)  # lunes
+        Horario.objects.create(dentista=self.dentista, dia_semana=1, hora_inicio=time(9, 0), hora_fin=time(11, 0))
+
+    def _checkout(self, inicio, fin, minutos, pagado=False):
+        """Cita PENDIENTE con su plazo de pago, como la deja iniciar_pago."""
+        cita = Cita.objects.create(
+            dentista=self.dentista, paciente=self.paciente, servicio=self.servicio,
+            fecha=self.fecha, hora_inicio=inicio, hora_fin=fin, estado="PENDIENTE",
+        )
+        if pagado:
+            Pago.objects.create(cita=cita, monto=100, estado="COMPLETADO", metodo="MERCADOPAGO")
+        ReservaTemporal.objects.create(
+            dentista=self.dentista, paciente=self.paciente, cita=cita, fecha=self.fecha,
+            hora_inicio=inicio, hora_fin=fin, expires_at=timezone.now() + timedelta(minutes=minutos),
+        )
+        return cita
+
+    def test_comando_cancela_checkouts_vencidos_sin_pagar(self):
+        vigente = self._checkout(time(9, 0), time(9, 30), minutos=10)
+        vencida = self._checkout(time(10, 0), time(10, 30), minutos=-1)
+        pagada = self._checkout(time(10, 30), time(11, 0), minutos=-1, pagado=True)
+
+        call_command("limpiar_reservas_temporales", stdout=StringIO())
+
+        estados = dict(Cita.objects.values_list("id", "estado"))
+        self.assertEqual(estados, {vigente.id: "PENDIENTE", vencida.id: "CANCELADA", pagada.id: "PENDIENTE"})
+        self.assertEqual(list(ReservaTemporal.objects.values_list("cita_id", flat=True)), [vigente.id])
+        # El hueco del checkout abandonado vuelve a ofrecerse
+        libres = obtener_slots_disponibles(self.dentista, self.fecha, self.servicio)
+        self.assertIn("10:00", libres)
+        self.assertNotIn("09:00", libres)
+
+    def test_reservar_vence_el_plazo_sin_esperar_al_comando(self):
+        self._checkout(time(9, 0), time(9, 30), minutos=-1)
+
+        cita = reservar_cita(
+            dentista=self.dentista, paciente=self.paciente, servicio=self.servicio,
+            fecha=self.fecha, hora_inicio=time(9, 0), estado="PENDIENTE",
+        )
+
+        self.assertEqual(cita.hora_inicio, time(9, 0))
+        self.assertEqual(Cita.objects.filter(estado="CANCELADA").count(), 1)
+        self.assertFalse(ReservaTemporal.objects.exists())
+
+
+class PrimerEspacioTests(TestCase):
+    def setUp(self):
+        self.dentista = Dentista.objects.create(user=User.objects.create_user(username="doc_pe", password="pwd"), nombre="Dr Pronto")
+        self.paciente = Paciente.objects.create(dentista=self.dentista, nombre="Pac Pronto")
+        self.servicio = Servicio.objects.create(dentista=self.dentista, nombre="Consulta", precio=100, duracion_estimada=30)
+        Horario.objects.create(dentista=self.dentista, dia_semana=1, hora_inicio=time(9, 0), hora_fin=time(10, 0))
+
+    def test_salta_dia_lleno_y_devuelve_huecos_en_orden(self):
+        lunes = date(2030, 1, 7)
+        Cita.objects.create(
+            dentista=self.dentista,
+            paciente=self.paciente,
+            servicio=self.servicio,
+            fecha=lunes,
+            hora_inicio=time(9, 0),
+            hora_fin=time(10, 0),
+            estado="CONFIRMADA",
+        )
+
+        espacios = buscar_primer_espacio(self.servicio, desde=datetime(2030, 1, 7, 0, 0), limite=3)
+
+        self.assertEqual(
+            [e.inicio.strftime("%Y-%m-%d %H:%M") for e in espacios],
+            ["2030-01-14 09:00", "2030-01-14 09:15", "2030-01-14 09:30"],
+        )
+        self.assertTrue(all(e.dentista == self.dentista for e in espacios))
+
+    def test_misma_regla_que_los_slots_dia_y_duracion_desde_horario(self):
+        # Domingo con turno y servicio sin duración: ambos caminos ofrecen lo mismo
+        Horario.objects.create(dentista=self.dentista, dia_semana=7, hora_inicio=time(9, 0), hora_fin=time(10, 0))
+        sin_duracion = Servicio.objects.create(dentista=self.dentista, nombre="Valoración", precio=0, duracion_estimada=0)
+        domingo = date(2030, 1, 6)
+
+        espacios = buscar_primer_espacio(sin_duracion, desde=datetime(2030, 1, 6, 0, 0), dias=0, limite=10)
+
+        self.assertEqual(
+            [e.inicio.strftime("%H:%M") for e in espacios],
+            obtener_slots_disponibles(self.dentista, domingo, sin_duracion),
+        )
+        self.assertEqual(len(espacios), 3)  # 09:00, 09:15 y 09:30 con DURACION_POR_DEFECTO = 30
+
+
+    def test_sugerir_horario_no_salta_de_un_dia_pasado_a_hoy(self):
+        dentista = Dentista.objects.create(user=User.objects.create_user(username="doc_sh", password="pwd"), nombre="Dr Sugerencia")
+        servicio = Servicio.objects.create(dentista=dentista, nombre="Consulta", precio=100, duracion_estimada=30)
+        for dia in range(1, 8):
+            Horario.objects.create(dentista=dentista, dia_semana=dia, hora_inicio=time(0, 0), hora_fin=time(23, 45))
+        hoy = timezone.localdate()
+
+        self.assertIsNone(sugerir_horario_cita(dentista, hoy - timedelta(days=7), servicio, time(9, 0)))
+        sugerido = sugerir_horario_cita(dentista, hoy + timedelta(days=7), servicio, time(9, 0))
+        self.assertEqual((sugerido.date(), sugerido.time()), (hoy + timedelta(days=7), time(9, 0)))
+
+class HorarioCacheTests(TestCase):
+    def setUp(self):
+        self.dentista = Dentista.objects.create(user=User.objects.create_user(username="doc_hc", password="pwd"), nombre="Dr Caché")
+        self.turno = Horario.objects.create(dentista=self.dentista, dia_semana=1, hora_inicio=time(9, 0), hora_fin=time(13, 0))
+        self.lunes = date(2030, 1, 7)
+
+    def test_cache_evita_consultas_y_se_invalida_con_senales(self):
+        self.assertEqual(turnos_del_dia(self.dentista, self.lunes), [(time(9, 0), time(13, 0))])
+        with self.assertNumQueries(0):
+            self.assertEqual(turnos_del_dia(self.dentista, self.lunes), [(time(9, 0), time(13, 0))])
+            self.assertEqual(turnos_del_dia(self.dentista, self.lunes + timedelta(days=1)), [])
+
+        self.turno.hora_fin = time(14, 0)
+        self.turno.save()
+        self.assertEqual(turnos_del_dia(self.dentista, self.lunes), [(time(9, 0), time(14, 0))])
+
+        self.turno.delete()
+        self.assertEqual(turnos_del_dia(self.dentista, self.lunes), [])
+
+
+class DatosSinteticosTests(TestCase):
+    OPCIONES = {"dentistas": 2, "pacientes": 30, "meses": 1, "semilla": 7, "hasta": date(2025, 3, 3), "lote": 50}
+
+    def _agenda(self):
+        return list(
+            Cita.objects.order_by("dentista__user__username", "fecha", "hora_inicio")
+            .values_list("paciente__nombre", "fecha", "hora_inicio", "estado", "veces_reprogramada")
+        )
+
+    def test_deterministico_por_semilla_y_sin_traslapes(self):
+        conteos = generar_datos_sinteticos(**self.OPCIONES)
+        primera = self._agenda()
+        self.assertEqual(conteos["citas"], len(primera))
+        self.assertEqual(Paciente.objects.count(), 30)
+
+        # Cada dentista atiende una cita a la vez
+        for dentista in Dentista.objects.all():
+            fin_anterior = None
+            for cita in Cita.objects.filter(dentista=dentista).order_by("fecha", "hora_inicio"):
+                if fin_anterior and fin_anterior[0] == cita.fecha:
+                    self.assertLessEqual(fin_anterior[1], cita.hora_inicio)
+                fin_anterior = (cita.fecha, cita.hora_fin)
+
+        # Desde la segunda inasistencia existe el cargo de $300
+        penalizadas = Pago.objects.filter(cita__estado="INASISTENCIA")
+        self.assertTrue(all(p.monto == 300 for p in penalizadas))
+
+        limpiar_datos_sinteticos()
+        self.assertFalse(Cita.objects.exists())
+        generar_datos_sinteticos(**self.OPCIONES)
+        self.assertEqual(self._agenda(), primera)
+
+    def test_sin_returning_en_bulk_create_relee_ids_por_clave(self):
+        generar_datos_sinteticos(**self.OPCIONES)
+        referencia = self._agenda()
+        limpiar_datos_sinteticos()
+
+        # Como MySQL: bulk_create no devuelve ids y otra conexión inserta pacientes a media carga
+        ajeno = Dentista.objects.create(user=User.objects.create_user(username="doc_ajeno", password="pwd"), nombre="Ajeno")
+        bulk_create = QuerySet.bulk_create
+
+        def con_intruso(qs, objs, *args, **kwargs):
+            creados = bulk_create(qs, objs, *args, **kwargs)
+            if qs.model is Paciente:
+                Paciente.objects.create(dentista=ajeno, nombre=f"Intruso {Paciente.objects.filter(dentista=ajeno).count()}", created_at=timezone.now())
+            return creados
+
+        with patch.object(type(connection.features), "can_return_rows_from_bulk_insert", False), \
+                patch.object(QuerySet, "bulk_create", con_intruso):
+            generar_datos_sinteticos(**self.OPCIONES)
+
+        self.assertEqual(self._agenda(), referencia)
+        self.assertFalse(Cita.objects.filter(paciente__dentista=ajeno).exists())
+        self.assertFalse(Pago.objects.exclude(paciente_id=F("cita__paciente_id")).exists())
+
+    def test_comando_requiere_limpiar_para_regenerar(self):
+        call_command("generar_datos_sinteticos", dentistas=1, pacientes=5, meses=1, stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command("generar_datos_sinteticos", dentistas=1, pacientes=5, meses=1, stdout=StringIO())
+        call_command("generar_datos_sinteticos", dentistas=1, pacientes=5, meses=1, limpiar=True, stdout=StringIO())
+        self.assertEqual(Dentista.objects.count(), 1)
+
+
+class BenchmarkTests(TestCase):
+    def test_percentil_interpola(self):
+        self.assertEqual(percentil([], 95), 0.0)
+        self.assertEqual(percentil([3, 1, 2], 50), 2)
+        self.assertAlmostEqual(percentil([10, 20], 95), 19.5)
+
+    def test_comparar_detecta_regresiones(self):
+        base = {"casos": {
+            "a": {"p95_ms": 10.0, "consultas": 5, "memoria_pico_kb": 100.0},
+            "b": {"p95_ms": 0.5, "consultas": 2, "memoria_pico_kb": 10.0},
+        }}
+        actual = {"casos": {
+            "a": {"p95_ms": 14.0, "consultas": 6, "memoria_pico_kb": 100.0},
+            "b": {"p95_ms": 1.2, "consultas": 2, "memoria_pico_kb": 10.0},  # ruido < 1 ms
+            "nuevo": {"p95_ms": 99.0, "consultas": 99, "memoria_pico_kb": 99.0},
+            "roto": {"error": "AssertionError"},
+        }}
+        regresiones = comparar(actual, base, umbral=0.25)
+        self.assertEqual(list(regresiones), ["a"])
+        self.assertEqual(len(regresiones["a"]), 2)
+
+    def test_escenarios_de_carga_validos(self):
+        for nombre in ("lunes_9am.json", "dia_recordatorios.json"):
+            escenario = cargar_escenario(Path(settings.BASE_DIR) / "benchmarks" / "escenarios" / nombre)
+            self.assertTrue(escenario["mezcla"])
+            self.assertEqual(escenario["cuentas"]["prefijo"], "sintetico.pac")
+
+    def test_estadisticas_de_carga_por_endpoint(self):
+        estadisticas = Estadisticas()
+        for ms, estado in ((10, 201), (20, 409), (30, 201), (40, 500), (50, 0)):
+            estadisticas.registrar("POST /api/citas/", estado, ms)
+        estadisticas.registrar("POST /api/chatbot/", 429, 5)
+        resumen = estadisticas.resumen(segundos=2)
+        citas = resumen["POST /api/citas/"]
+        self.assertEqual((citas["peticiones"], citas["rps"], citas["p50_ms"]), (5, 2.5, 30))
+        self.assertEqual((citas["errores"], citas["409"], citas["429"]), (2, 1, 0))
+        self.assertEqual(resumen["POST /api/chatbot/"]["429"], 1)
+
+    def test_casos_corren_sobre_datos_sinteticos(self):
+        generar_datos_sinteticos(dentistas=1, pacientes=10, meses=1, semilla=3, lote=50)
+        contexto = Contexto()
+        with self.settings(CHATBOT_IA_ENABLED=False, CHATBOT_REQUIRE_SECRET=False, PRESUPUESTO_CONSULTAS_ESTRICTO=False):
+            for nombre in ("obtener_slots_disponibles", "dashboard_dentista", "api_listar_citas"):
+                metricas = medir_caso(CASOS[nombre], contexto, repeticiones=2, calentamiento=0)
+                self.assertEqual(metricas["iteraciones"], 2)
+                self.assertGreater(metricas["consultas"], 0)
+
+
+class AuditoriaIndicesTests(TestCase):
+    def test_analiza_planes_sqlite_y_mysql(self):
+        plan_sqlite = "2 0 0 SCAN domain_cita\n23 0 0 USE TEMP B-TREE FOR ORDER BY"
+        self.assertEqual(
+            analizar_plan(plan_sqlite, "sqlite"),
+            ["recorrido completo de domain_cita", "ordenamiento temporal (for order by)"],
+        )
+        self.assertEqual(analizar_plan("3 0 0 SCAN domain_cita USING COVERING INDEX x", "sqlite"), [])
+
+        plan_mysql = (
+            '{"query_block": {"ordering_operation": {"using_filesort": true, '
+            '"table": {"table_name": "domain_avisodentista", "access_type": "ALL"}}}}'
+        )
+        self.assertEqual(analizar_plan(plan_mysql, "mysql"), ["filesort", "recorrido completo de domain_avisodentista"])
+
+    def test_catalogo_usa_indices(self):
+        generar_datos_sinteticos(dentistas=1, pacientes=10, meses=1, semilla=5, lote=50)
+        salida = StringIO()
+        call_command("auditar_indices", "--estricto", stdout=salida)
+        self.assertIn("Todas las consultas del catálogo usan índices", salida.getvalue())
+
+
+class PaginacionCursorTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="doc_pag", password="x")
+        self.dentista = Dentista.objects.create(user=user, nombre="Dr Cursor")
+        paciente = Paciente.objects.create(dentista=self.dentista, nombre="Paciente Cursor")
+        servicio = Servicio.objects.create(dentista=self.dentista, nombre="Limpieza", precio=100, duracion_estimada=30)
+        hoy = timezone.localdate()
+        for i in range(7):
+            cita = Cita.objects.create(
+                dentista=self.dentista, paciente=paciente, servicio=servicio,
+                fecha=hoy - timedelta(days=i), hora_inicio=time(9, 0), hora_fin=time(9, 30),
+            )
+            Pago.objects.create(cita=cita, monto=100, metodo="EFECTIVO", estado="COMPLETADO")
+        # Empates en created_at: el id desempata sin saltar ni repetir filas
+        Pago.objects.filter(id__in=list(Pago.objects.values_list("id", flat=True)[:4])).update(
+            created_at=timezone.now() - timedelta(days=1)
+        )
+
+    def test_recorre_todo_sin_repetir_con_una_consulta_por_pagina(self):
+        orden = ("-created_at", "-id")
+        qs = Pago.objects.filter(dentista=self.dentista)
+        vistos, cursor = [], None
+        while True:
+            with self.assertNumQueries(1):
+                pagina = paginar(qs, orden, cursor, tamano=3)
+            vistos += [p.id for p in pagina]
+            cursor = pagina.siguiente
+            if not cursor:
+                break
+        self.assertEqual(vistos, list(qs.order_by(*orden).values_list("id", flat=True)))
+
+    def test_cursor_alterado_o_de_otro_orden_se_rechaza(self):
+        cursor = paginar(Pago.objects.all(), ("-created_at", "-id"), tamano=2).siguiente
+        with self.assertRaises(CursorInvalido):
+            paginar(Pago.objects.all(), ("-created_at", "-id"), cursor[:-2] + "xx")
+        with self.assertRaises(CursorInvalido):
+            paginar(Pago.objects.all(), ("created_at", "id"), cursor)
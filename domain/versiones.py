@@ -0,0 +1,68 @@
+"""
+Versión de datos por dentista para cachés derivadas (paneles del dashboard).
+
+Mismo esquema que domain/horarios.py: la versión vive en la caché compartida y
+las señales de Cita, Pago, Paciente, AvisoDentista y Servicio la cambian
+(domain/signals.py). Lo cacheado se guarda bajo la versión vigente, así que un
+cambio lo deja inalcanzable sin tener que borrarlo; caduca solo por su timeout.
+
+Los cambios que no pasan por señales (QuerySet.update, bulk_create) deben
+llamar a invalidar_datos_dentista a mano.
+
+El catálogo público de servicios (/api/servicios/, todos los dentistas) lleva
+además una versión global que cambia con cualquier Servicio.
+"""
+
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = "datos:version:{}"
+CATALOGO_KEY = "catalogo:version"
+
+
+def _clave(dentista_id):
+    return VERSION_KEY.format(dentista_id)
+
+
+def _vigente(clave, version):
+    if version is None:
+        cache.add(clave, uuid.uuid4().hex, timeout=None)
+        version = cache.get(clave)
+    return version
+
+
+def version_datos_dentista(dentista_id):
+    """Versión vigente (una lectura de caché); si se perdió se crea una nueva."""
+    clave = _clave(dentista_id)
+    return _vigente(clave, cache.get(clave))
+
+
+def versiones_datos_dentistas(dentista_ids):
+    """{dentista_id: versión} con una sola lectura de caché."""
+    claves = {dentista_id: _clave(dentista_id) for dentista_id in dentista_ids}
+    encontradas = cache.get_many(list(claves.values()))
+    return {dentista_id: _vigente(clave, encontradas.get(clave)) for dentista_id, clave in claves.items()}
+
+
+def invalidar_datos_dentista(dentista_id):
+    """
+    Cambia la versión del dentista. Se repite al confirmar la transacción: si
+    otra request recalculó un panel antes del commit (con los datos viejos),
+    la segunda versión lo vuelve a invalidar.
+    """
+    if not dentista_id:
+        return
+    cache.set(_clave(dentista_id), uuid.uuid4().hex, timeout=None)
+    transaction.on_commit(lambda: cache.set(_clave(dentista_id), uuid.uuid4().hex, timeout=None))
+
+
+def version_catalogo():
+    return _vigente(CATALOGO_KEY, cache.get(CATALOGO_KEY))
+
+
+def invalidar_catalogo():
+    """Igual que invalidar_datos_dentista: ahora y otra vez al confirmar."""
+    cache.set(CATALOGO_KEY, uuid.uuid4().hex, timeout=None)
+    transaction.on_commit(lambda: cache.set(CATALOGO_KEY, uuid.uuid4().hex, timeout=None))
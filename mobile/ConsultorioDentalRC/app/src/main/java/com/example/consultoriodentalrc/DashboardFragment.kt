@@ -21,6 +21,7 @@ class DashboardFragment : Fragment() {
 
     private lateinit var tokenStore: TokenStore
     private lateinit var apiService: ApiService
+    private var conversacionChat: String? = null
 
     override fun onCreateView(
         inflater: LayoutInflater,
@@ -121,7 +122,8 @@ class DashboardFragment : Fragment() {
         binding.progress.isVisible = true
         lifecycleScope.launch {
             try {
-                val response = apiService.chatbot(ChatRequest(query))
+                val response = apiService.chatbot(ChatRequest(query, conversacionChat))
+                conversacionChat = response.conversacion ?: conversacionChat
                 binding.textChatResponse.text = response.message
             } catch (e: HttpException) {
                 binding.textChatResponse.text = "Error ${e.code()} en el chatbot"
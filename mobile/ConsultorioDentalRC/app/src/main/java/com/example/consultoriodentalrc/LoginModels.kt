@@ -48,14 +48,17 @@ data class SlotsResponse(
 )
 
 data class ChatRequest(
-    val query: String
+    val query: String,
+    // Token devuelto en la respuesta anterior; mantiene el historial de la conversación
+    val conversacion: String? = null
 )
 
 data class ChatbotResponse(
     val message: String,
     val source: String?,
     @SerializedName("source_detail")
-    val sourceDetail: String? = null
+    val sourceDetail: String? = null,
+    val conversacion: String? = null
 )
 
 data class CrearCitaRequest(
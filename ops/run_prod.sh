@@ -23,6 +23,13 @@ if [[ ! -x "$GUNICORN_BIN" ]]; then
   fi
 fi
 
+# Métricas multiproceso: los volcados de la corrida anterior no deben sumarse
+METRICAS_DIR="${METRICAS_DIR:-$(grep -E '^METRICAS_DIR=' .env | tail -n 1 | cut -d= -f2- || true)}"
+if [[ -n "$METRICAS_DIR" ]]; then
+  mkdir -p "$METRICAS_DIR"
+  rm -f "$METRICAS_DIR"/metricas-*.json
+fi
+
 export DJANGO_SETTINGS_MODULE="proyecto_rc.settings"
 export PYTHONPATH="$ROOT_DIR"
 
@@ -1,6 +1,6 @@
 # paciente/context_processors.py
 
-from domain.models import Paciente
+from accounts.perfiles import obtener_perfil
 from domain.ai_services import calcular_penalizacion_paciente
 
 
@@ -13,10 +13,9 @@ def penalizacion_paciente(request):
     if not request.user.is_authenticated:
         return {}
 
-    # Intentar obtener el perfil Paciente
-    try:
-        perfil_paciente = Paciente.objects.get(user=request.user)
-    except Paciente.DoesNotExist:
+    # Perfil ya resuelto en la request (la vista normalmente ya lo cargó)
+    perfil_paciente = obtener_perfil(request).paciente
+    if perfil_paciente is None:
         # Usuario sin perfil paciente (admin, dentista, primera vez con Google, etc.)
         return {}
 
@@ -6,8 +6,11 @@ import mercadopago
 from django.conf import settings
 from django.urls import reverse
 
+from proyecto_rc.trazas import span, trazar
+
 logger = logging.getLogger(__name__)
 
+@trazar()
 def crear_preferencia_pago(cita, request):
     token = settings.MERCADOPAGO_ACCESS_TOKEN
     if not token:
@@ -113,7 +116,8 @@ def crear_preferencia_pago(cita, request):
     )
 
     # 4. Crear la preferencia (con reintento si falla auto_return)
-    preference_response = sdk.preference().create(preference_data)
+    with span("mercadopago.preferencia", cita_id=cita.id):
+        preference_response = sdk.preference().create(preference_data)
     logger.debug("Respuesta de MercadoPago status=%s", preference_response.get("status"))
 
     if preference_response["status"] != 201:
@@ -1,28 +1,40 @@
 from datetime import datetime, timedelta
 # Importamos Horario en lugar de Disponibilidad
 from domain.models import Cita, Horario, Dentista
-from domain.notifications import registrar_aviso_dentista
+from domain.horarios import turnos_del_dia
+# crear_aviso_por_cita vive en domain.notifications (también lo usa domain/reservas); se reexporta aquí
+from domain.notifications import crear_aviso_por_cita  # noqa: F401
 
 
-def obtener_horarios_disponibles(fecha_str, duracion_minutos):
+def obtener_horarios_disponibles(fecha_str, duracion_minutos, dentista=None):
     """
     Calcula con precisión milimétrica los huecos disponibles.
     Respeta:
     1. Turnos partidos (ej. comida).
     2. Citas ya existentes (no empalma).
     3. Duración del servicio (no ofrece huecos donde no cabe).
+    - dentista: limita turnos y citas a su agenda (sin él se mezclan todas).
+    Para "primer espacio disponible" usar domain.ai_services.buscar_primer_espacio.
     """
     try:
         fecha_obj = datetime.strptime(fecha_str, "%Y-%m-%d").date()
     except (ValueError, TypeError):
         return []
 
-    dia_semana = fecha_obj.weekday()
+    # Horario.dia_semana usa isoweekday (lunes=1 ... domingo=7)
+    dia_semana = fecha_obj.isoweekday()
 
-    # 1. OBTENER TURNOS DEL DÍA (Usando modelo Horario)
-    turnos = Horario.objects.filter(dia_semana=dia_semana).order_by("hora_inicio")
+    # 1. OBTENER TURNOS DEL DÍA (caché de horarios si hay dentista)
+    if dentista is not None:
+        turnos = turnos_del_dia(dentista, fecha_obj)
+    else:
+        turnos = list(
+            Horario.objects.filter(dia_semana=dia_semana)
+            .order_by("hora_inicio")
+            .values_list("hora_inicio", "hora_fin")
+        )
 
-    if not turnos.exists():
+    if not turnos:
         return []  # Día libre completo (ej. Domingo)
 
     # 2. OBTENER CITAS YA AGENDADAS PARA ESE DÍA
@@ -31,16 +43,18 @@ def obtener_horarios_disponibles(fecha_str, duracion_minutos):
         fecha=fecha_obj,
         estado__in=['PENDIENTE', 'CONFIRMADA'],
     ).order_by("hora_inicio")
+    if dentista is not None:
+        citas_existentes = citas_existentes.filter(dentista=dentista)
 
     horarios_libres = []
     duracion_delta = timedelta(minutes=int(duracion_minutos))
     paso_agenda = timedelta(minutes=30)  # Intervalos de 30 min para ofrecer opciones
 
     # 3. ANALIZAR CADA TURNO
-    for turno in turnos:
+    for turno_inicio, turno_fin in turnos:
         # Definimos el inicio y fin exacto de ESTE turno
-        inicio_turno = datetime.combine(fecha_obj, turno.hora_inicio)
-        fin_turno = datetime.combine(fecha_obj, turno.hora_fin)
+        inicio_turno = datetime.combine(fecha_obj, turno_inicio)
+        fin_turno = datetime.combine(fecha_obj, turno_fin)
 
         tiempo_actual = inicio_turno
 
@@ -71,34 +85,3 @@ def obtener_horarios_disponibles(fecha_str, duracion_minutos):
 
     # Limpiamos duplicados y ordenamos
     return sorted(list(set(horarios_libres)))
-
-
-# ============================================================
-# AVISOS PARA EL DENTISTA
-# ============================================================
-
-def crear_aviso_por_cita(cita, tipo, mensaje):
-    """
-    Crea un AvisoDentista asociado a una cita y a su dentista.
-    """
-    if cita is None or cita.dentista is None:
-        return None
-
-    def _fmt_fecha_hora(c):
-        fecha_txt = c.fecha.strftime("%d/%m") if getattr(c, "fecha", None) else ""
-        hora_txt = c.hora_inicio.strftime("%H:%M") if getattr(c, "hora_inicio", None) else ""
-        return f"{fecha_txt} {hora_txt}".strip()
-
-    tipo_map = {
-        "NUEVA_CITA": "Nueva cita agendada",
-        "REPROGRAMADA": "Cita reprogramada",
-        "CANCELADA": "Cita cancelada",
-        "PAGO": "Pago registrado",
-    }
-
-    encabezado = tipo_map.get(tipo, "Actualización de cita")
-    cuerpo = f"{cita.paciente.nombre} - {cita.servicio.nombre} ({_fmt_fecha_hora(cita)})"
-    extra = mensaje.strip() if mensaje else ""
-    texto = " • ".join([p for p in [encabezado, cuerpo, extra] if p])
-
-    return registrar_aviso_dentista(cita.dentista, texto)
@@ -118,6 +118,8 @@ document.addEventListener("DOMContentLoaded", () => {
     const btnSubmit    = document.getElementById("btn-submit-cita");
     const formCancelar = document.getElementById("form-cancelar");
     const slotsUrl     = formCita ? formCita.dataset.slotsUrl || "/paciente/api/slots/" : "/paciente/api/slots/";
+    const primerUrl    = formCita ? formCita.dataset.primerUrl || "/paciente/api/slots/primero/" : "/paciente/api/slots/primero/";
+    const btnPrimer    = document.getElementById("btn-primer-espacio");
   
     // Si no estamos en el dashboard paciente, no hacemos nada más
     if (!formCita || !modalCita) {
@@ -436,7 +438,7 @@ document.addEventListener("DOMContentLoaded", () => {
        4. FUNCIÓN AUXILIAR: CONSULTAR HORARIOS (API)
        Se deja dentro del DOMContentLoaded para tener acceso a refs.
     ============================================================ */
-    async function consultarHorarios(fechaStr) {
+    async function consultarHorarios(fechaStr, horaPreferida) {
         if (!servicio || !horaSelect || !btnSubmit) return;
   
         const servicioId = servicio.value;
@@ -460,7 +462,7 @@ document.addEventListener("DOMContentLoaded", () => {
             }
   
             if (data.slots && data.slots.length > 0) {
-                setHorasDesdeSlots(data.slots);
+                setHorasDesdeSlots(data.slots, horaPreferida);
             } else {
                 resetHoras("Lleno / No disponible. Intenta otro día.");
             }
@@ -470,7 +472,7 @@ document.addEventListener("DOMContentLoaded", () => {
         }
     }
 
-    function setHorasDesdeSlots(slots) {
+    function setHorasDesdeSlots(slots, horaPreferida) {
         horaSelect.innerHTML = '<option value="" selected disabled>-- Elige hora --</option>';
         let candidato = null;
         slots.forEach((s) => {
@@ -485,6 +487,9 @@ document.addEventListener("DOMContentLoaded", () => {
             }
             horaSelect.appendChild(opt);
         });
+        if (horaPreferida && slots.some((s) => s.hora === horaPreferida && s.estado !== "ocupado")) {
+            candidato = horaPreferida;
+        }
 
         if (candidato) {
             horaSelect.value = candidato;
@@ -498,6 +503,37 @@ document.addEventListener("DOMContentLoaded", () => {
         }
     }
 
+    /* ------------------------------------------
+       4.1 Botón "Primer espacio disponible"
+       Una sola llamada al servidor en lugar de probar día por día.
+    ------------------------------------------- */
+    if (btnPrimer) {
+        btnPrimer.addEventListener("click", async () => {
+            if (!servicio || !servicio.value) {
+                showToast("Primero elige un tratamiento.", "danger");
+                return;
+            }
+            btnPrimer.disabled = true;
+            try {
+                const res = await fetch(`${primerUrl}?servicio_id=${servicio.value}`);
+                const data = await res.json();
+                const espacio = data.espacios && data.espacios[0];
+                if (!res.ok || !espacio) {
+                    throw new Error(data.msg || "Sin espacios disponibles.");
+                }
+                if (window.citaCalendar) {
+                    window.citaCalendar.setDate(espacio.fecha, false);
+                }
+                fecha.value = espacio.fecha;
+                await consultarHorarios(espacio.fecha, espacio.hora);
+            } catch (err) {
+                showToast(err.message || "No se pudo buscar el primer espacio.", "danger");
+            } finally {
+                btnPrimer.disabled = false;
+            }
+        });
+    }
+
     function resetHoras(mensaje) {
         if (horaSelect) {
             horaSelect.innerHTML = `<option value="">${mensaje}</option>`;
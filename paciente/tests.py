@@ -1,10 +1,12 @@
+from datetime import timedelta
 from unittest.mock import patch
 
 from django.test import TestCase, override_settings, RequestFactory
 from django.urls import reverse
 from django.contrib.auth.models import User
+from django.utils import timezone
 
-from domain.models import Dentista, Paciente, Cita, Pago, Servicio
+from domain.models import Dentista, Paciente, Cita, Pago, ReservaTemporal, Servicio
 from paciente.mp_service import crear_preferencia_pago
 
 
@@ -41,8 +43,37 @@ class PagoMercadoPagoTests(TestCase):
         self.pago.refresh_from_db()
         self.assertEqual(self.pago.metodo, "MERCADOPAGO")
 
+        # Al salir al checkout el hueco queda retenido con su plazo de pago
+        retencion = ReservaTemporal.objects.get(cita=self.cita)
+        self.assertGreater(retencion.expires_at, timezone.now())
+
+    @patch("paciente.views.crear_preferencia_pago", return_value="http://mp.test/checkout")
+    def test_iniciar_pago_renueva_el_plazo_del_checkout(self, mock_pref):
+        retencion = self._retencion(minutos=-1)
+        self.client.login(username="pac3", password="pwd")
+        self.client.post(reverse("paciente:iniciar_pago", args=[self.cita.id]))
+
+        retencion.refresh_from_db()
+        self.assertGreater(retencion.expires_at, timezone.now())
+
+    @patch("paciente.views.crear_preferencia_pago", side_effect=RuntimeError("sin credenciales"))
+    def test_iniciar_pago_fallido_no_retiene(self, mock_pref):
+        self.client.login(username="pac3", password="pwd")
+        self.client.post(reverse("paciente:iniciar_pago", args=[self.cita.id]))
+
+        # No llegó al checkout: la cita no queda expuesta a vencer
+        self.assertFalse(ReservaTemporal.objects.filter(cita=self.cita).exists())
+
+    def _retencion(self, minutos):
+        return ReservaTemporal.objects.create(
+            dentista=self.dentista, paciente=self.paciente, cita=self.cita, fecha=self.cita.fecha,
+            hora_inicio=self.cita.hora_inicio, hora_fin=self.cita.hora_fin,
+            expires_at=timezone.now() + timedelta(minutes=minutos),
+        )
+
     @patch("paciente.views.mercadopago.SDK")
     def test_webhook_actualiza_pago_aprobado(self, mock_sdk):
+        self._retencion(minutos=10)
         # Simular respuesta MP aprobada
         mock_payment = mock_sdk.return_value.payment.return_value
         mock_payment.get.return_value = {
@@ -67,6 +98,8 @@ class PagoMercadoPagoTests(TestCase):
         self.pago.refresh_from_db()
         self.assertEqual(self.pago.estado, "COMPLETADO")
         self.assertEqual(self.pago.metodo, "MERCADOPAGO")
+        # Pago aprobado: la retención del hueco se libera
+        self.assertFalse(ReservaTemporal.objects.filter(cita=self.cita).exists())
 
     @patch("paciente.views.mercadopago.SDK")
     def test_webhook_rechaza_monto_inconsistente(self, mock_sdk):
@@ -148,3 +181,28 @@ class PagoMercadoPagoTests(TestCase):
         self.assertIn("notification_url", call_data)
         self.assertNotIn("secret=", call_data["notification_url"])
         self.assertIn("/paciente/pagos/webhook/testsecret/", call_data["notification_url"])
+
+
+class PresupuestoConsultasPacienteTests(TestCase):
+    """El panel y los pagos del paciente no deben hacer consultas por cita/pago."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="pac_hist", password="pwd")
+        dentista = Dentista.objects.create(user=User.objects.create(username="doc_hist"), nombre="Dr Historial")
+        self.paciente = Paciente.objects.create(user=self.user, dentista=dentista, nombre="Paciente Historial")
+        servicio = Servicio.objects.create(dentista=dentista, nombre="Limpieza", precio=500, duracion_estimada=30)
+        hoy = timezone.localdate()
+        for i in range(30):
+            cita = Cita.objects.create(
+                dentista=dentista, paciente=self.paciente, servicio=servicio,
+                fecha=hoy + timedelta(days=i - 15), hora_inicio="09:00", hora_fin="09:30",
+                estado="COMPLETADA" if i < 15 else "PENDIENTE",
+            )
+            Pago.objects.create(cita=cita, monto=500, metodo="EFECTIVO", estado="COMPLETADO" if i % 2 else "PENDIENTE")
+
+    def test_vistas_dentro_de_presupuesto(self):
+        # PRESUPUESTO_CONSULTAS_ESTRICTO está activo en tests: exceder lanza PresupuestoExcedido
+        self.client.login(username="pac_hist", password="pwd")
+        for nombre in ("paciente:dashboard", "paciente:mis_pagos"):
+            with self.subTest(vista=nombre):
+                self.assertEqual(self.client.get(reverse(nombre)).status_code, 200)
@@ -7,6 +7,7 @@ urlpatterns = [
     # Dashboard
     path('', views.dashboard, name='dashboard'),
     path('api/slots/', views.api_slots, name='api_slots'),
+    path('api/slots/primero/', views.api_primer_espacio, name='api_primer_espacio'),
 
     # Perfil
     path('completar-perfil/', views.completar_perfil_paciente, name='completar_perfil'),
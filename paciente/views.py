@@ -6,6 +6,7 @@ from django.conf import settings
 from django.core.mail import send_mail
 from django.core.signing import TimestampSigner, BadSignature, SignatureExpired
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.http import JsonResponse, HttpResponse
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
@@ -22,7 +23,23 @@ from django.core.cache import cache
 # Importamos modelos
 from domain.models import Paciente, Dentista, Cita, Pago, Servicio, Horario, PenalizacionLog, EncuestaSatisfaccion
 from domain.notifications import enviar_correo_confirmacion_cita
-from domain.ai_services import calcular_penalizacion_paciente, obtener_slots_disponibles
+from domain.ai_services import (
+    buscar_primer_espacio,
+    calcular_penalizacion_paciente,
+    duracion_servicio,
+    es_dia_laboral,
+    firma_slots,
+    obtener_slots_disponibles,
+)
+from domain.catalogo import catalogo_servicios
+from domain.horarios import turnos_del_dia
+from domain.paginacion import paginar_request
+from domain.reservas import HorarioNoDisponible, liberar_retencion, reservar_cita, retener_hueco
+from domain.reservas import reprogramar_cita as reprogramar_cita_agenda
+from proyecto_rc.condicional import con_validadores, etag_de, no_modificada
+from proyecto_rc.metricas import incrementar, observar
+from proyecto_rc.presupuestos import presupuesto_consultas
+from proyecto_rc.trazas import anotar
 from .mp_service import crear_preferencia_pago
 
 # Servicios auxiliares con fallback
@@ -75,8 +92,8 @@ def _reactivar_paciente_si_penalizacion(pago):
 @login_required
 def completar_perfil_paciente(request):
     user = request.user
-    if hasattr(user, 'dentista'): return redirect('dentista:dashboard')
-    if hasattr(user, 'paciente_perfil'): return redirect('paciente:dashboard')
+    if request.perfil.es_dentista: return redirect('dentista:dashboard')
+    if request.perfil.es_paciente: return redirect('paciente:dashboard')
 
     dentista_asignado = Dentista.objects.first()
     if not dentista_asignado:
@@ -102,11 +119,11 @@ def completar_perfil_paciente(request):
 # ========================================================
 # 2. DASHBOARD
 # ========================================================
+@presupuesto_consultas(max=26)
 @login_required
 def dashboard(request):
-    try:
-        paciente = request.user.paciente_perfil
-    except:
+    paciente = request.perfil.paciente
+    if paciente is None:
         return redirect('paciente:completar_perfil')
 
     # Aseguramos que el paciente tenga dentista asignado (fallback al primero)
@@ -127,7 +144,7 @@ def dashboard(request):
         estado__in=['PENDIENTE', 'CONFIRMADA']
     ).filter(
         Q(fecha__gt=hoy) | Q(fecha=hoy, hora_inicio__gte=current_time)
-    ).order_by('fecha', 'hora_inicio').first()
+    ).select_related('servicio', 'dentista').order_by('fecha', 'hora_inicio').first()
     cancel_used_month = Cita.objects.filter(
         paciente=paciente,
         estado="CANCELADA",
@@ -145,13 +162,13 @@ def dashboard(request):
         paciente=paciente
     ).filter(
         Q(fecha__lt=hoy) | Q(fecha=hoy, hora_inicio__lt=current_time)
-    ).order_by('-fecha', '-hora_inicio').prefetch_related('encuestasatisfaccion_set')[:5]
+    ).order_by('-fecha', '-hora_inicio').select_related('servicio', 'dentista').prefetch_related('encuestasatisfaccion_set')[:5]
 
-    # --- NUEVO: Cargamos los servicios para el Modal ---
-    servicios = Servicio.objects.filter(activo=True).order_by('nombre')
+    # --- NUEVO: Cargamos los servicios para el Modal (catálogo en caché, domain/catalogo.py) ---
+    servicios = catalogo_servicios().servicios
 
     pagos_pendientes = Pago.objects.filter(
-        cita__paciente=paciente,
+        paciente=paciente,
         estado="PENDIENTE"
     ).select_related("cita", "cita__servicio").order_by("-created_at")[:3]
 
@@ -180,9 +197,8 @@ def dashboard(request):
 # ========================================================
 @login_required
 def editar_perfil(request):
-    try:
-        paciente = request.user.paciente_perfil
-    except:
+    paciente = request.perfil.paciente
+    if paciente is None:
         return redirect('paciente:completar_perfil')
 
     if request.method == 'POST':
@@ -207,9 +223,8 @@ def editar_perfil(request):
 # ========================================================
 @login_required
 def agendar_cita(request):
-    try:
-        paciente = request.user.paciente_perfil
-    except:
+    paciente = request.perfil.paciente
+    if paciente is None:
         return redirect('paciente:completar_perfil')
 
     penal_info = calcular_penalizacion_paciente(paciente)
@@ -235,7 +250,7 @@ def agendar_cita(request):
                 hora_inicio = datetime.strptime(hora_str, "%H:%M").time()
                 fecha_obj = datetime.strptime(fecha_str, "%Y-%m-%d").date()
 
-                # Validación de rango de fecha (no antes de hoy, no más de 60 días y sin domingos)
+                # Validación de rango de fecha (no antes de hoy, no más de 60 días, día con turnos)
                 hoy = timezone.localdate()
                 limite = hoy + timedelta(days=60)
                 if fecha_obj < hoy:
@@ -244,56 +259,36 @@ def agendar_cita(request):
                 if fecha_obj > limite:
                     messages.error(request, "Solo puedes agendar hasta 60 días a partir de hoy.")
                     return redirect('paciente:dashboard')
-                if fecha_obj.weekday() == 6:  # domingo
-                    messages.error(request, "No se atiende los domingos. Elige otro día.")
+                if not es_dia_laboral(dentista_especialista, fecha_obj):
+                    messages.error(request, "El dentista no atiende ese día. Elige otro día.")
                     return redirect('paciente:dashboard')
 
-                inicio_dt = datetime.combine(fecha_obj, hora_inicio)
-                fin_dt = inicio_dt + timedelta(minutes=servicio.duracion_estimada or 30)
-
                 # Evita agendar en horas ya pasadas el mismo día
                 now_local = timezone.localtime()
                 if fecha_obj == now_local.date() and hora_inicio <= now_local.time():
                     messages.error(request, "No puedes agendar en una hora que ya pasó.")
                     return redirect('paciente:dashboard')
 
-                # Validar que el horario esté disponible para ese servicio/dentista
-                slots_libres = set(
-                    obtener_slots_disponibles(
-                        dentista_especialista,
-                        fecha_obj,
-                        servicio,
-                        minutos_bloque=15,
-                    )
-                )
-                slot_key = hora_inicio.strftime("%H:%M")
-                if slot_key not in slots_libres:
-                    messages.error(request, "Ese horario ya no está disponible. Elige otro.")
-                    return redirect('paciente:dashboard')
-                
-                # Creamos la cita con el especialista correcto
-                nueva_cita = Cita.objects.create(
-                    dentista=dentista_especialista, # <--- AQUÍ ESTÁ EL CAMBIO
-                    paciente=paciente,
-                    servicio=servicio,
-                    fecha=fecha_obj,
-                    hora_inicio=hora_inicio,
-                    hora_fin=fin_dt.time(),
-                    estado='PENDIENTE'
-                )
-
-                # Crear pago pendiente para mostrar en "Pagos en línea"
+                # Validar disponibilidad y crear la cita (con su pago pendiente para
+                # "Pagos en línea") bajo el candado de la agenda del especialista
                 try:
-                    Pago.objects.get_or_create(
-                        cita=nueva_cita,
-                        defaults={
+                    nueva_cita = reservar_cita(
+                        dentista_especialista, # <--- AQUÍ ESTÁ EL CAMBIO
+                        paciente,
+                        servicio,
+                        fecha_obj,
+                        hora_inicio,
+                        pago_defaults={
                             "monto": servicio.precio,
                             "metodo": "MERCADOPAGO",
                             "estado": "PENDIENTE",
-                        }
+                        },
                     )
-                except Exception as e:
-                    print(f"[WARN] No se pudo crear pago pendiente: {e}")
+                except HorarioNoDisponible:
+                    anotar(resultado="ocupado")
+                    messages.error(request, "Ese horario ya no está disponible. Elige otro.")
+                    return redirect('paciente:dashboard')
+                anotar(cita_id=nueva_cita.id, servicio_id=servicio.id, dentista_id=dentista_especialista.id)
 
                 # Correo de confirmación al paciente
                 try:
@@ -321,7 +316,8 @@ def agendar_cita(request):
 
     # GET: Mostrar TODOS los servicios activos de la clínica
     # Ordenamos primero por el dentista del paciente (para sugerirlos primero) y luego por nombre
-    servicios = Servicio.objects.filter(activo=True).order_by('dentista__id', 'nombre')
+    # (sorted es estable: dentro de cada dentista se conserva el orden por nombre del catálogo)
+    servicios = sorted(catalogo_servicios().servicios, key=lambda s: s.dentista_id)
     
     return render(request, 'paciente/agendar_cita.html', {
         'servicios': servicios,
@@ -332,11 +328,11 @@ def agendar_cita(request):
 # ========================================================
 # 5. PAGOS & EXTRAS
 # ========================================================
+@presupuesto_consultas(max=16)
 @login_required
 def mis_pagos(request):
-    try:
-        paciente = request.user.paciente_perfil
-    except:
+    paciente = request.perfil.paciente
+    if paciente is None:
         return redirect('paciente:completar_perfil')
 
     # Evita repetir banners de pago_ok tras cambiar idioma o recargar
@@ -349,7 +345,7 @@ def mis_pagos(request):
     # Aseguramos que exista un pago pendiente para la penalización si el estado es pending
     penal_pago = (
         Pago.objects.filter(
-            cita__paciente=paciente,
+            paciente=paciente,
             estado="PENDIENTE",
             cita__estado="INASISTENCIA",
             monto__gte=Decimal("300"),
@@ -395,13 +391,10 @@ def mis_pagos(request):
                 penal_pago.estado = "PENDIENTE"
                 penal_pago.save(update_fields=["monto", "estado"])
 
-    pagos = (
-        Pago.objects.filter(cita__paciente=paciente)
-        .select_related("cita", "cita__servicio")
-        .order_by("-created_at")
-    )
-    pagos_pendientes = [p for p in pagos if p.estado == "PENDIENTE"]
-    pagos_completados = [p for p in pagos if p.estado == "COMPLETADO"]
+    pagos = Pago.objects.filter(paciente=paciente).select_related("cita", "cita__servicio", "cita__dentista")
+    # Los pendientes son pocos y accionables; el historial completado va por páginas
+    pagos_pendientes = list(pagos.filter(estado="PENDIENTE").order_by("-created_at"))
+    pagos_completados = paginar_request(request, pagos.filter(estado="COMPLETADO"), ("-created_at", "-id"))
 
     return render(request, 'paciente/pagos.html', {
         'pagos_pendientes': pagos_pendientes,
@@ -415,12 +408,11 @@ def iniciar_pago(request, cita_id):
     """
     Crea la preferencia de MercadoPago y redirige al checkout.
     """
-    try:
-        paciente = request.user.paciente_perfil
-    except Exception:
+    paciente = request.perfil.paciente
+    if paciente is None:
         return redirect('paciente:completar_perfil')
 
-    pago = get_object_or_404(Pago, cita__id=cita_id, cita__paciente=paciente)
+    pago = get_object_or_404(Pago, cita_id=cita_id, paciente=paciente)
     if pago.estado == "COMPLETADO":
         messages.info(request, "Este pago ya está completado.")
         return redirect("paciente:mis_pagos")
@@ -434,6 +426,9 @@ def iniciar_pago(request, cita_id):
         # Guardamos método para saber que salió hacia MP
         pago.metodo = "MERCADOPAGO"
         pago.save(update_fields=["metodo"])
+        # La cita sale al checkout: el hueco queda retenido hasta pagar (o se cancela al vencer)
+        if pago.cita.estado == "PENDIENTE":
+            retener_hueco(pago.cita)
         return redirect(init_point)
     except Exception as exc:
         print(f"[MP] Error creando preferencia: {exc}")
@@ -457,7 +452,7 @@ def pago_exitoso(request):
         messages.error(request, "No pudimos validar el pago (sin referencia).")
         return redirect("paciente:mis_pagos")
 
-    pago = Pago.objects.filter(cita__id=cita_id, cita__paciente=request.user.paciente_perfil).first()
+    pago = Pago.objects.filter(cita_id=cita_id, paciente=request.perfil.paciente).first()
     if not pago:
         messages.error(request, "Pago no encontrado para esta cuenta.")
         return redirect("paciente:mis_pagos")
@@ -467,6 +462,7 @@ def pago_exitoso(request):
         pago.estado = "COMPLETADO"
         pago.metodo = pago.metodo or "MERCADOPAGO"
         pago.save(update_fields=["estado", "metodo"])
+        liberar_retencion(pago.cita)
         _reactivar_paciente_si_penalizacion(pago)
         if previo != "COMPLETADO":
             try:
@@ -498,6 +494,20 @@ def pago_pendiente(request):
     return redirect("paciente:mis_pagos")
 
 
+def _registrar_webhook(resultado, response=None):
+    """Cuenta el webhook y, si MP trae la fecha del evento, el retraso hasta procesarlo."""
+    incrementar("rc_webhook_mp_total", resultado=resultado)
+    if not response:
+        return
+    crudo = response.get("date_last_updated") or response.get("date_approved") or response.get("date_created")
+    try:
+        momento = parse_datetime(crudo) if crudo else None
+    except ValueError:
+        momento = None
+    if momento and timezone.is_aware(momento):
+        observar("rc_webhook_mp_lag_segundos", max((timezone.now() - momento).total_seconds(), 0))
+
+
 @csrf_exempt
 def mp_webhook(request, webhook_key=None):
     """
@@ -540,6 +550,7 @@ def mp_webhook(request, webhook_key=None):
 
     cache_key = f"mp:payment:{payment_id}"
     if cache.get(cache_key):
+        _registrar_webhook("duplicado")
         return JsonResponse({"detail": "Evento ya procesado"}, status=200)
 
     sdk = mercadopago.SDK(settings.MERCADOPAGO_ACCESS_TOKEN)
@@ -549,6 +560,7 @@ def mp_webhook(request, webhook_key=None):
         response = payment_info.get("response", {})
     except Exception as exc:
         print(f"[MP] Error consultando pago {payment_id}: {exc}")
+        _registrar_webhook("error_mp")
         return JsonResponse({"detail": "Error consultando pago"}, status=500)
 
     if status != 200:
@@ -586,6 +598,7 @@ def mp_webhook(request, webhook_key=None):
         pago.metodo = "MERCADOPAGO"
         pago.save(update_fields=["estado", "metodo"])
         cache.set(cache_key, True, timeout=3600)
+        liberar_retencion(pago.cita)
         _reactivar_paciente_si_penalizacion(pago)
         if previo != "COMPLETADO":
             try:
@@ -596,6 +609,7 @@ def mp_webhook(request, webhook_key=None):
                 )
             except Exception as exc:
                 print(f"[WARN] Aviso de webhook no guardado: {exc}")
+        _registrar_webhook("aprobado", response)
         return JsonResponse({"detail": "Pago confirmado"}, status=200)
 
     # Otros estados: pending, in_process, rejected...
@@ -604,22 +618,23 @@ def mp_webhook(request, webhook_key=None):
         pago.metodo = "MERCADOPAGO"
         pago.save(update_fields=["estado", "metodo"])
         cache.set(cache_key, True, timeout=900)
+        _registrar_webhook("en_proceso", response)
         return JsonResponse({"detail": "Pago en proceso"}, status=202)
 
+    _registrar_webhook("no_aprobado", response)
     return JsonResponse({"detail": f"Estado no aprobado: {mp_status}"}, status=200)
 
 
 @login_required
 def pagar_penalizacion(request):
-    try:
-        paciente = request.user.paciente_perfil
-    except Paciente.DoesNotExist:
+    paciente = request.perfil.paciente
+    if paciente is None:
         return redirect("paciente:completar_perfil")
 
     info = calcular_penalizacion_paciente(paciente)
     penal_pendiente = (
         Pago.objects.filter(
-            cita__paciente=paciente,
+            paciente=paciente,
             cita__estado="INASISTENCIA",
             estado="PENDIENTE",
             monto__gte=Decimal("300"),
@@ -660,9 +675,8 @@ def cancelar_registro_paciente(request):
 
 @login_required
 def cancelar_cita(request, cita_id):
-    try:
-        paciente = request.user.paciente_perfil
-    except Paciente.DoesNotExist:
+    paciente = request.perfil.paciente
+    if paciente is None:
         return redirect('paciente:completar_perfil')
 
     if request.method != "POST":
@@ -698,6 +712,7 @@ def cancelar_cita(request, cita_id):
 
     cita.estado = "CANCELADA"
     cita.save(update_fields=["estado"])
+    liberar_retencion(cita)
     try:
         crear_aviso_por_cita(cita, "CANCELADA", "Cita cancelada por el paciente")
     except Exception as e:
@@ -713,9 +728,8 @@ def contactar_dentista(request):
     """
     Envía un correo de contacto al buzón del consultorio.
     """
-    try:
-        paciente = request.user.paciente_perfil
-    except Exception:
+    paciente = request.perfil.paciente
+    if paciente is None:
         return JsonResponse({"status": "error", "msg": "Perfil de paciente no encontrado."}, status=400)
 
     destino = "dentista.choyo@gmail.com"
@@ -739,9 +753,8 @@ def contactar_dentista(request):
 
 @login_required
 def feedback_cita(request, cita_id):
-    try:
-        paciente = request.user.paciente_perfil
-    except Exception:
+    paciente = request.perfil.paciente
+    if paciente is None:
         return redirect("paciente:completar_perfil")
 
     cita = get_object_or_404(Cita, id=cita_id, paciente=paciente)
@@ -788,7 +801,7 @@ def confirmar_por_email(request, token):
         messages.error(request, "Enlace inválido o expirado.")
         return redirect("paciente:dashboard")
 
-    cita = get_object_or_404(Cita, id=cita_id, paciente=request.user.paciente_perfil)
+    cita = get_object_or_404(Cita, id=cita_id, paciente=request.perfil.paciente)
     if cita.estado != "CONFIRMADA":
         cita.estado = "CONFIRMADA"
         cita.save(update_fields=["estado"])
@@ -800,14 +813,14 @@ def confirmar_por_email(request, token):
 
 @login_required
 def recibo_pago_pdf(request, pago_id):
-    paciente = getattr(request.user, "paciente_perfil", None)
+    paciente = request.perfil.paciente
     if not paciente:
         return redirect("paciente:dashboard")
 
     pago = get_object_or_404(
         Pago.objects.select_related("cita", "cita__servicio", "cita__dentista", "cita__paciente"),
         id=pago_id,
-        cita__paciente=paciente,
+        paciente=paciente,
     )
 
     def _esc(text):
@@ -911,9 +924,8 @@ def recibo_pago_pdf(request, pago_id):
 
 @login_required
 def reprogramar_cita(request, cita_id):
-    try:
-        paciente = request.user.paciente_perfil
-    except:
+    paciente = request.perfil.paciente
+    if paciente is None:
         return redirect('paciente:completar_perfil')
 
     cita = get_object_or_404(Cita, id=cita_id, paciente=paciente)
@@ -957,50 +969,24 @@ def reprogramar_cita(request, cita_id):
     if fecha_obj > limite:
         messages.error(request, "Solo puedes reprogramar hasta 60 días a partir de hoy.")
         return redirect("paciente:dashboard")
-    if fecha_obj.weekday() == 6:
-        messages.error(request, "No se atiende los domingos. Elige otro día.")
+    if not es_dia_laboral(cita.dentista_id, fecha_obj):
+        messages.error(request, "El dentista no atiende ese día. Elige otro día.")
         return redirect("paciente:dashboard")
 
-    inicio_dt = datetime.combine(fecha_obj, hora_inicio)
-    fin_dt = inicio_dt + timedelta(minutes=cita.servicio.duracion_estimada or 30)
-
     now_local = timezone.localtime()
     if fecha_obj == now_local.date() and hora_inicio <= now_local.time():
         messages.error(request, "No puedes reprogramar a una hora que ya pasó.")
         return redirect("paciente:dashboard")
 
-    # Validar disponibilidad (permitimos el mismo slot original para evitar bloquear reprogramar sin cambios)
-    slots_libres = set(
-        obtener_slots_disponibles(
-            cita.dentista,
-            fecha_obj,
-            cita.servicio,
-            minutos_bloque=15,
-        )
-    )
-    slot_key = hora_inicio.strftime("%H:%M")
-    slot_actual = cita.hora_inicio.strftime("%H:%M")
-    if slot_key not in slots_libres and not (
-        cita.fecha == fecha_obj and slot_key == slot_actual
-    ):
+    # Validar disponibilidad bajo candado (la propia cita no cuenta como ocupada,
+    # así se permite conservar el mismo slot original)
+    cita.recordatorio_24h_enviado = False
+    try:
+        reprogramar_cita_agenda(cita, fecha_obj, hora_inicio, extra_update_fields=["recordatorio_24h_enviado"])
+    except HorarioNoDisponible:
         messages.error(request, "Ese horario ya no está disponible. Elige otro.")
         return redirect("paciente:dashboard")
 
-    cita.fecha = fecha_obj
-    cita.hora_inicio = hora_inicio
-    cita.hora_fin = fin_dt.time()
-    cita.estado = "PENDIENTE"
-    cita.veces_reprogramada = getattr(cita, "veces_reprogramada", 0) + 1
-    cita.recordatorio_24h_enviado = False
-    cita.save(update_fields=[
-        "fecha",
-        "hora_inicio",
-        "hora_fin",
-        "estado",
-        "veces_reprogramada",
-        "recordatorio_24h_enviado",
-    ])
-
     try:
         crear_aviso_por_cita(cita, "REPROGRAMADA", "Cita reprogramada por el paciente")
     except Exception as e:
@@ -1040,23 +1026,28 @@ def api_slots(request):
         return JsonResponse({"slots": [], "msg": "No se permiten fechas pasadas"}, status=400)
     if fecha > limite:
         return JsonResponse({"slots": [], "msg": "Fuera de rango (60 días)"}, status=400)
-    if fecha.weekday() == 6:
-        return JsonResponse({"slots": [], "msg": "No se atiende domingos"}, status=400)
+
+    # Hoy también cuenta el minuto actual: los horarios ya pasados se dejan fuera
+    ahora = timezone.localtime()
+    minuto = ahora.strftime("%H:%M") if fecha == hoy else None
+    etag = etag_de("slots_paciente", minuto, *firma_slots(servicio.dentista_id, fecha, servicio))
+    vigente = no_modificada(request, etag)
+    if vigente:
+        return vigente
 
     dentista = servicio.dentista
-    horarios = Horario.objects.filter(dentista=dentista, dia_semana=fecha.isoweekday())
+    horarios = turnos_del_dia(dentista, fecha)
     if not horarios:
-        return JsonResponse({"slots": [], "msg": "Día no laboral"})
+        return con_validadores(JsonResponse({"slots": [], "msg": "Día no laboral"}), etag)
 
     # Usamos la misma lógica centralizada de domain.ai_services para calcular libres
     libres = set(obtener_slots_disponibles(dentista, fecha, servicio, minutos_bloque=15))
 
     slots = []
-    ahora = timezone.localtime()
-    duracion = servicio.duracion_estimada or 30
-    for h in horarios:
-        cursor = datetime.combine(fecha, h.hora_inicio)
-        fin = datetime.combine(fecha, h.hora_fin)
+    duracion = duracion_servicio(servicio)
+    for h_inicio, h_fin in horarios:
+        cursor = datetime.combine(fecha, h_inicio)
+        fin = datetime.combine(fecha, h_fin)
         while cursor + timedelta(minutes=duracion) <= fin:
             label = cursor.strftime("%H:%M")
             if fecha > hoy or cursor.time() > ahora.time():
@@ -1072,4 +1063,24 @@ def api_slots(request):
             s["recomendado"] = True
             break
 
-    return JsonResponse({"slots": slots})
+    return con_validadores(JsonResponse({"slots": slots}), etag)
+
+
+# ========================================================
+# API PRIMER ESPACIO DISPONIBLE (botón del modal de cita)
+# ========================================================
+def api_primer_espacio(request):
+    servicio_id = request.GET.get("servicio_id")
+    if not servicio_id:
+        return JsonResponse({"espacios": [], "msg": "Faltan parámetros"}, status=400)
+
+    servicio = Servicio.objects.filter(id=servicio_id, activo=True).select_related("dentista").first()
+    if not servicio:
+        return JsonResponse({"espacios": [], "msg": "Servicio no encontrado"}, status=404)
+
+    cualquier_dentista = request.GET.get("cualquier_dentista") == "1"
+    espacios = buscar_primer_espacio(servicio, dias=60, cualquier_dentista=cualquier_dentista)
+    if not espacios:
+        return JsonResponse({"espacios": [], "msg": "Sin espacios en los próximos 60 días"})
+    return JsonResponse({"espacios": [e.como_dict() for e in espacios]})
+
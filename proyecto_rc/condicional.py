@@ -0,0 +1,68 @@
+"""Respuestas condicionales (ETag / Last-Modified) calculadas sin armar el cuerpo.
+
+La vista obtiene primero un validador barato (versiones por entidad de
+domain/versiones.py, domain/horarios.py, OdontogramaVersion, un conteo...)
+y solo si el cliente no tiene esa versión consulta y serializa:
+
+    etag = etag_de("odontograma", paciente.id, version)
+    vigente = no_modificada(request, etag, ultima_modificacion=updated_at)
+    if vigente:
+        return vigente
+    ...
+    return con_validadores(JsonResponse(data), etag, ultima_modificacion=updated_at)
+
+Todo lo que cambie el cuerpo tiene que estar en las partes del ETag: si un
+dato no tiene versión (p. ej. la hora actual en los horarios de hoy) se mete
+su valor redondeado.
+
+Cache-Control por defecto es "private, no-cache": el navegador guarda la
+respuesta pero revalida siempre, así un cambio se ve en la siguiente consulta.
+"""
+
+import hashlib
+
+from django.http import HttpResponseNotModified
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+def etag_de(*partes):
+    """ETag fuerte a partir de valores simples (ids, versiones, fechas)."""
+    resumen = hashlib.blake2b(repr(partes).encode(), digest_size=16).hexdigest()
+    return f'"{resumen}"'
+
+
+def _marcar(respuesta, etag, ultima_modificacion, publica, max_age):
+    if etag:
+        respuesta["ETag"] = etag
+    if ultima_modificacion:
+        respuesta["Last-Modified"] = http_date(ultima_modificacion.timestamp())
+    opciones = {"public": True} if publica else {"private": True}
+    if max_age is None:
+        opciones["no_cache"] = True
+    else:
+        opciones["max_age"] = max_age
+    patch_cache_control(respuesta, **opciones)
+    return respuesta
+
+
+def no_modificada(request, etag=None, ultima_modificacion=None, publica=False, max_age=None):
+    """
+    304 (con los mismos validadores y Cache-Control) si If-None-Match /
+    If-Modified-Since coinciden; None si hay que construir la respuesta.
+    Solo GET y HEAD.
+    """
+    if request.method not in ("GET", "HEAD"):
+        return None
+    marca = int(ultima_modificacion.timestamp()) if ultima_modificacion else None
+    respuesta = get_conditional_response(request, etag=etag, last_modified=marca)
+    if not isinstance(respuesta, HttpResponseNotModified):
+        return None
+    return _marcar(respuesta, etag, ultima_modificacion, publica, max_age)
+
+
+def con_validadores(respuesta, etag=None, ultima_modificacion=None, publica=False, max_age=None):
+    """Pone ETag, Last-Modified y Cache-Control en una respuesta 200 (las de error no se tocan)."""
+    if respuesta.status_code != 200:
+        return respuesta
+    return _marcar(respuesta, etag, ultima_modificacion, publica, max_age)
@@ -0,0 +1,249 @@
+"""Métricas en formato Prometheus (GET /api/metrics/).
+
+    from proyecto_rc.metricas import incrementar, observar
+    incrementar("rc_chatbot_respuestas_total", source="ia")
+    observar("rc_chatbot_llm_segundos", 0.8, resultado="ok")
+
+Contadores e histogramas viven en memoria de cada proceso. Con gunicorn cada
+worker tiene los suyos, así que con METRICAS_DIR cada proceso vuelca su estado
+a METRICAS_DIR/metricas-<pid>.json (un hilo de fondo cada METRICAS_VOLCADO_SEGUNDOS
+si hubo cambios, y al salir) y el endpoint suma todos los archivos del directorio. Los archivos de workers
+ya muertos se siguen sumando para que los contadores no retrocedan; el
+directorio se limpia al arrancar (ops/run_prod.sh).
+
+Los gauges de dominio (reservas retenidas, recordatorios pendientes) se
+calculan en cada scrape con consultas baratas, no dependen del proceso.
+"""
+
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_LLM = (0.25, 0.5, 1, 2, 4, 8, 15, 30)
+BUCKETS_LAG = (1, 5, 15, 30, 60, 300, 900, 3600)
+
+# nombre -> (tipo, ayuda, buckets)
+METRICAS = {
+    "rc_http_requests_total": ("counter", "Requests atendidas por vista, método y código.", None),
+    "rc_http_request_segundos": ("histogram", "Latencia de la request por vista.", BUCKETS_LATENCIA),
+    "rc_db_consultas_segundos": ("histogram", "Tiempo SQL acumulado por request y vista.", BUCKETS_LATENCIA),
+    "rc_cache_horarios_total": ("counter", "Consultas a la caché de horarios (hit/miss).", None),
+    "rc_cache_paneles_total": ("counter", "Paneles del dashboard servidos desde caché o recalculados (hit/miss).", None),
+    "rc_cache_catalogo_total": ("counter", "Catálogo de servicios servido desde caché o reconstruido (hit/miss).", None),
+    "rc_cache_principal_total": ("counter", "Usuarios JWT resueltos desde caché o desde la BD (hit/miss).", None),
+    "rc_emails_total": ("counter", "Correos por resultado (enviado/omitido/error).", None),
+    "rc_chatbot_respuestas_total": ("counter", "Respuestas del chatbot por origen (ia/local/agenda).", None),
+    "rc_chatbot_llm_segundos": ("histogram", "Latencia de la llamada al modelo de IA.", BUCKETS_LLM),
+    "rc_webhook_mp_total": ("counter", "Webhooks de MercadoPago por resultado.", None),
+    "rc_webhook_mp_lag_segundos": ("histogram", "Segundos entre el evento en MercadoPago y su procesamiento.", BUCKETS_LAG),
+}
+
+_lock = threading.Lock()
+# (nombre, (("label", "valor"), ...)) -> valor | [conteos por bucket..., suma, cuenta]
+_contadores = {}
+_histogramas = {}
+_sucio = False
+_volcador = None
+
+
+def _habilitado():
+    return getattr(settings, "METRICAS_HABILITADO", True)
+
+
+def _clave(nombre, labels):
+    return nombre, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def incrementar(nombre, valor=1, **labels):
+    if not _habilitado():
+        return
+    clave = _clave(nombre, labels)
+    with _lock:
+        _contadores[clave] = _contadores.get(clave, 0) + valor
+    _marcar_cambio()
+
+
+def observar(nombre, valor, **labels):
+    if not _habilitado():
+        return
+    buckets = METRICAS[nombre][2]
+    clave = _clave(nombre, labels)
+    with _lock:
+        datos = _histogramas.get(clave)
+        if datos is None:
+            datos = _histogramas[clave] = [0] * len(buckets) + [0.0, 0]
+        for i, limite in enumerate(buckets):
+            if valor <= limite:
+                datos[i] += 1
+        datos[-2] += valor
+        datos[-1] += 1
+    _marcar_cambio()
+
+
+@contextmanager
+def cronometro(nombre, **labels):
+    """Observa la duración del bloque en el histograma `nombre` (label resultado=ok/error)."""
+    inicio = time.perf_counter()
+    resultado = "ok"
+    try:
+        yield
+    except Exception:
+        resultado = "error"
+        raise
+    finally:
+        observar(nombre, time.perf_counter() - inicio, **{"resultado": resultado, **labels})
+
+
+# ---------------------------------------------------------
+# Modo multiproceso (directorio compartido)
+# ---------------------------------------------------------
+def _directorio():
+    ruta = getattr(settings, "METRICAS_DIR", "")
+    return Path(ruta) if ruta else None
+
+
+def _foto():
+    with _lock:
+        return {
+            "contadores": [[nombre, list(map(list, labels)), valor] for (nombre, labels), valor in _contadores.items()],
+            "histogramas": [[nombre, list(map(list, labels)), list(datos)] for (nombre, labels), datos in _histogramas.items()],
+        }
+
+
+def volcar():
+    """Escribe el estado de este proceso en METRICAS_DIR (reemplazo atómico)."""
+    global _sucio
+    directorio = _directorio()
+    if directorio is None:
+        return
+    _sucio = False
+    try:
+        directorio.mkdir(parents=True, exist_ok=True)
+        fd, temporal = tempfile.mkstemp(dir=directorio, prefix=".tmp-")
+        with os.fdopen(fd, "w", encoding="utf-8") as archivo:
+            json.dump(_foto(), archivo)
+        os.replace(temporal, directorio / f"metricas-{os.getpid()}.json")
+    except OSError as exc:
+        print(f"[WARN] No se pudieron volcar métricas: {exc}")
+
+
+def _bucle_volcado(intervalo):
+    while True:
+        time.sleep(intervalo)
+        if _sucio:
+            volcar()
+
+
+def _marcar_cambio():
+    """Arranca (una vez por proceso) el hilo que vuelca periódicamente."""
+    global _sucio, _volcador
+    _sucio = True
+    if _volcador is not None and _volcador.pid == os.getpid():
+        return
+    if _directorio() is None:
+        return
+    with _lock:
+        # Tras un fork (workers de gunicorn) el hilo del padre no existe en el hijo
+        if _volcador is None or _volcador.pid != os.getpid():
+            intervalo = float(getattr(settings, "METRICAS_VOLCADO_SEGUNDOS", 5))
+            hilo = threading.Thread(target=_bucle_volcado, args=(intervalo,), name="metricas-volcado", daemon=True)
+            hilo.pid = os.getpid()
+            hilo.start()
+            _volcador = hilo
+            atexit.register(volcar)
+
+
+def _sumar(foto, contadores, histogramas):
+    for nombre, labels, valor in foto.get("contadores", []):
+        clave = (nombre, tuple(map(tuple, labels)))
+        contadores[clave] = contadores.get(clave, 0) + valor
+    for nombre, labels, datos in foto.get("histogramas", []):
+        clave = (nombre, tuple(map(tuple, labels)))
+        if clave in histogramas:
+            histogramas[clave] = [a + b for a, b in zip(histogramas[clave], datos)]
+        else:
+            histogramas[clave] = list(datos)
+
+
+def agregado():
+    """Contadores e histogramas de todos los procesos (o solo de este, sin METRICAS_DIR)."""
+    contadores, histogramas = {}, {}
+    directorio = _directorio()
+    propio = f"metricas-{os.getpid()}.json"
+    if directorio is not None and directorio.is_dir():
+        for archivo in directorio.glob("metricas-*.json"):
+            # Este proceso se suma en vivo, no desde su último volcado
+            if archivo.name == propio:
+                continue
+            try:
+                _sumar(json.loads(archivo.read_text(encoding="utf-8")), contadores, histogramas)
+            except (OSError, ValueError):
+                continue
+    _sumar(_foto(), contadores, histogramas)
+    return contadores, histogramas
+
+
+def reiniciar():
+    """Solo para pruebas."""
+    with _lock:
+        _contadores.clear()
+        _histogramas.clear()
+
+
+# ---------------------------------------------------------
+# Exposición
+# ---------------------------------------------------------
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pares):
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in pares) + "}"
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def exponer(gauges=None):
+    """
+    Texto en formato de exposición de Prometheus (0.0.4).
+    gauges: {nombre: (ayuda, valor)} calculados al momento del scrape.
+    """
+    contadores, histogramas = agregado()
+    lineas = []
+    for nombre, (tipo, ayuda, buckets) in METRICAS.items():
+        if tipo == "counter":
+            series = sorted((labels, valor) for (n, labels), valor in contadores.items() if n == nombre)
+        else:
+            series = sorted((labels, datos) for (n, labels), datos in histogramas.items() if n == nombre)
+        if not series:
+            continue
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} {tipo}")
+        for labels, valor in series:
+            if tipo == "counter":
+                lineas.append(f"{nombre}{_labels(labels)} {_numero(valor)}")
+                continue
+            for limite, conteo in zip(buckets, valor):
+                lineas.append(f"{nombre}_bucket{_labels(labels + (('le', str(float(limite))),))} {conteo}")
+            lineas.append(f"{nombre}_bucket{_labels(labels + (('le', '+Inf'),))} {valor[-1]}")
+            lineas.append(f"{nombre}_sum{_labels(labels)} {_numero(float(valor[-2]))}")
+            lineas.append(f"{nombre}_count{_labels(labels)} {valor[-1]}")
+
+    for nombre, (ayuda, valor) in (gauges or {}).items():
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} gauge")
+        lineas.append(f"{nombre} {_numero(valor)}")
+    return "\n".join(lineas) + "\n"
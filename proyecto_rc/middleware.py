@@ -1,14 +1,33 @@
-"""Middleware utilitario para registrar contexto de host cuando hay excepciones.
+"""Middleware utilitario del proyecto.
 
-Se evita modificar el flujo de errores: solo registra y vuelve a lanzar.
+- HostLoggingMiddleware: registra contexto de host cuando hay excepciones
+  (no modifica el flujo de errores: solo registra y vuelve a lanzar).
+- PerfilUsuarioMiddleware: resuelve el rol/perfil del usuario una vez por request.
+- PerfiladorSQLMiddleware: perfilado opcional de SQL/latencia por request (muestreado).
+- MetricasMiddleware: conteo, latencia y tiempo SQL por vista para /api/metrics/.
+- TrazasMiddleware: request ID (X-Request-ID) y span raíz de la traza de cada request.
 """
 
+import hmac
 import logging
+import random
+import time
+import traceback
+import uuid
+from collections import defaultdict
+from contextlib import ExitStack
+from pathlib import Path
 
 from django.conf import settings
+from django.db import connections
+
+from accounts.perfiles import PerfilUsuario
+from proyecto_rc import metricas, trazas
+from proyecto_rc.sql import forma_sql
 
 
 logger = logging.getLogger("proyecto_rc.requests")
+logger_perfilador = logging.getLogger("proyecto_rc.perfilador")
 
 
 class HostLoggingMiddleware:
@@ -39,3 +58,200 @@ class HostLoggingMiddleware:
                 exc_info=True,
             )
             raise
+
+
+class TrazasMiddleware:
+    """
+    Asigna request.request_id (el X-Request-ID entrante si es válido, o uno
+    nuevo), lo devuelve en la respuesta y abre el span raíz de la traza.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_id = trazas.request_id_valido(request.headers.get("X-Request-ID")) or uuid.uuid4().hex
+        request.request_id = request_id
+        atributos = {"http.method": request.method, "http.target": request.path}
+        with trazas.traza_request(f"{request.method} {request.path}", request_id, **atributos) as raiz:
+            response = self.get_response(request)
+            match = getattr(request, "resolver_match", None)
+            if match is not None and raiz.nombre is not None:
+                # Nombre por ruta (no por URL) para poder agrupar en el resumen
+                raiz.nombre = f"{request.method} {match.view_name}"
+                raiz.atributo("http.route", match.route)
+            raiz.atributo("http.status_code", response.status_code)
+        response["X-Request-ID"] = request_id
+        return response
+
+
+class PerfilUsuarioMiddleware:
+    """Cuelga request.perfil (perezoso) para vistas, context processors y DRF."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.perfil = PerfilUsuario(request)
+        return self.get_response(request)
+
+
+def _origen_en_proyecto():
+    """Primer frame (desde el más interno) que pertenece al código del proyecto."""
+    base = str(Path(settings.BASE_DIR))
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        archivo = frame.filename
+        if archivo.startswith(base) and "site-packages" not in archivo and not archivo.endswith("middleware.py"):
+            return f"{Path(archivo).relative_to(base)}:{frame.lineno} en {frame.name}"
+    return None
+
+
+class _RegistroSQL:
+    """execute_wrapper que acumula tiempos por consulta y detecta formas repetidas."""
+
+    def __init__(self, umbral_nmas1):
+        self.umbral_nmas1 = umbral_nmas1
+        self.consultas = []
+        self.por_forma = defaultdict(lambda: {"veces": 0, "ms": 0.0, "origen": None})
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            ms = (time.perf_counter() - inicio) * 1000
+            self.consultas.append((ms, sql))
+            grupo = self.por_forma[forma_sql(sql)]
+            grupo["veces"] += 1
+            grupo["ms"] += ms
+            # El stack solo se extrae una vez por forma, al cruzar el umbral
+            if grupo["veces"] == self.umbral_nmas1 + 1:
+                grupo["origen"] = _origen_en_proyecto()
+
+
+class PerfiladorSQLMiddleware:
+    """
+    Registra por request: número de consultas, tiempo SQL, las más lentas y
+    patrones N+1 (misma forma de SQL repetida más de PERFILADOR_SQL_NMAS1 veces,
+    con el frame del proyecto que la originó). Emite una línea JSON en el logger
+    proyecto_rc.perfilador.
+
+    Se activa con PERFILADOR_SQL_HABILITADO y perfila:
+    - un porcentaje de requests (PERFILADOR_SQL_MUESTREO, 0-100), o
+    - las que traen la cabecera X-Perfilar-SQL con PERFILADOR_SQL_TOKEN
+      (sin token configurado, la cabecera solo se acepta con DEBUG).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def _debe_perfilar(self, request):
+        if not getattr(settings, "PERFILADOR_SQL_HABILITADO", False):
+            return False
+        cabecera = request.headers.get("X-Perfilar-SQL")
+        if cabecera:
+            token = getattr(settings, "PERFILADOR_SQL_TOKEN", "")
+            if token:
+                return hmac.compare_digest(cabecera, token)
+            return settings.DEBUG
+        muestreo = float(getattr(settings, "PERFILADOR_SQL_MUESTREO", 0))
+        return muestreo > 0 and random.random() * 100 < muestreo
+
+    def __call__(self, request):
+        if not self._debe_perfilar(request):
+            return self.get_response(request)
+
+        registro = _RegistroSQL(int(getattr(settings, "PERFILADOR_SQL_NMAS1", 5)))
+        inicio = time.perf_counter()
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(registro))
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - inicio) * 1000
+
+        self._emitir(request, response, registro, total_ms)
+        return response
+
+    def _emitir(self, request, response, registro, total_ms):
+        top = int(getattr(settings, "PERFILADOR_SQL_TOP", 5))
+        sql_ms = sum(ms for ms, _ in registro.consultas)
+        lentas = sorted(registro.consultas, key=lambda c: c[0], reverse=True)[:top]
+        nmas1 = sorted(
+            (
+                {"sql": forma[:300], "veces": g["veces"], "ms": round(g["ms"], 2), "origen": g["origen"]}
+                for forma, g in registro.por_forma.items()
+                if g["veces"] > registro.umbral_nmas1
+            ),
+            key=lambda g: g["veces"],
+            reverse=True,
+        )
+        match = getattr(request, "resolver_match", None)
+        vista = getattr(match, "_func_path", None) or getattr(match, "view_name", None)
+
+        datos = {
+            "request_id": getattr(request, "request_id", None),
+            "metodo": request.method,
+            "ruta": request.path,
+            "vista": vista,
+            "status": getattr(response, "status_code", None),
+            "total_ms": round(total_ms, 2),
+            "consultas": len(registro.consultas),
+            "sql_ms": round(sql_ms, 2),
+            "mas_lentas": [{"sql": sql[:300], "ms": round(ms, 2)} for ms, sql in lentas],
+            "nmas1": nmas1,
+        }
+        logger_perfilador.info(
+            "perfil_request %s %s consultas=%d sql_ms=%.1f total_ms=%.1f",
+            request.method,
+            request.path,
+            datos["consultas"],
+            datos["sql_ms"],
+            datos["total_ms"],
+            extra={"perfil": datos},
+        )
+
+
+class _TiempoSQL:
+    """execute_wrapper que solo acumula el tiempo de las consultas del hilo de la request."""
+
+    def __init__(self):
+        self.segundos = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.segundos += time.perf_counter() - inicio
+
+
+class MetricasMiddleware:
+    """
+    Alimenta proyecto_rc.metricas: requests por vista/método/código, latencia y
+    tiempo SQL por request. La vista se toma del nombre de la ruta (cardinalidad
+    acotada); lo que no resuelve ninguna ruta cuenta como "sin_ruta".
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, "METRICAS_HABILITADO", True):
+            return self.get_response(request)
+
+        tiempo_sql = _TiempoSQL()
+        inicio = time.perf_counter()
+        estado = 500
+        try:
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(tiempo_sql))
+                response = self.get_response(request)
+            estado = response.status_code
+            return response
+        finally:
+            match = getattr(request, "resolver_match", None)
+            vista = (getattr(match, "view_name", None) or "sin_ruta") if match else "sin_ruta"
+            metricas.incrementar("rc_http_requests_total", vista=vista, metodo=request.method, estado=estado)
+            metricas.observar("rc_http_request_segundos", time.perf_counter() - inicio, vista=vista)
+            metricas.observar("rc_db_consultas_segundos", tiempo_sql.segundos, vista=vista)
@@ -0,0 +1,114 @@
+"""Presupuestos de consultas SQL por vista.
+
+    @presupuesto_consultas(max=15)
+    @login_required
+    def dashboard_dentista(request): ...
+
+Se aplica como decorador más externo (o en urls.py sobre la vista ya armada,
+p. ej. ClaseAPIView.as_view()) para que cuente también las consultas de
+autenticación. Cada vista decorada queda en PRESUPUESTOS.
+
+- En tests (PRESUPUESTO_CONSULTAS_ESTRICTO) exceder el presupuesto lanza
+  PresupuestoExcedido: la suite falla cuando aparece un N+1. Solo para tests:
+  el conteo se revisa cuando la vista ya terminó, así que sus escrituras ya
+  se confirmaron (TestCase las revierte; en producción quedarían hechas y el
+  cliente recibiría un 500).
+- En producción solo se registra un warning en proyecto_rc.presupuestos con
+  la vista, el conteo y las formas de SQL más repetidas.
+"""
+
+import logging
+import threading
+from collections import Counter
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+from proyecto_rc.sql import forma_sql
+
+
+logger = logging.getLogger("proyecto_rc.presupuestos")
+
+# "modulo.vista" -> máximo de consultas
+PRESUPUESTOS = {}
+
+
+class PresupuestoExcedido(AssertionError):
+    """Una vista hizo más consultas de las que tiene presupuestadas."""
+
+
+class _ContadorSQL:
+    """
+    execute_wrapper mínimo: solo guarda el SQL (las formas se calculan si se excede).
+    Ignora otros hilos que compartan la conexión (LiveServerTestCase con SQLite en memoria).
+    """
+
+    def __init__(self):
+        self.hilo = threading.get_ident()
+        self.consultas = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if threading.get_ident() == self.hilo:
+            self.consultas.append(sql)
+        return execute(sql, params, many, context)
+
+
+def _nombre_vista(vista):
+    clase = getattr(vista, "view_class", None)
+    if clase is not None:
+        return f"{clase.__module__}.{clase.__name__}"
+    return f"{vista.__module__}.{vista.__qualname__}"
+
+
+def _reportar(nombre, maximo, request, contador):
+    top = int(getattr(settings, "PRESUPUESTO_CONSULTAS_TOP", 5))
+    repetidas = Counter(forma_sql(sql) for sql in contador.consultas).most_common(top)
+    datos = {
+        "request_id": getattr(request, "request_id", None),
+        "vista": nombre,
+        "metodo": request.method,
+        "ruta": request.path,
+        "consultas": len(contador.consultas),
+        "maximo": maximo,
+        "repetidas": [{"sql": forma[:300], "veces": veces} for forma, veces in repetidas],
+    }
+    mensaje = "presupuesto_consultas excedido en %s: %d consultas (máximo %d) %s %s"
+    args = (nombre, datos["consultas"], maximo, request.method, request.path)
+    if getattr(settings, "PRESUPUESTO_CONSULTAS_ESTRICTO", False):
+        detalle = "\n".join(f"  {r['veces']}x {r['sql']}" for r in datos["repetidas"])
+        raise PresupuestoExcedido((mensaje % args) + "\nConsultas más repetidas:\n" + detalle)
+    logger.warning(mensaje, *args, extra={"presupuesto": datos})
+
+
+def presupuesto_consultas(max):
+    """Limita el número de consultas SQL de una vista (ver docstring del módulo)."""
+    maximo = max
+
+    def decorador(vista):
+        nombre = _nombre_vista(vista)
+        PRESUPUESTOS[nombre] = maximo
+
+        @wraps(vista)
+        def envuelta(request, *args, **kwargs):
+            if not getattr(settings, "PRESUPUESTO_CONSULTAS_HABILITADO", True):
+                return vista(request, *args, **kwargs)
+
+            contador = _ContadorSQL()
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(contador))
+                response = vista(request, *args, **kwargs)
+                # Respuestas perezosas (DRF / TemplateResponse): contamos también su render
+                if callable(getattr(response, "render", None)) and not getattr(response, "is_rendered", True):
+                    response.render()
+
+            if len(contador.consultas) > maximo:
+                _reportar(nombre, maximo, request, contador)
+            return response
+
+        envuelta.presupuesto_consultas = maximo
+        return envuelta
+
+    return decorador
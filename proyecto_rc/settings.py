@@ -95,11 +95,18 @@ ACCOUNT_DEFAULT_HTTP_PROTOCOL = os.getenv(
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    # Request ID y span raíz de las trazas (ver TRAZAS_* más abajo)
+    "proyecto_rc.middleware.TrazasMiddleware",
+    # Perfilado SQL opcional (ver PERFILADOR_SQL_* más abajo); no hace nada si está apagado
+    "proyecto_rc.middleware.PerfiladorSQLMiddleware",
+    # Métricas Prometheus por vista (ver METRICAS_* más abajo)
+    "proyecto_rc.middleware.MetricasMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.locale.LocaleMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "proyecto_rc.middleware.PerfilUsuarioMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "allauth.account.middleware.AccountMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
@@ -157,6 +164,13 @@ DATABASES = {
     }
 }
 
+# Desarrollo / pruebas de rendimiento locales sin MySQL (p. ej. generar_datos_sinteticos)
+if os.getenv("SQLITE_PATH"):
+    DATABASES["default"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.getenv("SQLITE_PATH"),
+    }
+
 # Para ejecutar tests sin requerir permisos CREATE en MySQL,
 # usamos SQLite cuando el comando incluye "test".
 if "test" in sys.argv:
@@ -274,7 +288,7 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # DRF / JWT
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "accounts.principal.JWTPrincipalAuthentication",
     ),
     # Solo autenticados por defecto; abre endpoints puntuales con AllowAny.
     "DEFAULT_PERMISSION_CLASSES": (
@@ -291,6 +305,13 @@ REST_FRAMEWORK = {
     },
 }
 
+SIMPLE_JWT = {
+    # Claims rol/perfil_id para resolver el perfil sin consultas (accounts/principal.py)
+    "TOKEN_OBTAIN_SERIALIZER": "accounts.principal.TokenConPerfilSerializer",
+}
+# Segundos que el usuario del JWT vive en caché; save/delete del User lo invalidan antes
+JWT_PRINCIPAL_TTL = int(os.getenv("JWT_PRINCIPAL_TTL", "60"))
+
 # MercadoPago
 MERCADOPAGO_PUBLIC_KEY = os.getenv("MERCADOPAGO_PUBLIC_KEY", "")
 MERCADOPAGO_ACCESS_TOKEN = os.getenv("MERCADOPAGO_ACCESS_TOKEN", "")
@@ -352,13 +373,25 @@ CSRF_COOKIE_HTTPONLY = _env_bool("CSRF_COOKIE_HTTPONLY", True)
 # ====================================
 # 14. CACHE (para throttling y webhooks)
 # ====================================
-# En prod usa Redis/Memcached; aquí dejamos LocMem por defecto.
-CACHES = {
-    "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "proyecto-rc-cache",
+# En prod usa Redis (REDIS_URL, requiere el paquete redis); sin él, LocMem por proceso.
+# Las versiones de horarios y de paneles del dashboard solo invalidan entre
+# workers de gunicorn si la caché es compartida.
+REDIS_URL = os.getenv("REDIS_URL", "")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "proyecto_rc",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "proyecto-rc-cache",
+        }
     }
-}
 
 # ====================================
 # 15. LOGGING
@@ -405,13 +438,63 @@ LOGGING = {
             "level": "WARNING",
             "propagate": False,
         },
+        "proyecto_rc.perfilador": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
+        "proyecto_rc.presupuestos": {
+            "handlers": ["console"],
+            "level": "WARNING",
+            "propagate": False,
+        },
     },
 }
 
+# Perfilador de SQL por request (proyecto_rc.middleware.PerfiladorSQLMiddleware)
+PERFILADOR_SQL_HABILITADO = _env_bool("PERFILADOR_SQL_HABILITADO", False)
+PERFILADOR_SQL_MUESTREO = float(os.getenv("PERFILADOR_SQL_MUESTREO", "1"))  # % de requests
+PERFILADOR_SQL_TOKEN = os.getenv("PERFILADOR_SQL_TOKEN", "")  # para X-Perfilar-SQL
+PERFILADOR_SQL_NMAS1 = int(os.getenv("PERFILADOR_SQL_NMAS1", "5"))
+PERFILADOR_SQL_TOP = int(os.getenv("PERFILADOR_SQL_TOP", "5"))
+
+# Presupuestos de consultas por vista (proyecto_rc.presupuestos.presupuesto_consultas)
+# En tests exceder un presupuesto falla la prueba; en producción solo deja un warning.
+# El modo estricto no se lee del entorno: la excepción llega después de que la vista
+# confirmó sus escrituras, así que solo tiene sentido dentro de la suite.
+PRESUPUESTO_CONSULTAS_HABILITADO = _env_bool("PRESUPUESTO_CONSULTAS_HABILITADO", True)
+PRESUPUESTO_CONSULTAS_ESTRICTO = "test" in sys.argv
+PRESUPUESTO_CONSULTAS_TOP = int(os.getenv("PRESUPUESTO_CONSULTAS_TOP", "5"))
+
+# Métricas Prometheus (proyecto_rc.metricas, GET /api/metrics/)
+# METRICAS_TOKEN protege el endpoint (Authorization: Bearer <token>); sin token solo responde con DEBUG.
+# Con varios workers (gunicorn) define METRICAS_DIR: cada proceso vuelca ahí y el endpoint suma.
+METRICAS_HABILITADO = _env_bool("METRICAS_HABILITADO", True)
+METRICAS_TOKEN = os.getenv("METRICAS_TOKEN", "")
+METRICAS_DIR = os.getenv("METRICAS_DIR", "")
+METRICAS_VOLCADO_SEGUNDOS = float(os.getenv("METRICAS_VOLCADO_SEGUNDOS", "5"))
+
+# Trazas (proyecto_rc.trazas): JSONL con forma OTLP en TRAZAS_DIR, un archivo por proceso.
+# Resumen de las más lentas: python manage.py trazas
+TRAZAS_HABILITADO = _env_bool("TRAZAS_HABILITADO", False)
+TRAZAS_DIR = os.getenv("TRAZAS_DIR", str(BASE_DIR / "logs" / "trazas"))
+TRAZAS_MUESTREO = float(os.getenv("TRAZAS_MUESTREO", "100"))  # % de requests
+TRAZAS_UMBRAL_MS = float(os.getenv("TRAZAS_UMBRAL_MS", "0"))  # solo exporta las más lentas que esto
+TRAZAS_MAX_BYTES = int(os.getenv("TRAZAS_MAX_BYTES", str(10 * 1024 * 1024)))
+TRAZAS_ARCHIVOS = int(os.getenv("TRAZAS_ARCHIVOS", "5"))
+
 # ====================================
 # 16. CONTROLES DE ENDPOINTS PUBLICOS
 # ====================================
 CHATBOT_REQUIRE_SECRET = _env_bool("CHATBOT_REQUIRE_SECRET", not DEBUG)
 CHATBOT_RATE_LIMIT_MAX = int(os.getenv("CHATBOT_RATE_LIMIT_MAX", "20"))
 CHATBOT_RATE_LIMIT_WINDOW = int(os.getenv("CHATBOT_RATE_LIMIT_WINDOW", "60"))
+# Segundos sin mensajes tras los que se olvida el historial de una conversación (domain/conversaciones.py)
+CHATBOT_HISTORIAL_TTL = int(os.getenv("CHATBOT_HISTORIAL_TTL", "1800"))
 WEBHOOK_MAX_BODY_BYTES = int(os.getenv("WEBHOOK_MAX_BODY_BYTES", "32768"))
+
+# ====================================
+# 17. AGENDA / RESERVAS
+# ====================================
+# Minutos para pagar una cita reservada con checkout en línea; después se cancela y el hueco se libera
+RESERVA_TEMPORAL_MINUTOS = int(os.getenv("RESERVA_TEMPORAL_MINUTOS", "15"))
@@ -0,0 +1,20 @@
+"""Utilidades de SQL compartidas por el perfilador (middleware.py) y los presupuestos.
+
+forma_sql quita los parámetros de una consulta para agrupar las que solo
+difieren en ellos: un N+1 aparece como la misma forma repetida.
+"""
+
+import re
+
+# Literales que cambian entre ejecuciones de la misma consulta (números, cadenas, listas IN)
+_RE_CADENA = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMERO = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_LISTA_IN = re.compile(r"\bIN \((?:\s*(?:%s|\?),?)+\)", re.IGNORECASE)
+
+
+def forma_sql(sql):
+    """Normaliza la consulta para agrupar las que solo difieren en parámetros."""
+    forma = _RE_CADENA.sub("?", sql)
+    forma = _RE_NUMERO.sub("?", forma)
+    forma = forma.replace("%s", "?")
+    return _RE_LISTA_IN.sub("IN (...)", forma)
@@ -0,0 +1,300 @@
+"""Trazas ligeras: spans anidados con tiempos y atributos, exportados a JSONL local.
+
+    from proyecto_rc.trazas import anotar, span, trazar
+
+    @trazar()
+    def obtener_slots_disponibles(...): ...
+
+    with span("pago.crear", cita_id=cita.id):
+        ...
+
+TrazasMiddleware abre el span raíz de cada request con su request ID
+(cabecera X-Request-ID o uno nuevo, que se devuelve en la respuesta). Los
+spans de dominio se cuelgan del span activo (contextvars); fuera de una
+request (comandos) el primer span abre su propia traza.
+
+Al cerrar la raíz, la traza completa se escribe como una línea JSON con la
+forma de OTLP/JSON (resourceSpans -> scopeSpans -> spans) en
+TRAZAS_DIR/trazas-<pid>.jsonl, con rotación por tamaño. Es un archivo por
+proceso para que los workers de gunicorn no se pisen al rotar.
+
+Con TRAZAS_HABILITADO apagado todo es no-op. `manage.py trazas` resume las
+trazas más lentas.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from django.conf import settings
+
+
+# Códigos de estado OTLP
+ESTADO_SIN_DEFINIR = 0
+ESTADO_ERROR = 2
+# Tipos de span OTLP
+TIPO_INTERNO = 1
+TIPO_SERVIDOR = 2
+
+_RE_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+_RE_TRACE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+_traza_actual = contextvars.ContextVar("traza_actual", default=None)
+_span_actual = contextvars.ContextVar("span_actual", default=None)
+
+_lock = threading.Lock()
+_exportador = None  # (ruta, RotatingFileHandler); la ruta lleva el pid
+
+
+class Span:
+    __slots__ = ("nombre", "span_id", "padre_id", "tipo", "inicio_ns", "fin_ns", "atributos", "error")
+
+    def __init__(self, nombre, padre_id=None, tipo=TIPO_INTERNO, atributos=None):
+        self.nombre = nombre
+        self.span_id = uuid.uuid4().hex[:16]
+        self.padre_id = padre_id
+        self.tipo = tipo
+        self.inicio_ns = time.time_ns()
+        self.fin_ns = None
+        self.atributos = dict(atributos or {})
+        self.error = None
+
+    def atributo(self, clave, valor):
+        self.atributos[clave] = valor
+
+
+class _SpanNulo:
+    """Lo que se entrega cuando no se traza: acepta atributos y los descarta."""
+
+    nombre = None
+
+    def atributo(self, clave, valor):
+        pass
+
+
+_SPAN_NULO = _SpanNulo()
+# Marca de "request no muestreada": sus spans hijos tampoco se registran
+_NO_MUESTREADA = object()
+
+
+class _Traza:
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+        self.spans = []
+
+
+def _habilitado():
+    return getattr(settings, "TRAZAS_HABILITADO", False)
+
+
+def request_id_valido(valor):
+    """El X-Request-ID entrante solo se propaga si es corto y sin caracteres raros."""
+    return valor if valor and _RE_REQUEST_ID.match(valor) else None
+
+
+@contextmanager
+def _abrir(nombre, atributos, traza=None, tipo=TIPO_INTERNO):
+    raiz = traza is not None
+    if not raiz:
+        traza = _traza_actual.get()
+        if traza is _NO_MUESTREADA or (traza is None and not _habilitado()):
+            yield _SPAN_NULO
+            return
+        if traza is None:
+            raiz = True
+            traza = _Traza(uuid.uuid4().hex)
+
+    padre = None if raiz else _span_actual.get()
+    actual = Span(nombre, padre.span_id if padre else None, tipo, atributos)
+    traza.spans.append(actual)
+    token_traza = _traza_actual.set(traza) if raiz else None
+    token_span = _span_actual.set(actual)
+    try:
+        yield actual
+    except BaseException as exc:
+        actual.error = f"{type(exc).__name__}: {exc}"[:300]
+        raise
+    finally:
+        actual.fin_ns = time.time_ns()
+        _span_actual.reset(token_span)
+        if raiz:
+            _traza_actual.reset(token_traza)
+            exportar(traza)
+
+
+def span(nombre, **atributos):
+    """Context manager: span hijo del activo (o raíz de una traza nueva)."""
+    return _abrir(nombre, atributos)
+
+
+@contextmanager
+def traza_request(nombre, request_id, **atributos):
+    """Span raíz de una request; respeta TRAZAS_MUESTREO (0-100)."""
+    muestreo = float(getattr(settings, "TRAZAS_MUESTREO", 100))
+    if not _habilitado() or random.random() * 100 >= muestreo:
+        token = _traza_actual.set(_NO_MUESTREADA)
+        try:
+            yield _SPAN_NULO
+        finally:
+            _traza_actual.reset(token)
+        return
+
+    # Si el request ID ya tiene forma de trace id (32 hex) se usa tal cual
+    trace_id = request_id if _RE_TRACE_ID.match(request_id) else uuid.uuid4().hex
+    atributos = {"request.id": request_id, **atributos}
+    with _abrir(nombre, atributos, traza=_Traza(trace_id), tipo=TIPO_SERVIDOR) as raiz:
+        yield raiz
+
+
+def trazar(nombre=None, **atributos):
+    """Decorador: envuelve cada llamada en un span (por defecto modulo.funcion)."""
+
+    def decorador(funcion):
+        nombre_span = nombre or f"{funcion.__module__}.{funcion.__qualname__}"
+
+        @wraps(funcion)
+        def envuelta(*args, **kwargs):
+            with _abrir(nombre_span, atributos):
+                return funcion(*args, **kwargs)
+
+        return envuelta
+
+    return decorador
+
+
+def anotar(**atributos):
+    """Agrega atributos al span activo (no hace nada si no se está trazando)."""
+    actual = _span_actual.get()
+    if actual is not None:
+        actual.atributos.update(atributos)
+
+
+# ---------------------------------------------------------
+# Exportación OTLP/JSON
+# ---------------------------------------------------------
+def _valor_otlp(valor):
+    if isinstance(valor, bool):
+        return {"boolValue": valor}
+    if isinstance(valor, int):
+        return {"intValue": str(valor)}
+    if isinstance(valor, float):
+        return {"doubleValue": valor}
+    return {"stringValue": str(valor)}
+
+
+def _atributos_otlp(atributos):
+    return [{"key": clave, "value": _valor_otlp(valor)} for clave, valor in atributos.items()]
+
+
+def a_otlp(traza):
+    spans = []
+    for s in traza.spans:
+        estado = {"code": ESTADO_ERROR, "message": s.error} if s.error else {"code": ESTADO_SIN_DEFINIR}
+        spans.append({
+            "traceId": traza.trace_id,
+            "spanId": s.span_id,
+            "parentSpanId": s.padre_id or "",
+            "name": s.nombre,
+            "kind": s.tipo,
+            "startTimeUnixNano": str(s.inicio_ns),
+            "endTimeUnixNano": str(s.fin_ns or s.inicio_ns),
+            "attributes": _atributos_otlp(s.atributos),
+            "status": estado,
+        })
+    recurso = {"service.name": "proyecto_rc", "process.pid": os.getpid()}
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _atributos_otlp(recurso)},
+            "scopeSpans": [{"scope": {"name": "proyecto_rc.trazas"}, "spans": spans}],
+        }]
+    }
+
+
+def _archivo():
+    global _exportador
+    ruta = Path(settings.TRAZAS_DIR) / f"trazas-{os.getpid()}.jsonl"
+    if _exportador is None or _exportador[0] != ruta:
+        with _lock:
+            if _exportador is None or _exportador[0] != ruta:
+                ruta.parent.mkdir(parents=True, exist_ok=True)
+                handler = RotatingFileHandler(
+                    ruta,
+                    maxBytes=int(getattr(settings, "TRAZAS_MAX_BYTES", 10 * 1024 * 1024)),
+                    backupCount=int(getattr(settings, "TRAZAS_ARCHIVOS", 5)),
+                    encoding="utf-8",
+                    delay=True,
+                )
+                if _exportador is not None:
+                    _exportador[1].close()
+                _exportador = (ruta, handler)
+    return _exportador[1]
+
+
+def exportar(traza):
+    raiz = traza.spans[0]
+    duracion_ms = (raiz.fin_ns - raiz.inicio_ns) / 1e6
+    if duracion_ms < float(getattr(settings, "TRAZAS_UMBRAL_MS", 0)):
+        return
+    try:
+        linea = json.dumps(a_otlp(traza), ensure_ascii=False, separators=(",", ":"))
+        _archivo().handle(logging.makeLogRecord({"msg": linea, "levelno": logging.INFO}))
+    except Exception as exc:
+        print(f"[WARN] No se pudo exportar la traza {traza.trace_id}: {exc}")
+
+
+# ---------------------------------------------------------
+# Lectura (manage.py trazas)
+# ---------------------------------------------------------
+def _valor_plano(valor):
+    if "intValue" in valor:
+        return int(valor["intValue"])
+    return next(iter(valor.values()), None)
+
+
+def leer_trazas(directorio):
+    """
+    Lee los JSONL (incluidos los rotados) y devuelve una lista de trazas:
+    {"trace_id", "spans": [{"id", "padre", "nombre", "inicio_ns", "duracion_ms", "atributos", "error"}]}
+    """
+    trazas = []
+    for archivo in sorted(Path(directorio).glob("trazas-*.jsonl*")):
+        with open(archivo, encoding="utf-8") as fh:
+            for linea in fh:
+                try:
+                    datos = json.loads(linea)
+                except ValueError:
+                    continue
+                spans = [
+                    s
+                    for recurso in datos.get("resourceSpans", [])
+                    for alcance in recurso.get("scopeSpans", [])
+                    for s in alcance.get("spans", [])
+                ]
+                if not spans:
+                    continue
+                trazas.append({
+                    "trace_id": spans[0]["traceId"],
+                    "spans": [
+                        {
+                            "id": s["spanId"],
+                            "padre": s.get("parentSpanId") or None,
+                            "nombre": s["name"],
+                            "inicio_ns": int(s["startTimeUnixNano"]),
+                            "duracion_ms": (int(s["endTimeUnixNano"]) - int(s["startTimeUnixNano"])) / 1e6,
+                            "atributos": {a["key"]: _valor_plano(a["value"]) for a in s.get("attributes", [])},
+                            "error": (s.get("status") or {}).get("message"),
+                        }
+                        for s in spans
+                    ],
+                })
+    return trazas
@@ -28,6 +28,17 @@ document.addEventListener("DOMContentLoaded", () => {
       chatBox.scrollTop = chatBox.scrollHeight;
     }
   
+    // Token de la conversación (historial en el servidor, sin cookie de sesión)
+    const CONVERSACION_KEY = "rc_chatbot_conversacion";
+
+    function leerConversacion() {
+      try { return sessionStorage.getItem(CONVERSACION_KEY); } catch (e) { return null; }
+    }
+
+    function guardarConversacion(token) {
+      try { if (token) sessionStorage.setItem(CONVERSACION_KEY, token); } catch (e) { /* sin storage */ }
+    }
+
     async function enviarMensaje(texto) {
       const mensaje = texto.trim();
       if (!mensaje) return;
@@ -42,10 +53,11 @@ document.addEventListener("DOMContentLoaded", () => {
             "Content-Type": "application/json",
             "X-Requested-With": "XMLHttpRequest",
           },
-          body: JSON.stringify({ query: mensaje }), // la API espera "query"
+          body: JSON.stringify({ query: mensaje, conversacion: leerConversacion() }), // la API espera "query"
         });
 
         const data = await resp.json().catch(() => ({}));
+        guardarConversacion(data.conversacion);
         const respuesta = data.message ?? (resp.ok ? "No pude procesar tu consulta en este momento." : "⚠️ Error al conectar. Intenta de nuevo.");
         agregarMensaje(respuesta, "bot");
       } catch (error) {
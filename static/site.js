@@ -106,6 +106,15 @@ function initChatbot() {
         return div;
     };
 
+    // Token de la conversación (historial en el servidor, sin cookie de sesión)
+    const CONVERSACION_KEY = 'rc_chatbot_conversacion';
+    const leerConversacion = () => {
+        try { return sessionStorage.getItem(CONVERSACION_KEY); } catch (e) { return null; }
+    };
+    const guardarConversacion = (token) => {
+        try { if (token) sessionStorage.setItem(CONVERSACION_KEY, token); } catch (e) { /* sin storage */ }
+    };
+
     // Lógica de envío al backend (API Django)
     const send = async (text) => {
         if (!text.trim()) return;
@@ -121,10 +130,11 @@ function initChatbot() {
                 'X-Requested-With': 'XMLHttpRequest'
                 // Si usas CSRF token en headers, agrégalo aquí
             },
-            body: JSON.stringify({ query: text })
+            body: JSON.stringify({ query: text, conversacion: leerConversacion() })
         });
 
             const data = await res.json().catch(() => ({}));
+            guardarConversacion(data.conversacion);
             loader.remove();
 
             const respuestas = Array.isArray(data.messages) && data.messages.length